@@ -0,0 +1,166 @@
+"""
+EPAR Data Portal - Catalog Snapshot
+Compact, dictionary-encoded copy of all project metadata for client-side filtering.
+
+Facet values (research areas, geographies, people, output types, partners,
+file types) are interned into sorted dictionaries and projects reference them
+by index, so each distinct value is sent once. The snapshot is gzipped once
+per catalog generation (the latest catalog_changes seq) and served with an
+ETag, so unchanged clients revalidate with a 304.
+"""
+
+import gzip
+import json
+import logging
+import threading
+from typing import Any, Dict, List, Optional
+
+try:
+    from api.metrics import CACHE_REQUESTS
+except ImportError:
+    from metrics import CACHE_REQUESTS
+
+logger = logging.getLogger(__name__)
+
+# Bump when the encoding changes so cached copies are not reused
+SNAPSHOT_VERSION = 2
+
+PROJECT_COLUMNS = [
+    'id', 'projectCode', 'title', 'dateInitialRequest', 'dateCompletion',
+    'poContact', 'otherPos', 'agdevPartner', 'outputType',
+    'researchAreas', 'geographies', 'lastUploadDate', 'files'
+]
+
+# size is in bytes; blobPath is only sent when it is not {projectCode}/{name}
+FILE_COLUMNS = ['id', 'name', 'type', 'size', 'blobPath']
+
+
+def snapshot_etag(generation: int) -> str:
+    """Weak ETag: the same for the gzipped and plain representations."""
+    return f'W/"catalog-v{SNAPSHOT_VERSION}-{generation}"'
+
+
+def encode_file(project_code: str, file: Dict[str, Any], file_types: Dict[str, int]) -> List[Any]:
+    """File row; the blob path is omitted when it follows the usual layout."""
+    row = [file['id'], file['name'], file_types[file['type']], file['size']]
+    if file['blobPath'] != f"{project_code}/{file['name']}":
+        row.append(file['blobPath'])
+    return row
+
+
+def encode_catalog(generation: int, projects: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Dictionary-encode the catalog.
+
+    Args:
+        generation: Catalog generation the projects were read at
+        projects: Projects in API field names, each with files
+            [{id, name, type, size (bytes), blobPath}]
+
+    Returns:
+        Snapshot dict (see PROJECT_COLUMNS and FILE_COLUMNS)
+    """
+    values = {
+        'researchAreas': set(),
+        'geographies': set(),
+        'people': set(),
+        'outputTypes': set(),
+        'agdevPartners': set(),
+        'fileTypes': set()
+    }
+    for project in projects:
+        values['researchAreas'].update(project['researchAreas'])
+        values['geographies'].update(project['geographies'])
+        values['people'].update(person for person in [project['poContact'], *project['otherPos']] if person)
+        if project['outputType']:
+            values['outputTypes'].add(project['outputType'])
+        if project['agdevPartner']:
+            values['agdevPartners'].add(project['agdevPartner'])
+        values['fileTypes'].update(file['type'] for file in project['files'])
+
+    dictionaries = {name: sorted(found) for name, found in values.items()}
+    index = {name: {value: i for i, value in enumerate(table)} for name, table in dictionaries.items()}
+
+    def ref(name: str, value: Optional[str]) -> Optional[int]:
+        return index[name][value] if value else None
+
+    rows = []
+    for project in projects:
+        rows.append([
+            project['id'],
+            project['projectCode'],
+            project['title'],
+            project['dateInitialRequest'] or None,
+            project['dateCompletion'] or None,
+            ref('people', project['poContact']),
+            [index['people'][person] for person in project['otherPos'] if person],
+            ref('agdevPartners', project['agdevPartner']),
+            ref('outputTypes', project['outputType']),
+            [index['researchAreas'][area] for area in project['researchAreas']],
+            [index['geographies'][geography] for geography in project['geographies']],
+            project['lastUploadDate'],
+            [encode_file(project['projectCode'], file, index['fileTypes']) for file in project['files']]
+        ])
+
+    return {
+        'version': SNAPSHOT_VERSION,
+        'generation': generation,
+        'dictionaries': dictionaries,
+        'columns': PROJECT_COLUMNS,
+        'fileColumns': FILE_COLUMNS,
+        'projects': rows
+    }
+
+
+class CatalogSnapshot:
+    """One encoded generation, kept as gzip and plain JSON bytes."""
+
+    def __init__(self, generation: int, projects: List[Dict[str, Any]]):
+        self.generation = generation
+        self.etag = snapshot_etag(generation)
+        self.body = json.dumps(encode_catalog(generation, projects), separators=(',', ':')).encode('utf-8')
+        # mtime=0 keeps the bytes identical across instances
+        self.gzip_body = gzip.compress(self.body, compresslevel=9, mtime=0)
+        self.project_count = len(projects)
+
+
+class CatalogSnapshotCache:
+    """Builds the snapshot once per catalog generation."""
+
+    def __init__(self, repository):
+        """
+        Initialize the cache.
+
+        Args:
+            repository: Catalog repository (catalog_generation, list_catalog)
+        """
+        self.repository = repository
+        self._snapshot: Optional[CatalogSnapshot] = None
+        self._lock = threading.Lock()
+
+    def current_etag(self) -> str:
+        """ETag of the current generation, without building anything."""
+        return snapshot_etag(self.repository.catalog_generation())
+
+    def get(self) -> CatalogSnapshot:
+        """Snapshot of the current generation, rebuilt only after catalog changes."""
+        generation = self.repository.catalog_generation()
+        snapshot = self._snapshot
+        if snapshot and snapshot.generation == generation:
+            CACHE_REQUESTS.inc('catalog', 'hit')
+            return snapshot
+
+        # One rebuild at a time; concurrent requests wait for it
+        with self._lock:
+            snapshot = self._snapshot
+            if snapshot and snapshot.generation >= generation:
+                CACHE_REQUESTS.inc('catalog', 'hit')
+                return snapshot
+            CACHE_REQUESTS.inc('catalog', 'miss')
+            generation, projects = self.repository.list_catalog()
+            snapshot = CatalogSnapshot(generation, projects)
+            self._snapshot = snapshot
+
+        logger.info(f"Built catalog snapshot generation {snapshot.generation}: {snapshot.project_count} projects, "
+                    f"{len(snapshot.body)} bytes ({len(snapshot.gzip_body)} gzipped)")
+        return snapshot
@@ -6,7 +6,8 @@ Provides database query functions for the API.
 import sqlite3
 import json
 import logging
-from typing import List, Dict, Any, Optional
+import time
+from typing import List, Dict, Any, Callable, Optional, Tuple
 from pathlib import Path
 import sys
 
@@ -17,23 +18,123 @@ if parent_dir not in sys.path:
 
 from config import config
 
+try:
+    from api.db_writer import DatabaseWriter
+    from api.fts_shards import ShardedSearchIndex
+    from api.profiling import current_profile, statement_finished
+    from api.query_budget import current_budget, install as install_budget
+    from api.query_recorder import QueryRecorder
+    from api.repository import CursorExpiredError, Repository, change_entries, collapse_changes, file_size_label
+    from api.timing import phase
+except ImportError:
+    from db_writer import DatabaseWriter
+    from fts_shards import ShardedSearchIndex
+    from profiling import current_profile, statement_finished
+    from query_budget import current_budget, install as install_budget
+    from query_recorder import QueryRecorder
+    from repository import CursorExpiredError, Repository, change_entries, collapse_changes, file_size_label
+    from timing import phase
+
 logger = logging.getLogger(__name__)
 
+# Tables the search and download paths read (warmed up with their indexes)
+WARM_UP_TABLES = ('projects', 'files', 'project_file_types', 'catalog_changes')
+
+# Insert a project or update the fields that changed (no write when identical)
+UPSERT_PROJECT_SQL = """
+    INSERT INTO projects (
+        project_code, title, research_areas, date_initial_request,
+        date_completion, po_contact, other_pos, agdev_partner,
+        output_type, geographies
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(project_code) DO UPDATE SET
+        title = excluded.title,
+        research_areas = excluded.research_areas,
+        date_initial_request = excluded.date_initial_request,
+        date_completion = excluded.date_completion,
+        po_contact = excluded.po_contact,
+        other_pos = excluded.other_pos,
+        agdev_partner = excluded.agdev_partner,
+        output_type = excluded.output_type,
+        geographies = excluded.geographies,
+        updated_at = CURRENT_TIMESTAMP
+    WHERE projects.title IS NOT excluded.title
+        OR projects.research_areas IS NOT excluded.research_areas
+        OR projects.date_initial_request IS NOT excluded.date_initial_request
+        OR projects.date_completion IS NOT excluded.date_completion
+        OR projects.po_contact IS NOT excluded.po_contact
+        OR projects.other_pos IS NOT excluded.other_pos
+        OR projects.agdev_partner IS NOT excluded.agdev_partner
+        OR projects.output_type IS NOT excluded.output_type
+        OR projects.geographies IS NOT excluded.geographies
+"""
+
+
+def project_to_dict(row: sqlite3.Row) -> Dict[str, Any]:
+    """Project metadata in API field names (row has project_id and project columns)."""
+    return {
+        'id': row['project_id'],
+        'projectCode': row['project_code'],
+        'title': row['title'],
+        'researchAreas': json.loads(row['research_areas']) if row['research_areas'] else [],
+        'dateInitialRequest': row['date_initial_request'],
+        'dateCompletion': row['date_completion'],
+        'poContact': row['po_contact'],
+        'otherPos': json.loads(row['other_pos']) if row['other_pos'] else [],
+        'agdevPartner': row['agdev_partner'],
+        'outputType': row['output_type'],
+        'geographies': json.loads(row['geographies']) if row['geographies'] else [],
+        'fileCount': row['file_count'],
+        'totalBytes': row['total_bytes'],
+        'fileTypes': json.loads(row['file_types']),
+        'lastUploadDate': row['last_upload_date']
+    }
+
 
-class DatabaseHelper:
-    """Helper class for database operations."""
+class DatabaseHelper(Repository):
+    """Helper class for database operations (SQLite catalog repository)."""
+    
+    mode = 'sqlite'
     
     def __init__(self, db_path: str = None):
         """Initialize database helper."""
         self.db_path = db_path or config.db_path
+        # Single writer for this database file (thread starts on first write)
+        self.writer = DatabaseWriter(self.get_connection)
+        # Sharded full-text index (FTS_SHARD_BY=year|hash); None searches files_fts
+        self.shards = None
+        if config.fts_shard_by in ('year', 'hash'):
+            self.shards = ShardedSearchIndex(self.db_path, self.writer)
+        # Query shape sampling for tools/query_advisor.py (QUERY_RECORDER=true)
+        self.recorder = QueryRecorder() if config.query_recorder else None
         logger.info(f"Database helper initialized with path: {self.db_path}")
     
     def get_connection(self) -> sqlite3.Connection:
         """Get database connection."""
-        conn = sqlite3.connect(self.db_path)
+        conn = sqlite3.connect(self.db_path, timeout=config.db_busy_timeout_ms / 1000)
         conn.row_factory = sqlite3.Row  # Return rows as dictionaries
+        profile = current_profile()
+        if profile is not None:
+            conn.set_trace_callback(profile.trace)
+        budget = current_budget()
+        if budget is not None:
+            install_budget(conn, budget)
         return conn
     
+    def fetch_all(self, cursor: sqlite3.Cursor, sql: str, params: List[Any]) -> List[sqlite3.Row]:
+        """Execute a read query and fetch its rows, recording its shape when enabled."""
+        if not self.recorder:
+            with phase('sql'):
+                rows = cursor.execute(sql, params).fetchall()
+            statement_finished()
+            return rows
+        started = time.perf_counter()
+        with phase('sql'):
+            rows = cursor.execute(sql, params).fetchall()
+        statement_finished()
+        self.recorder.record(cursor.connection, sql, params, (time.perf_counter() - started) * 1000)
+        return rows
+    
     def search_files(
         self,
         query: str = None,
@@ -45,7 +146,10 @@ class DatabaseHelper:
         date_from: str = None,
         date_to: str = None,
         limit: int = 100,
-        offset: int = 0
+        offset: int = 0,
+        sort: str = 'date',
+        file_types: List[str] = None,
+        include_files: bool = True
     ) -> List[Dict[str, Any]]:
         """
         Search files with filters.
@@ -61,6 +165,10 @@ class DatabaseHelper:
             date_to: Filter by completion date (to)
             limit: Maximum number of results
             offset: Offset for pagination
+            sort: 'date' (newest first) or 'relevance' (best match first)
+            file_types: Projects with at least one file of these types
+            include_files: Attach each project's file list (the per-project
+                aggregates are always included)
         
         Returns:
             List of projects with files
@@ -69,59 +177,70 @@ class DatabaseHelper:
         cursor = conn.cursor()
         
         try:
-            # Build query based on filters
+            sql = """
+                SELECT
+                    p.id as project_id,
+                    p.project_code,
+                    p.title,
+                    p.research_areas,
+                    p.date_initial_request,
+                    p.date_completion,
+                    p.po_contact,
+                    p.other_pos,
+                    p.agdev_partner,
+                    p.output_type,
+                    p.geographies,
+                    p.file_count,
+                    p.total_bytes,
+                    p.file_types,
+                    p.last_upload_date
+                FROM projects p
+            """
+            params = []
+            
             if query:
-                # Use FTS5 search
-                sql = """
-                    SELECT DISTINCT
-                        p.id as project_id,
-                        p.project_code,
-                        p.title,
-                        p.research_areas,
-                        p.date_initial_request,
-                        p.date_completion,
-                        p.po_contact,
-                        p.other_pos,
-                        p.agdev_partner,
-                        p.output_type,
-                        p.geographies
-                    FROM projects p
-                    INNER JOIN files f ON p.id = f.project_id
-                    INNER JOIN files_fts fts ON f.id = fts.file_id
-                    WHERE files_fts MATCH ?
-                """
-                params = [query]
-            else:
-                # No search query, just filter
-                sql = """
-                    SELECT DISTINCT
-                        p.id as project_id,
-                        p.project_code,
-                        p.title,
-                        p.research_areas,
-                        p.date_initial_request,
-                        p.date_completion,
-                        p.po_contact,
-                        p.other_pos,
-                        p.agdev_partner,
-                        p.output_type,
-                        p.geographies
-                    FROM projects p
-                    WHERE 1=1
-                """
-                params = []
+                # Projects with at least one matching file and their best bm25 score
+                if self.shards and self.shards.shard_keys():
+                    facet_filters = research_areas or geographies or output_types or po_contacts or agdev_partners or file_types
+                    # Without facets the shards can cut to the top results themselves
+                    top_k = offset + limit if sort == 'relevance' and not facet_filters else None
+                    with phase('sql'):
+                        ranked = self.shards.search(query, date_from, date_to, top_k)
+                    sql += """
+                        INNER JOIN (
+                            SELECT CAST(key AS INTEGER) AS project_id, value AS score
+                            FROM json_each(?)
+                        ) m ON m.project_id = p.id
+                    """
+                    params.append(json.dumps({str(project_id): score for score, project_id in ranked}))
+                else:
+                    if self.shards:
+                        logger.warning("No FTS shards built yet; searching files_fts")
+                    sql += """
+                        INNER JOIN (
+                            SELECT f.project_id, min(files_fts.rank) AS score
+                            FROM files_fts
+                            INNER JOIN files f ON f.id = files_fts.rowid
+                            WHERE files_fts MATCH ?
+                            GROUP BY f.project_id
+                        ) m ON m.project_id = p.id
+                    """
+                    params.append(query)
+            
+            sql += " WHERE 1=1"
             
             # Add filters
             if research_areas:
-                # JSON array contains any of the research areas
-                conditions = " OR ".join(["p.research_areas LIKE ?" for _ in research_areas])
-                sql += f" AND ({conditions})"
-                params.extend([f'%{area}%' for area in research_areas])
+                # JSON array contains any of the research areas (whole values, so
+                # "Niger" does not match "Nigeria")
+                placeholders = ",".join(["?" for _ in research_areas])
+                sql += f" AND EXISTS (SELECT 1 FROM json_each(p.research_areas) WHERE value IN ({placeholders}))"
+                params.extend(research_areas)
             
             if geographies:
-                conditions = " OR ".join(["p.geographies LIKE ?" for _ in geographies])
-                sql += f" AND ({conditions})"
-                params.extend([f'%{geo}%' for geo in geographies])
+                placeholders = ",".join(["?" for _ in geographies])
+                sql += f" AND EXISTS (SELECT 1 FROM json_each(p.geographies) WHERE value IN ({placeholders}))"
+                params.extend(geographies)
             
             if output_types:
                 placeholders = ",".join(["?" for _ in output_types])
@@ -146,39 +265,37 @@ class DatabaseHelper:
                 sql += " AND p.date_completion <= ?"
                 params.append(date_to)
             
+            if file_types:
+                # Index lookup on project_file_types, no files scan
+                placeholders = ",".join(["?" for _ in file_types])
+                sql += f" AND p.id IN (SELECT project_id FROM project_file_types WHERE file_type IN ({placeholders}))"
+                params.extend(file_types)
+            
             # Add ordering and pagination
-            sql += " ORDER BY p.date_completion DESC LIMIT ? OFFSET ?"
+            if query and sort == 'relevance':
+                sql += " ORDER BY m.score, p.date_completion DESC LIMIT ? OFFSET ?"
+            else:
+                sql += " ORDER BY p.date_completion DESC LIMIT ? OFFSET ?"
             params.extend([limit, offset])
             
             logger.info(f"Executing search query: {sql[:100]}... with {len(params)} params")
-            cursor.execute(sql, params)
-            
             projects_dict = {}
-            for row in cursor.fetchall():
-                project_id = row['project_id']
-                
-                if project_id not in projects_dict:
-                    projects_dict[project_id] = {
-                        'id': project_id,
-                        'projectCode': row['project_code'],
-                        'title': row['title'],
-                        'researchAreas': json.loads(row['research_areas']) if row['research_areas'] else [],
-                        'dateInitialRequest': row['date_initial_request'],
-                        'dateCompletion': row['date_completion'],
-                        'poContact': row['po_contact'],
-                        'otherPos': json.loads(row['other_pos']) if row['other_pos'] else [],
-                        'agdevPartner': row['agdev_partner'],
-                        'outputType': row['output_type'],
-                        'geographies': json.loads(row['geographies']) if row['geographies'] else [],
-                        'files': []
-                    }
+            rows = self.fetch_all(cursor, sql, params)
+            with phase('assemble'):
+                for row in rows:
+                    project_id = row['project_id']
+                    
+                    if project_id not in projects_dict:
+                        projects_dict[project_id] = project_to_dict(row)
+                        if include_files:
+                            projects_dict[project_id]['files'] = []
             
             # Get files for each project
-            if projects_dict:
+            if projects_dict and include_files:
                 project_ids = list(projects_dict.keys())
                 placeholders = ",".join(["?" for _ in project_ids])
                 
-                cursor.execute(f"""
+                files_sql = f"""
                     SELECT 
                         id,
                         project_id,
@@ -189,19 +306,21 @@ class DatabaseHelper:
                     FROM files
                     WHERE project_id IN ({placeholders})
                     ORDER BY file_name
-                """, project_ids)
+                """
                 
-                for row in cursor.fetchall():
-                    project_id = row['project_id']
-                    file_size_mb = f"{row['file_size'] / 1024 / 1024:.1f} MB" if row['file_size'] else "Unknown"
-                    
-                    projects_dict[project_id]['files'].append({
-                        'id': row['id'],
-                        'name': row['file_name'],
-                        'type': row['file_type'],
-                        'size': file_size_mb,
-                        'blobPath': row['blob_path']
-                    })
+                file_rows = self.fetch_all(cursor, files_sql, project_ids)
+                with phase('assemble'):
+                    for row in file_rows:
+                        project_id = row['project_id']
+                        file_size_mb = f"{row['file_size'] / 1024 / 1024:.1f} MB" if row['file_size'] else "Unknown"
+                        
+                        projects_dict[project_id]['files'].append({
+                            'id': row['id'],
+                            'name': row['file_name'],
+                            'type': row['file_type'],
+                            'size': file_size_mb,
+                            'blobPath': row['blob_path']
+                        })
             
             results = list(projects_dict.values())
             logger.info(f"Search returned {len(results)} projects")
@@ -235,6 +354,7 @@ class DatabaseHelper:
                     f.file_type,
                     f.file_size,
                     f.blob_path,
+                    f.content_hash,
                     p.project_code
                 FROM files f
                 INNER JOIN projects p ON f.project_id = p.id
@@ -254,6 +374,7 @@ class DatabaseHelper:
                 'type': row['file_type'],
                 'size': file_size_mb,
                 'blobPath': row['blob_path'],
+                'contentHash': row['content_hash'],
                 'projectCode': row['project_code']
             }
             
@@ -263,6 +384,258 @@ class DatabaseHelper:
         finally:
             conn.close()
 
+    def upsert_project(self, cursor: sqlite3.Cursor, project: Dict[str, Any]) -> Tuple[int, str]:
+        """
+        Insert a project, or update its metadata if the project code exists.
+        
+        The row is only written when a field actually differs, so re-uploading
+        an unchanged project does not touch projects or files_fts.
+        
+        Args:
+            cursor: Cursor inside an open transaction
+            project: Project metadata using API field names (projectCode, title, ...)
+        
+        Returns:
+            (project ID, 'created' | 'updated' | 'unchanged')
+        """
+        existing_id = self.get_project_id(cursor, project['projectCode'])
+        cursor.execute(UPSERT_PROJECT_SQL, (
+            project['projectCode'],
+            project['title'],
+            json.dumps(project.get('researchAreas', [])),
+            project.get('dateInitialRequest', ''),
+            project['dateCompletion'],
+            project['poContact'],
+            json.dumps(project.get('otherPos', [])),
+            project.get('agdevPartner', ''),
+            project['outputType'],
+            json.dumps(project.get('geographies', []))
+        ))
+        
+        if existing_id is None:
+            return cursor.lastrowid, 'created'
+        return existing_id, 'updated' if cursor.rowcount else 'unchanged'
+    
+    def upsert_file(self, cursor: sqlite3.Cursor, project_id: int, file: Dict[str, Any]) -> Tuple[int, str]:
+        """
+        Insert a file row, or update it if its blob path already exists.
+        
+        A file whose content hash, size and type match the stored row is left
+        alone. An updated file keeps its text until ingestion replaces it, and
+        files_fts is only rewritten if that text changes.
+        
+        Args:
+            cursor: Cursor inside an open transaction
+            project_id: Owning project ID
+            file: Dict with fileName, fileType, fileSize, blobPath and contentHash
+                (None when the hash is not known yet)
+        
+        Returns:
+            (file ID, 'created' | 'updated' | 'unchanged')
+        """
+        row = cursor.execute("""
+            SELECT id, project_id, file_type, file_size, content_hash
+            FROM files WHERE blob_path = ?
+        """, (file['blobPath'],)).fetchone()
+        
+        if row is None:
+            cursor.execute("""
+                INSERT INTO files (
+                    project_id, file_name, file_type, file_size, blob_path, content_hash
+                ) VALUES (?, ?, ?, ?, ?, ?)
+            """, (
+                project_id,
+                file['fileName'],
+                file['fileType'],
+                file['fileSize'],
+                file['blobPath'],
+                file.get('contentHash')
+            ))
+            return cursor.lastrowid, 'created'
+        
+        if (file.get('contentHash') and row['content_hash'] == file['contentHash']
+                and row['file_size'] == file['fileSize'] and row['file_type'] == file['fileType']
+                and row['project_id'] == project_id):
+            return row['id'], 'unchanged'
+        
+        cursor.execute("""
+            UPDATE files
+            SET project_id = ?, file_type = ?, file_size = ?, content_hash = ?,
+                upload_date = CURRENT_TIMESTAMP
+            WHERE id = ?
+        """, (project_id, file['fileType'], file['fileSize'], file.get('contentHash'), row['id']))
+        return row['id'], 'updated'
+    
+    def write(self, fn: Callable[[sqlite3.Cursor], Any]) -> Any:
+        """Run fn(cursor) through the group-commit writer and return its result."""
+        return self.writer.execute(fn)
+    
+    def get_text_for_content(self, content_hash: str, file_type: str, exclude_file_id: int) -> Optional[str]:
+        """Text already extracted for identical content in another file, if any."""
+        conn = self.get_connection()
+        try:
+            row = conn.execute("""
+                SELECT text_content FROM files
+                WHERE content_hash = ? AND file_type = ? AND id != ? AND text_content IS NOT NULL
+                LIMIT 1
+            """, (content_hash, file_type, exclude_file_id)).fetchone()
+        finally:
+            conn.close()
+        return row['text_content'] if row else None
+    
+    def set_file_content(self, file_id: int, content_hash: str, text_content: Optional[str]) -> None:
+        """Record a file's content hash and text; files_au refreshes files_fts."""
+        self.write(lambda cursor: cursor.execute(
+            "UPDATE files SET content_hash = ?, text_content = ? WHERE id = ?",
+            (content_hash, text_content, file_id)
+        ))
+    
+    def get_changes(self, since: Optional[int], limit: int = 500) -> Dict[str, Any]:
+        """Catalog changes after a cursor (see Repository.get_changes)."""
+        conn = self.get_connection()
+        try:
+            # One read transaction: the log and the current rows are consistent
+            conn.execute("BEGIN")
+            head = conn.execute(
+                "SELECT COALESCE(MIN(seq) - 1, 0), COALESCE(MAX(seq), 0) FROM catalog_changes"
+            ).fetchone()
+            horizon, current = head[0], head[1]
+            if since is None:
+                return {'changes': [], 'cursor': current, 'hasMore': False}
+            if since < horizon:
+                raise CursorExpiredError(f"Changes before {horizon} are no longer available")
+            
+            rows = [dict(row) for row in conn.execute("""
+                SELECT seq, entity, entity_id, op FROM catalog_changes
+                WHERE seq > ? ORDER BY seq LIMIT ?
+            """, (since, limit))]
+            latest, inserted = collapse_changes(rows)
+            
+            project_ids = json.dumps([entity_id for entity, entity_id in latest if entity == 'project'])
+            projects = {row['project_id']: project_to_dict(row) for row in conn.execute("""
+                SELECT id AS project_id, * FROM projects
+                WHERE id IN (SELECT value FROM json_each(?))
+            """, (project_ids,))}
+            
+            file_ids = json.dumps([entity_id for entity, entity_id in latest if entity == 'file'])
+            files = {row['id']: {
+                'id': row['id'],
+                'projectId': row['project_id'],
+                'name': row['file_name'],
+                'type': row['file_type'],
+                'size': file_size_label(row['file_size']),
+                'blobPath': row['blob_path']
+            } for row in conn.execute("""
+                SELECT id, project_id, file_name, file_type, file_size, blob_path FROM files
+                WHERE id IN (SELECT value FROM json_each(?))
+            """, (file_ids,))}
+        finally:
+            conn.close()
+        
+        return {
+            'changes': change_entries(latest, inserted, projects, files),
+            'cursor': rows[-1]['seq'] if rows else since,
+            'hasMore': len(rows) == limit
+        }
+    
+    def prune_changes(self, retention_days: int) -> int:
+        """Delete old change log entries, keeping the newest so the cursor horizon stays known."""
+        return self.writer.execute(lambda cursor: cursor.execute("""
+            DELETE FROM catalog_changes
+            WHERE changed_at < datetime('now', ?)
+              AND seq < (SELECT MAX(seq) FROM catalog_changes)
+        """, (f'-{int(retention_days)} days',)).rowcount)
+    
+    def warm_up(self) -> Dict[str, Any]:
+        """
+        Read the catalog tables, their indexes and the full-text index once.
+        
+        Requests open their own connections, so this primes the operating
+        system's page cache (SQLite's cache lives with the connection). The
+        sharded index also applies queued changes and opens its per-thread
+        shard connections.
+        
+        Returns:
+            Dict with btrees (tables and indexes read), ftsBytes and shards
+        """
+        conn = self.get_connection()
+        try:
+            btrees = 0
+            for table in WARM_UP_TABLES:
+                conn.execute(f"SELECT count(*) FROM {table} NOT INDEXED").fetchone()
+                btrees += 1
+                indexes = conn.execute(
+                    "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = ?", (table,)
+                ).fetchall()
+                for (index,) in indexes:
+                    # count(column) makes SQLite walk that index; count(*) picks the smallest
+                    column = conn.execute(f'PRAGMA index_info("{index}")').fetchone()[2]
+                    if column is None:
+                        continue  # Expression index
+                    conn.execute(f'SELECT count("{column}") FROM {table} INDEXED BY "{index}"').fetchone()
+                    btrees += 1
+            fts_bytes = 0
+            if not self.shards:
+                fts_bytes = sum(len(row[0]) for row in conn.execute("SELECT block FROM files_fts_data") if row[0])
+        finally:
+            conn.close()
+        
+        result = {'btrees': btrees, 'ftsBytes': fts_bytes}
+        if self.shards:
+            result['shards'] = self.shards.warm_up()
+            result['ftsBytes'] = sum(result['shards'].values())
+        return result
+    
+    def catalog_generation(self) -> int:
+        """Current catalog generation: the latest change log seq (0 if none)."""
+        conn = self.get_connection()
+        try:
+            return conn.execute("SELECT COALESCE(MAX(seq), 0) FROM catalog_changes").fetchone()[0]
+        finally:
+            conn.close()
+    
+    def search_generation(self) -> Tuple[int, int]:
+        """Version of search results: (catalog generation, search index version)."""
+        conn = self.get_connection()
+        try:
+            return tuple(conn.execute("""
+                SELECT (SELECT COALESCE(MAX(seq), 0) FROM catalog_changes),
+                       (SELECT version FROM search_index_version)
+            """).fetchone())
+        finally:
+            conn.close()
+    
+    def list_catalog(self) -> Tuple[int, List[Dict[str, Any]]]:
+        """All projects with their files and the generation they were read at."""
+        conn = self.get_connection()
+        try:
+            conn.execute("BEGIN")
+            generation = conn.execute("SELECT COALESCE(MAX(seq), 0) FROM catalog_changes").fetchone()[0]
+            projects = {row['project_id']: dict(project_to_dict(row), files=[]) for row in conn.execute("""
+                SELECT id AS project_id, * FROM projects
+                ORDER BY date_completion DESC, id
+            """)}
+            for row in conn.execute("""
+                SELECT id, project_id, file_name, file_type, file_size, blob_path FROM files
+                ORDER BY file_name
+            """):
+                projects[row['project_id']]['files'].append({
+                    'id': row['id'],
+                    'name': row['file_name'],
+                    'type': row['file_type'],
+                    'size': row['file_size'],
+                    'blobPath': row['blob_path']
+                })
+        finally:
+            conn.close()
+        return generation, list(projects.values())
+    
+    def get_project_id(self, cursor: sqlite3.Cursor, project_code: str) -> Optional[int]:
+        """Look up a project ID by project code."""
+        row = cursor.execute(
+            "SELECT id FROM projects WHERE project_code = ?", (project_code,)
+        ).fetchone()
+        return row[0] if row else None
 
 # Global instance
 db_helper = DatabaseHelper()
@@ -0,0 +1,272 @@
+"""
+EPAR Data Portal - Database Writer
+Single-writer queue that applies write intents in group commits.
+
+SQLite allows one writer at a time. Instead of every request opening its own
+write transaction, callers hand a short function (a write intent) to the
+writer thread, which runs a batch of intents inside one transaction and
+commits them together. Each intent runs in its own savepoint, so a failing
+intent is rolled back without affecting the rest of the batch.
+
+Intents must only touch the database: storage I/O, hashing and extraction
+belong before or after the call, never inside the write transaction.
+"""
+
+import logging
+import queue
+import sqlite3
+import sys
+import threading
+import time
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Any, Callable, List, Tuple
+
+# Add parent directory to path to import config
+parent_dir = str(Path(__file__).parent.parent)
+if parent_dir not in sys.path:
+    sys.path.insert(0, parent_dir)
+
+from config import config
+
+try:
+    from api.metrics import DB_BUSY_RETRIES, DB_LOCK_WAIT, DB_WRITE_BATCH
+    from api.profiling import current_profile
+except ImportError:
+    from metrics import DB_BUSY_RETRIES, DB_LOCK_WAIT, DB_WRITE_BATCH
+    from profiling import current_profile
+
+logger = logging.getLogger(__name__)
+
+# Base delay for retrying BEGIN/COMMIT when the database is busy
+RETRY_BASE_SECONDS = 0.05
+
+
+def is_busy_error(error: Exception) -> bool:
+    """Whether an exception is SQLite's 'database is locked/busy' error."""
+    message = str(error).lower()
+    return isinstance(error, sqlite3.OperationalError) and ('locked' in message or 'busy' in message)
+
+
+class WriteIntent:
+    """A write function waiting for the writer thread, with its result future."""
+
+    def __init__(self, fn: Callable[[sqlite3.Cursor], Any]):
+        self.fn = fn
+        self.future = Future()
+        self.profile = current_profile()  # Request profile to trace the statements into
+
+
+class DatabaseWriter:
+    """Dedicated writer thread that batches write intents into group commits."""
+
+    def __init__(
+        self,
+        get_connection: Callable[[], sqlite3.Connection],
+        batch_size: int = None,
+        window_ms: float = None,
+        max_retries: int = None
+    ):
+        """
+        Initialize the writer (the thread starts on first use).
+
+        Args:
+            get_connection: Factory for database connections
+            batch_size: Maximum intents per transaction
+            window_ms: How long to wait for more intents after the first one
+            max_retries: Retries of BEGIN/COMMIT while the database is busy
+        """
+        self.get_connection = get_connection
+        self.batch_size = batch_size or config.db_write_batch_size
+        self.window_seconds = (config.db_write_window_ms if window_ms is None else window_ms) / 1000
+        self.max_retries = config.db_write_retries if max_retries is None else max_retries
+        self._intents = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._listeners: List[Callable[[], None]] = []
+
+    def submit(self, fn: Callable[[sqlite3.Cursor], Any]) -> Future:
+        """
+        Queue a write intent.
+
+        Args:
+            fn: Function that performs the writes with the given cursor and
+                returns a result (e.g. a new row ID). It must not commit.
+
+        Returns:
+            Future resolved with fn's result once the batch has committed
+        """
+        if threading.current_thread() is self._thread:
+            raise RuntimeError("Write intents cannot be submitted from the writer thread")
+        intent = WriteIntent(fn)
+        with self._lock:
+            # Queued under the lock so a dying writer either fails it or leaves it to its successor
+            self._start()
+            self._intents.put(intent)
+        return intent.future
+
+    def execute(self, fn: Callable[[sqlite3.Cursor], Any], timeout: float = None) -> Any:
+        """Queue a write intent and wait for it to commit; returns fn's result."""
+        return self.submit(fn).result(timeout)
+
+    def listen(self, callback: Callable[[], None]) -> None:
+        """
+        Call callback on the writer thread after every committed batch.
+
+        It must return quickly and must not submit write intents; use it to
+        wake a background task (e.g. the FTS shard sync).
+        """
+        self._listeners.append(callback)
+
+    def stop(self, timeout: float = None) -> None:
+        """Commit queued intents and stop the writer thread."""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread:
+            self._intents.put(None)
+            thread.join(timeout)
+
+    def _start(self) -> None:
+        """Start the writer thread if it is not running (caller holds _lock)."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="db-writer", daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        conn = None
+        batch = []
+        try:
+            conn = self.get_connection()
+            conn.isolation_level = None  # Transactions are managed explicitly
+            conn.execute(f"PRAGMA busy_timeout = {config.db_busy_timeout_ms}")
+            while True:
+                batch, stopping = self._collect()
+                if batch:
+                    self._commit_batch(conn, batch)
+                batch = []
+                if stopping:
+                    break
+        except Exception as e:
+            logger.error(f"Database writer stopped: {str(e)}")
+            self._abandon(batch, e)
+        finally:
+            if conn is not None:
+                conn.close()  # Rolls back a transaction left open by the error
+
+    def _abandon(self, batch: List[WriteIntent], error: Exception) -> None:
+        """
+        Fail the batch in flight and the queued intents after the writer thread
+        hit an error; the next submit starts a new writer.
+        """
+        with self._lock:
+            pending = list(batch)
+            # After stop() a new writer may already own the queue
+            if self._thread in (None, threading.current_thread()):
+                self._thread = None
+                while True:
+                    try:
+                        intent = self._intents.get_nowait()
+                    except queue.Empty:
+                        break
+                    if intent is not None:
+                        pending.append(intent)
+        for intent in pending:
+            if not intent.future.done():
+                intent.future.set_exception(error)
+
+    def _collect(self) -> Tuple[List[WriteIntent], bool]:
+        """Wait for one intent, then gather more until the batch or window is full."""
+        first = self._intents.get()
+        if first is None:
+            return [], True
+
+        batch = [first]
+        deadline = time.monotonic() + self.window_seconds
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                intent = self._intents.get(timeout=remaining) if remaining > 0 else self._intents.get_nowait()
+            except queue.Empty:
+                break
+            if intent is None:
+                return batch, True
+            batch.append(intent)
+        return batch, False
+
+    def _retry_busy(self, conn: sqlite3.Connection, sql: str) -> None:
+        """Run BEGIN/COMMIT, retrying with exponential backoff while busy."""
+        for attempt in range(self.max_retries + 1):
+            try:
+                conn.execute(sql)
+                return
+            except sqlite3.OperationalError as e:
+                if not is_busy_error(e) or attempt == self.max_retries:
+                    raise
+                delay = RETRY_BASE_SECONDS * (2 ** attempt)
+                DB_BUSY_RETRIES.inc(sql.split()[0])
+                logger.warning(f"Database busy on {sql}; retrying in {delay:.2f}s")
+                time.sleep(delay)
+
+    @staticmethod
+    def _run_intent(conn: sqlite3.Connection, cursor: sqlite3.Cursor, intent: WriteIntent) -> Any:
+        """Run one intent, tracing its statements into the profile of the request that sent it."""
+        if intent.profile is None:
+            return intent.fn(cursor)
+        conn.set_trace_callback(intent.profile.trace)
+        try:
+            return intent.fn(cursor)
+        finally:
+            conn.set_trace_callback(None)
+            intent.profile.statement_finished()
+
+    def _commit_batch(self, conn: sqlite3.Connection, batch: List[WriteIntent]) -> None:
+        """Apply a batch of intents in one transaction and resolve their futures."""
+        started = time.perf_counter()
+        try:
+            self._retry_busy(conn, "BEGIN IMMEDIATE")
+        except Exception as e:
+            for intent in batch:
+                intent.future.set_exception(e)
+            return
+        finally:
+            # Includes busy_timeout waits inside SQLite, not just our retries
+            DB_LOCK_WAIT.observe(time.perf_counter() - started)
+        DB_WRITE_BATCH.observe(len(batch))
+
+        outcomes = []
+        cursor = conn.cursor()
+        for intent in batch:
+            cursor.execute("SAVEPOINT intent")
+            try:
+                outcomes.append((intent, self._run_intent(conn, cursor, intent), None))
+                cursor.execute("RELEASE intent")
+            except Exception as e:
+                cursor.execute("ROLLBACK TO intent")
+                cursor.execute("RELEASE intent")
+                outcomes.append((intent, None, e))
+
+        try:
+            self._retry_busy(conn, "COMMIT")
+        except Exception as e:
+            logger.error(f"Group commit of {len(batch)} writes failed: {str(e)}")
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            for intent in batch:
+                intent.future.set_exception(e)
+            return
+
+        # Results are only released once the whole batch is durable
+        for intent, result, error in outcomes:
+            if error is not None:
+                intent.future.set_exception(error)
+            else:
+                intent.future.set_result(result)
+
+        for callback in self._listeners:
+            try:
+                callback()
+            except Exception as e:
+                logger.error(f"Commit listener failed: {str(e)}")
+
+        if len(batch) > 1:
+            logger.debug(f"Group-committed {len(batch)} writes")
@@ -0,0 +1,190 @@
+"""
+EPAR Data Portal - Text Extraction
+Extracts a bounded amount of searchable text from uploaded files.
+
+Each extractor streams its input and stops as soon as the byte budget
+(MAX_ABSTRACT_BYTES) is filled, so memory use does not grow with file size.
+"""
+
+import codecs
+import logging
+import sys
+import zipfile
+from pathlib import Path
+from typing import BinaryIO, Iterator, Optional
+from xml.etree import ElementTree
+
+# Add parent directory to path to import config
+parent_dir = str(Path(__file__).parent.parent)
+if parent_dir not in sys.path:
+    sys.path.insert(0, parent_dir)
+
+from config import config
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 64 * 1024
+
+# OOXML namespaces
+WORD_NS = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+SHEET_NS = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+
+
+class TextBuffer:
+    """Collects normalized text until a UTF-8 byte budget is reached."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.parts = []
+        self.size = 0
+
+    @property
+    def full(self) -> bool:
+        return self.size >= self.max_bytes
+
+    def add(self, text: str) -> bool:
+        """
+        Add text, collapsing whitespace.
+
+        Returns:
+            True once the buffer is full and extraction should stop
+        """
+        text = ' '.join(text.split())
+        if not text or self.full:
+            return self.full
+
+        piece = f" {text}" if self.parts else text
+        encoded = piece.encode('utf-8')
+        remaining = self.max_bytes - self.size
+
+        if len(encoded) >= remaining:
+            # Truncate on a character boundary
+            self.parts.append(encoded[:remaining].decode('utf-8', errors='ignore'))
+            self.size = self.max_bytes
+            return True
+
+        self.parts.append(piece)
+        self.size += len(encoded)
+        return False
+
+    def text(self) -> str:
+        return ''.join(self.parts).strip()
+
+
+# ============================================================================
+# EXTRACTORS
+# ============================================================================
+
+def _iter_plain_text(stream: BinaryIO) -> Iterator[str]:
+    """
+    Decode a text file incrementally as UTF-8, yielding whole words.
+
+    Runs without whitespace longer than CHUNK_SIZE characters are split, so
+    the held-back partial word never exceeds one chunk.
+    """
+    decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+    carry = ''
+    while True:
+        chunk = stream.read(CHUNK_SIZE)
+        if not chunk:
+            break
+        text = carry + decoder.decode(chunk)
+        # Hold back a trailing partial word until the next chunk
+        split_at = max(text.rfind(c) for c in ' \t\r\n')
+        if split_at < 0:
+            if len(text) < CHUNK_SIZE:
+                carry = text
+                continue
+            # No whitespace in a whole chunk (e.g. base64): split at a fixed length
+            split_at = CHUNK_SIZE
+        carry = text[split_at:]
+        yield text[:split_at]
+    yield carry + decoder.decode(b'', final=True)
+
+
+def _iter_xml_text(xml_stream: BinaryIO, text_tag: str, break_tag: str) -> Iterator[str]:
+    """
+    Stream text nodes out of an XML part with iterparse.
+
+    Elements are cleared as soon as they are consumed so memory stays flat.
+    A break_tag (paragraph, shared string) ends a run of text.
+    """
+    pending = []
+    for _, elem in ElementTree.iterparse(xml_stream, events=('end',)):
+        if elem.tag == text_tag:
+            if elem.text:
+                pending.append(elem.text)
+        elif elem.tag == break_tag:
+            if pending:
+                yield ''.join(pending)
+                pending = []
+            elem.clear()
+    if pending:
+        yield ''.join(pending)
+
+
+def _iter_docx_text(stream: BinaryIO) -> Iterator[str]:
+    """Yield paragraphs from a .docx file."""
+    with zipfile.ZipFile(stream) as archive:
+        with archive.open('word/document.xml') as xml_stream:
+            yield from _iter_xml_text(xml_stream, f'{WORD_NS}t', f'{WORD_NS}p')
+
+
+def _iter_xlsx_text(stream: BinaryIO) -> Iterator[str]:
+    """Yield shared strings (cell text) from a .xlsx file."""
+    with zipfile.ZipFile(stream) as archive:
+        if 'xl/sharedStrings.xml' not in archive.namelist():
+            return
+        with archive.open('xl/sharedStrings.xml') as xml_stream:
+            yield from _iter_xml_text(xml_stream, f'{SHEET_NS}t', f'{SHEET_NS}si')
+
+
+def _iter_pdf_text(stream: BinaryIO) -> Iterator[str]:
+    """Yield text page by page from a PDF (requires pypdf)."""
+    try:
+        from pypdf import PdfReader
+    except ImportError:
+        logger.warning("pypdf not installed; skipping PDF text extraction")
+        return
+
+    reader = PdfReader(stream)
+    for page in reader.pages:
+        yield page.extract_text() or ''
+
+
+EXTRACTORS = {
+    '.txt': _iter_plain_text,
+    '.md': _iter_plain_text,
+    '.docx': _iter_docx_text,
+    '.xlsx': _iter_xlsx_text,
+    '.pdf': _iter_pdf_text,
+}
+
+
+def extract_text(file_name: str, stream: BinaryIO, max_bytes: int = None) -> Optional[str]:
+    """
+    Extract searchable text from a file.
+
+    Args:
+        file_name: Original file name (used to pick the extractor)
+        stream: Seekable binary stream with the file contents
+        max_bytes: UTF-8 byte budget (defaults to config.max_abstract_bytes)
+
+    Returns:
+        Extracted text, or None if the file type is unsupported or unreadable
+    """
+    extension = Path(file_name).suffix.lower()
+    if extension not in config.supported_extensions or extension not in EXTRACTORS:
+        return None
+
+    buffer = TextBuffer(max_bytes if max_bytes is not None else config.max_abstract_bytes)
+    try:
+        for text in EXTRACTORS[extension](stream):
+            if buffer.add(text):
+                break
+    except Exception as e:
+        logger.warning(f"Text extraction failed for {file_name}: {str(e)}")
+        if not buffer.parts:
+            return None
+
+    return buffer.text()
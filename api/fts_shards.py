@@ -0,0 +1,667 @@
+"""
+EPAR Data Portal - Sharded Full-Text Index
+Partitions the FTS5 index into shard databases searched in parallel.
+
+Each shard is a separate SQLite file (FTS_SHARD_PATH/fts_<key>.sqlite) holding
+the index entries of the files whose project falls into it: by completion year
+(FTS_SHARD_BY=year, with an 'undated' shard) or by project ID hash
+(FTS_SHARD_BY=hash). Searches fan out to the shards on a thread pool, each
+shard returns its best-scoring projects, and the results are merged. Year
+shards outside the requested date range are never opened.
+
+SQLite triggers cannot write to other database files, so the catalog triggers
+record changed file IDs in fts_shard_queue and sync() applies them to the
+shards, reading the catalog through an attached read-only connection. A
+background thread runs sync() after each catalog commit of the writer, so
+searches read the shards as they are and never wait for queued changes. Old
+shards can be optimized and frozen independently of the current ones.
+
+Usage:
+    python api/fts_shards.py build            # install triggers and (re)build all shards
+    python api/fts_shards.py sync             # apply queued changes
+    python api/fts_shards.py status           # list shards
+    python api/fts_shards.py freeze --before 2022
+    python api/fts_shards.py optimize
+"""
+
+import argparse
+import heapq
+import itertools
+import json
+import logging
+import sqlite3
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+# Add parent directory to path to import config
+parent_dir = str(Path(__file__).parent.parent)
+if parent_dir not in sys.path:
+    sys.path.insert(0, parent_dir)
+
+from config import config
+
+try:
+    from api.query_budget import QueryBudget, current_budget, install as install_budget
+except ImportError:
+    from query_budget import QueryBudget, current_budget, install as install_budget
+
+logger = logging.getLogger(__name__)
+
+UNDATED_SHARD = 'undated'
+
+# Changed file IDs waiting to be applied to the shards. version increases on
+# every change so sync() only dequeues entries it has actually applied.
+# fts_shard_rows records which shards may hold each file's entry, so sync()
+# only opens the shards a change leaves or enters.
+SHARD_QUEUE_SQL = [
+    """
+    CREATE TABLE IF NOT EXISTS fts_shard_queue (
+        file_id INTEGER PRIMARY KEY,
+        version INTEGER NOT NULL DEFAULT 0
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS fts_shard_rows (
+        file_id INTEGER NOT NULL,
+        shard_key TEXT NOT NULL,
+        PRIMARY KEY (file_id, shard_key)
+    ) WITHOUT ROWID
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS files_shard_ai AFTER INSERT ON files BEGIN
+        INSERT INTO fts_shard_queue(file_id) VALUES (new.id)
+        ON CONFLICT(file_id) DO UPDATE SET version = version + 1;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS files_shard_ad AFTER DELETE ON files BEGIN
+        INSERT INTO fts_shard_queue(file_id) VALUES (old.id)
+        ON CONFLICT(file_id) DO UPDATE SET version = version + 1;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS files_shard_au AFTER UPDATE OF file_name, text_content, project_id ON files
+    WHEN old.file_name IS NOT new.file_name
+        OR old.text_content IS NOT new.text_content
+        OR old.project_id IS NOT new.project_id
+    BEGIN
+        INSERT INTO fts_shard_queue(file_id) VALUES (new.id)
+        ON CONFLICT(file_id) DO UPDATE SET version = version + 1;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS projects_shard_au AFTER UPDATE OF project_code, title, date_completion ON projects
+    WHEN old.project_code IS NOT new.project_code
+        OR old.title IS NOT new.title
+        OR old.date_completion IS NOT new.date_completion
+    BEGIN
+        INSERT INTO fts_shard_queue(file_id) SELECT id FROM files WHERE project_id = new.id
+        ON CONFLICT(file_id) DO UPDATE SET version = version + 1;
+    END
+    """
+]
+
+SHARD_TRIGGERS = ('files_shard_ai', 'files_shard_ad', 'files_shard_au', 'projects_shard_au')
+
+SHARD_SCHEMA_SQL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS files_fts USING fts5(
+        project_code,
+        title,
+        file_name,
+        text_content,
+        project_id UNINDEXED,
+        date_completion UNINDEXED
+    )
+    """,
+    "CREATE TABLE IF NOT EXISTS shard_meta (key TEXT PRIMARY KEY, value TEXT)"
+]
+
+
+def install_shard_queue(conn: sqlite3.Connection) -> None:
+    """Create the change queue and the triggers that fill it (catalog database)."""
+    for sql in SHARD_QUEUE_SQL:
+        conn.execute(sql)
+
+
+def drop_shard_queue(conn: sqlite3.Connection) -> None:
+    """Remove the change queue and its triggers when sharding is turned off."""
+    for trigger in SHARD_TRIGGERS:
+        conn.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+    conn.execute("DROP TABLE IF EXISTS fts_shard_queue")
+    conn.execute("DROP TABLE IF EXISTS fts_shard_rows")
+
+
+class ShardedSearchIndex:
+    """FTS5 index split across shard databases, searched with scatter-gather."""
+
+    def __init__(
+        self,
+        db_path: str,
+        writer,
+        shard_path: str = None,
+        shard_by: str = None,
+        hash_shards: int = None,
+        workers: int = None
+    ):
+        """
+        Initialize the index (shard files are created by build/sync).
+
+        Args:
+            db_path: Catalog database with the files/projects tables
+            writer: DatabaseWriter for the catalog database (dequeues changes;
+                its commits wake the background sync)
+            shard_path: Directory holding the shard databases
+            shard_by: 'year' (completion year) or 'hash' (project ID)
+            hash_shards: Number of shards when sharding by hash
+            workers: Threads used to search shards in parallel
+        """
+        self.db_path = db_path
+        self.writer = writer
+        self.shard_dir = Path(shard_path or config.fts_shard_path)
+        self.shard_by = shard_by or config.fts_shard_by
+        self.hash_shards = hash_shards or config.fts_hash_shards
+        self.workers = workers or config.fts_search_workers
+        self.pool = ThreadPoolExecutor(
+            max_workers=self.workers,
+            thread_name_prefix='fts-shard'
+        )
+        self._local = threading.local()
+        self._sync_lock = threading.Lock()
+        self._sync_wanted = threading.Event()
+        self._syncer = None
+        self._syncer_lock = threading.Lock()
+        self.writer.listen(self.schedule_sync)
+
+    # ========================================================================
+    # SHARD LAYOUT
+    # ========================================================================
+
+    def shard_key_sql(self) -> str:
+        """SQL expression giving the shard key of a catalog row (aliases f, p)."""
+        if self.shard_by == 'hash':
+            return f"printf('h%02d', p.id % {self.hash_shards})"
+        return (f"CASE WHEN p.date_completion GLOB '[0-9][0-9][0-9][0-9]*' "
+                f"THEN substr(p.date_completion, 1, 4) ELSE '{UNDATED_SHARD}' END")
+
+    def shard_file(self, key: str) -> Path:
+        return self.shard_dir / f"fts_{key}.sqlite"
+
+    def shard_keys(self) -> List[str]:
+        """Keys of the shards that exist on disk."""
+        return sorted(path.stem[len('fts_'):] for path in self.shard_dir.glob('fts_*.sqlite'))
+
+    def prune(self, keys: List[str], date_from: str = None, date_to: str = None) -> List[str]:
+        """
+        Drop year shards that cannot hold matches for the date filters.
+
+        Dates compare as text (YYYY-MM), so a project in year Y can only match
+        date_from/date_to if Y lies between their first four characters.
+        """
+        if self.shard_by != 'year' or not (date_from or date_to):
+            return keys
+
+        kept = []
+        for key in keys:
+            if key == UNDATED_SHARD:
+                # Non-year values ('', 'TBD') can still compare inside the range
+                kept.append(key)
+                continue
+            if date_from and key < date_from[:4]:
+                continue
+            if date_to and key > date_to[:4]:
+                continue
+            kept.append(key)
+        return kept
+
+    # ========================================================================
+    # SEARCH
+    # ========================================================================
+
+    def search(
+        self,
+        query: str,
+        date_from: str = None,
+        date_to: str = None,
+        top_k: int = None
+    ) -> List[Tuple[float, int]]:
+        """
+        Search all relevant shards in parallel.
+
+        Changes still queued for the background sync are not visible yet.
+        bm25 statistics are per shard, so scores from different shards are
+        comparable but not identical to those of a single index.
+
+        Args:
+            query: FTS5 query
+            date_from: Skip projects completed before this date
+            date_to: Skip projects completed after this date
+            top_k: Only return the k best projects (None for all matches)
+
+        Returns:
+            (score, project_id) pairs, best first (lower bm25 score is better)
+        """
+        keys = self.prune(self.shard_keys(), date_from, date_to)
+        # The search threads do not share the request's context
+        budget = current_budget()
+        futures = [
+            self.pool.submit(self._search_shard, key, query, date_from, date_to, top_k, budget)
+            for key in keys
+        ]
+
+        # A project lives in exactly one shard, so shard results never overlap
+        ranked = heapq.merge(*[future.result() for future in futures])
+        if top_k is not None:
+            ranked = heapq.nsmallest(top_k, ranked)
+        results = list(ranked)
+        logger.info(f"Sharded search matched {len(results)} projects in {len(keys)} shards")
+        return results
+
+    def _search_shard(
+        self,
+        key: str,
+        query: str,
+        date_from: Optional[str],
+        date_to: Optional[str],
+        top_k: Optional[int],
+        budget: Optional[QueryBudget] = None
+    ) -> List[Tuple[float, int]]:
+        sql = """
+            SELECT min(rank) AS score, project_id
+            FROM files_fts
+            WHERE files_fts MATCH ?
+        """
+        params: List[Any] = [query]
+        if date_from:
+            sql += " AND date_completion >= ?"
+            params.append(date_from)
+        if date_to:
+            sql += " AND date_completion <= ?"
+            params.append(date_to)
+        sql += " GROUP BY project_id ORDER BY score"
+        if top_k is not None:
+            sql += " LIMIT ?"
+            params.append(top_k)
+
+        conn = self._reader(key)
+        install_budget(conn, budget)
+        try:
+            rows = conn.execute(sql, params).fetchall()
+        except sqlite3.OperationalError as e:
+            if 'no such table' in str(e):
+                return []  # Shard is still being created
+            raise
+        finally:
+            if budget is not None:
+                install_budget(conn, None)  # The connection outlives the request
+        return [(row[0], row[1]) for row in rows]
+
+    def _reader(self, key: str) -> sqlite3.Connection:
+        """Per-thread read connection to a shard."""
+        connections = getattr(self._local, 'connections', None)
+        if connections is None:
+            connections = self._local.connections = {}
+        conn = connections.get(key)
+        if conn is None:
+            conn = sqlite3.connect(str(self.shard_file(key)), timeout=config.db_busy_timeout_ms / 1000)
+            conn.execute("PRAGMA query_only = ON")
+            connections[key] = conn
+        return conn
+
+    def warm_up(self) -> Dict[str, int]:
+        """
+        Read every shard's index on the search threads.
+
+        Changes queued while no instance was running are left to the
+        background sync, which this wakes.
+
+        Shard connections are kept per search thread, so each thread opens its
+        own (which also fills that connection's page cache).
+
+        Returns:
+            {shard key: index bytes read}
+        """
+        self.schedule_sync()
+        futures = {
+            key: [self.pool.submit(self._read_shard, key) for _ in range(self.workers)]
+            for key in self.shard_keys()
+        }
+        return {key: max(future.result() for future in shard_futures) for key, shard_futures in futures.items()}
+
+    def _read_shard(self, key: str) -> int:
+        try:
+            return sum(len(row[0]) for row in self._reader(key).execute("SELECT block FROM files_fts_data") if row[0])
+        except sqlite3.OperationalError as e:
+            if 'no such table' in str(e):
+                return 0  # Shard is still being created
+            raise
+
+    # ========================================================================
+    # MAINTENANCE
+    # ========================================================================
+
+    def _catalog_connection(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=config.db_busy_timeout_ms / 1000)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _shard_writer(self, key: str) -> sqlite3.Connection:
+        """Open a shard for writing with the catalog attached read-only."""
+        self.shard_dir.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(str(self.shard_file(key)), timeout=config.db_busy_timeout_ms / 1000, uri=True)
+        conn.isolation_level = None  # Transactions are managed explicitly
+        conn.execute("PRAGMA journal_mode = WAL")
+        for sql in SHARD_SCHEMA_SQL:
+            conn.execute(sql)
+        catalog_uri = Path(self.db_path).resolve().as_uri() + '?mode=ro'
+        conn.execute("ATTACH DATABASE ? AS catalog", (catalog_uri,))
+        return conn
+
+    def _lock(self) -> sqlite3.Connection:
+        """Cross-process sync lock: a write transaction on a small lock database."""
+        self.shard_dir.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(str(self.shard_dir / 'sync.lock'), timeout=config.db_busy_timeout_ms / 1000)
+        conn.isolation_level = None
+        conn.execute("BEGIN EXCLUSIVE")
+        return conn
+
+    def _insert_sql(self, file_filter: str) -> str:
+        return f"""
+            INSERT INTO files_fts(rowid, project_code, title, file_name, text_content, project_id, date_completion)
+            SELECT f.id, p.project_code, p.title, f.file_name, f.text_content, p.id, p.date_completion
+            FROM catalog.files f
+            INNER JOIN catalog.projects p ON f.project_id = p.id
+            WHERE {file_filter} AND {self.shard_key_sql()} = ?
+        """
+
+    def has_pending(self) -> bool:
+        """Whether catalog changes are waiting to be applied to the shards."""
+        conn = self._catalog_connection()
+        try:
+            conn.execute("SELECT 1 FROM fts_shard_rows LIMIT 0")
+            return conn.execute("SELECT 1 FROM fts_shard_queue LIMIT 1").fetchone() is not None
+        except sqlite3.OperationalError as e:
+            if 'no such table' in str(e):
+                logger.warning("fts_shard_queue missing; run python api/fts_shards.py build")
+                return False
+            raise
+        finally:
+            conn.close()
+
+    def schedule_sync(self) -> None:
+        """Wake the background sync thread (started on first use)."""
+        with self._syncer_lock:
+            if self._syncer is None:
+                self._syncer = threading.Thread(target=self._sync_loop, name="fts-shard-sync", daemon=True)
+                self._syncer.start()
+        self._sync_wanted.set()
+
+    def _sync_loop(self) -> None:
+        """Apply the queue whenever woken; commits during a sync wake it again."""
+        while True:
+            self._sync_wanted.wait()
+            self._sync_wanted.clear()
+            try:
+                if self.has_pending():
+                    self.sync()
+            except Exception as e:
+                logger.error(f"Background FTS shard sync failed: {str(e)}")
+
+    def sync(self, batch_size: int = 5000) -> int:
+        """
+        Apply queued catalog changes to the shards.
+
+        Only the shards recorded in fts_shard_rows for the changed files and
+        the shards they belong in now are opened; other shards (frozen ones
+        in particular) are left alone. The target shards are recorded before
+        any shard is written, so fts_shard_rows never misses an entry even if
+        a sync is interrupted.
+
+        Shards always read the current catalog rows, which are at least as new
+        as the queue entries read beforehand; an entry changed in the meantime
+        keeps its newer version and is applied again on the next sync.
+
+        Returns:
+            Number of queue entries applied
+        """
+        applied = 0
+        with self._sync_lock:
+            lock = self._lock()
+            try:
+                while True:
+                    conn = self._catalog_connection()
+                    try:
+                        pending = [tuple(row) for row in conn.execute(
+                            "SELECT file_id, version FROM fts_shard_queue LIMIT ?", (batch_size,)
+                        )]
+                        if not pending:
+                            break
+                        file_ids = json.dumps([file_id for file_id, _ in pending])
+                        located = conn.execute("""
+                            SELECT file_id, shard_key FROM fts_shard_rows
+                            WHERE file_id IN (SELECT value FROM json_each(?))
+                        """, (file_ids,)).fetchall()
+                        targets = conn.execute(f"""
+                            SELECT f.id, {self.shard_key_sql()}
+                            FROM files f INNER JOIN projects p ON f.project_id = p.id
+                            WHERE f.id IN (SELECT value FROM json_each(?))
+                        """, (file_ids,)).fetchall()
+                    finally:
+                        conn.close()
+
+                    self.writer.execute(lambda cursor: cursor.executemany(
+                        "INSERT OR IGNORE INTO fts_shard_rows (file_id, shard_key) VALUES (?, ?)",
+                        [tuple(row) for row in targets]
+                    ))
+
+                    by_shard: Dict[str, set] = {}
+                    for file_id, key in itertools.chain(located, targets):
+                        by_shard.setdefault(key, set()).add(file_id)
+                    target_ids: Dict[str, List[int]] = {}
+                    for file_id, key in targets:
+                        target_ids.setdefault(key, []).append(file_id)
+
+                    stored = []
+                    for key in sorted(by_shard):
+                        shard = self._shard_writer(key)
+                        try:
+                            shard.execute("BEGIN IMMEDIATE")
+                            changed = shard.execute(
+                                "DELETE FROM files_fts WHERE rowid IN (SELECT value FROM json_each(?))",
+                                (json.dumps(sorted(by_shard[key])),)
+                            ).rowcount
+                            if key in target_ids:
+                                inserted = json.dumps(target_ids[key])
+                                changed += shard.execute(
+                                    self._insert_sql("f.id IN (SELECT value FROM json_each(?))"),
+                                    (inserted, key)
+                                ).rowcount
+                                # Rows that moved again since the catalog read are not inserted
+                                stored.extend((row[0], key) for row in shard.execute(
+                                    "SELECT rowid FROM files_fts WHERE rowid IN (SELECT value FROM json_each(?))",
+                                    (inserted,)
+                                ))
+                            if changed:
+                                self._set_frozen(shard, False)
+                            shard.execute("COMMIT")
+                        finally:
+                            shard.close()
+
+                    def dequeue(cursor):
+                        cursor.executemany(
+                            "DELETE FROM fts_shard_queue WHERE file_id = ? AND version = ?", pending
+                        )
+                        cursor.execute(
+                            "DELETE FROM fts_shard_rows WHERE file_id IN (SELECT value FROM json_each(?))",
+                            (file_ids,)
+                        )
+                        cursor.executemany(
+                            "INSERT INTO fts_shard_rows (file_id, shard_key) VALUES (?, ?)", stored
+                        )
+                        # Cached searches read the shards from here on
+                        cursor.execute("UPDATE search_index_version SET version = version + 1")
+
+                    self.writer.execute(dequeue)
+                    applied += len(pending)
+            finally:
+                lock.close()
+
+        if applied:
+            logger.info(f"Applied {applied} catalog changes to FTS shards")
+        return applied
+
+    def build(self) -> Dict[str, int]:
+        """
+        Rebuild every shard from the catalog.
+
+        Returns:
+            Entries per shard
+        """
+        counts = {}
+        with self._sync_lock:
+            lock = self._lock()
+            try:
+                conn = self._catalog_connection()
+                try:
+                    pending = [tuple(row) for row in conn.execute("SELECT file_id, version FROM fts_shard_queue")]
+                    keys = [row[0] for row in conn.execute(f"""
+                        SELECT DISTINCT {self.shard_key_sql()}
+                        FROM files f INNER JOIN projects p ON f.project_id = p.id
+                    """)]
+                finally:
+                    conn.close()
+
+                for key in sorted(set(self.shard_keys()) | set(keys)):
+                    shard = self._shard_writer(key)
+                    try:
+                        shard.execute("BEGIN IMMEDIATE")
+                        shard.execute("DELETE FROM files_fts")
+                        counts[key] = shard.execute(self._insert_sql("1 = 1"), (key,)).rowcount
+                        self._set_frozen(shard, False)
+                        shard.execute("COMMIT")
+                        shard.execute("INSERT INTO files_fts(files_fts) VALUES ('optimize')")
+                        stored = [(row[0], key) for row in shard.execute("SELECT rowid FROM files_fts")]
+                    finally:
+                        shard.close()
+
+                    def record(cursor, key=key, stored=stored):
+                        cursor.execute("DELETE FROM fts_shard_rows WHERE shard_key = ?", (key,))
+                        cursor.executemany("INSERT INTO fts_shard_rows (file_id, shard_key) VALUES (?, ?)", stored)
+
+                    self.writer.execute(record)
+
+                # The rebuild covers everything queued before it started
+                self.writer.execute(lambda cursor: cursor.executemany(
+                    "DELETE FROM fts_shard_queue WHERE file_id = ? AND version = ?", pending
+                ))
+            finally:
+                lock.close()
+
+        logger.info(f"Built {len(counts)} FTS shards with {sum(counts.values())} entries")
+        return counts
+
+    def optimize(self, key: str, freeze: bool = False) -> None:
+        """
+        Merge a shard's index into a single segment and compact the file.
+
+        Frozen shards are marked as such; any later write to them (a late
+        upload or correction) thaws them again.
+        """
+        with self._sync_lock:
+            shard = self._shard_writer(key)
+            try:
+                shard.execute("INSERT INTO files_fts(files_fts) VALUES ('optimize')")
+                shard.execute("DETACH DATABASE catalog")
+                shard.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+                shard.execute("VACUUM")
+                if freeze:
+                    self._set_frozen(shard, True)
+            finally:
+                shard.close()
+        logger.info(f"{'Froze' if freeze else 'Optimized'} FTS shard {key}")
+
+    def freeze_before(self, year: str) -> List[str]:
+        """Optimize and freeze all year shards older than the given year."""
+        frozen = []
+        for key in self.shard_keys():
+            if key != UNDATED_SHARD and key < year and not self.shard_status(key)['frozen']:
+                self.optimize(key, freeze=True)
+                frozen.append(key)
+        return frozen
+
+    def shard_status(self, key: str) -> Dict[str, Any]:
+        path = self.shard_file(key)
+        conn = sqlite3.connect(str(path))
+        try:
+            entries = conn.execute("SELECT COUNT(*) FROM files_fts").fetchone()[0]
+            meta = dict(conn.execute("SELECT key, value FROM shard_meta").fetchall())
+        finally:
+            conn.close()
+        return {
+            'shard': key,
+            'entries': entries,
+            'bytes': path.stat().st_size,
+            'frozen': meta.get('frozen') == '1',
+            'frozenAt': meta.get('frozen_at')
+        }
+
+    def _set_frozen(self, shard: sqlite3.Connection, frozen: bool) -> None:
+        shard.execute(
+            "INSERT OR REPLACE INTO shard_meta (key, value) VALUES ('frozen', ?)",
+            ('1' if frozen else '0',)
+        )
+        shard.execute(
+            "INSERT OR REPLACE INTO shard_meta (key, value) VALUES ('frozen_at', ?)",
+            (datetime.now(timezone.utc).isoformat() if frozen else None,)
+        )
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+
+    try:
+        from api.db_helper import db_helper
+    except ImportError:
+        from db_helper import db_helper
+
+    parser = argparse.ArgumentParser(description="Manage the sharded full-text index")
+    parser.add_argument('command', choices=['build', 'sync', 'status', 'optimize', 'freeze'])
+    parser.add_argument('--shard', help="Only this shard (optimize)")
+    parser.add_argument('--before', help="Freeze year shards older than this year (default: current year)")
+    args = parser.parse_args()
+
+    if config.fts_shard_by not in ('year', 'hash'):
+        print("Set FTS_SHARD_BY=year or FTS_SHARD_BY=hash to use the sharded index")
+        sys.exit(1)
+
+    index = db_helper.shards or ShardedSearchIndex(db_helper.db_path, db_helper.writer)
+
+    if args.command == 'build':
+        conn = db_helper.get_connection()
+        try:
+            install_shard_queue(conn)
+            conn.commit()
+        finally:
+            conn.close()
+        counts = index.build()
+        for key, count in sorted(counts.items()):
+            print(f"  {key}: {count} entries")
+    elif args.command == 'sync':
+        print(f"Applied {index.sync()} changes")
+    elif args.command == 'optimize':
+        for key in [args.shard] if args.shard else index.shard_keys():
+            index.optimize(key)
+    elif args.command == 'freeze':
+        before = args.before or str(datetime.now(timezone.utc).year)
+        print(f"Froze shards: {', '.join(index.freeze_before(before)) or 'none'}")
+
+    for key in index.shard_keys():
+        status = index.shard_status(key)
+        print(f"  {status['shard']}: {status['entries']} entries, {status['bytes'] / 1024:.0f} KB"
+              f"{' (frozen)' if status['frozen'] else ''}")
+
+    db_helper.writer.stop()
@@ -4,55 +4,190 @@ Backend API for searching and downloading EPAR documents.
 """
 
 import azure.functions as func
-import datetime
+import asyncio
 import json
 import logging
+import mimetypes
 import os
 import sys
+import threading
+import time
 from pathlib import Path
-from datetime import timedelta
 
 # Add parent directory to path to import config
 parent_dir = str(Path(__file__).parent.parent)
 if parent_dir not in sys.path:
     sys.path.insert(0, parent_dir)
 
-# Import config
-try:
-    from config import config
-    USE_AZURE_STORAGE = config.use_azure_storage
-    logger = logging.getLogger(__name__)
-    if USE_AZURE_STORAGE:
-        logger.info("Azure Storage mode: ENABLED (will generate real SAS URLs)")
-    else:
-        logger.info("Azure Storage mode: DISABLED (using mock data)")
-except Exception as e:
-    logger = logging.getLogger(__name__)
-    logger.warning(f"Could not load config: {e}. Using mock mode.")
-    USE_AZURE_STORAGE = False
-
-# Import database helper
+from config import config
+
+logger = logging.getLogger(__name__)
+
+# Light modules only: helpers and exception types used by the routes. The
+# database helper, ingestion (text extraction), catalog encoding and the Azure
+# SDK are imported by the service factories below on first use, so a cold
+# start only pays for what the first request needs.
+#
+# The HTTP routes are coroutines on the worker's event loop: blob storage is
+# awaited through the *_async storage methods, and blocking database calls go
+# through run_db (a bounded executor) or, for writes, run_catalog_write (the
+# group-commit writer for SQLite).
 try:
-    # Try importing from api subdirectory first (when running from parent)
+    from api.offload import run_catalog_write, run_db
+    from api.storage import get_storage, parse_range_header, content_blob_path, content_disposition, MockStorage, MAX_RANGE_BYTES
+    from api.repository import CursorExpiredError, QueryTimeoutError
+    from api.upload_sessions import UploadSessionError
+    from api.timing import phase, timed
+    from api.metrics import registry as metrics_registry
+    from api.profiling import profiled
+    from api.query_budget import budgeted
+except ImportError:
+    from offload import run_catalog_write, run_db
+    from storage import get_storage, parse_range_header, content_blob_path, content_disposition, MockStorage, MAX_RANGE_BYTES
+    from repository import CursorExpiredError, QueryTimeoutError
+    from upload_sessions import UploadSessionError
+    from timing import phase, timed
+    from metrics import registry as metrics_registry
+    from profiling import profiled
+    from query_budget import budgeted
+
+
+# ============================================================================
+# SERVICES (created on first use)
+# ============================================================================
+
+class LazyService:
+    """
+    Module-level service created by its factory on first attribute access.
+
+    Routes use the instance like the service itself (storage.mode,
+    repository.search_files(...)); creation is thread-safe and happens once.
+    """
+
+    def __init__(self, name: str, factory):
+        self._name = name
+        self._factory = factory
+        self._instance = None
+        self._lock = threading.Lock()
+
+    def resolve(self):
+        """Return the service, creating it on the first call."""
+        instance = self._instance
+        if instance is None:
+            with self._lock:
+                if self._instance is None:
+                    started = time.perf_counter()
+                    self._instance = self._factory()
+                    logger.info(f"Initialized {self._name} in {(time.perf_counter() - started) * 1000:.0f} ms")
+                instance = self._instance
+        return instance
+
+    def __getattr__(self, attribute):
+        return getattr(self.resolve(), attribute)
+
+
+def _create_db_helper():
     try:
         from api.db_helper import db_helper
     except ImportError:
-        # If that fails, try importing directly (when running from api/)
         from db_helper import db_helper
-    USE_DATABASE = True
     logger.info("Database helper loaded successfully")
-except Exception as e:
-    logger.warning(f"Could not load database helper: {e}. Using mock data.")
-    USE_DATABASE = False
+    return db_helper
+
+
+def _create_storage():
+    try:
+        return get_storage()
+    except Exception as e:
+        logger.warning(f"Could not initialize storage backend: {e}. Using mock mode.")
+        return MockStorage()
+
 
-# Import Azure Storage SDK only if needed
-if USE_AZURE_STORAGE:
+def _create_repository():
     try:
-        from azure.storage.blob import BlobServiceClient, generate_blob_sas, BlobSasPermissions
-        logger.info("Azure Storage SDK loaded successfully")
+        from api.repository import get_repository
     except ImportError:
-        logger.warning("Azure Storage SDK not available. Falling back to mock mode.")
-        USE_AZURE_STORAGE = False
+        from repository import get_repository
+    try:
+        return get_repository()
+    except Exception as e:
+        logger.warning(f"Could not initialize {config.database_backend} repository: {e}. Using SQLite.")
+        return db_helper.resolve()
+
+
+def _create_ingestion_queue():
+    try:
+        from api.ingestion import IngestionQueue
+    except ImportError:
+        from ingestion import IngestionQueue
+    # Jobs and upload sessions stay in the local SQLite file with the staged bytes
+    return IngestionQueue(db_helper.get_connection, writer=db_writer.resolve(), repository=repository.resolve())
+
+
+def _create_ingestion_pool():
+    try:
+        from api.ingestion import IngestionWorkerPool
+    except ImportError:
+        from ingestion import IngestionWorkerPool
+    pool = IngestionWorkerPool(ingestion_queue.resolve(), storage.resolve())
+    pool.start()
+    return pool
+
+
+def _create_upload_store(store_class: str):
+    try:
+        from api import upload_sessions as module
+    except ImportError:
+        import upload_sessions as module
+    # Uploads enqueue ingestion jobs, so the workers must be running
+    ingestion_pool.resolve()
+    return getattr(module, store_class)(
+        db_helper.resolve(), storage.resolve(), ingestion_queue.resolve(), db_writer.resolve(), repository.resolve()
+    )
+
+
+def _create_catalog_cache():
+    try:
+        from api.catalog import CatalogSnapshotCache
+    except ImportError:
+        from catalog import CatalogSnapshotCache
+    return CatalogSnapshotCache(repository.resolve())
+
+
+def _create_search_cache():
+    try:
+        from api.search_cache import SearchCache
+    except ImportError:
+        from search_cache import SearchCache
+    return SearchCache(repository.resolve(), db_writer.resolve())
+
+
+db_helper = LazyService('database helper', _create_db_helper)
+storage = LazyService('storage backend', _create_storage)
+repository = LazyService('catalog repository', _create_repository)
+db_writer = LazyService('database writer', lambda: db_helper.writer)
+ingestion_queue = LazyService('ingestion queue', _create_ingestion_queue)
+ingestion_pool = LazyService('ingestion workers', _create_ingestion_pool)
+upload_sessions = LazyService('upload sessions', lambda: _create_upload_store('UploadSessionStore'))
+direct_uploads = LazyService('direct uploads', lambda: _create_upload_store('DirectUploadStore'))
+catalog_cache = LazyService('catalog cache', _create_catalog_cache)
+search_cache = LazyService('search cache', _create_search_cache)
+
+_database_available = None
+
+
+def database_available() -> bool:
+    """Whether the catalog database can be used (otherwise routes serve mock data)."""
+    global _database_available
+    if _database_available is None:
+        try:
+            db_helper.resolve()
+            _database_available = True
+        except Exception as e:
+            logger.warning(f"Could not load database helper: {e}. Using mock data.")
+            _database_available = False
+    return _database_available
+
 
 app = func.FunctionApp()
 
@@ -124,7 +259,10 @@ MOCK_PROJECTS = [
 # ============================================================================
 
 @app.route(route="search", methods=["GET"], auth_level=func.AuthLevel.ANONYMOUS)
-def search(req: func.HttpRequest) -> func.HttpResponse:
+@timed('search')
+@profiled('search')
+@budgeted('search')
+async def search(req: func.HttpRequest) -> func.HttpResponse:
     """
     Search for EPAR projects.
 
@@ -136,6 +274,9 @@ def search(req: func.HttpRequest) -> func.HttpResponse:
     - poContacts: Comma-separated list of PO contacts
     - dateFrom: Start date (YYYY-MM format)
     - dateTo: End date (YYYY-MM format)
+    - fileTypes: Comma-separated list of file types (e.g. pdf,xlsx)
+    - includeFiles: false to return only the per-project file aggregates
+    - sort: date (newest first, default) or relevance (best match first)
 
     Returns:
     - JSON with results array and total count
@@ -143,28 +284,49 @@ def search(req: func.HttpRequest) -> func.HttpResponse:
     logger.info('Search API called')
 
     try:
-        # Get query parameters
-        search_query = req.params.get('q', '')
-        research_areas = req.params.get('researchAreas', '').split(',') if req.params.get('researchAreas') else []
-        geographies = req.params.get('geographies', '').split(',') if req.params.get('geographies') else []
-        output_types = req.params.get('outputTypes', '').split(',') if req.params.get('outputTypes') else []
-        po_contacts = req.params.get('poContacts', '').split(',') if req.params.get('poContacts') else []
-
-        # Clean up filter lists (remove empty strings)
-        research_areas = [ra.strip() for ra in research_areas if ra.strip()]
-        geographies = [g.strip() for g in geographies if g.strip()]
-        output_types = [ot.strip() for ot in output_types if ot.strip()]
-        po_contacts = [pc.strip() for pc in po_contacts if pc.strip()]
+        with phase('parse'):
+            # Get query parameters
+            search_query = req.params.get('q', '')
+            research_areas = req.params.get('researchAreas', '').split(',') if req.params.get('researchAreas') else []
+            geographies = req.params.get('geographies', '').split(',') if req.params.get('geographies') else []
+            output_types = req.params.get('outputTypes', '').split(',') if req.params.get('outputTypes') else []
+            po_contacts = req.params.get('poContacts', '').split(',') if req.params.get('poContacts') else []
+            file_types = req.params.get('fileTypes', '').split(',') if req.params.get('fileTypes') else []
+            include_files = req.params.get('includeFiles', 'true').strip().lower() not in ('false', '0', 'no')
+            date_from = req.params.get('dateFrom', '').strip()
+            date_to = req.params.get('dateTo', '').strip()
+            sort = req.params.get('sort', 'date')
+            if sort not in ('date', 'relevance'):
+                return func.HttpResponse(
+                    body=json.dumps({"error": "sort must be 'date' or 'relevance'"}),
+                    mimetype="application/json",
+                    status_code=400,
+                    headers={
+                        "Access-Control-Allow-Origin": "http://localhost:5173"
+                    }
+                )
+
+            # Clean up filter lists (remove empty strings)
+            research_areas = [ra.strip() for ra in research_areas if ra.strip()]
+            geographies = [g.strip() for g in geographies if g.strip()]
+            output_types = [ot.strip() for ot in output_types if ot.strip()]
+            po_contacts = [pc.strip() for pc in po_contacts if pc.strip()]
+            file_types = [ft.strip().lower() for ft in file_types if ft.strip()]
 
         # Use database if available, otherwise fall back to mock data
-        if USE_DATABASE:
-            # Query database
-            results = db_helper.search_files(
+        if database_available():
+            # Query database (cached until the catalog changes, identical concurrent searches run once)
+            results = await search_cache.search_async(
                 query=search_query if search_query else None,
                 research_areas=research_areas if research_areas else None,
                 geographies=geographies if geographies else None,
                 output_types=output_types if output_types else None,
-                po_contacts=po_contacts if po_contacts else None
+                po_contacts=po_contacts if po_contacts else None,
+                date_from=date_from if date_from else None,
+                date_to=date_to if date_to else None,
+                sort=sort,
+                file_types=file_types if file_types else None,
+                include_files=include_files
             )
         else:
             # Fall back to mock data
@@ -195,6 +357,18 @@ def search(req: func.HttpRequest) -> func.HttpResponse:
             if po_contacts:
                 results = [p for p in results if p['poContact'] in po_contacts]
 
+            if date_from:
+                results = [p for p in results if p['dateCompletion'] >= date_from]
+
+            if date_to:
+                results = [p for p in results if p['dateCompletion'] <= date_to]
+
+            if file_types:
+                results = [p for p in results if any(f['type'] in file_types for f in p['files'])]
+
+            if not include_files:
+                results = [{k: v for k, v in p.items() if k != 'files'} for p in results]
+
         # Return results
         response_data = {
             "results": results,
@@ -204,14 +378,22 @@ def search(req: func.HttpRequest) -> func.HttpResponse:
                 "researchAreas": research_areas,
                 "geographies": geographies,
                 "outputTypes": output_types,
-                "poContacts": po_contacts
+                "poContacts": po_contacts,
+                "dateFrom": date_from,
+                "dateTo": date_to,
+                "fileTypes": file_types,
+                "includeFiles": include_files,
+                "sort": sort
             }
         }
 
         logger.info(f'Search returned {len(results)} results')
 
+        with phase('serialize'):
+            body = json.dumps(response_data)
+
         return func.HttpResponse(
-            body=json.dumps(response_data),
+            body=body,
             mimetype="application/json",
             status_code=200,
             headers={
@@ -221,6 +403,14 @@ def search(req: func.HttpRequest) -> func.HttpResponse:
             }
         )
 
+    except QueryTimeoutError as e:
+        logger.warning(f'Search timed out: {str(e)}')
+        return func.HttpResponse(
+            body=json.dumps({"error": str(e)}),
+            mimetype="application/json",
+            status_code=503,
+            headers={"Retry-After": "5"}
+        )
     except Exception as e:
         logger.error(f'Search error: {str(e)}')
         return func.HttpResponse(
@@ -231,7 +421,8 @@ def search(req: func.HttpRequest) -> func.HttpResponse:
 
 
 @app.route(route="download", methods=["GET"], auth_level=func.AuthLevel.ANONYMOUS)
-def download(req: func.HttpRequest) -> func.HttpResponse:
+@timed('download')
+async def download(req: func.HttpRequest) -> func.HttpResponse:
     """
     Generate a temporary download URL for a file.
 
@@ -256,9 +447,10 @@ def download(req: func.HttpRequest) -> func.HttpResponse:
         # Get file from database or mock data
         file_id = int(file_id)
 
-        if USE_DATABASE:
+        if database_available():
             # Query database
-            file_info = db_helper.get_file_by_id(file_id)
+            with phase('sql'):
+                file_info = await run_db(repository.get_file_by_id, file_id)
         else:
             # Fall back to mock data
             file_info = None
@@ -277,55 +469,24 @@ def download(req: func.HttpRequest) -> func.HttpResponse:
                 status_code=404
             )
 
-        # Generate download URL based on configuration
-        if USE_AZURE_STORAGE:
-            # REAL AZURE STORAGE MODE: Generate SAS URL
-            try:
-                blob_service_client = BlobServiceClient.from_connection_string(
-                    config.blob_connection_string
-                )
-
-                # Get blob client
-                blob_client = blob_service_client.get_blob_client(
-                    container=config.blob_container,
-                    blob=file_info['blobPath']
-                )
-
-                # Extract account key from connection string
-                conn_str = config.blob_connection_string
-                account_key = None
-                for part in conn_str.split(';'):
-                    if part.startswith('AccountKey='):
-                        account_key = part.split('=', 1)[1]
-                        break
-
-                if not account_key:
-                    raise ValueError("Could not extract AccountKey from connection string")
-
-                # Generate SAS token (valid for 1 hour)
-                sas_token = generate_blob_sas(
-                    account_name=blob_client.account_name,
-                    container_name=config.blob_container,
-                    blob_name=file_info['blobPath'],
-                    account_key=account_key,
-                    permission=BlobSasPermissions(read=True),
-                    expiry=datetime.datetime.utcnow() + timedelta(hours=1)
-                )
-
-                download_url = f"{blob_client.url}?{sas_token}"
-                logger.info(f'Generated real SAS URL for file {file_id}')
-
-            except Exception as e:
-                logger.error(f'Error generating SAS URL: {str(e)}')
-                return func.HttpResponse(
-                    body=json.dumps({"error": f"Failed to generate download URL: {str(e)}"}),
-                    mimetype="application/json",
-                    status_code=500
-                )
+        # Generate download URL from the storage backend; content-addressed
+        # files resolve to their shared blob but keep their own file name
+        if file_info.get('contentHash'):
+            storage_key = content_blob_path(file_info['contentHash'])
         else:
-            # MOCK MODE: Return mock URL with explanation
-            download_url = f"#mock-download-{file_id}"
-            logger.info(f'Generated mock download URL for file {file_id} (Azure Storage not configured)')
+            storage_key = file_info['blobPath']
+
+        try:
+            with phase('sign'):
+                download_url = storage.get_download_url(storage_key, expires_in=3600, filename=file_info['name'])
+            logger.info(f'Generated {storage.mode} download URL for file {file_id}')
+        except Exception as e:
+            logger.error(f'Error generating download URL: {str(e)}')
+            return func.HttpResponse(
+                body=json.dumps({"error": f"Failed to generate download URL: {str(e)}"}),
+                mimetype="application/json",
+                status_code=500
+            )
 
         response_data = {
             "download_url": download_url,
@@ -333,13 +494,16 @@ def download(req: func.HttpRequest) -> func.HttpResponse:
             "size": file_info['size'],
             "type": file_info['type'],
             "expires_in": 3600,  # 1 hour
-            "mode": "azure" if USE_AZURE_STORAGE else "mock"  # Tell frontend which mode
+            "mode": storage.mode  # Tell frontend which mode (azure, local or mock)
         }
 
         logger.info(f'Generated download URL for file {file_id}')
 
+        with phase('serialize'):
+            body = json.dumps(response_data)
+
         return func.HttpResponse(
-            body=json.dumps(response_data),
+            body=body,
             mimetype="application/json",
             status_code=200,
             headers={
@@ -364,8 +528,139 @@ def download(req: func.HttpRequest) -> func.HttpResponse:
         )
 
 
+@app.route(route="storage/{*blobPath}", methods=["GET", "HEAD", "PUT", "OPTIONS"], auth_level=func.AuthLevel.ANONYMOUS)
+@timed('storage')
+async def storage_blob(req: func.HttpRequest) -> func.HttpResponse:
+    """
+    Serve or accept a blob for the local filesystem storage backend.
+
+    Only available when STORAGE_BACKEND=local. URLs are produced by the
+    download and upload/initiate endpoints and carry a signed expiry and
+    permission, like an Azure SAS URL.
+
+    Query Parameters:
+    - se: Expiry timestamp (seconds since epoch)
+    - sp: Permission ("r" for GET/HEAD, "cw" for PUT)
+    - sig: Signature
+    - rscd: Content-Disposition to serve (part of the signed string)
+
+    Headers:
+    - Range: Optional single byte range (e.g. "bytes=0-1023")
+
+    Returns:
+    - 200 with the full blob, 206 with the requested range (at most
+      MAX_RANGE_BYTES; Content-Range tells the client where to continue),
+      or 201 after a PUT
+
+    Responses are not streamed: a GET without Range holds the whole blob in
+    memory, so large downloads should use Range requests.
+    """
+    cors_headers = {
+        "Access-Control-Allow-Origin": "http://localhost:5173",
+        "Access-Control-Allow-Methods": "GET, HEAD, PUT, OPTIONS",
+        "Access-Control-Allow-Headers": "Content-Type, Range, x-ms-blob-type"
+    }
+
+    if storage.mode != 'local':
+        return func.HttpResponse(status_code=404)
+
+    if req.method == "OPTIONS":
+        return func.HttpResponse(status_code=200, headers=cors_headers)
+
+    blob_path = req.route_params.get('blobPath', '')
+    permission = 'cw' if req.method == 'PUT' else 'r'
+
+    rscd = req.params.get('rscd', '')
+    if req.params.get('sp') != permission or \
+            not storage.verify(blob_path, req.params.get('se'), permission, req.params.get('sig'), rscd):
+        return func.HttpResponse(
+            body=json.dumps({"error": "Invalid or expired signature"}),
+            mimetype="application/json",
+            status_code=403,
+            headers=cors_headers
+        )
+
+    if req.method == 'PUT':
+        try:
+            with phase('blob'):
+                await storage.upload_async(blob_path, req.get_body())
+            return func.HttpResponse(status_code=201, headers=cors_headers)
+        except ValueError as e:
+            return func.HttpResponse(
+                body=json.dumps({"error": str(e)}),
+                mimetype="application/json",
+                status_code=400,
+                headers=cors_headers
+            )
+
+    try:
+        size = await storage.get_size_async(blob_path)
+        if size is None:
+            return func.HttpResponse(
+                body=json.dumps({"error": "Blob not found"}),
+                mimetype="application/json",
+                status_code=404
+            )
+
+        # Content-addressed links carry the original file name in rscd (signed)
+        filename = Path(blob_path).name
+        disposition = content_disposition(filename)
+        if rscd.startswith('attachment;') and '\r' not in rscd and '\n' not in rscd:
+            disposition = rscd
+            filename = rscd.split('filename=', 1)[-1].strip('"')
+
+        headers = {
+            "Accept-Ranges": "bytes",
+            "Content-Disposition": disposition,
+            "Access-Control-Allow-Origin": "http://localhost:5173"
+        }
+        mimetype = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+
+        try:
+            byte_range = parse_range_header(req.headers.get('Range', ''), size)
+        except ValueError:
+            headers["Content-Range"] = f"bytes */{size}"
+            return func.HttpResponse(status_code=416, headers=headers)
+
+        if byte_range:
+            start, end = byte_range
+            end = min(end, start + MAX_RANGE_BYTES - 1)
+            status_code = 206
+            headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+        else:
+            start, end = 0, size - 1
+            status_code = 200
+
+        with phase('blob'):
+            body = b'' if req.method == 'HEAD' else await storage.read_range_async(blob_path, start, end)
+        headers["Content-Length"] = str(end - start + 1)
+
+        return func.HttpResponse(
+            body=body,
+            mimetype=mimetype,
+            status_code=status_code,
+            headers=headers
+        )
+
+    except ValueError as e:
+        return func.HttpResponse(
+            body=json.dumps({"error": str(e)}),
+            mimetype="application/json",
+            status_code=400
+        )
+    except Exception as e:
+        logger.error(f'Storage read error: {str(e)}')
+        return func.HttpResponse(
+            body=json.dumps({"error": str(e)}),
+            mimetype="application/json",
+            status_code=500
+        )
+
+
 @app.route(route="upload", methods=["POST", "OPTIONS"], auth_level=func.AuthLevel.ANONYMOUS)
-def upload(req: func.HttpRequest) -> func.HttpResponse:
+@timed('upload')
+@profiled('upload')
+async def upload(req: func.HttpRequest) -> func.HttpResponse:
     """
     Upload project files and metadata.
 
@@ -382,8 +677,14 @@ def upload(req: func.HttpRequest) -> func.HttpResponse:
     - dateCompletion: Date of completion (YYYY-MM format, required)
     - file_0, file_1, ...: Files to upload
 
+    Re-uploading an existing project code updates it: changed metadata is
+    written, files are matched by name and only those whose content differs
+    are re-ingested.
+
     Returns:
-    - JSON with project ID and uploaded file information
+    - 202 with project ID, per-file status (created, updated, unchanged) and an
+      ingestion job ID; poll /jobs/{jobId} until the files are stored and indexed
+    - 200 with jobId null when nothing changed
     """
     # Handle CORS preflight
     if req.method == "OPTIONS":
@@ -398,8 +699,9 @@ def upload(req: func.HttpRequest) -> func.HttpResponse:
 
     try:
         # Parse form data
-        form_data = req.form
-        files = req.files
+        with phase('parse'):
+            form_data = req.form
+            files = req.files
 
         logger.info(f"Upload request received with {len(files)} files")
 
@@ -439,107 +741,127 @@ def upload(req: func.HttpRequest) -> func.HttpResponse:
             )
 
         # Process files and save to database
-        if USE_DATABASE:
-            # Insert project into database
-            import sqlite3
-            conn = db_helper.get_connection()
-            cursor = conn.cursor()
-
-            try:
-                # Insert project
-                cursor.execute("""
-                    INSERT INTO projects (
-                        project_code, title, research_areas, date_initial_request,
-                        date_completion, po_contact, other_pos, agdev_partner,
-                        output_type, geographies
-                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """, (
-                    project_code,
-                    title,
-                    json.dumps(research_areas),
-                    date_initial_request,
-                    date_completion,
-                    po_contact,
-                    json.dumps(other_pos),
-                    agdev_partner,
-                    output_type,
-                    json.dumps(geographies)
-                ))
-
-                project_id = cursor.lastrowid
-                uploaded_files = []
-
-                # Process each file
-                for file_key in files:
-                    file = files[file_key]
+        if database_available():
+            # Stage file bytes before opening the write transaction; storage
+            # upload and text extraction happen later in the ingestion workers
+            with phase('stage'):
+                uploads = [files[file_key] for file_key in files]
+                staged_all = await asyncio.gather(
+                    *(asyncio.to_thread(ingestion_queue.stage_file, file.stream) for file in uploads)
+                )
+                staged_files = []
+                for file, staged in zip(uploads, staged_all):
                     file_name = file.filename
-                    file_content = file.read()
-                    file_size = len(file_content)
-                    file_type = file_name.split('.')[-1].lower() if '.' in file_name else 'unknown'
-
-                    # Generate blob path
-                    blob_path = f"{project_code}/{file_name}"
-
-                    # Upload to Azure Storage if configured
-                    if USE_AZURE_STORAGE:
-                        try:
-                            from azure.storage.blob import BlobServiceClient
-                            blob_service_client = BlobServiceClient.from_connection_string(config.blob_connection_string)
-                            container_client = blob_service_client.get_container_client(config.blob_container)
-
-                            # Upload file
-                            blob_client = container_client.get_blob_client(blob_path)
-                            blob_client.upload_blob(file_content, overwrite=True)
-
-                            logger.info(f"Uploaded {file_name} to Azure Storage: {blob_path}")
-                        except Exception as e:
-                            logger.error(f"Azure upload error: {str(e)}")
-                            # Continue anyway - file metadata will be saved
-
-                    # Insert file metadata into database
-                    cursor.execute("""
-                        INSERT INTO files (
-                            project_id, file_name, file_type, file_size, blob_path
-                        ) VALUES (?, ?, ?, ?, ?)
-                    """, (project_id, file_name, file_type, file_size, blob_path))
-
-                    file_id = cursor.lastrowid
-
-                    uploaded_files.append({
-                        'id': file_id,
-                        'name': file_name,
-                        'type': file_type,
-                        'size': file_size,
-                        'blobPath': blob_path
+                    staged_files.append({
+                        'fileName': file_name,
+                        'fileType': file_name.split('.')[-1].lower() if '.' in file_name else 'unknown',
+                        'fileSize': staged['size'],
+                        'blobPath': f"{project_code}/{file_name}",
+                        'contentHash': staged['contentHash'],
+                        'stagedPath': staged['stagedPath']
                     })
 
-                conn.commit()
-
-                logger.info(f"Project {project_code} uploaded successfully with {len(uploaded_files)} files")
-
-                return func.HttpResponse(
-                    body=json.dumps({
-                        "success": True,
-                        "projectId": project_id,
-                        "projectCode": project_code,
-                        "filesUploaded": len(uploaded_files),
-                        "files": uploaded_files,
-                        "mode": "azure" if USE_AZURE_STORAGE else "local"
-                    }),
-                    mimetype="application/json",
-                    status_code=200,
-                    headers={
-                        "Access-Control-Allow-Origin": "http://localhost:5173",
-                        "Access-Control-Allow-Methods": "POST, OPTIONS",
-                        "Access-Control-Allow-Headers": "Content-Type"
-                    }
+            # Check storage before queuing the write; no blob I/O inside the transaction
+            with phase('blob'):
+                stored = await asyncio.gather(
+                    *(storage.exists_async(content_blob_path(entry['contentHash'])) for entry in staged_files)
                 )
-
-            except Exception as e:
-                conn.rollback()
+                for entry, is_stored in zip(staged_files, stored):
+                    entry['stored'] = is_stored
+
+            def write_upload(cursor):
+                # Create the project, or update its metadata if it already exists
+                project_id, project_status = repository.upsert_project(cursor, {
+                    'projectCode': project_code,
+                    'title': title,
+                    'researchAreas': research_areas,
+                    'dateInitialRequest': date_initial_request,
+                    'dateCompletion': date_completion,
+                    'poContact': po_contact,
+                    'otherPos': other_pos,
+                    'agdevPartner': agdev_partner,
+                    'outputType': output_type,
+                    'geographies': geographies
+                })
+
+                # Upsert file metadata; text_content is filled in by ingestion
+                for entry in staged_files:
+                    entry['fileId'], entry['status'] = repository.upsert_file(cursor, project_id, entry)
+                    # Identical content that is already stored needs no ingestion
+                    entry['ingest'] = entry['status'] != 'unchanged' or not entry['stored']
+
+                job_files = [{
+                    key: entry[key] for key in
+                    ('fileId', 'fileName', 'fileType', 'fileSize', 'blobPath', 'contentHash', 'stagedPath')
+                } for entry in staged_files if entry['ingest']]
+                if not job_files:
+                    return project_id, project_status, None
+
+                def enqueue(jobs_cursor):
+                    return ingestion_queue.enqueue(jobs_cursor, project_id, job_files)
+
+                # The job commits with the catalog rows (SQLite) or before them, so
+                # a failed enqueue rolls the catalog transaction back (PostgreSQL)
+                if repository.mode == 'sqlite':
+                    return project_id, project_status, enqueue(cursor)
+                return project_id, project_status, db_writer.execute(enqueue)
+
+            # Catalog rows and the job for this instance's queue in one write
+            try:
+                with phase('sql'):
+                    project_id, project_status, job_id = await run_catalog_write(
+                        repository, db_writer, write_upload
+                    )
+            except Exception:
+                for entry in staged_files:
+                    os.unlink(entry['stagedPath'])
                 raise
-            finally:
-                conn.close()
+
+            changed_files = [entry for entry in staged_files if entry['ingest']]
+            for entry in staged_files:
+                if not entry['ingest']:
+                    os.unlink(entry['stagedPath'])
+
+            uploaded_files = [{
+                'id': entry['fileId'],
+                'name': entry['fileName'],
+                'type': entry['fileType'],
+                'size': entry['fileSize'],
+                'blobPath': entry['blobPath'],
+                'contentHash': entry['contentHash'],
+                'status': entry['status']
+            } for entry in staged_files]
+
+            if job_id:
+                ingestion_pool.wake()
+
+            logger.info(f"Project {project_code} {project_status}: {len(changed_files)} of "
+                        f"{len(uploaded_files)} files changed (ingestion job {job_id})")
+
+            with phase('serialize'):
+                body = json.dumps({
+                    "success": True,
+                    "projectId": project_id,
+                    "projectCode": project_code,
+                    "projectStatus": project_status,
+                    "filesUploaded": len(uploaded_files),
+                    "filesChanged": len(changed_files),
+                    "files": uploaded_files,
+                    "jobId": job_id,
+                    "statusUrl": f"{config.public_api_url}/jobs/{job_id}" if job_id else None,
+                    "mode": "azure" if storage.mode == "azure" else "local"
+                })
+
+            return func.HttpResponse(
+                body=body,
+                mimetype="application/json",
+                status_code=202 if job_id else 200,
+                headers={
+                    "Access-Control-Allow-Origin": "http://localhost:5173",
+                    "Access-Control-Allow-Methods": "POST, OPTIONS",
+                    "Access-Control-Allow-Headers": "Content-Type"
+                }
+            )
         else:
             # Mock mode - just return success
             return func.HttpResponse(
@@ -568,4 +890,405 @@ def upload(req: func.HttpRequest) -> func.HttpResponse:
             headers={
                 "Access-Control-Allow-Origin": "http://localhost:5173"
             }
-        )
\ No newline at end of file
+        )
+
+
+@app.route(route="jobs/{jobId}", methods=["GET"], auth_level=func.AuthLevel.ANONYMOUS)
+@timed('jobs')
+async def job_status(req: func.HttpRequest) -> func.HttpResponse:
+    """
+    Get the status of an ingestion job.
+
+    Returns:
+    - JSON with status (queued, running, succeeded, failed), attempts and last error
+    """
+    try:
+        job_id = int(req.route_params.get('jobId'))
+    except (TypeError, ValueError):
+        return func.HttpResponse(
+            body=json.dumps({"error": "Invalid jobId"}),
+            mimetype="application/json",
+            status_code=400
+        )
+
+    if not database_available():
+        return func.HttpResponse(
+            body=json.dumps({"error": "Job not found"}),
+            mimetype="application/json",
+            status_code=404
+        )
+
+    try:
+        job = await run_db(ingestion_queue.get_job, job_id)
+        if not job:
+            return func.HttpResponse(
+                body=json.dumps({"error": "Job not found"}),
+                mimetype="application/json",
+                status_code=404
+            )
+
+        return func.HttpResponse(
+            body=json.dumps(job),
+            mimetype="application/json",
+            status_code=200,
+            headers={
+                "Access-Control-Allow-Origin": "http://localhost:5173",
+                "Access-Control-Allow-Methods": "GET, OPTIONS",
+                "Access-Control-Allow-Headers": "Content-Type"
+            }
+        )
+
+    except Exception as e:
+        logger.error(f'Job status error: {str(e)}')
+        return func.HttpResponse(
+            body=json.dumps({"error": str(e)}),
+            mimetype="application/json",
+            status_code=500
+        )
+
+
+# ============================================================================
+# RESUMABLE AND DIRECT-TO-STORAGE UPLOADS
+# ============================================================================
+
+def json_response(data, status_code: int = 200, methods: str = "GET, OPTIONS") -> func.HttpResponse:
+    """Build a JSON response with the frontend CORS headers."""
+    return func.HttpResponse(
+        body=json.dumps(data),
+        mimetype="application/json",
+        status_code=status_code,
+        headers={
+            "Access-Control-Allow-Origin": "http://localhost:5173",
+            "Access-Control-Allow-Methods": methods,
+            "Access-Control-Allow-Headers": "Content-Type"
+        }
+    )
+
+
+async def upload_session_call(handler, methods: str, success_status: int = 200) -> func.HttpResponse:
+    """Await an upload session operation and map its errors to HTTP responses."""
+    if not database_available():
+        return json_response({"error": "Upload sessions require the database"}, 501, methods)
+    if storage.mode == 'mock':
+        return json_response({"error": "Upload sessions require azure or local storage"}, 501, methods)
+
+    try:
+        return json_response(await handler(), success_status, methods)
+    except UploadSessionError as e:
+        return json_response({"error": str(e)}, e.status_code, methods)
+    except Exception as e:
+        logger.error(f'Upload session error: {str(e)}')
+        return json_response({"error": str(e)}, 500, methods)
+
+
+@app.route(route="upload/sessions", methods=["POST", "OPTIONS"], auth_level=func.AuthLevel.ANONYMOUS)
+@timed('upload/sessions')
+async def create_upload_session(req: func.HttpRequest) -> func.HttpResponse:
+    """
+    Start a resumable upload for one file.
+
+    JSON Body:
+    - Project metadata, as for /upload (projectCode, title, outputType, poContact,
+      dateCompletion, researchAreas, geographies, otherPos, agdevPartner, dateInitialRequest)
+    - fileName: Name of the file (required)
+    - fileSize: Size in bytes (required)
+    - chunkSize: Chunk size in bytes (optional)
+
+    Returns:
+    - 201 with sessionId, chunkSize and chunkCount
+    """
+    if req.method == "OPTIONS":
+        return json_response({}, 200, "POST, OPTIONS")
+
+    async def handler():
+        try:
+            body = req.get_json()
+        except ValueError:
+            raise UploadSessionError("Request body must be JSON")
+        project = {key: value for key, value in body.items() if key not in ('fileName', 'fileSize', 'chunkSize')}
+        return await run_db(
+            upload_sessions.create, project, body.get('fileName'), body.get('fileSize'), body.get('chunkSize')
+        )
+
+    return await upload_session_call(handler, "POST, OPTIONS", 201)
+
+
+@app.route(route="upload/sessions/{sessionId}", methods=["GET"], auth_level=func.AuthLevel.ANONYMOUS)
+@timed('upload/sessions/status')
+async def get_upload_session(req: func.HttpRequest) -> func.HttpResponse:
+    """
+    Get upload progress, so a client can resume.
+
+    Returns:
+    - JSON with receivedRanges (inclusive byte ranges) and missingChunks
+    """
+    session_id = req.route_params.get('sessionId')
+    return await upload_session_call(lambda: run_db(upload_sessions.get, session_id), "GET, OPTIONS")
+
+
+@app.route(route="upload/sessions/{sessionId}/chunks", methods=["PUT", "OPTIONS"], auth_level=func.AuthLevel.ANONYMOUS)
+@timed('upload/sessions/chunks')
+async def put_upload_chunk(req: func.HttpRequest) -> func.HttpResponse:
+    """
+    Upload one chunk. Chunks may be sent in any order, in parallel, and re-sent.
+
+    Query Parameters:
+    - offset: Byte offset of the chunk (a multiple of chunkSize)
+
+    Body:
+    - Raw chunk bytes (chunkSize bytes, except for the last chunk)
+    """
+    if req.method == "OPTIONS":
+        return json_response({}, 200, "PUT, OPTIONS")
+
+    session_id = req.route_params.get('sessionId')
+
+    async def handler():
+        try:
+            offset = int(req.params.get('offset', ''))
+        except ValueError:
+            raise UploadSessionError("offset parameter is required")
+        return await upload_sessions.put_chunk(session_id, offset, req.get_body())
+
+    return await upload_session_call(handler, "PUT, OPTIONS")
+
+
+@app.route(route="upload/sessions/{sessionId}/finalize", methods=["POST", "OPTIONS"], auth_level=func.AuthLevel.ANONYMOUS)
+@timed('upload/sessions/finalize')
+async def finalize_upload_session(req: func.HttpRequest) -> func.HttpResponse:
+    """
+    Assemble the uploaded chunks and hand the file to background ingestion.
+
+    Returns:
+    - 202 with fileId and jobId (poll /jobs/{jobId})
+    """
+    if req.method == "OPTIONS":
+        return json_response({}, 200, "POST, OPTIONS")
+
+    session_id = req.route_params.get('sessionId')
+    return await upload_session_call(lambda: upload_sessions.finalize(session_id), "POST, OPTIONS", 202)
+
+
+@app.route(route="upload/initiate", methods=["POST", "OPTIONS"], auth_level=func.AuthLevel.ANONYMOUS)
+@timed('upload/initiate')
+async def initiate_direct_upload(req: func.HttpRequest) -> func.HttpResponse:
+    """
+    Start a direct-to-storage upload.
+
+    JSON Body:
+    - Project metadata, as for /upload
+    - files: [{name, size, sha256}] (sha256 as lowercase hex)
+
+    Returns:
+    - 201 with uploadId and, per file, a write-only uploadUrl (valid 15 minutes)
+      plus the headers to send with the PUT. Files already in storage are
+      returned with skip=true and need no upload.
+    """
+    if req.method == "OPTIONS":
+        return json_response({}, 200, "POST, OPTIONS")
+
+    async def handler():
+        try:
+            body = req.get_json()
+        except ValueError:
+            raise UploadSessionError("Request body must be JSON")
+        project = {key: value for key, value in body.items() if key != 'files'}
+        return await direct_uploads.initiate(project, body.get('files'))
+
+    return await upload_session_call(handler, "POST, OPTIONS", 201)
+
+
+@app.route(route="upload/complete", methods=["POST", "OPTIONS"], auth_level=func.AuthLevel.ANONYMOUS)
+@timed('upload/complete')
+async def complete_direct_upload(req: func.HttpRequest) -> func.HttpResponse:
+    """
+    Register files uploaded directly to storage.
+
+    JSON Body:
+    - uploadId: ID returned by /upload/initiate
+
+    Returns:
+    - 202 with project ID, file information and an ingestion jobId
+    """
+    if req.method == "OPTIONS":
+        return json_response({}, 200, "POST, OPTIONS")
+
+    async def handler():
+        try:
+            upload_id = req.get_json().get('uploadId')
+        except ValueError:
+            raise UploadSessionError("Request body must be JSON")
+        return await direct_uploads.complete(upload_id)
+
+    return await upload_session_call(handler, "POST, OPTIONS", 202)
+
+
+# ============================================================================
+# CATALOG CHANGE FEED
+# ============================================================================
+
+# Maximum change log entries returned per /changes call
+MAX_CHANGES_LIMIT = 5000
+
+
+@app.route(route="changes", methods=["GET", "OPTIONS"], auth_level=func.AuthLevel.ANONYMOUS)
+@timed('changes')
+@budgeted('changes')
+async def catalog_changes(req: func.HttpRequest) -> func.HttpResponse:
+    """
+    Get catalog changes since a cursor, for incremental sync.
+
+    Query Parameters:
+    - since: Cursor from the previous response (omit to get the current cursor)
+    - limit: Maximum change log entries to read (default 500)
+
+    Returns:
+    - JSON with changes (insert/update with current data, delete tombstones),
+      the next cursor and hasMore
+    - 410 if the cursor is older than the retained history (reload the catalog)
+    """
+    if req.method == "OPTIONS":
+        return json_response({})
+
+    try:
+        since = int(req.params['since']) if req.params.get('since') else None
+        limit = min(int(req.params.get('limit', 500)), MAX_CHANGES_LIMIT)
+        if limit < 1 or (since is not None and since < 0):
+            raise ValueError
+    except ValueError:
+        return json_response({"error": "since and limit must be non-negative integers"}, 400)
+
+    if not database_available():
+        return json_response({"error": "The change feed requires the database"}, 501)
+
+    try:
+        return json_response(await run_db(repository.get_changes, since, limit))
+    except CursorExpiredError as e:
+        return json_response({"error": str(e)}, 410)
+    except QueryTimeoutError as e:
+        logger.warning(f'Change feed timed out: {str(e)}')
+        response = json_response({"error": str(e)}, 503)
+        response.headers['Retry-After'] = "5"
+        return response
+    except Exception as e:
+        logger.error(f'Change feed error: {str(e)}')
+        return json_response({"error": str(e)}, 500)
+
+
+@app.timer_trigger(schedule="0 30 3 * * *", arg_name="timer", run_on_startup=False, use_monitor=False)
+def prune_catalog_changes(timer: func.TimerRequest) -> None:
+    """Delete change history older than CATALOG_CHANGES_RETENTION_DAYS (daily)."""
+    if not database_available():
+        return
+    pruned = repository.prune_changes(config.catalog_changes_retention_days)
+    logger.info(f"Pruned {pruned} catalog changes")
+
+
+# ============================================================================
+# WARMUP
+# ============================================================================
+
+@app.warm_up_trigger('warmup')
+def warmup_instance(warmup) -> None:
+    """
+    Prime a new instance before it receives traffic (runs on scale-out).
+
+    Opens connections, reads the hot tables and the full-text index, builds
+    the catalog snapshot and replays the most popular searches into the
+    search cache. Also starts the ingestion workers.
+    """
+    if not database_available():
+        return
+    try:
+        from api.warmup import warm_up
+    except ImportError:
+        from warmup import warm_up
+
+    report = warm_up(repository.resolve(), search_cache.resolve(), catalog_cache.resolve())
+    ingestion_pool.resolve()
+    logger.info(f"Instance warmed up: {json.dumps(report)}")
+
+
+# ============================================================================
+# CATALOG SNAPSHOT
+# ============================================================================
+
+def etag_matches(req: func.HttpRequest, etag: str) -> bool:
+    """Weak If-None-Match comparison against an ETag."""
+    header = req.headers.get('If-None-Match', '')
+    if header.strip() == '*':
+        return True
+    candidates = [tag.strip().removeprefix('W/') for tag in header.split(',')]
+    return etag.removeprefix('W/') in candidates
+
+
+@app.route(route="catalog", methods=["GET", "OPTIONS"], auth_level=func.AuthLevel.ANONYMOUS)
+@timed('catalog')
+async def catalog_snapshot(req: func.HttpRequest) -> func.HttpResponse:
+    """
+    Get all project metadata in a compact form for client-side filtering.
+
+    Facet values are sent once in dictionaries and projects reference them by
+    index. The gzipped snapshot is built once per catalog generation; clients
+    revalidate with If-None-Match and get 304 until the catalog changes. The
+    generation is also a /changes cursor.
+
+    Returns:
+    - JSON snapshot (gzip-encoded when accepted) with an ETag
+    """
+    headers = {
+        "Access-Control-Allow-Origin": "http://localhost:5173",
+        "Access-Control-Allow-Methods": "GET, OPTIONS",
+        "Access-Control-Allow-Headers": "Content-Type, If-None-Match",
+        "Access-Control-Expose-Headers": "ETag"
+    }
+    if req.method == "OPTIONS":
+        return func.HttpResponse(status_code=200, headers=headers)
+
+    if not database_available():
+        return json_response({"error": "The catalog snapshot requires the database"}, 501)
+
+    try:
+        etag = await run_db(catalog_cache.current_etag)
+        headers.update({"ETag": etag, "Cache-Control": "no-cache", "Vary": "Accept-Encoding"})
+        if etag_matches(req, etag):
+            return func.HttpResponse(status_code=304, headers=headers)
+
+        snapshot = await run_db(catalog_cache.get)
+        headers["ETag"] = snapshot.etag
+        if 'gzip' in req.headers.get('Accept-Encoding', ''):
+            headers["Content-Encoding"] = "gzip"
+            body = snapshot.gzip_body
+        else:
+            body = snapshot.body
+
+        return func.HttpResponse(body=body, mimetype="application/json", status_code=200, headers=headers)
+
+    except Exception as e:
+        logger.error(f'Catalog snapshot error: {str(e)}')
+        return json_response({"error": str(e)}, 500)
+
+
+# ============================================================================
+# METRICS
+# ============================================================================
+
+@app.route(route="metrics", methods=["GET"], auth_level=func.AuthLevel.FUNCTION)
+async def metrics(req: func.HttpRequest) -> func.HttpResponse:
+    """
+    Request, search, cache, database and blob metrics in Prometheus text format.
+
+    Counters and histograms live in the memory of each instance: a scrape
+    reaches one instance, and values start over when it restarts (see
+    process_start_time_seconds). Requires a function key.
+
+    Returns:
+    - text/plain; version=0.0.4
+    """
+    return func.HttpResponse(
+        body=metrics_registry.render(),
+        mimetype="text/plain; version=0.0.4",
+        charset="utf-8",
+        status_code=200,
+        headers={"Cache-Control": "no-store"}
+    )
@@ -0,0 +1,408 @@
+"""
+EPAR Data Portal - Ingestion Queue
+SQLite-backed job queue that moves uploaded files into storage and extracts
+their text in the background, so /upload can return immediately.
+
+Run directly to drain the queue without the Functions host:
+    python api/ingestion.py
+"""
+
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any, BinaryIO, Callable, Dict, List, Optional
+
+# Add parent directory to path to import config
+parent_dir = str(Path(__file__).parent.parent)
+if parent_dir not in sys.path:
+    sys.path.insert(0, parent_dir)
+
+from config import config
+
+try:
+    from api.db_writer import DatabaseWriter
+    from api.extraction import CHUNK_SIZE, extract_text
+    from api.repository import Repository, get_repository
+    from api.storage import content_blob_path
+except ImportError:
+    from db_writer import DatabaseWriter
+    from extraction import CHUNK_SIZE, extract_text
+    from repository import Repository, get_repository
+    from storage import content_blob_path
+
+logger = logging.getLogger(__name__)
+
+# How long a running job may go without finishing before another worker retries it
+LEASE_SECONDS = 300
+
+# Upper bound for the exponential retry delay
+MAX_RETRY_DELAY_SECONDS = 300
+
+
+class IngestionQueue:
+    """Job queue stored in the ingestion_jobs table."""
+
+    def __init__(
+        self,
+        get_connection: Callable[[], sqlite3.Connection],
+        staging_dir: str = None,
+        max_attempts: int = None,
+        retry_base_seconds: float = None,
+        writer: DatabaseWriter = None,
+        repository: Repository = None
+    ):
+        """
+        Initialize the queue.
+
+        Args:
+            get_connection: Factory for database connections
+            staging_dir: Directory for files awaiting ingestion
+            max_attempts: Attempts before a job is marked failed
+            retry_base_seconds: Base delay for exponential backoff
+            writer: Shared database writer (a private one is created if omitted)
+            repository: Catalog repository that receives extracted text
+                (the configured one if omitted)
+        """
+        self.get_connection = get_connection
+        self.writer = writer or DatabaseWriter(get_connection)
+        self.repository = repository or get_repository()
+        self.staging_dir = Path(staging_dir or config.ingest_staging_path)
+        self.max_attempts = config.ingest_max_attempts if max_attempts is None else max_attempts
+        self.retry_base_seconds = (
+            config.ingest_retry_base_seconds if retry_base_seconds is None else retry_base_seconds
+        )
+
+    def stage_file(self, stream: BinaryIO) -> Dict[str, Any]:
+        """
+        Copy an upload stream to the staging directory, hashing it on the way.
+
+        Returns:
+            Dict with stagedPath, size and contentHash (hex SHA-256)
+        """
+        self.staging_dir.mkdir(parents=True, exist_ok=True)
+        fd, staged_path = tempfile.mkstemp(dir=self.staging_dir, prefix=f"{uuid.uuid4().hex}-")
+
+        digest = hashlib.sha256()
+        size = 0
+        with os.fdopen(fd, 'wb') as f:
+            while True:
+                chunk = stream.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                size += len(chunk)
+                f.write(chunk)
+
+        return {'stagedPath': staged_path, 'size': size, 'contentHash': digest.hexdigest()}
+
+    def stage_blob(self, storage, blob_path: str) -> Dict[str, Any]:
+        """
+        Download a blob staged in storage (e.g. an assembled upload session)
+        into the staging directory, hashing it on the way.
+
+        Returns:
+            Dict with stagedPath, size and contentHash (hex SHA-256)
+        """
+        self.staging_dir.mkdir(parents=True, exist_ok=True)
+
+        staged_path = self.blob_staging_path(blob_path)
+        with open(staged_path, 'wb') as f:
+            storage.download_to(blob_path, f)
+
+        digest = hashlib.sha256()
+        size = 0
+        with open(staged_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+                digest.update(chunk)
+                size += len(chunk)
+
+        return {'stagedPath': staged_path, 'size': size, 'contentHash': digest.hexdigest()}
+
+    def blob_staging_path(self, blob_path: str) -> str:
+        """Local copy of a storage-staged blob (a stable name, so a retried job replaces it)."""
+        return str(self.staging_dir / f"blob-{blob_path.replace('/', '_')}")
+
+    def remove_staged(self, files: List[Dict[str, Any]]) -> None:
+        """Delete the local staged copies of a job's files."""
+        for entry in files:
+            paths = [entry.get('stagedPath')]
+            if entry.get('stagedBlob'):
+                paths.append(self.blob_staging_path(entry['stagedBlob']))
+            for path in filter(None, paths):
+                try:
+                    os.unlink(path)
+                except FileNotFoundError:
+                    pass
+
+    def enqueue(self, cursor: sqlite3.Cursor, project_id: int, files: List[Dict[str, Any]]) -> int:
+        """
+        Add a job in the caller's transaction.
+
+        Args:
+            cursor: Cursor inside the transaction that created the file rows
+            project_id: Project the files belong to
+            files: Entries with fileId, fileName, fileType, blobPath and either
+                contentHash + stagedPath (local staging) or stagedBlob (a staging key
+                in storage, with an optional declared contentHash to verify)
+
+        Returns:
+            Job ID
+        """
+        cursor.execute("""
+            INSERT INTO ingestion_jobs (project_id, payload, max_attempts, next_attempt_at)
+            VALUES (?, ?, ?, ?)
+        """, (project_id, json.dumps(files), self.max_attempts, time.time()))
+        return cursor.lastrowid
+
+    def claim_next(self) -> Optional[Dict[str, Any]]:
+        """
+        Claim the next ready job (queued, or running with an expired lease).
+
+        Returns:
+            Job dict or None if nothing is ready
+        """
+        def claim(cursor: sqlite3.Cursor) -> Optional[Dict[str, Any]]:
+            now = time.time()
+            row = cursor.execute("""
+                SELECT id, project_id, payload, attempts, max_attempts
+                FROM ingestion_jobs
+                WHERE (status = 'queued' AND next_attempt_at <= ?)
+                   OR (status = 'running' AND locked_until < ?)
+                ORDER BY next_attempt_at
+                LIMIT 1
+            """, (now, now)).fetchone()
+
+            if not row:
+                return None
+
+            cursor.execute("""
+                UPDATE ingestion_jobs
+                SET status = 'running', attempts = attempts + 1,
+                    locked_until = ?, updated_at = CURRENT_TIMESTAMP
+                WHERE id = ?
+            """, (now + LEASE_SECONDS, row['id']))
+
+            return {
+                'id': row['id'],
+                'projectId': row['project_id'],
+                'files': json.loads(row['payload']),
+                'attempts': row['attempts'] + 1,
+                'maxAttempts': row['max_attempts']
+            }
+
+        return self.writer.execute(claim)
+
+    def complete(self, job_id: int) -> None:
+        """Mark a job as succeeded."""
+        self.writer.execute(lambda cursor: cursor.execute("""
+            UPDATE ingestion_jobs
+            SET status = 'succeeded', last_error = NULL, locked_until = NULL,
+                updated_at = CURRENT_TIMESTAMP
+            WHERE id = ?
+        """, (job_id,)))
+
+    def fail(self, job: Dict[str, Any], error: str) -> None:
+        """
+        Schedule a retry with exponential backoff, or mark the job failed.
+
+        A failed job is not retried, so its staged files are deleted.
+        """
+        if job['attempts'] >= job['maxAttempts']:
+            status, next_attempt_at = 'failed', time.time()
+        else:
+            delay = min(self.retry_base_seconds * (2 ** (job['attempts'] - 1)), MAX_RETRY_DELAY_SECONDS)
+            status, next_attempt_at = 'queued', time.time() + delay
+
+        self.writer.execute(lambda cursor: cursor.execute("""
+            UPDATE ingestion_jobs
+            SET status = ?, last_error = ?, next_attempt_at = ?, locked_until = NULL,
+                updated_at = CURRENT_TIMESTAMP
+            WHERE id = ?
+        """, (status, error, next_attempt_at, job['id'])))
+        if status == 'failed':
+            self.remove_staged(job['files'])
+
+    def get_job(self, job_id: int) -> Optional[Dict[str, Any]]:
+        """
+        Get job status by ID.
+
+        Returns:
+            Job status dict or None if not found
+        """
+        conn = self.get_connection()
+        try:
+            row = conn.execute("""
+                SELECT id, project_id, status, payload, attempts, max_attempts,
+                       last_error, created_at, updated_at
+                FROM ingestion_jobs
+                WHERE id = ?
+            """, (job_id,)).fetchone()
+        finally:
+            conn.close()
+
+        if not row:
+            return None
+
+        return {
+            'id': row['id'],
+            'projectId': row['project_id'],
+            'status': row['status'],
+            'fileIds': [f['fileId'] for f in json.loads(row['payload'])],
+            'attempts': row['attempts'],
+            'maxAttempts': row['max_attempts'],
+            'lastError': row['last_error'],
+            'createdAt': row['created_at'],
+            'updatedAt': row['updated_at']
+        }
+
+
+def process_job(job: Dict[str, Any], queue: IngestionQueue, storage) -> None:
+    """
+    Upload a job's staged files to storage and index their text.
+
+    Blobs are stored once under their content hash: if the content is already
+    in storage the transfer is skipped, and text extracted for an identical
+    file is reused. Only this function writes content keys, and only bytes it
+    has hashed itself. Files are streamed, never read whole: local uploads
+    are uploaded from the staged file, and blobs already in storage (upload
+    sessions) are copied to their content key inside the storage. Every step
+    is idempotent so a retried job can safely redo earlier work.
+    """
+    for entry in job['files']:
+        if entry.get('stagedBlob'):
+            # Bring storage-staged uploads local so they can be hashed and extracted
+            staged = queue.stage_blob(storage, entry['stagedBlob'])
+            declared_hash = entry.get('contentHash')
+            if declared_hash and staged['contentHash'] != declared_hash:
+                os.unlink(staged['stagedPath'])
+                raise ValueError(f"Content hash mismatch for {entry['blobPath']}")
+            entry.update(staged)
+
+        staged_path = entry['stagedPath']
+        storage_key = content_blob_path(entry['contentHash'])
+
+        known_text = queue.repository.get_text_for_content(
+            entry['contentHash'], entry['fileType'], entry['fileId']
+        )
+
+        if storage.exists(storage_key):
+            logger.info(f"Content {entry['contentHash'][:12]} already stored; skipping upload")
+        elif entry.get('stagedBlob') and not entry.get('clientWritable'):
+            storage.copy(entry['stagedBlob'], storage_key)
+        else:
+            # A direct upload's client may still hold a write URL for its staged
+            # blob, so store the bytes that were hashed, not the blob
+            storage.upload_file(storage_key, staged_path)
+
+        if known_text is not None:
+            text_content = known_text
+        else:
+            with open(staged_path, 'rb') as f:
+                text_content = extract_text(entry['fileName'], f)
+
+        # Refreshes the search index (files_fts trigger / tsvector trigger)
+        queue.repository.set_file_content(entry['fileId'], entry['contentHash'], text_content)
+
+        logger.info(f"Ingested file {entry['fileId']} ({entry['blobPath']} -> {storage_key})")
+
+    queue.remove_staged(job['files'])
+    for entry in job['files']:
+        # Files skipped by a direct upload are staged at their content key; keep those
+        if entry.get('stagedBlob') and entry['stagedBlob'] != content_blob_path(entry['contentHash']):
+            storage.delete(entry['stagedBlob'])
+
+
+class IngestionWorkerPool:
+    """Background threads that drain the ingestion queue."""
+
+    def __init__(self, queue: IngestionQueue, storage, workers: int = None, poll_interval: float = 1.0):
+        self.queue = queue
+        self.storage = storage
+        self.workers = config.ingest_workers if workers is None else workers
+        self.poll_interval = poll_interval
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._threads = []
+
+    def start(self) -> None:
+        """Start worker threads (no-op if already started or workers == 0)."""
+        if self._threads or self.workers <= 0:
+            return
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f"ingestion-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        logger.info(f"Started {self.workers} ingestion workers")
+
+    def stop(self, timeout: float = None) -> None:
+        """Signal workers to stop and wait for them."""
+        self._stopping.set()
+        self._wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def wake(self) -> None:
+        """Tell idle workers a new job is available."""
+        self._wakeup.set()
+
+    def run_once(self) -> bool:
+        """
+        Claim and process a single job.
+
+        Returns:
+            True if a job was processed (successfully or not)
+        """
+        job = self.queue.claim_next()
+        if not job:
+            return False
+
+        try:
+            process_job(job, self.queue, self.storage)
+            self.queue.complete(job['id'])
+            logger.info(f"Ingestion job {job['id']} succeeded")
+        except Exception as e:
+            logger.error(f"Ingestion job {job['id']} attempt {job['attempts']} failed: {str(e)}")
+            self.queue.fail(job, str(e))
+        return True
+
+    def drain(self) -> int:
+        """Process ready jobs until none are left. Returns the number processed."""
+        processed = 0
+        while self.run_once():
+            processed += 1
+        return processed
+
+    def _run(self) -> None:
+        while not self._stopping.is_set():
+            try:
+                if self.run_once():
+                    continue
+            except Exception as e:
+                logger.error(f"Ingestion worker error: {str(e)}")
+            self._wakeup.wait(self.poll_interval)
+            self._wakeup.clear()
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+
+    try:
+        from api.db_helper import db_helper
+        from api.storage import get_storage
+    except ImportError:
+        from db_helper import db_helper
+        from storage import get_storage
+
+    queue = IngestionQueue(db_helper.get_connection, writer=db_helper.writer)
+    pool = IngestionWorkerPool(queue, get_storage(), workers=0)
+    count = pool.drain()
+    print(f"Processed {count} ingestion jobs")
@@ -0,0 +1,212 @@
+"""
+EPAR Data Portal - Metrics Registry
+In-process counters and histograms exposed in Prometheus text format at /metrics.
+
+Updates are cheap and take no lock: every thread writes to its own cell (a
+dict of label values -> count or bucket list), and only a scrape walks the
+cells of all threads and adds them up. A cell is registered under a lock once
+per thread and metric. Reads during a scrape may miss an update in progress,
+which the next scrape picks up; counters never go backwards.
+
+Values are per instance and start at zero when the process starts
+(process_start_time_seconds lets the scraper detect restarts).
+"""
+
+import bisect
+import threading
+import time
+from typing import Dict, List, Sequence, Tuple
+
+# Request latency buckets (seconds)
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+PROCESS_START_TIME = time.time()
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class _Metric:
+    """Per-thread cells of one metric."""
+
+    kind = ''
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._local = threading.local()
+        self._cells: List[Dict[Tuple[str, ...], object]] = []
+        self._cells_lock = threading.Lock()
+
+    def _cell(self) -> dict:
+        cell = getattr(self._local, 'cell', None)
+        if cell is None:
+            cell = self._local.cell = {}
+            with self._cells_lock:
+                self._cells.append(cell)
+        return cell
+
+    def _snapshot(self) -> List[dict]:
+        with self._cells_lock:
+            cells = list(self._cells)
+        # dict.copy() runs without releasing the GIL, so it never sees a half-inserted key
+        return [cell.copy() for cell in cells]
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    """Monotonic counter."""
+
+    kind = 'counter'
+
+    def inc(self, *labelvalues: str, amount: float = 1) -> None:
+        """Add amount to the series of these label values (in labelnames order)."""
+        cell = self._cell()
+        cell[labelvalues] = cell.get(labelvalues, 0) + amount
+
+    def value(self, *labelvalues: str) -> float:
+        """Current total of one series (for tests and tools)."""
+        return sum(cell.get(labelvalues, 0) for cell in self._snapshot())
+
+    def render(self) -> List[str]:
+        totals: Dict[Tuple[str, ...], float] = {}
+        for cell in self._snapshot():
+            for labelvalues, value in cell.items():
+                totals[labelvalues] = totals.get(labelvalues, 0) + value
+        lines = super().render()
+        for labelvalues in sorted(totals):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labelvalues)} {_format_value(totals[labelvalues])}")
+        return lines
+
+
+class Histogram(_Metric):
+    """Fixed-bucket histogram."""
+
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, *labelvalues: str) -> None:
+        """Record one observation for the series of these label values."""
+        cell = self._cell()
+        series = cell.get(labelvalues)
+        if series is None:
+            # Bucket counts (non-cumulative, last one is +Inf), then sum
+            series = cell[labelvalues] = [0] * (len(self.buckets) + 1) + [0.0]
+        series[bisect.bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def total(self, *labelvalues: str) -> Tuple[int, float]:
+        """Observation count and sum of one series (for tests and tools)."""
+        count, total = 0, 0.0
+        for cell in self._snapshot():
+            series = cell.get(labelvalues)
+            if series is not None:
+                count += sum(series[:-1])
+                total += series[-1]
+        return count, total
+
+    def render(self) -> List[str]:
+        totals: Dict[Tuple[str, ...], List[float]] = {}
+        for cell in self._snapshot():
+            for labelvalues, series in cell.items():
+                total = totals.get(labelvalues)
+                if total is None:
+                    totals[labelvalues] = list(series)
+                else:
+                    for i, value in enumerate(series):
+                        total[i] += value
+        lines = super().render()
+        for labelvalues in sorted(totals):
+            series = totals[labelvalues]
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), series):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else _format_value(bound)
+                labels = _format_labels(self.labelnames, labelvalues, f'le="{le}"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, labelvalues)
+            lines.append(f"{self.name}_sum{labels} {_format_value(series[-1])}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """The metrics of this process, rendered together."""
+
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        metric = Counter(name, documentation, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        metric = Histogram(name, documentation, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        """All metrics in Prometheus text exposition format (version 0.0.4)."""
+        lines = [
+            "# HELP process_start_time_seconds Start time of the process since the Unix epoch",
+            "# TYPE process_start_time_seconds gauge",
+            f"process_start_time_seconds {PROCESS_START_TIME:.3f}"
+        ]
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+# ============================================================================
+# PORTAL METRICS
+# ============================================================================
+
+HTTP_REQUESTS = registry.counter(
+    'epar_http_requests_total', 'HTTP requests by route and status code', ('route', 'status'))
+HTTP_DURATION = registry.histogram(
+    'epar_http_request_duration_seconds', 'HTTP request latency by route', ('route',))
+HTTP_PHASE_DURATION = registry.histogram(
+    'epar_http_request_phase_seconds', 'Time spent in each request phase (see Server-Timing)', ('route', 'phase'))
+SEARCH_DURATION = registry.histogram(
+    'epar_search_duration_seconds', 'Search latency by filter shape and cache result', ('shape', 'cache'))
+SEARCH_FLIGHTS = registry.counter(
+    'epar_search_flights_total', 'Searches by single-flight role (leader ran it, follower shared it) and outcome',
+    ('role', 'result'))
+CACHE_REQUESTS = registry.counter(
+    'epar_cache_requests_total', 'Search and catalog snapshot cache lookups', ('cache', 'result'))
+DB_LOCK_WAIT = registry.histogram(
+    'epar_db_lock_wait_seconds', 'Time the database writer waited to begin a write transaction')
+DB_BUSY_RETRIES = registry.counter(
+    'epar_db_busy_retries_total', 'BEGIN/COMMIT retries while the database was locked', ('statement',))
+QUERY_BUDGET_OVERRUNS = registry.counter(
+    'epar_query_budget_overruns_total', 'Database queries interrupted at their route time budget, by query shape',
+    ('route', 'shape'))
+DB_EXECUTOR_WAIT = registry.histogram(
+    'epar_db_executor_wait_seconds', 'Time database calls of the async routes waited for an executor thread')
+DB_WRITE_BATCH = registry.histogram(
+    'epar_db_write_batch_size', 'Write intents per group commit', buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256))
+BLOB_BYTES = registry.counter(
+    'epar_blob_bytes_total', 'Bytes moved to and from blob storage', ('backend', 'direction'))
@@ -0,0 +1,195 @@
+"""
+EPAR Data Portal - Blocking Work Offload
+Runs the blocking database calls of the async HTTP routes off the event loop.
+
+The routes are coroutines that share one event loop per worker process, so
+they must never block it. Database calls (SQLite reads, the PostgreSQL pool,
+cache lookups that fall through to the database) go to one executor with
+DB_EXECUTOR_WORKERS threads: however many requests are in flight, at most
+that many threads touch the database, and the rest wait in its queue (see
+epar_db_executor_wait_seconds). Writes for the group-commit writer are
+awaited on its future instead of occupying a thread while they wait.
+
+Each call runs in a copy of the caller's context, so phase() timings, request
+profiles and query budgets follow the work onto the executor thread. A
+statement interrupted by the request's query budget is re-raised as
+QueryTimeoutError (see api/query_budget.py).
+
+SingleFlight lets concurrent identical calls share one execution: the first
+caller for a key starts it, later callers await the same result or error.
+"""
+
+import asyncio
+import contextvars
+import functools
+import logging
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+# Add parent directory to path to import config
+parent_dir = str(Path(__file__).parent.parent)
+if parent_dir not in sys.path:
+    sys.path.insert(0, parent_dir)
+
+from config import config
+
+try:
+    from api.metrics import DB_EXECUTOR_WAIT
+    from api.profiling import current_profile
+    from api.query_budget import overrun
+except ImportError:
+    from metrics import DB_EXECUTOR_WAIT
+    from profiling import current_profile
+    from query_budget import overrun
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def db_executor():
+    """The process-wide database executor, a ThreadPoolExecutor (created on first use)."""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                from concurrent.futures import ThreadPoolExecutor
+
+                _executor = ThreadPoolExecutor(
+                    max_workers=config.db_executor_workers, thread_name_prefix='db-call'
+                )
+                logger.info(f"Started database executor with {config.db_executor_workers} threads")
+    return _executor
+
+
+def _call(context: contextvars.Context, queued: float, fn: Callable, args, kwargs) -> Any:
+    DB_EXECUTOR_WAIT.observe(time.perf_counter() - queued)
+    return context.run(_traced_call, fn, args, kwargs)
+
+
+def _traced_call(fn: Callable, args, kwargs) -> Any:
+    profile = current_profile()
+    try:
+        if profile is None:
+            return fn(*args, **kwargs)
+        # Samples of the waiting request continue on this thread
+        with profile.attached(sys._getframe()):
+            return fn(*args, **kwargs)
+    except Exception as e:
+        timeout = overrun(e)
+        if timeout is None:
+            raise
+        raise timeout from e
+
+
+async def run_db(fn: Callable, *args, **kwargs) -> Any:
+    """
+    Run a blocking database call on the database executor and await its result.
+
+    Args:
+        fn: Function to call; exceptions it raises are re-raised here
+        *args, **kwargs: Arguments for fn
+
+    Returns:
+        fn's return value
+    """
+    loop = asyncio.get_running_loop()
+    call = functools.partial(_call, contextvars.copy_context(), time.perf_counter(), fn, args, kwargs)
+    return await loop.run_in_executor(db_executor(), call)
+
+
+async def run_write(writer, fn: Callable) -> Any:
+    """
+    Queue a write intent on the database writer and await its commit.
+
+    Args:
+        writer: DatabaseWriter
+        fn: Function that performs the writes with the given cursor (must not commit)
+
+    Returns:
+        fn's result
+    """
+    return await asyncio.wrap_future(writer.submit(fn))
+
+
+async def run_catalog_write(repository, writer, fn: Callable) -> Any:
+    """
+    Run a catalog write intent on the repository and await its commit.
+
+    The SQLite repository shares the writer's database, so its intents go to
+    the writer and are awaited without holding an executor thread; other
+    repositories run fn in their own transaction on the database executor.
+
+    Args:
+        repository: Catalog repository
+        writer: DatabaseWriter of the local SQLite database
+        fn: Function that performs the writes with the given cursor (must not commit)
+
+    Returns:
+        fn's result
+    """
+    if repository.mode == 'sqlite':
+        return await run_write(writer, fn)
+    return await run_db(repository.write, fn)
+
+
+class SingleFlight:
+    """
+    Concurrent calls with the same key share one in-flight execution.
+
+    Every flight has a deadline, set when it starts: callers that joined it
+    get asyncio.TimeoutError once it passes (the work itself keeps running), and the
+    key is released so the next call starts a new flight. Errors raised by
+    the work reach every caller of the flight. Used from one event loop.
+    """
+
+    def __init__(self):
+        self._flights: Dict[str, Tuple[asyncio.Future, float]] = {}
+
+    def __len__(self) -> int:
+        return len(self._flights)
+
+    def join(self, key: str, start: Callable[[], Awaitable], timeout: float) -> Tuple[Awaitable, bool]:
+        """
+        Join the flight for key, starting it if there is none.
+
+        Args:
+            key: Identity of the call (equal keys must mean equal results)
+            start: Starts the work, e.g. lambda: run_db(fn, ...)
+            timeout: Seconds from the start of a new flight to its deadline
+
+        Returns:
+            (awaitable of the flight's result, True if another caller started it)
+        """
+        flight = self._flights.get(key)
+        shared = flight is not None
+        if not shared:
+            loop = asyncio.get_running_loop()
+            future = asyncio.ensure_future(start())
+            flight = (future, loop.time() + timeout)
+            self._flights[key] = flight
+            future.add_done_callback(functools.partial(self._landed, key, flight))
+        return self._wait(key, flight), shared
+
+    async def _wait(self, key: str, flight: Tuple[asyncio.Future, float]) -> Any:
+        future, deadline = flight
+        remaining = deadline - asyncio.get_running_loop().time()
+        try:
+            # shield: a caller giving up (timeout, cancelled request) leaves the flight running
+            return await asyncio.wait_for(asyncio.shield(future), max(remaining, 0))
+        except asyncio.TimeoutError:  # Not the builtin TimeoutError before Python 3.11
+            self._release(key, flight)
+            raise
+
+    def _landed(self, key: str, flight: Tuple[asyncio.Future, float], future: asyncio.Future) -> None:
+        self._release(key, flight)
+        if not future.cancelled():
+            future.exception()  # Retrieved, even if every caller timed out
+
+    def _release(self, key: str, flight: Tuple[asyncio.Future, float]) -> None:
+        if self._flights.get(key) is flight:
+            del self._flights[key]
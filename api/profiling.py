@@ -0,0 +1,336 @@
+"""
+EPAR Data Portal - Request Profiling
+On-demand profiles of single requests as collapsed stacks and SQL statements.
+
+A request to a route decorated with @profiled(...) that carries the header
+`X-Profile: <PROFILE_TOKEN>` is profiled: a sampling thread records where the
+request is every PROFILE_INTERVAL_MS, and the SQLite statements run for it
+(on its own connections, on the database executor and by the database writer
+on its behalf) are captured through set_trace_callback. Samples taken while a
+statement runs end in a "[sql] ..." frame, so database time shows up in the
+flamegraph under the code that waited for it.
+
+Stacks start at the decorated handler. For an async handler a sample is the
+event loop thread's stack while the handler runs; while it is suspended, the
+chain of coroutines it awaits followed by the stack of each executor thread
+working for it (see api/offload.py), or "[await]" for other I/O such as blob
+storage calls.
+
+Two files are written to PROFILE_PATH, and the response carries X-Profile-Id:
+
+    <id>.folded     collapsed stacks ("frame;frame;frame count") for
+                    flamegraph.pl, speedscope or inferno
+    <id>.sql.json   the statements with their start offset and duration
+
+Statement durations end when the rows have been fetched (queries through
+DatabaseHelper.fetch_all, writer intents) or otherwise at the next statement
+on the same thread. Requests without the header cost one header lookup, and
+connections opened outside a profile one context variable lookup.
+"""
+
+import asyncio
+import contextlib
+import contextvars
+import functools
+import hmac
+import inspect
+import json
+import logging
+import sys
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+# Add parent directory to path to import config
+parent_dir = str(Path(__file__).parent.parent)
+if parent_dir not in sys.path:
+    sys.path.insert(0, parent_dir)
+
+from config import config
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = 'X-Profile'
+
+# Longest statement text kept in a flamegraph frame
+SQL_FRAME_CHARS = 120
+
+_current_profile: contextvars.ContextVar = contextvars.ContextVar('request_profile', default=None)
+
+
+def frame_label(frame) -> str:
+    """Flamegraph frame name: function (file:first line)."""
+    code = frame.f_code
+    # co_qualname is new in Python 3.11
+    return f"{getattr(code, 'co_qualname', code.co_name)} ({Path(code.co_filename).name}:{code.co_firstlineno})"
+
+
+def _frames_from(leaf, root) -> Optional[list]:
+    """Frames from root down to leaf, or None if root is not on leaf's stack."""
+    frames = []
+    frame = leaf
+    while frame is not None:
+        frames.append(frame)
+        if frame is root:
+            frames.reverse()
+            return frames
+        frame = frame.f_back
+    return None
+
+
+def _awaited_frames(task: asyncio.Task, root) -> list:
+    """Frames of the suspended coroutines awaited from root, outermost first."""
+    frames = []
+    coroutine = task.get_coro()
+    while coroutine is not None:
+        frame = getattr(coroutine, 'cr_frame', None)
+        if frame is None:
+            break  # Awaiting a future (executor call, I/O)
+        if frames or frame is root:
+            frames.append(frame)
+        coroutine = getattr(coroutine, 'cr_await', None)
+    return frames
+
+
+class RequestProfile:
+    """Stack samples and SQL statements of one request."""
+
+    def __init__(self, route: str, interval_seconds: float):
+        self.id = f"{route}-{time.strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        self.route = route
+        self.interval_seconds = interval_seconds
+        self.thread_id = threading.get_ident()
+        self.started = time.perf_counter()
+        self.ms = 0.0
+        self.samples = 0
+        self.stacks: Dict[str, int] = {}
+        self.statements: List[Dict[str, Any]] = []
+        self._running: Dict[int, Dict[str, Any]] = {}  # Thread -> statement in progress
+        self._helpers: Dict[int, Any] = {}  # Executor thread -> frame the work entered at
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._sampler: Optional[threading.Thread] = None
+        self._anchor = None  # Frame of the decorated handler's wrapper
+        self._task: Optional[asyncio.Task] = None  # Task running an async handler
+
+    # ------------------------------------------------------------------
+    # SQL statements
+    # ------------------------------------------------------------------
+
+    def trace(self, sql: str) -> None:
+        """set_trace_callback target: a statement starts on the calling thread."""
+        now = time.perf_counter()
+        thread = threading.current_thread()
+        with self._lock:
+            self._finish(thread.ident, now)
+            statement = {
+                'sql': ' '.join(sql.split()),
+                'thread': thread.name,
+                'at_ms': round((now - self.started) * 1000, 3),
+                'started': now
+            }
+            self.statements.append(statement)
+            self._running[thread.ident] = statement
+
+    def statement_finished(self) -> None:
+        """The calling thread has fetched the results of its current statement."""
+        with self._lock:
+            self._finish(threading.get_ident(), time.perf_counter())
+
+    def _finish(self, thread_id: int, now: float) -> None:
+        statement = self._running.pop(thread_id, None)
+        if statement is not None:
+            statement['ms'] = round((now - statement.pop('started')) * 1000, 3)
+
+    # ------------------------------------------------------------------
+    # Stack sampling
+    # ------------------------------------------------------------------
+
+    def start(self, anchor, task: Optional[asyncio.Task] = None) -> None:
+        """
+        Start sampling.
+
+        Args:
+            anchor: Frame that stacks start at (the profiled wrapper)
+            task: Task running the handler, for async handlers
+        """
+        self._anchor = anchor
+        self._task = task
+        self._sampler = threading.Thread(target=self._sample, name=f"profiler-{self.id}", daemon=True)
+        self._sampler.start()
+
+    def stop(self) -> None:
+        self._stopping.set()
+        self._sampler.join()
+        now = time.perf_counter()
+        with self._lock:
+            for thread_id in list(self._running):
+                self._finish(thread_id, now)
+        self.ms = round((now - self.started) * 1000, 3)
+
+    @contextlib.contextmanager
+    def attached(self, entry_frame):
+        """Sample the calling thread as working for this request while the block runs."""
+        thread_id = threading.get_ident()
+        with self._lock:
+            self._helpers[thread_id] = entry_frame
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._helpers.pop(thread_id, None)
+
+    def _sample(self) -> None:
+        while not self._stopping.wait(self.interval_seconds):
+            try:
+                stacks = self._current_stacks(sys._current_frames())
+            except Exception:
+                continue  # The request moved on while its frames were read
+            for stack in stacks:
+                key = ';'.join(label.replace(';', ',') for label in stack)
+                self.stacks[key] = self.stacks.get(key, 0) + 1
+            self.samples += 1
+
+    def _current_stacks(self, frames: Dict[int, Any]) -> List[List[str]]:
+        """Stacks of one sample: the handler's own, or one per thread working for it."""
+        with self._lock:
+            helpers = dict(self._helpers)
+            running = dict(self._running)
+
+        def sql_leaf(thread_id: Optional[int]) -> List[str]:
+            # Otherwise the request may be waiting for SQL run on another thread (the writer)
+            statement = running.get(thread_id) or max(running.values(), key=lambda s: s['started'], default=None)
+            return [f"[sql] {statement['sql'][:SQL_FRAME_CHARS]}"] if statement is not None else []
+
+        stack = _frames_from(frames.get(self.thread_id), self._anchor)
+        if stack is not None:
+            return [[frame_label(frame) for frame in stack] + sql_leaf(self.thread_id)]
+        if self._task is None:
+            return []
+
+        # The handler coroutine is suspended: where it awaits, then what runs for it
+        suspended = [frame_label(frame) for frame in _awaited_frames(self._task, self._anchor)]
+        if not helpers:
+            return [suspended + (sql_leaf(None) or ['[await]'])]
+        stacks = []
+        for thread_id, entry_frame in helpers.items():
+            helper = _frames_from(frames.get(thread_id), entry_frame) or []
+            stacks.append(suspended + [frame_label(frame) for frame in helper] + sql_leaf(thread_id))
+        return stacks
+
+    # ------------------------------------------------------------------
+    # Output
+    # ------------------------------------------------------------------
+
+    def collapsed(self) -> str:
+        """Collapsed stack text, one "frames count" line per distinct stack."""
+        return ''.join(f"{stack} {count}\n" for stack, count in sorted(self.stacks.items()))
+
+    def summary(self) -> Dict[str, Any]:
+        """Log record: totals and the slowest statements."""
+        timed = [s for s in self.statements if 'ms' in s]
+        slowest = sorted(timed, key=lambda s: s['ms'], reverse=True)[:5]
+        return {
+            'id': self.id,
+            'route': self.route,
+            'ms': self.ms,
+            'samples': self.samples,
+            'statements': len(self.statements),
+            'sqlMs': round(sum(s['ms'] for s in timed), 3),
+            'slowest': [{'ms': s['ms'], 'sql': s['sql'][:200]} for s in slowest]
+        }
+
+    def save(self, directory: str) -> Path:
+        """Write <id>.folded and <id>.sql.json; returns the .folded path."""
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        folded = directory / f"{self.id}.folded"
+        folded.write_text(self.collapsed(), encoding='utf-8')
+        (directory / f"{self.id}.sql.json").write_text(json.dumps({
+            'id': self.id,
+            'route': self.route,
+            'ms': self.ms,
+            'intervalMs': self.interval_seconds * 1000,
+            'samples': self.samples,
+            'statements': self.statements
+        }, indent=2), encoding='utf-8')
+        return folded
+
+
+def current_profile() -> Optional[RequestProfile]:
+    """The profile of the request being handled in this context, if any."""
+    return _current_profile.get()
+
+
+def statement_finished() -> None:
+    """Mark the current statement of this thread as done (no-op outside profiles)."""
+    profile = _current_profile.get()
+    if profile is not None:
+        profile.statement_finished()
+
+
+def _requested(req, route: str) -> Optional[RequestProfile]:
+    """A new profile if the request asks for one with the right token."""
+    token = config.profile_token
+    header = req.headers.get(PROFILE_HEADER) if token else None
+    if not header:
+        return None
+    if not hmac.compare_digest(header.encode('utf-8'), token.encode('utf-8')):
+        logger.warning(f"Ignoring {PROFILE_HEADER} header with a wrong token")
+        return None
+    return RequestProfile(route, config.profile_interval_ms / 1000)
+
+
+def _finish(profile: RequestProfile, context_token, response) -> None:
+    profile.stop()
+    _current_profile.reset(context_token)
+    try:
+        path = profile.save(config.profile_path)
+        logger.info(f"Request profile {json.dumps(profile.summary())} saved to {path}")
+        if response is not None:
+            response.headers['X-Profile-Id'] = profile.id
+    except OSError as e:
+        logger.warning(f"Could not save request profile {profile.id}: {e}")
+
+
+def profiled(route: str) -> Callable:
+    """
+    Decorator for HTTP functions (sync or async): profile requests sent with a
+    valid X-Profile header.
+
+    Place it below @timed so the profile covers the handler only.
+    """
+    def decorate(fn):
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(req, *args, **kwargs):
+                profile = _requested(req, route)
+                if profile is None:
+                    return await fn(req, *args, **kwargs)
+                context_token = _current_profile.set(profile)
+                profile.start(sys._getframe(), asyncio.current_task())
+                response = None
+                try:
+                    response = await fn(req, *args, **kwargs)
+                    return response
+                finally:
+                    _finish(profile, context_token, response)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(req, *args, **kwargs):
+            profile = _requested(req, route)
+            if profile is None:
+                return fn(req, *args, **kwargs)
+            context_token = _current_profile.set(profile)
+            profile.start(sys._getframe())
+            response = None
+            try:
+                response = fn(req, *args, **kwargs)
+                return response
+            finally:
+                _finish(profile, context_token, response)
+        return wrapper
+    return decorate
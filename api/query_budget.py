@@ -0,0 +1,134 @@
+"""
+EPAR Data Portal - Query Time Budgets
+Per-route deadlines for the SQLite queries of a request.
+
+A route decorated with @budgeted(route) gets QUERY_BUDGETS_MS[route] from the
+start of the request for its database work. Connections opened while the
+request's budget is active (DatabaseHelper.get_connection, the FTS shard
+readers) get a progress handler that interrupts the running statement once
+the deadline has passed, so a pathological FTS expression or an unindexed
+filter combination stops at the budget instead of holding an executor thread
+for seconds.
+
+The interrupted statement raises sqlite3.OperationalError('interrupted');
+run_db (api/offload.py) turns it into QueryTimeoutError, which the routes
+answer with 503 and Retry-After. Overruns are counted by route and query
+shape (epar_query_budget_overruns_total); the search cache labels searches
+with search_shape().
+"""
+
+import contextvars
+import functools
+import inspect
+import logging
+import sys
+import time
+from pathlib import Path
+from typing import Callable, Optional
+
+# Add parent directory to path to import config
+parent_dir = str(Path(__file__).parent.parent)
+if parent_dir not in sys.path:
+    sys.path.insert(0, parent_dir)
+
+from config import config
+
+try:
+    from api.metrics import QUERY_BUDGET_OVERRUNS
+    from api.repository import QueryTimeoutError
+except ImportError:
+    from metrics import QUERY_BUDGET_OVERRUNS
+    from repository import QueryTimeoutError
+
+logger = logging.getLogger(__name__)
+
+# SQLite virtual machine instructions between deadline checks
+PROGRESS_INSTRUCTIONS = 10000
+
+_current_budget: contextvars.ContextVar = contextvars.ContextVar('query_budget', default=None)
+
+
+class QueryBudget:
+    """Deadline for the database queries of one request."""
+
+    def __init__(self, route: str, budget_ms: float):
+        self.route = route
+        self.budget_ms = budget_ms
+        self.deadline = time.monotonic() + budget_ms / 1000
+        self.shape = route  # Refined by the code that knows the query, e.g. search_shape()
+
+    def expired(self) -> bool:
+        return time.monotonic() >= self.deadline
+
+    def progress(self) -> int:
+        """set_progress_handler callback: non-zero interrupts the statement."""
+        return 1 if time.monotonic() >= self.deadline else 0
+
+
+def current_budget() -> Optional[QueryBudget]:
+    """The query budget of the request being handled in this context, if any."""
+    return _current_budget.get()
+
+
+def label_shape(shape: str) -> None:
+    """Name the shape of the current request's queries for the overrun metric."""
+    budget = _current_budget.get()
+    if budget is not None:
+        budget.shape = shape
+
+
+def install(conn, budget: Optional[QueryBudget]) -> None:
+    """
+    Interrupt statements on conn when the budget runs out.
+
+    Args:
+        conn: sqlite3.Connection
+        budget: Budget to enforce (None clears the handler of a reused connection)
+    """
+    conn.set_progress_handler(budget.progress if budget is not None else None, PROGRESS_INSTRUCTIONS)
+
+
+def overrun(error: BaseException) -> Optional[QueryTimeoutError]:
+    """
+    QueryTimeoutError for a statement the current budget interrupted, or None.
+
+    Counts the overrun by route and shape.
+    """
+    budget = _current_budget.get()
+    if budget is None or 'interrupted' not in str(error) or not budget.expired():
+        return None
+    QUERY_BUDGET_OVERRUNS.inc(budget.route, budget.shape)
+    logger.warning(f"Interrupted {budget.route} query ({budget.shape}) at its {budget.budget_ms:.0f} ms budget")
+    return QueryTimeoutError(f"Query exceeded the {budget.budget_ms:.0f} ms time budget")
+
+
+def budgeted(route: str) -> Callable:
+    """
+    Decorator for HTTP functions (sync or async): enforce QUERY_BUDGETS_MS[route]
+    on the request's database queries. Routes without a budget are unchanged.
+    """
+    budget_ms = config.query_budgets_ms.get(route, 0)
+
+    def decorate(fn):
+        if not budget_ms:
+            return fn
+
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                token = _current_budget.set(QueryBudget(route, budget_ms))
+                try:
+                    return await fn(*args, **kwargs)
+                finally:
+                    _current_budget.reset(token)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            token = _current_budget.set(QueryBudget(route, budget_ms))
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                _current_budget.reset(token)
+        return wrapper
+    return decorate
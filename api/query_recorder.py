@@ -0,0 +1,277 @@
+"""
+EPAR Data Portal - Query Workload Recorder
+Samples the SQL shapes the SQLite catalog runs, with latency and query plans.
+
+search_files builds a different statement for every combination of filters.
+The recorder normalizes each statement into a shape (placeholder lists and
+repeated LIKE conditions collapsed, literals replaced by ?), keeps call
+counts and timings per shape, and captures EXPLAIN QUERY PLAN the first time
+a shape runs slower than QUERY_RECORDER_SLOW_MS. Stats are flushed every few
+seconds to a separate workload database (QUERY_RECORDER_PATH) so several
+instances can record into one file and tools/query_advisor.py can report on
+it. Only the SQL text is stored, never the parameters.
+
+Enable with QUERY_RECORDER=true (opt-in; off by default).
+"""
+
+import atexit
+import hashlib
+import json
+import logging
+import random
+import re
+import sqlite3
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Sequence
+
+# Add parent directory to path to import config
+parent_dir = str(Path(__file__).parent.parent)
+if parent_dir not in sys.path:
+    sys.path.insert(0, parent_dir)
+
+from config import config
+
+logger = logging.getLogger(__name__)
+
+WORKLOAD_SCHEMA_SQL = [
+    """
+    CREATE TABLE IF NOT EXISTS query_shapes (
+        fingerprint TEXT PRIMARY KEY,
+        shape TEXT NOT NULL,
+        sample_sql TEXT NOT NULL,
+        param_count INTEGER NOT NULL,
+        calls INTEGER NOT NULL DEFAULT 0,
+        total_ms REAL NOT NULL DEFAULT 0,
+        max_ms REAL NOT NULL DEFAULT 0,
+        slow_calls INTEGER NOT NULL DEFAULT 0,
+        first_seen TEXT NOT NULL,
+        last_seen TEXT NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS query_plans (
+        fingerprint TEXT PRIMARY KEY,
+        plan TEXT NOT NULL,
+        elapsed_ms REAL NOT NULL,
+        captured_at TEXT NOT NULL
+    )
+    """
+]
+
+# Add this flush's counts to the stored totals
+FLUSH_SHAPE_SQL = """
+    INSERT INTO query_shapes (
+        fingerprint, shape, sample_sql, param_count, calls, total_ms,
+        max_ms, slow_calls, first_seen, last_seen
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(fingerprint) DO UPDATE SET
+        calls = calls + excluded.calls,
+        total_ms = total_ms + excluded.total_ms,
+        max_ms = max(max_ms, excluded.max_ms),
+        slow_calls = slow_calls + excluded.slow_calls,
+        last_seen = excluded.last_seen
+"""
+
+_WHITESPACE = re.compile(r'\s+')
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+_PLACEHOLDER_LIST = re.compile(r'\bIN \(\s*\?(?:\s*,\s*\?)*\s*\)', re.IGNORECASE)
+_REPEATED_CONDITION = re.compile(r'(\b[\w.]+ LIKE \?)(?: OR \1)*')
+
+
+def normalize_sql(sql: str) -> str:
+    """
+    Reduce a statement to its shape.
+
+    Args:
+        sql: SQL text as executed
+
+    Returns:
+        Single-line SQL where IN (?, ...) becomes IN (?+), x LIKE ? OR x LIKE ? ...
+        becomes x LIKE ?+ and literals become ?, so the number of selected
+        filter values does not make a new shape
+    """
+    shape = _WHITESPACE.sub(' ', sql).strip()
+    shape = _STRING.sub('?', shape)
+    shape = _NUMBER.sub('?', shape)
+    shape = _PLACEHOLDER_LIST.sub('IN (?+)', shape)
+    return _REPEATED_CONDITION.sub(r'\1+', shape)
+
+
+def shape_fingerprint(shape: str) -> str:
+    """Short stable ID of a normalized shape."""
+    return hashlib.sha1(shape.encode('utf-8')).hexdigest()[:12]
+
+
+def explain_query_plan(conn: sqlite3.Connection, sql: str, params: Sequence[Any]) -> List[List[Any]]:
+    """EXPLAIN QUERY PLAN rows as [id, parent, detail]."""
+    return [[row[0], row[1], row[3]] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", list(params))]
+
+
+def format_plan(plan: List[List[Any]]) -> List[str]:
+    """Plan rows indented under their parent step."""
+    depth = {0: -1}
+    lines = []
+    for step_id, parent, detail in plan:
+        depth[step_id] = depth.get(parent, -1) + 1
+        lines.append(f"{'  ' * depth[step_id]}{detail}")
+    return lines
+
+
+def plan_warnings(plan: List[List[Any]], tables: Sequence[str]) -> List[str]:
+    """
+    Plan steps worth an index: full scans of catalog tables and temporary sorts.
+
+    Args:
+        plan: Rows from explain_query_plan
+        tables: Names and aliases of real tables in the statement (virtual
+            tables and subqueries are expected to be scanned)
+
+    Returns:
+        Plan details of the flagged steps
+    """
+    flagged = []
+    for _, _, detail in plan:
+        words = detail.split()
+        if words[:1] == ['SCAN'] and len(words) > 1 and words[1] in tables and 'VIRTUAL' not in words:
+            flagged.append(detail)
+        elif detail.startswith('USE TEMP B-TREE'):
+            flagged.append(detail)
+    return flagged
+
+
+_TABLE_REFERENCE = re.compile(r'\b(?:FROM|JOIN)\s+(\w+)(?:\s+(?:AS\s+)?(\w+))?', re.IGNORECASE)
+_NOT_ALIAS = {'WHERE', 'INNER', 'LEFT', 'JOIN', 'ON', 'ORDER', 'GROUP', 'LIMIT', 'USING', 'AS'}
+
+
+def table_aliases(conn: sqlite3.Connection, sql: str) -> Dict[str, str]:
+    """Real (non-virtual) tables referenced by the statement: {alias or name: table}."""
+    real_tables = {
+        row[0] for row in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND sql NOT LIKE 'CREATE VIRTUAL%'"
+        )
+    }
+    aliases = {}
+    for table, alias in _TABLE_REFERENCE.findall(sql):
+        if table not in real_tables:
+            continue
+        aliases[table] = table
+        if alias and alias.upper() not in _NOT_ALIAS:
+            aliases[alias] = table
+    return aliases
+
+
+class QueryRecorder:
+    """Samples query shapes and latencies and flushes them to the workload database."""
+
+    def __init__(self, path: str = None, sample_rate: float = None, slow_ms: float = None,
+                 flush_seconds: float = 5.0):
+        """
+        Initialize the recorder.
+
+        Args:
+            path: Workload database (default QUERY_RECORDER_PATH)
+            sample_rate: Fraction of queries recorded (default QUERY_RECORDER_SAMPLE_RATE)
+            slow_ms: Queries at least this slow get their plan captured
+            flush_seconds: Minimum interval between flushes to the workload database
+        """
+        self.path = path or config.query_recorder_path
+        self.sample_rate = config.query_recorder_sample_rate if sample_rate is None else sample_rate
+        self.slow_ms = config.query_recorder_slow_ms if slow_ms is None else slow_ms
+        self.flush_seconds = flush_seconds
+        self._pending: Dict[str, Dict[str, Any]] = {}
+        self._plans: Dict[str, Dict[str, Any]] = {}
+        self._planned = set()
+        self._lock = threading.Lock()
+        self._last_flush = time.monotonic()
+        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        conn = self._connect()
+        try:
+            for statement in WORKLOAD_SCHEMA_SQL:
+                conn.execute(statement)
+        finally:
+            conn.close()
+        atexit.register(self.flush)
+        logger.info(f"Query recorder writing to {self.path} (sample rate {self.sample_rate}, slow {self.slow_ms} ms)")
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=config.db_busy_timeout_ms / 1000)
+
+    def record(self, conn: sqlite3.Connection, sql: str, params: Sequence[Any], elapsed_ms: float) -> None:
+        """
+        Record one executed statement.
+
+        Args:
+            conn: Connection the statement ran on (used to capture its plan)
+            sql: SQL text as executed
+            params: Bound parameters (only used for EXPLAIN, never stored)
+            elapsed_ms: Execution time including fetching the rows
+        """
+        if self.sample_rate < 1 and random.random() >= self.sample_rate:
+            return
+
+        shape = normalize_sql(sql)
+        fingerprint = shape_fingerprint(shape)
+        slow = elapsed_ms >= self.slow_ms
+        now = datetime.now(timezone.utc).isoformat()
+
+        plan = None
+        if slow and fingerprint not in self._planned:
+            self._planned.add(fingerprint)
+            try:
+                plan = explain_query_plan(conn, sql, params)
+                warnings = plan_warnings(plan, list(table_aliases(conn, sql)))
+                if warnings:
+                    logger.warning(f"Slow query shape {fingerprint} ({elapsed_ms:.0f} ms): {'; '.join(warnings)}")
+            except sqlite3.Error as e:
+                logger.warning(f"Could not capture plan for query shape {fingerprint}: {e}")
+
+        with self._lock:
+            stats = self._pending.get(fingerprint)
+            if stats is None:
+                stats = self._pending[fingerprint] = {
+                    'shape': shape, 'sql': sql, 'param_count': len(params), 'calls': 0,
+                    'total_ms': 0.0, 'max_ms': 0.0, 'slow_calls': 0, 'first_seen': now
+                }
+            stats['calls'] += 1
+            stats['total_ms'] += elapsed_ms
+            stats['max_ms'] = max(stats['max_ms'], elapsed_ms)
+            stats['slow_calls'] += slow
+            stats['last_seen'] = now
+            if plan is not None:
+                self._plans[fingerprint] = {'plan': plan, 'elapsed_ms': elapsed_ms, 'captured_at': now}
+            due = time.monotonic() - self._last_flush >= self.flush_seconds
+
+        if due:
+            self.flush()
+
+    def flush(self) -> None:
+        """Add the pending stats and plans to the workload database."""
+        with self._lock:
+            pending, plans = self._pending, self._plans
+            self._pending, self._plans = {}, {}
+            self._last_flush = time.monotonic()
+        if not pending and not plans:
+            return
+
+        conn = self._connect()
+        try:
+            with conn:
+                conn.executemany(FLUSH_SHAPE_SQL, [
+                    (fingerprint, s['shape'], s['sql'], s['param_count'], s['calls'], s['total_ms'],
+                     s['max_ms'], s['slow_calls'], s['first_seen'], s['last_seen'])
+                    for fingerprint, s in pending.items()
+                ])
+                conn.executemany(
+                    "INSERT OR REPLACE INTO query_plans (fingerprint, plan, elapsed_ms, captured_at) VALUES (?, ?, ?, ?)",
+                    [(fingerprint, json.dumps(p['plan']), p['elapsed_ms'], p['captured_at']) for fingerprint, p in plans.items()]
+                )
+        except sqlite3.Error as e:
+            # Recording must never fail a request; these samples are dropped
+            logger.warning(f"Could not flush query workload to {self.path}: {e}")
+        finally:
+            conn.close()
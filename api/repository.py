@@ -0,0 +1,623 @@
+"""
+EPAR Data Portal - Catalog Repositories
+Storage-agnostic access to the project/file catalog used by search, download
+and upload. SQLite (db_helper.DatabaseHelper) is the default; PostgreSQL lets
+several Function instances share one catalog.
+
+Instance-local bookkeeping (ingestion jobs, upload sessions) always stays in the
+SQLite database at DB_PATH, next to the staged files it refers to.
+"""
+
+import logging
+import sys
+from contextlib import ExitStack
+from datetime import timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# Add parent directory to path to import config
+parent_dir = str(Path(__file__).parent.parent)
+if parent_dir not in sys.path:
+    sys.path.insert(0, parent_dir)
+
+from config import config
+
+try:
+    from api.timing import phase
+except ImportError:
+    from timing import phase
+
+logger = logging.getLogger(__name__)
+
+SCHEMA_PATH = Path(__file__).parent.parent / 'db' / 'postgres_schema.sql'
+
+
+class CursorExpiredError(Exception):
+    """A change feed cursor points before the retained change history."""
+
+
+class QueryTimeoutError(Exception):
+    """A query did not finish in time (search or time budget); the caller may retry later."""
+
+
+def file_size_label(file_size: Optional[int]) -> str:
+    """Human-readable file size as shown in search results."""
+    return f"{file_size / 1024 / 1024:.1f} MB" if file_size else "Unknown"
+
+
+class Repository:
+    """Base class for catalog repositories."""
+
+    mode = 'sqlite'
+
+    def search_files(
+        self,
+        query: str = None,
+        research_areas: List[str] = None,
+        geographies: List[str] = None,
+        output_types: List[str] = None,
+        po_contacts: List[str] = None,
+        agdev_partners: List[str] = None,
+        date_from: str = None,
+        date_to: str = None,
+        limit: int = 100,
+        offset: int = 0,
+        sort: str = 'date',
+        file_types: List[str] = None,
+        include_files: bool = True
+    ) -> List[Dict[str, Any]]:
+        """
+        Search projects by full text and facets; returns projects with their files.
+
+        sort is 'date' (newest first) or 'relevance' (best match first).
+        file_types keeps projects with a file of one of those types. Projects
+        carry file aggregates (fileCount, totalBytes, fileTypes, lastUploadDate);
+        include_files=False leaves out the file lists.
+        """
+        raise NotImplementedError
+
+    def get_file_by_id(self, file_id: int) -> Optional[Dict[str, Any]]:
+        """Get file metadata (including projectCode and contentHash) by ID."""
+        raise NotImplementedError
+
+    def write(self, fn: Callable[[Any], Any]) -> Any:
+        """
+        Run fn(cursor) in a write transaction and return its result.
+
+        fn should only call this repository's cursor-level methods
+        (upsert_project, upsert_file) so it works with every backend.
+        """
+        raise NotImplementedError
+
+    def upsert_project(self, cursor, project: Dict[str, Any]) -> Tuple[int, str]:
+        """Insert or update a project; returns (id, 'created' | 'updated' | 'unchanged')."""
+        raise NotImplementedError
+
+    def upsert_file(self, cursor, project_id: int, file: Dict[str, Any]) -> Tuple[int, str]:
+        """Insert or update a file row; returns (id, 'created' | 'updated' | 'unchanged')."""
+        raise NotImplementedError
+
+    def get_text_for_content(self, content_hash: str, file_type: str, exclude_file_id: int) -> Optional[str]:
+        """Text already extracted for identical content in another file, if any."""
+        raise NotImplementedError
+
+    def set_file_content(self, file_id: int, content_hash: str, text_content: Optional[str]) -> None:
+        """Record a file's content hash and extracted text (refreshes the search index)."""
+        raise NotImplementedError
+
+    def get_changes(self, since: Optional[int], limit: int = 500) -> Dict[str, Any]:
+        """
+        Catalog changes after a cursor, for incremental sync.
+
+        Several changes to one project or file are collapsed into one entry
+        carrying its current state: op 'insert' if it was created after the
+        cursor, 'update' otherwise, or 'delete' (a tombstone, no data) if it
+        no longer exists.
+
+        Args:
+            since: Cursor from a previous call; None returns only the current
+                cursor (load the catalog first, then sync from there)
+            limit: Maximum change log entries to read
+
+        Returns:
+            Dict with changes, cursor and hasMore
+
+        Raises:
+            CursorExpiredError: Changes after the cursor were already pruned
+        """
+        raise NotImplementedError
+
+    def prune_changes(self, retention_days: int) -> int:
+        """Delete change log entries older than the retention period (the newest is kept)."""
+        raise NotImplementedError
+
+    def catalog_generation(self) -> int:
+        """Current catalog generation: the latest change log seq (0 if none)."""
+        raise NotImplementedError
+
+    def search_generation(self) -> Tuple[int, int]:
+        """
+        Version of search results: (catalog generation, search index version).
+
+        File text is not in the change log, so text changes advance only the
+        second part.
+        """
+        raise NotImplementedError
+
+    def warm_up(self) -> Dict[str, Any]:
+        """
+        Open connections and read the tables and indexes searches use, so the
+        first requests of a new instance do not start cold.
+
+        Returns:
+            Backend-specific counts of what was warmed
+        """
+        raise NotImplementedError
+
+    def list_catalog(self) -> Tuple[int, List[Dict[str, Any]]]:
+        """
+        All projects with their files, read in one snapshot.
+
+        Returns:
+            (generation, projects) with files as [{id, name, type, size (bytes), blobPath}]
+        """
+        raise NotImplementedError
+
+
+def collapse_changes(rows: List[Dict[str, Any]]) -> Tuple[Dict[Tuple[str, int], Dict[str, Any]], set]:
+    """
+    Keep the last change per entity; also return the entities inserted in the page.
+
+    Returns:
+        ({(entity, id): change row}, {(entity, id) inserted})
+    """
+    latest = {}
+    inserted = set()
+    for row in rows:
+        key = (row['entity'], row['entity_id'])
+        latest[key] = row
+        if row['op'] == 'insert':
+            inserted.add(key)
+    return latest, inserted
+
+
+def change_entries(
+    latest: Dict[Tuple[str, int], Dict[str, Any]],
+    inserted: set,
+    projects: Dict[int, Dict[str, Any]],
+    files: Dict[int, Dict[str, Any]]
+) -> List[Dict[str, Any]]:
+    """Build change feed entries from collapsed changes and the current rows."""
+    changes = []
+    for key, row in sorted(latest.items(), key=lambda item: item[1]['seq']):
+        entity, entity_id = key
+        data = (projects if entity == 'project' else files).get(entity_id)
+        if data is None:
+            op = 'delete'
+        else:
+            op = 'insert' if key in inserted else 'update'
+        change = {'seq': row['seq'], 'entity': entity, 'id': entity_id, 'op': op}
+        if data is not None:
+            change['data'] = data
+        changes.append(change)
+    return changes
+
+
+# ============================================================================
+# POSTGRESQL BACKEND
+# ============================================================================
+
+class PostgresRepository(Repository):
+    """
+    PostgreSQL catalog with a pooled connection per request.
+
+    Full-text search uses a tsvector column with a GIN index ('simple'
+    configuration, like SQLite's unicode61 tokenizer: no stemming). Facets are
+    text[] columns with GIN indexes, filtered with && (overlap).
+    """
+
+    mode = 'postgres'
+
+    def __init__(self, database_url: str, pool_size: int = None):
+        """Open the connection pool (imports psycopg)."""
+        from psycopg.rows import dict_row
+        from psycopg_pool import ConnectionPool
+
+        self.pool = ConnectionPool(
+            database_url,
+            min_size=1,
+            max_size=pool_size or config.db_pool_size,
+            kwargs={'row_factory': dict_row},
+            open=True
+        )
+
+    def create_schema(self) -> None:
+        """Create tables, indexes and triggers (safe to re-run)."""
+        with self.pool.connection() as conn:
+            conn.execute(SCHEMA_PATH.read_text())
+
+    def close(self) -> None:
+        self.pool.close()
+
+    def write(self, fn: Callable[[Any], Any]) -> Any:
+        # The pooled connection commits on success and rolls back on error
+        with self.pool.connection() as conn:
+            with conn.cursor() as cursor:
+                return fn(cursor)
+
+    def search_files(
+        self,
+        query: str = None,
+        research_areas: List[str] = None,
+        geographies: List[str] = None,
+        output_types: List[str] = None,
+        po_contacts: List[str] = None,
+        agdev_partners: List[str] = None,
+        date_from: str = None,
+        date_to: str = None,
+        limit: int = 100,
+        offset: int = 0,
+        sort: str = 'date',
+        file_types: List[str] = None,
+        include_files: bool = True
+    ) -> List[Dict[str, Any]]:
+        sql = """
+            SELECT
+                p.id AS project_id, p.project_code, p.title, p.research_areas,
+                p.date_initial_request, p.date_completion, p.po_contact, p.other_pos,
+                p.agdev_partner, p.output_type, p.geographies,
+                p.file_count, p.total_bytes, p.file_types, p.last_upload_date
+            FROM projects p
+        """
+        params = []
+
+        if query:
+            # Projects with at least one matching file and their best rank
+            sql += """
+                INNER JOIN (
+                    SELECT f.project_id, max(ts_rank(f.search_vector, q)) AS score
+                    FROM files f, websearch_to_tsquery('simple', %s) q
+                    WHERE f.search_vector @@ q
+                    GROUP BY f.project_id
+                ) m ON m.project_id = p.id
+            """
+            params.append(query)
+
+        sql += " WHERE TRUE"
+
+        if research_areas:
+            sql += " AND p.research_areas && %s::text[]"
+            params.append(research_areas)
+
+        if geographies:
+            sql += " AND p.geographies && %s::text[]"
+            params.append(geographies)
+
+        if output_types:
+            sql += " AND p.output_type = ANY(%s)"
+            params.append(output_types)
+
+        if po_contacts:
+            sql += " AND p.po_contact = ANY(%s)"
+            params.append(po_contacts)
+
+        if agdev_partners:
+            sql += " AND p.agdev_partner ILIKE ANY(%s)"
+            params.append([f'%{partner}%' for partner in agdev_partners])
+
+        if date_from:
+            sql += " AND p.date_completion >= %s"
+            params.append(date_from)
+
+        if date_to:
+            sql += " AND p.date_completion <= %s"
+            params.append(date_to)
+
+        if file_types:
+            sql += " AND p.file_types && %s::text[]"
+            params.append(file_types)
+
+        # NULLS LAST matches SQLite's ordering of missing dates
+        if query and sort == 'relevance':
+            sql += " ORDER BY m.score DESC, p.date_completion DESC NULLS LAST LIMIT %s OFFSET %s"
+        else:
+            sql += " ORDER BY p.date_completion DESC NULLS LAST LIMIT %s OFFSET %s"
+        params.extend([limit, offset])
+
+        with self.pool.connection() as conn:
+            with phase('sql'):
+                rows = conn.execute(sql, params).fetchall()
+
+            projects_dict = {}
+            with phase('assemble'):
+                for row in rows:
+                    projects_dict[row['project_id']] = self._project_dict(row)
+                    if include_files:
+                        projects_dict[row['project_id']]['files'] = []
+
+            if projects_dict and include_files:
+                # COLLATE "C" sorts names byte-wise, like SQLite
+                with phase('sql'):
+                    file_rows = conn.execute("""
+                        SELECT id, project_id, file_name, file_type, file_size, blob_path
+                        FROM files
+                        WHERE project_id = ANY(%s)
+                        ORDER BY file_name COLLATE "C"
+                    """, (list(projects_dict),)).fetchall()
+
+                with phase('assemble'):
+                    for row in file_rows:
+                        projects_dict[row['project_id']]['files'].append({
+                            'id': row['id'],
+                            'name': row['file_name'],
+                            'type': row['file_type'],
+                            'size': file_size_label(row['file_size']),
+                            'blobPath': row['blob_path']
+                        })
+
+        results = list(projects_dict.values())
+        logger.info(f"Search returned {len(results)} projects")
+        return results
+
+    @staticmethod
+    def _project_dict(row: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            'id': row['project_id'],
+            'projectCode': row['project_code'],
+            'title': row['title'],
+            'researchAreas': row['research_areas'] or [],
+            'dateInitialRequest': row['date_initial_request'],
+            'dateCompletion': row['date_completion'],
+            'poContact': row['po_contact'],
+            'otherPos': row['other_pos'] or [],
+            'agdevPartner': row['agdev_partner'],
+            'outputType': row['output_type'],
+            'geographies': row['geographies'] or [],
+            'fileCount': row['file_count'],
+            'totalBytes': row['total_bytes'],
+            'fileTypes': row['file_types'] or [],
+            # Same format as SQLite's CURRENT_TIMESTAMP (UTC)
+            'lastUploadDate': (row['last_upload_date'].astimezone(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+                               if row['last_upload_date'] else None)
+        }
+
+    def get_file_by_id(self, file_id: int) -> Optional[Dict[str, Any]]:
+        with self.pool.connection() as conn:
+            row = conn.execute("""
+                SELECT f.id, f.file_name, f.file_type, f.file_size, f.blob_path,
+                       f.content_hash, p.project_code
+                FROM files f
+                INNER JOIN projects p ON f.project_id = p.id
+                WHERE f.id = %s
+            """, (file_id,)).fetchone()
+
+        if not row:
+            return None
+
+        return {
+            'id': row['id'],
+            'name': row['file_name'],
+            'type': row['file_type'],
+            'size': file_size_label(row['file_size']),
+            'blobPath': row['blob_path'],
+            'contentHash': row['content_hash'],
+            'projectCode': row['project_code']
+        }
+
+    def upsert_project(self, cursor, project: Dict[str, Any]) -> Tuple[int, str]:
+        cursor.execute("""
+            INSERT INTO projects (
+                project_code, title, research_areas, date_initial_request,
+                date_completion, po_contact, other_pos, agdev_partner,
+                output_type, geographies
+            ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+            ON CONFLICT (project_code) DO UPDATE SET
+                title = excluded.title,
+                research_areas = excluded.research_areas,
+                date_initial_request = excluded.date_initial_request,
+                date_completion = excluded.date_completion,
+                po_contact = excluded.po_contact,
+                other_pos = excluded.other_pos,
+                agdev_partner = excluded.agdev_partner,
+                output_type = excluded.output_type,
+                geographies = excluded.geographies,
+                updated_at = now()
+            WHERE (projects.title, projects.research_areas, projects.date_initial_request,
+                   projects.date_completion, projects.po_contact, projects.other_pos,
+                   projects.agdev_partner, projects.output_type, projects.geographies)
+                IS DISTINCT FROM
+                  (excluded.title, excluded.research_areas, excluded.date_initial_request,
+                   excluded.date_completion, excluded.po_contact, excluded.other_pos,
+                   excluded.agdev_partner, excluded.output_type, excluded.geographies)
+            RETURNING id, (xmax = 0) AS inserted
+        """, (
+            project['projectCode'],
+            project['title'],
+            list(project.get('researchAreas', [])),
+            project.get('dateInitialRequest', ''),
+            project['dateCompletion'],
+            project['poContact'],
+            list(project.get('otherPos', [])),
+            project.get('agdevPartner', ''),
+            project['outputType'],
+            list(project.get('geographies', []))
+        ))
+        row = cursor.fetchone()
+        if row:
+            return row['id'], 'created' if row['inserted'] else 'updated'
+
+        # No row returned: the project exists and nothing changed
+        cursor.execute("SELECT id FROM projects WHERE project_code = %s", (project['projectCode'],))
+        return cursor.fetchone()['id'], 'unchanged'
+
+    def upsert_file(self, cursor, project_id: int, file: Dict[str, Any]) -> Tuple[int, str]:
+        cursor.execute("""
+            SELECT id, project_id, file_type, file_size, content_hash
+            FROM files WHERE blob_path = %s
+            FOR UPDATE
+        """, (file['blobPath'],))
+        row = cursor.fetchone()
+
+        if row is None:
+            cursor.execute("""
+                INSERT INTO files (
+                    project_id, file_name, file_type, file_size, blob_path, content_hash
+                ) VALUES (%s, %s, %s, %s, %s, %s)
+                RETURNING id
+            """, (
+                project_id,
+                file['fileName'],
+                file['fileType'],
+                file['fileSize'],
+                file['blobPath'],
+                file.get('contentHash')
+            ))
+            return cursor.fetchone()['id'], 'created'
+
+        if (file.get('contentHash') and row['content_hash'] == file['contentHash']
+                and row['file_size'] == file['fileSize'] and row['file_type'] == file['fileType']
+                and row['project_id'] == project_id):
+            return row['id'], 'unchanged'
+
+        cursor.execute("""
+            UPDATE files
+            SET project_id = %s, file_type = %s, file_size = %s, content_hash = %s,
+                upload_date = now()
+            WHERE id = %s
+        """, (project_id, file['fileType'], file['fileSize'], file.get('contentHash'), row['id']))
+        return row['id'], 'updated'
+
+    def get_text_for_content(self, content_hash: str, file_type: str, exclude_file_id: int) -> Optional[str]:
+        with self.pool.connection() as conn:
+            row = conn.execute("""
+                SELECT text_content FROM files
+                WHERE content_hash = %s AND file_type = %s AND id <> %s AND text_content IS NOT NULL
+                LIMIT 1
+            """, (content_hash, file_type, exclude_file_id)).fetchone()
+        return row['text_content'] if row else None
+
+    def set_file_content(self, file_id: int, content_hash: str, text_content: Optional[str]) -> None:
+        self.write(lambda cursor: cursor.execute(
+            "UPDATE files SET content_hash = %s, text_content = %s WHERE id = %s",
+            (content_hash, text_content, file_id)
+        ))
+
+    def get_changes(self, since: Optional[int], limit: int = 500) -> Dict[str, Any]:
+        with self.pool.connection() as conn:
+            # One snapshot for the log and the current rows
+            conn.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ READ ONLY")
+            head = conn.execute("""
+                SELECT COALESCE(MIN(seq) - 1, 0) AS horizon, COALESCE(MAX(seq), 0) AS current
+                FROM catalog_changes
+            """).fetchone()
+            if since is None:
+                return {'changes': [], 'cursor': head['current'], 'hasMore': False}
+            if since < head['horizon']:
+                raise CursorExpiredError(f"Changes before {head['horizon']} are no longer available")
+
+            rows = conn.execute("""
+                SELECT seq, entity, entity_id, op FROM catalog_changes
+                WHERE seq > %s ORDER BY seq LIMIT %s
+            """, (since, limit)).fetchall()
+            latest, inserted = collapse_changes(rows)
+
+            project_ids = [entity_id for entity, entity_id in latest if entity == 'project']
+            projects = {row['project_id']: self._project_dict(row) for row in conn.execute("""
+                SELECT id AS project_id, * FROM projects WHERE id = ANY(%s)
+            """, (project_ids,))}
+
+            file_ids = [entity_id for entity, entity_id in latest if entity == 'file']
+            files = {row['id']: {
+                'id': row['id'],
+                'projectId': row['project_id'],
+                'name': row['file_name'],
+                'type': row['file_type'],
+                'size': file_size_label(row['file_size']),
+                'blobPath': row['blob_path']
+            } for row in conn.execute("""
+                SELECT id, project_id, file_name, file_type, file_size, blob_path
+                FROM files WHERE id = ANY(%s)
+            """, (file_ids,))}
+
+        return {
+            'changes': change_entries(latest, inserted, projects, files),
+            'cursor': rows[-1]['seq'] if rows else since,
+            'hasMore': len(rows) == limit
+        }
+
+    def prune_changes(self, retention_days: int) -> int:
+        return self.write(lambda cursor: cursor.execute("""
+            DELETE FROM catalog_changes
+            WHERE changed_at < now() - make_interval(days => %s)
+              AND seq < (SELECT MAX(seq) FROM catalog_changes)
+        """, (int(retention_days),)).rowcount)
+
+    def warm_up(self) -> Dict[str, Any]:
+        # Open the whole pool now rather than during the first burst of requests
+        with ExitStack() as stack:
+            connections = [stack.enter_context(self.pool.connection()) for _ in range(self.pool.max_size)]
+            conn = connections[0]
+            for table in ('projects', 'files', 'catalog_changes'):
+                conn.execute(f"SELECT count(*) FROM {table}").fetchone()
+            # pg_prewarm (when installed) loads the indexes too, including the GIN ones
+            prewarmed = 0
+            if conn.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_prewarm'").fetchone():
+                prewarmed = conn.execute("""
+                    SELECT COALESCE(SUM(pg_prewarm(i.indexrelid)), 0) AS blocks
+                    FROM pg_index i
+                    JOIN pg_class t ON t.oid = i.indrelid
+                    WHERE t.relname IN ('projects', 'files') AND t.relnamespace = 'public'::regnamespace
+                """).fetchone()['blocks']
+        return {'connections': len(connections), 'prewarmedBlocks': prewarmed}
+
+    def catalog_generation(self) -> int:
+        with self.pool.connection() as conn:
+            return conn.execute("SELECT COALESCE(MAX(seq), 0) AS generation FROM catalog_changes").fetchone()['generation']
+
+    def search_generation(self) -> Tuple[int, int]:
+        with self.pool.connection() as conn:
+            row = conn.execute("""
+                SELECT (SELECT COALESCE(MAX(seq), 0) FROM catalog_changes) AS generation,
+                       (SELECT version FROM search_index_version) AS version
+            """).fetchone()
+        return row['generation'], row['version']
+
+    def list_catalog(self) -> Tuple[int, List[Dict[str, Any]]]:
+        with self.pool.connection() as conn:
+            conn.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ READ ONLY")
+            generation = conn.execute(
+                "SELECT COALESCE(MAX(seq), 0) AS generation FROM catalog_changes"
+            ).fetchone()['generation']
+            projects = {row['project_id']: dict(self._project_dict(row), files=[]) for row in conn.execute("""
+                SELECT id AS project_id, * FROM projects
+                ORDER BY date_completion DESC NULLS LAST, id
+            """)}
+            for row in conn.execute("""
+                SELECT id, project_id, file_name, file_type, file_size, blob_path FROM files
+                ORDER BY file_name COLLATE "C"
+            """):
+                projects[row['project_id']]['files'].append({
+                    'id': row['id'],
+                    'name': row['file_name'],
+                    'type': row['file_type'],
+                    'size': row['file_size'],
+                    'blobPath': row['blob_path']
+                })
+        return generation, list(projects.values())
+
+
+def get_repository() -> Repository:
+    """Create the catalog repository selected by configuration."""
+    backend = config.database_backend
+
+    if backend == 'postgres':
+        repository = PostgresRepository(config.database_url)
+        logger.info("Catalog repository: PostgreSQL")
+        return repository
+
+    try:
+        from api.db_helper import db_helper
+    except ImportError:
+        from db_helper import db_helper
+    logger.info(f"Catalog repository: SQLite at {db_helper.db_path}")
+    return db_helper
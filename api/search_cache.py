@@ -0,0 +1,259 @@
+"""
+EPAR Data Portal - Search Cache
+Caches search results per catalog generation and search index version, and
+counts popular searches.
+
+Results are keyed by the canonical search parameters and stay valid until the
+catalog changes (the generation moves on with every catalog_changes entry) or
+the searchable text does (search_index_version, which the change log leaves
+out), so repeated searches cost one small lookup instead of the full query. Hit
+counts are added to the popular_searches table in batches; the warmup hook
+(api/warmup.py) replays the most popular searches on new instances.
+
+The async search route calls search_async, which coalesces identical
+concurrent searches: while one is in flight (a cache miss after a newsletter
+link, say), requests for the same canonical parameters wait for its results
+instead of each running the query on its own executor thread.
+"""
+
+import asyncio
+import atexit
+import json
+import logging
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List
+
+# Add parent directory to path to import config
+parent_dir = str(Path(__file__).parent.parent)
+if parent_dir not in sys.path:
+    sys.path.insert(0, parent_dir)
+
+from config import config
+
+try:
+    from api.metrics import CACHE_REQUESTS, SEARCH_DURATION, SEARCH_FLIGHTS
+    from api.offload import SingleFlight, run_db
+    from api.query_budget import label_shape
+    from api.repository import QueryTimeoutError
+    from api.timing import note, phase
+except ImportError:
+    from metrics import CACHE_REQUESTS, SEARCH_DURATION, SEARCH_FLIGHTS
+    from offload import SingleFlight, run_db
+    from query_budget import label_shape
+    from repository import QueryTimeoutError
+    from timing import note, phase
+
+logger = logging.getLogger(__name__)
+
+# Add this flush's hits to the stored counts
+FLUSH_HITS_SQL = """
+    INSERT INTO popular_searches (search_key, hits, last_seen)
+    VALUES (?, ?, ?)
+    ON CONFLICT(search_key) DO UPDATE SET
+        hits = hits + excluded.hits,
+        last_seen = excluded.last_seen
+"""
+
+# search_files arguments that narrow the results, by the name used in search shapes
+SHAPE_FILTERS = {
+    'query': 'query', 'research_areas': 'researchAreas', 'geographies': 'geographies',
+    'output_types': 'outputTypes', 'po_contacts': 'poContacts', 'agdev_partners': 'agdevPartners',
+    'date_from': 'dates', 'date_to': 'dates', 'file_types': 'fileTypes'
+}
+
+
+def canonical_params(params: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Canonical form of search_files keyword arguments.
+
+    Filter lists are sorted (their order does not change the results) and
+    empty values dropped, so equivalent searches compare equal.
+    """
+    canonical = {}
+    for name, value in params.items():
+        if value is None or value == [] or value == '':
+            continue
+        canonical[name] = sorted(value) if isinstance(value, list) else value
+    return canonical
+
+
+def search_key(params: Dict[str, Any]) -> str:
+    """Cache key of a search: its canonical parameters as JSON (usable as search_files kwargs)."""
+    return json.dumps(canonical_params(params), sort_keys=True, separators=(',', ':'))
+
+
+def search_shape(params: Dict[str, Any]) -> str:
+    """
+    Which filters a search uses, without their values (a metrics label).
+
+    For example 'query+researchAreas:relevance', or 'browse' with no filters.
+    """
+    filters = sorted({SHAPE_FILTERS[name] for name in canonical_params(params) if name in SHAPE_FILTERS})
+    shape = '+'.join(filters) or 'browse'
+    return f"{shape}:relevance" if params.get('sort') == 'relevance' else shape
+
+
+class SearchCache:
+    """LRU cache of search results for the current catalog generation and search index version."""
+
+    def __init__(self, repository, writer, max_entries: int = None, flush_seconds: float = 30.0):
+        """
+        Initialize the cache.
+
+        Args:
+            repository: Catalog repository (search_files, search_generation)
+            writer: DatabaseWriter of the local SQLite database (popular_searches)
+            max_entries: Cached searches (default SEARCH_CACHE_SIZE; 0 disables caching)
+            flush_seconds: Minimum interval between hit count flushes
+        """
+        self.repository = repository
+        self.writer = writer
+        self.max_entries = config.search_cache_size if max_entries is None else max_entries
+        self.flush_seconds = flush_seconds
+        self._entries: 'OrderedDict[str, tuple]' = OrderedDict()
+        self._hits: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._last_flush = time.monotonic()
+        self._flights = SingleFlight()
+        self.stats = {'hits': 0, 'misses': 0}
+        atexit.register(self.flush, wait=True)
+
+    def search(self, count: bool = True, **params) -> List[Dict[str, Any]]:
+        """
+        Search results for search_files keyword arguments, cached per search generation.
+
+        The returned list is shared between requests and must not be modified.
+
+        Args:
+            count: Count the search as popular (False for warmup replays)
+            **params: search_files keyword arguments
+        """
+        started = time.perf_counter()
+        key = search_key(params)
+        shape = search_shape(params)
+        label_shape(shape)  # For query budget overruns
+        if count:
+            self._count(key)
+        if self.max_entries <= 0:
+            results = self.repository.search_files(**params)
+            SEARCH_DURATION.observe(time.perf_counter() - started, shape, 'off')
+            return results
+
+        with phase('cache'):
+            generation = self.repository.search_generation()
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry and entry[0] == generation:
+                    self._entries.move_to_end(key)
+                    self.stats['hits'] += 1
+                    hit = entry[1]
+                else:
+                    self.stats['misses'] += 1
+                    hit = None
+        result = 'miss' if hit is None else 'hit'
+        note('cache', result)
+        CACHE_REQUESTS.inc('search', result)
+
+        if hit is not None:
+            SEARCH_DURATION.observe(time.perf_counter() - started, shape, 'hit')
+            return hit
+
+        results = self.repository.search_files(**params)
+        with self._lock:
+            self._entries[key] = (generation, results)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        SEARCH_DURATION.observe(time.perf_counter() - started, shape, 'miss')
+        return results
+
+    async def search_async(self, **params) -> List[Dict[str, Any]]:
+        """
+        search() for the async routes: identical concurrent searches share one call.
+
+        Requests with the same canonical parameters join the search already in
+        flight and get its results, or its error. A flight still running
+        SEARCH_COALESCE_TIMEOUT_MS after it started fails its callers with
+        QueryTimeoutError; the next request starts a new one.
+
+        Args:
+            **params: search_files keyword arguments
+        """
+        key = search_key(params)
+        self._count(key)
+        flight, shared = self._flights.join(
+            key, lambda: run_db(self.search, count=False, **params), config.search_coalesce_timeout_ms / 1000
+        )
+        role = 'follower' if shared else 'leader'
+        if shared:
+            note('search', 'coalesced')
+        try:
+            results = await flight
+        except asyncio.TimeoutError:
+            SEARCH_FLIGHTS.inc(role, 'timeout')
+            raise QueryTimeoutError(
+                f"Search did not finish within {config.search_coalesce_timeout_ms:.0f} ms"
+            ) from None
+        except Exception:
+            SEARCH_FLIGHTS.inc(role, 'error')
+            raise
+        SEARCH_FLIGHTS.inc(role, 'ok')
+        return results
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def popular(self, limit: int) -> List[Dict[str, Any]]:
+        """The most popular searches as search_files keyword arguments."""
+        conn = self.writer.get_connection()
+        try:
+            rows = conn.execute(
+                "SELECT search_key FROM popular_searches ORDER BY hits DESC, last_seen DESC LIMIT ?", (limit,)
+            ).fetchall()
+        except sqlite3.OperationalError as e:
+            if 'no such table' in str(e):
+                logger.warning("popular_searches missing; run python db/init_db.py --schema-only")
+                return []
+            raise
+        finally:
+            conn.close()
+        return [json.loads(row[0]) for row in rows]
+
+    def _count(self, key: str) -> None:
+        with self._lock:
+            self._hits[key] = self._hits.get(key, 0) + 1
+            due = time.monotonic() - self._last_flush >= self.flush_seconds
+        if due:
+            self.flush()
+
+    def flush(self, wait: bool = False) -> None:
+        """
+        Add the pending hit counts to popular_searches.
+
+        Args:
+            wait: Wait for the commit (at exit, before the writer thread is gone)
+        """
+        with self._lock:
+            hits, self._hits = self._hits, {}
+            self._last_flush = time.monotonic()
+        if not hits:
+            return
+
+        now = datetime.now(timezone.utc).isoformat()
+        rows = [(key, count, now) for key, count in hits.items()]
+        future = self.writer.submit(lambda cursor: cursor.executemany(FLUSH_HITS_SQL, rows))
+        # Counting must never fail a search; these hits are dropped
+        future.add_done_callback(
+            lambda done: done.exception() and logger.warning(f"Could not record popular searches: {done.exception()}")
+        )
+        if wait:
+            try:
+                future.result(timeout=5)
+            except Exception:
+                pass  # Already logged by the callback
@@ -0,0 +1,577 @@
+"""
+EPAR Data Portal - Storage Backends
+Pluggable blob storage used by the upload and download endpoints.
+"""
+
+import asyncio
+import datetime
+import hashlib
+import hmac
+import logging
+import os
+import secrets
+import shutil
+import sys
+import tempfile
+import time
+from datetime import timedelta
+from pathlib import Path
+from typing import Any, BinaryIO, Dict, List, Optional, Tuple
+from urllib.parse import quote
+
+# Add parent directory to path to import config
+parent_dir = str(Path(__file__).parent.parent)
+if parent_dir not in sys.path:
+    sys.path.insert(0, parent_dir)
+
+from config import config
+
+try:
+    from api.metrics import BLOB_BYTES
+except ImportError:
+    from metrics import BLOB_BYTES
+
+logger = logging.getLogger(__name__)
+
+
+# Longest byte range served by one /storage response (the Functions HTTP model
+# has no streamed bodies); clients continue with further Range requests
+MAX_RANGE_BYTES = 8 * 1024 * 1024
+
+
+def content_blob_path(content_hash: str) -> str:
+    """Storage key for content-addressed blobs (shared by all projects)."""
+    return f"content/sha256/{content_hash[:2]}/{content_hash}"
+
+
+class StorageBackend:
+    """Base class for blob storage backends."""
+
+    mode = 'mock'
+
+    def upload(self, blob_path: str, data: bytes) -> None:
+        """Store bytes under the given blob path, replacing any existing blob."""
+        raise NotImplementedError
+
+    def upload_file(self, blob_path: str, file_path: str) -> None:
+        """Store a local file under the given blob path, streaming it (never read whole)."""
+        raise NotImplementedError
+
+    def copy(self, source_path: str, blob_path: str) -> None:
+        """Copy a blob to another path inside the storage, without moving its bytes through this process."""
+        raise NotImplementedError
+
+    def exists(self, blob_path: str) -> bool:
+        """Check whether a blob exists."""
+        raise NotImplementedError
+
+    def download_to(self, blob_path: str, stream: BinaryIO) -> None:
+        """Write a blob's contents to a binary stream."""
+        raise NotImplementedError
+
+    def get_properties(self, blob_path: str) -> Optional[Dict[str, Any]]:
+        """
+        Get blob properties.
+
+        Returns:
+            Dict with size and sha256 (None unless the backend computed it from
+            the contents), or None if the blob does not exist
+        """
+        raise NotImplementedError
+
+    def get_upload_url(self, blob_path: str, expires_in: int = 900) -> str:
+        """Generate a temporary write-only URL that a client can PUT the blob to."""
+        raise NotImplementedError
+
+    def delete(self, blob_path: str) -> None:
+        """Delete a blob if it exists."""
+        raise NotImplementedError
+
+    def stage_block(self, blob_path: str, block_id: str, data: bytes) -> None:
+        """Stage one block of a blob that will be assembled by commit_blocks()."""
+        raise NotImplementedError
+
+    def commit_blocks(self, blob_path: str, block_ids: List[str]) -> None:
+        """Assemble staged blocks, in order, into the final blob."""
+        raise NotImplementedError
+
+    def get_download_url(self, blob_path: str, expires_in: int = 3600, filename: str = None) -> str:
+        """
+        Generate a temporary read-only URL for a blob.
+
+        Args:
+            blob_path: Storage key
+            expires_in: Link lifetime in seconds
+            filename: Download file name, if different from the key's last segment
+        """
+        raise NotImplementedError
+
+    # Async variants, awaited by the async HTTP routes. By default they run the
+    # blocking method on a worker thread; AzureBlobStorage uses the async SDK.
+
+    async def upload_async(self, blob_path: str, data: bytes) -> None:
+        await asyncio.to_thread(self.upload, blob_path, data)
+
+    async def exists_async(self, blob_path: str) -> bool:
+        return await asyncio.to_thread(self.exists, blob_path)
+
+    async def get_properties_async(self, blob_path: str) -> Optional[Dict[str, Any]]:
+        return await asyncio.to_thread(self.get_properties, blob_path)
+
+    async def stage_block_async(self, blob_path: str, block_id: str, data: bytes) -> None:
+        await asyncio.to_thread(self.stage_block, blob_path, block_id, data)
+
+    async def commit_blocks_async(self, blob_path: str, block_ids: List[str]) -> None:
+        await asyncio.to_thread(self.commit_blocks, blob_path, block_ids)
+
+
+# ============================================================================
+# MOCK BACKEND
+# ============================================================================
+
+class MockStorage(StorageBackend):
+    """Discards uploads and returns placeholder download URLs."""
+
+    mode = 'mock'
+
+    def upload(self, blob_path: str, data: bytes) -> None:
+        logger.info(f"Mock storage: discarded {len(data)} bytes for {blob_path}")
+
+    def upload_file(self, blob_path: str, file_path: str) -> None:
+        logger.info(f"Mock storage: discarded {os.path.getsize(file_path)} bytes for {blob_path}")
+
+    def copy(self, source_path: str, blob_path: str) -> None:
+        logger.info(f"Mock storage: discarded copy of {source_path} to {blob_path}")
+
+    def exists(self, blob_path: str) -> bool:
+        return False
+
+    def get_download_url(self, blob_path: str, expires_in: int = 3600, filename: str = None) -> str:
+        return f"#mock-download-{blob_path}"
+
+    async def upload_async(self, blob_path: str, data: bytes) -> None:
+        self.upload(blob_path, data)
+
+    async def exists_async(self, blob_path: str) -> bool:
+        return False
+
+
+# ============================================================================
+# AZURE BLOB BACKEND
+# ============================================================================
+
+class AzureBlobStorage(StorageBackend):
+    """
+    Azure Blob Storage backend with SAS download URLs.
+
+    The blocking methods (used by the ingestion workers) go through the sync
+    SDK; the *_async methods (used by the HTTP routes) through the async SDK,
+    whose client and HTTP session are shared by all requests on the event loop.
+    """
+
+    mode = 'azure'
+
+    def __init__(self, connection_string: str, container: str):
+        """Initialize the blob service client (imports the Azure SDK)."""
+        from azure.storage.blob import BlobServiceClient
+
+        self.connection_string = connection_string
+        self.container = container
+        self.service_client = BlobServiceClient.from_connection_string(connection_string)
+        self.container_client = self.service_client.get_container_client(container)
+        self._async_loop = None
+        self._async_container_client = None
+
+        # Extract account key from connection string for SAS signing
+        self.account_key = None
+        for part in connection_string.split(';'):
+            if part.startswith('AccountKey='):
+                self.account_key = part.split('=', 1)[1]
+                break
+
+    def upload(self, blob_path: str, data: bytes) -> None:
+        blob_client = self.container_client.get_blob_client(blob_path)
+        blob_client.upload_blob(data, overwrite=True)
+        BLOB_BYTES.inc(self.mode, 'write', amount=len(data))
+
+    def upload_file(self, blob_path: str, file_path: str) -> None:
+        size = os.path.getsize(file_path)
+        with open(file_path, 'rb') as f:
+            # The SDK reads the stream in blocks (max_block_size) and stages them
+            self.container_client.get_blob_client(blob_path).upload_blob(f, length=size, overwrite=True)
+        BLOB_BYTES.inc(self.mode, 'write', amount=size)
+
+    def copy(self, source_path: str, blob_path: str) -> None:
+        from azure.storage.blob import generate_blob_sas, BlobSasPermissions
+
+        if not self.account_key:
+            raise ValueError("Could not extract AccountKey from connection string")
+
+        # Put Blob From URL: the service copies the bytes and returns when done
+        source_client = self.container_client.get_blob_client(source_path)
+        sas_token = generate_blob_sas(
+            account_name=source_client.account_name,
+            container_name=self.container,
+            blob_name=source_path,
+            account_key=self.account_key,
+            permission=BlobSasPermissions(read=True),
+            expiry=datetime.datetime.utcnow() + timedelta(minutes=15)
+        )
+        self.container_client.get_blob_client(blob_path).upload_blob_from_url(
+            f"{source_client.url}?{sas_token}", overwrite=True
+        )
+
+    def exists(self, blob_path: str) -> bool:
+        return self.container_client.get_blob_client(blob_path).exists()
+
+    def download_to(self, blob_path: str, stream: BinaryIO) -> None:
+        size = self.container_client.get_blob_client(blob_path).download_blob().readinto(stream)
+        BLOB_BYTES.inc(self.mode, 'read', amount=size)
+
+    def get_properties(self, blob_path: str) -> Optional[Dict[str, Any]]:
+        from azure.core.exceptions import ResourceNotFoundError
+
+        try:
+            properties = self.container_client.get_blob_client(blob_path).get_blob_properties()
+        except ResourceNotFoundError:
+            return None
+        # Metadata is client-set, so it is no proof of the content's hash
+        return {'size': properties.size, 'sha256': None}
+
+    def get_upload_url(self, blob_path: str, expires_in: int = 900) -> str:
+        from azure.storage.blob import generate_blob_sas, BlobSasPermissions
+
+        if not self.account_key:
+            raise ValueError("Could not extract AccountKey from connection string")
+
+        blob_client = self.container_client.get_blob_client(blob_path)
+        sas_token = generate_blob_sas(
+            account_name=blob_client.account_name,
+            container_name=self.container,
+            blob_name=blob_path,
+            account_key=self.account_key,
+            permission=BlobSasPermissions(create=True, write=True),
+            expiry=datetime.datetime.utcnow() + timedelta(seconds=expires_in)
+        )
+        return f"{blob_client.url}?{sas_token}"
+
+    def delete(self, blob_path: str) -> None:
+        from azure.core.exceptions import ResourceNotFoundError
+
+        try:
+            self.container_client.get_blob_client(blob_path).delete_blob()
+        except ResourceNotFoundError:
+            pass
+
+    def stage_block(self, blob_path: str, block_id: str, data: bytes) -> None:
+        self.container_client.get_blob_client(blob_path).stage_block(block_id=block_id, data=data)
+        BLOB_BYTES.inc(self.mode, 'write', amount=len(data))
+
+    def commit_blocks(self, blob_path: str, block_ids: List[str]) -> None:
+        from azure.storage.blob import BlobBlock
+
+        blob_client = self.container_client.get_blob_client(blob_path)
+        blob_client.commit_block_list([BlobBlock(block_id=block_id) for block_id in block_ids])
+
+    def get_download_url(self, blob_path: str, expires_in: int = 3600, filename: str = None) -> str:
+        from azure.storage.blob import generate_blob_sas, BlobSasPermissions
+
+        if not self.account_key:
+            raise ValueError("Could not extract AccountKey from connection string")
+
+        blob_client = self.container_client.get_blob_client(blob_path)
+        sas_token = generate_blob_sas(
+            account_name=blob_client.account_name,
+            container_name=self.container,
+            blob_name=blob_path,
+            account_key=self.account_key,
+            permission=BlobSasPermissions(read=True),
+            expiry=datetime.datetime.utcnow() + timedelta(seconds=expires_in),
+            content_disposition=content_disposition(filename) if filename else None
+        )
+        return f"{blob_client.url}?{sas_token}"
+
+    def _async_container(self):
+        """Container client of the async SDK for the running event loop (created once)."""
+        loop = asyncio.get_running_loop()
+        if self._async_loop is not loop:
+            from azure.storage.blob.aio import BlobServiceClient as AsyncBlobServiceClient
+
+            # Blob clients derived from one service client share its HTTP session
+            service_client = AsyncBlobServiceClient.from_connection_string(self.connection_string)
+            self._async_container_client = service_client.get_container_client(self.container)
+            self._async_loop = loop
+        return self._async_container_client
+
+    async def upload_async(self, blob_path: str, data: bytes) -> None:
+        await self._async_container().get_blob_client(blob_path).upload_blob(data, overwrite=True)
+        BLOB_BYTES.inc(self.mode, 'write', amount=len(data))
+
+    async def exists_async(self, blob_path: str) -> bool:
+        return await self._async_container().get_blob_client(blob_path).exists()
+
+    async def get_properties_async(self, blob_path: str) -> Optional[Dict[str, Any]]:
+        from azure.core.exceptions import ResourceNotFoundError
+
+        try:
+            properties = await self._async_container().get_blob_client(blob_path).get_blob_properties()
+        except ResourceNotFoundError:
+            return None
+        return {'size': properties.size, 'sha256': None}
+
+    async def stage_block_async(self, blob_path: str, block_id: str, data: bytes) -> None:
+        await self._async_container().get_blob_client(blob_path).stage_block(block_id=block_id, data=data)
+        BLOB_BYTES.inc(self.mode, 'write', amount=len(data))
+
+    async def commit_blocks_async(self, blob_path: str, block_ids: List[str]) -> None:
+        from azure.storage.blob import BlobBlock
+
+        blob_client = self._async_container().get_blob_client(blob_path)
+        await blob_client.commit_block_list([BlobBlock(block_id=block_id) for block_id in block_ids])
+
+
+# ============================================================================
+# LOCAL FILESYSTEM BACKEND
+# ============================================================================
+
+class LocalFileStorage(StorageBackend):
+    """
+    Stores blobs as files under a local directory.
+
+    Downloads and direct client uploads go through the /storage route using
+    signed, expiring URLs (the same shape as a SAS URL).
+    """
+
+    mode = 'local'
+
+    def __init__(self, root: str, secret: str = '', base_url: str = ''):
+        """Initialize local storage rooted at the given directory."""
+        self.root = Path(root).resolve()
+        self.root.mkdir(parents=True, exist_ok=True)
+        if not secret:
+            logger.warning("LOCAL_STORAGE_SECRET not set; download links are valid for this process only")
+            secret = secrets.token_hex(32)
+        self.secret = secret.encode('utf-8')
+        self.base_url = base_url
+
+    def _resolve(self, blob_path: str) -> Path:
+        """Map a blob path to a file, rejecting paths that escape the root."""
+        path = (self.root / blob_path).resolve()
+        if path == self.root or self.root not in path.parents:
+            raise ValueError(f"Invalid blob path: {blob_path}")
+        return path
+
+    def _write(self, blob_path: str, write) -> None:
+        """Create a blob with write(file); readers never see a partial blob."""
+        path = self._resolve(blob_path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        # Write to a temp file and rename
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix='.upload-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                write(f)
+            os.replace(tmp_path, path)
+        except Exception:
+            os.unlink(tmp_path)
+            raise
+
+    def upload(self, blob_path: str, data: bytes) -> None:
+        self._write(blob_path, lambda f: f.write(data))
+        BLOB_BYTES.inc(self.mode, 'write', amount=len(data))
+
+    def upload_file(self, blob_path: str, file_path: str) -> None:
+        with open(file_path, 'rb') as source:
+            self._write(blob_path, lambda f: shutil.copyfileobj(source, f))
+            BLOB_BYTES.inc(self.mode, 'write', amount=source.tell())
+
+    def copy(self, source_path: str, blob_path: str) -> None:
+        with open(self._resolve(source_path), 'rb') as source:
+            self._write(blob_path, lambda f: shutil.copyfileobj(source, f))
+
+    def exists(self, blob_path: str) -> bool:
+        return self._resolve(blob_path).is_file()
+
+    def download_to(self, blob_path: str, stream: BinaryIO) -> None:
+        with open(self._resolve(blob_path), 'rb') as f:
+            shutil.copyfileobj(f, stream)
+            BLOB_BYTES.inc(self.mode, 'read', amount=f.tell())
+
+    def get_properties(self, blob_path: str) -> Optional[Dict[str, Any]]:
+        path = self._resolve(blob_path)
+        if not path.is_file():
+            return None
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(chunk)
+        return {'size': path.stat().st_size, 'sha256': digest.hexdigest()}
+
+    def get_upload_url(self, blob_path: str, expires_in: int = 900) -> str:
+        expiry = int(time.time()) + expires_in
+        signature = self.sign(blob_path, expiry, 'cw')
+        return f"{self.base_url}/storage/{quote(blob_path)}?se={expiry}&sp=cw&sig={signature}"
+
+    def delete(self, blob_path: str) -> None:
+        try:
+            self._resolve(blob_path).unlink()
+        except FileNotFoundError:
+            pass
+
+    def _block_dir(self, blob_path: str) -> Path:
+        """Directory holding uncommitted blocks for a blob."""
+        return self._resolve(f".blocks/{blob_path}")
+
+    def stage_block(self, blob_path: str, block_id: str, data: bytes) -> None:
+        block_dir = self._block_dir(blob_path)
+        block_dir.mkdir(parents=True, exist_ok=True)
+        # Block IDs are base64 and may contain '/', so store them hex-encoded
+        block_path = block_dir / block_id.encode('utf-8').hex()
+        tmp_path = block_path.with_suffix('.tmp')
+        tmp_path.write_bytes(data)
+        os.replace(tmp_path, block_path)
+        BLOB_BYTES.inc(self.mode, 'write', amount=len(data))
+
+    def commit_blocks(self, blob_path: str, block_ids: List[str]) -> None:
+        block_dir = self._block_dir(blob_path)
+        path = self._resolve(blob_path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix='.upload-')
+        try:
+            with os.fdopen(fd, 'wb') as out:
+                for block_id in block_ids:
+                    with open(block_dir / block_id.encode('utf-8').hex(), 'rb') as block:
+                        shutil.copyfileobj(block, out)
+            os.replace(tmp_path, path)
+        except Exception:
+            os.unlink(tmp_path)
+            raise
+        shutil.rmtree(block_dir, ignore_errors=True)
+
+    def get_size(self, blob_path: str) -> Optional[int]:
+        """Get blob size in bytes, or None if the blob does not exist."""
+        try:
+            return self._resolve(blob_path).stat().st_size
+        except FileNotFoundError:
+            return None
+
+    def read_range(self, blob_path: str, start: int, end: int) -> bytes:
+        """
+        Read bytes [start, end] (inclusive) from a blob.
+
+        The range is returned as one bytes object, so callers bound its length
+        (the /storage route serves at most MAX_RANGE_BYTES per Range request).
+        """
+        with open(self._resolve(blob_path), 'rb') as f:
+            if end < start:
+                return b''
+            f.seek(start)
+            data = f.read(end - start + 1)
+        BLOB_BYTES.inc(self.mode, 'read', amount=len(data))
+        return data
+
+    async def get_size_async(self, blob_path: str) -> Optional[int]:
+        return await asyncio.to_thread(self.get_size, blob_path)
+
+    async def read_range_async(self, blob_path: str, start: int, end: int) -> bytes:
+        return await asyncio.to_thread(self.read_range, blob_path, start, end)
+
+    def sign(self, blob_path: str, expiry: int, permission: str, rscd: str = '') -> str:
+        """Sign a blob path, expiry timestamp, permission string and Content-Disposition override."""
+        message = f"{blob_path}\n{expiry}\n{permission}\n{rscd}".encode('utf-8')
+        return hmac.new(self.secret, message, hashlib.sha256).hexdigest()
+
+    def verify(self, blob_path: str, expiry: str, permission: str, signature: str, rscd: str = '') -> bool:
+        """Check a signature produced by sign() (for the same rscd) and that it has not expired."""
+        try:
+            expiry_ts = int(expiry)
+        except (TypeError, ValueError):
+            return False
+        if expiry_ts < time.time():
+            return False
+        expected = self.sign(blob_path, expiry_ts, permission, rscd)
+        return hmac.compare_digest(expected, signature or '')
+
+    def get_download_url(self, blob_path: str, expires_in: int = 3600, filename: str = None) -> str:
+        expiry = int(time.time()) + expires_in
+        rscd = content_disposition(filename) if filename else ''
+        # rscd is signed like in a SAS, so a link cannot be rewritten to serve another file name
+        signature = self.sign(blob_path, expiry, 'r', rscd)
+        url = f"{self.base_url}/storage/{quote(blob_path)}?se={expiry}&sp=r&sig={signature}"
+        if rscd:
+            url += f"&rscd={quote(rscd)}"
+        return url
+
+
+def content_disposition(filename: str) -> str:
+    """Build an attachment Content-Disposition header value."""
+    safe_name = filename.replace('"', '').replace('\r', '').replace('\n', '')
+    return f'attachment; filename="{safe_name}"'
+
+
+def parse_range_header(range_header: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    Parse a single-range HTTP Range header.
+
+    Args:
+        range_header: Header value, e.g. "bytes=0-1023", "bytes=1024-" or "bytes=-500"
+        size: Total size of the resource in bytes
+
+    Returns:
+        Inclusive (start, end) tuple, or None if the header should be ignored
+        (missing, malformed or multi-range), in which case the full body is served.
+
+    Raises:
+        ValueError: If the range is syntactically valid but not satisfiable
+    """
+    if not range_header or not range_header.startswith('bytes='):
+        return None
+
+    spec = range_header[len('bytes='):].strip()
+    if ',' in spec or '-' not in spec:
+        return None
+
+    start_str, end_str = spec.split('-', 1)
+    if not any([start_str, end_str]) or not all(s == '' or s.isdigit() for s in (start_str, end_str)):
+        return None
+
+    if start_str == '':
+        # Suffix range: the last N bytes
+        suffix = int(end_str)
+        if suffix == 0 or size == 0:
+            raise ValueError("Unsatisfiable range")
+        return max(size - suffix, 0), size - 1
+
+    start = int(start_str)
+    end = int(end_str) if end_str else size - 1
+    if end_str and end < start:
+        return None
+    if start >= size:
+        raise ValueError("Unsatisfiable range")
+    return start, min(end, size - 1)
+
+
+def get_storage() -> StorageBackend:
+    """Create the storage backend selected by configuration."""
+    backend = config.storage_backend
+
+    if backend == 'azure':
+        try:
+            storage = AzureBlobStorage(config.blob_connection_string, config.blob_container)
+            logger.info("Storage backend: Azure Blob Storage")
+            return storage
+        except ImportError:
+            logger.warning("Azure Storage SDK not available. Falling back to mock mode.")
+        except ValueError as e:
+            logger.warning(f"Azure Storage not configured: {e}. Falling back to mock mode.")
+    elif backend == 'local':
+        logger.info(f"Storage backend: local filesystem at {config.local_storage_path}")
+        return LocalFileStorage(
+            config.local_storage_path,
+            secret=config.local_storage_secret,
+            base_url=config.public_api_url
+        )
+
+    logger.info("Storage backend: mock (uploads discarded)")
+    return MockStorage()
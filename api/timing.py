@@ -0,0 +1,178 @@
+"""
+EPAR Data Portal - Request Phase Timing
+Per-request phase timings reported as a Server-Timing header and a log line.
+
+A route decorated with @timed('search') gets a RequestTimer for the duration
+of the call. Code anywhere below it (routes, repositories, caches) marks its
+phases with `with phase('sql'):` without the timer being passed around; the
+current timer lives in a context variable, and phase() is a no-op outside a
+timed request. Durations of a phase that runs several times are added up.
+
+The response gets a header like
+
+    Server-Timing: parse;dur=0.1, cache;desc="miss";dur=0.3, sql;dur=8.2, assemble;dur=1.4, serialize;dur=2.0, total;dur=12.3
+
+(browser dev tools show it next to the request) and one log line
+"Request timing {...}" with the same data as JSON, for log queries. The same
+durations feed the route and phase histograms served at /metrics.
+"""
+
+import contextvars
+import functools
+import inspect
+import json
+import logging
+import time
+from typing import Any, Callable, Dict, Optional
+
+try:
+    from api.metrics import HTTP_DURATION, HTTP_PHASE_DURATION, HTTP_REQUESTS
+except ImportError:
+    from metrics import HTTP_DURATION, HTTP_PHASE_DURATION, HTTP_REQUESTS
+
+logger = logging.getLogger(__name__)
+
+_current_timer: contextvars.ContextVar = contextvars.ContextVar('request_timer', default=None)
+
+
+class _Phase:
+    """Context manager adding its duration to one phase of a timer."""
+
+    __slots__ = ('timer', 'name', 'started')
+
+    def __init__(self, timer: 'RequestTimer', name: str):
+        self.timer = timer
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.timer.add(self.name, time.perf_counter() - self.started)
+        return False
+
+
+class _NoPhase:
+    """Stand-in used outside timed requests."""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NO_PHASE = _NoPhase()
+
+
+class RequestTimer:
+    """Phase durations and notes of one request."""
+
+    def __init__(self, route: str):
+        self.route = route
+        self.started = time.perf_counter()
+        self.phases: Dict[str, float] = {}
+        self.notes: Dict[str, Any] = {}
+
+    def add(self, name: str, seconds: float) -> None:
+        self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    def phase(self, name: str) -> _Phase:
+        return _Phase(self, name)
+
+    def total_ms(self) -> float:
+        return (time.perf_counter() - self.started) * 1000
+
+    def server_timing(self, total_ms: float) -> str:
+        """Server-Timing header value (durations in milliseconds)."""
+        entries = []
+        for name, seconds in self.phases.items():
+            note = self.notes.get(name)
+            desc = f';desc="{note}"' if note is not None else ''
+            entries.append(f"{name}{desc};dur={seconds * 1000:.1f}")
+        entries.append(f"total;dur={total_ms:.1f}")
+        return ', '.join(entries)
+
+    def record(self, status: Optional[int], total_ms: float) -> Dict[str, Any]:
+        """The log record: route, status, total and per-phase milliseconds."""
+        return {
+            'route': self.route,
+            'status': status,
+            'ms': round(total_ms, 1),
+            'phases': {name: round(seconds * 1000, 1) for name, seconds in self.phases.items()},
+            **({'notes': self.notes} if self.notes else {})
+        }
+
+
+def current_timer() -> Optional[RequestTimer]:
+    """The timer of the request being handled in this context, if any."""
+    return _current_timer.get()
+
+
+def phase(name: str):
+    """Time a block as a phase of the current request (no-op outside requests)."""
+    timer = _current_timer.get()
+    return timer.phase(name) if timer is not None else _NO_PHASE
+
+
+def note(name: str, value: Any) -> None:
+    """Attach a short note to a phase, e.g. note('cache', 'hit')."""
+    timer = _current_timer.get()
+    if timer is not None:
+        timer.notes[name] = value
+
+
+def _report(route: str, timer: RequestTimer, response) -> None:
+    total_ms = timer.total_ms()
+    status = response.status_code if response is not None else None
+    if response is not None:
+        response.headers['Server-Timing'] = timer.server_timing(total_ms)
+        origin = response.headers.get('Access-Control-Allow-Origin')
+        if origin:
+            # Lets the frontend read the timings cross-origin
+            response.headers['Timing-Allow-Origin'] = origin
+    logger.info(f"Request timing {json.dumps(timer.record(status, total_ms))}")
+    # No response means the function raised; the host answers 500
+    HTTP_REQUESTS.inc(route, str(status or 500))
+    HTTP_DURATION.observe(total_ms / 1000, route)
+    for name, seconds in timer.phases.items():
+        HTTP_PHASE_DURATION.observe(seconds, route, name)
+
+
+def timed(route: str) -> Callable:
+    """
+    Decorator for HTTP functions (sync or async): time the request and report its phases.
+
+    Place it below @app.route so the host still sees the original signature.
+    """
+    def decorate(fn):
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(req, *args, **kwargs):
+                timer = RequestTimer(route)
+                token = _current_timer.set(timer)
+                response = None
+                try:
+                    response = await fn(req, *args, **kwargs)
+                    return response
+                finally:
+                    _current_timer.reset(token)
+                    _report(route, timer, response)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(req, *args, **kwargs):
+            timer = RequestTimer(route)
+            token = _current_timer.set(timer)
+            response = None
+            try:
+                response = fn(req, *args, **kwargs)
+                return response
+            finally:
+                _current_timer.reset(token)
+                _report(route, timer, response)
+        return wrapper
+    return decorate
@@ -0,0 +1,511 @@
+"""
+EPAR Data Portal - Upload Sessions
+Upload flows that do not push whole files through a single /upload request.
+
+Resumable sessions: chunks are staged as blocks in storage and tracked in
+SQLite, so clients can resume after failures and send chunks in parallel.
+Flow: create session -> PUT chunks at chunk-aligned offsets -> finalize.
+
+Direct uploads: the client PUTs each file straight to storage with a
+short-lived write-only URL, so file bytes never pass through the API.
+Flow: initiate (get URLs) -> PUT files to storage -> complete.
+
+Operations that touch storage are coroutines for the async routes: blob
+calls are awaited, database reads run on the database executor and writes
+are awaited on the writer's future. Database-only operations stay blocking.
+"""
+
+import asyncio
+import base64
+import json
+import logging
+import math
+import re
+import sqlite3
+import sys
+import uuid
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+# Add parent directory to path to import config
+parent_dir = str(Path(__file__).parent.parent)
+if parent_dir not in sys.path:
+    sys.path.insert(0, parent_dir)
+
+from config import config
+
+try:
+    from api.offload import run_catalog_write, run_db, run_write
+    from api.storage import content_blob_path
+except ImportError:
+    from offload import run_catalog_write, run_db, run_write
+    from storage import content_blob_path
+
+logger = logging.getLogger(__name__)
+
+MIN_CHUNK_SIZE = 256 * 1024
+MAX_CHUNK_SIZE = 64 * 1024 * 1024
+
+REQUIRED_PROJECT_FIELDS = ['projectCode', 'title', 'outputType', 'poContact', 'dateCompletion']
+
+# Lifetime of direct upload URLs
+DIRECT_UPLOAD_EXPIRY_SECONDS = 900
+
+SHA256_PATTERN = re.compile(r'^[0-9a-f]{64}$')
+
+
+class UploadSessionError(Exception):
+    """Invalid upload session request; carries the HTTP status to return."""
+
+    def __init__(self, message: str, status_code: int = 400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def validate_upload_file(file_name: str, file_size: int) -> None:
+    """Check a declared file name and size."""
+    if not file_name or not isinstance(file_name, str) or Path(file_name).name != file_name:
+        raise UploadSessionError("Invalid fileName")
+    if not isinstance(file_size, int) or file_size <= 0:
+        raise UploadSessionError("fileSize must be a positive integer")
+
+
+def file_type_for(file_name: str) -> str:
+    """File type as stored in files.file_type (extension without the dot)."""
+    return file_name.split('.')[-1].lower() if '.' in file_name else 'unknown'
+
+
+def block_id(chunk_index: int) -> str:
+    """Block ID for a chunk (base64, fixed length as Azure requires)."""
+    return base64.b64encode(f"{chunk_index:08d}".encode('utf-8')).decode('ascii')
+
+
+def staged_blob_path(session_id: str) -> str:
+    """Storage key the session's blocks are committed to on finalize."""
+    return f"uploads/{session_id}"
+
+
+def direct_upload_blob_path(upload_id: str, file_name: str) -> str:
+    """Storage key a direct upload's file is written to before ingestion verifies it."""
+    return f"uploads/{upload_id}/{file_name}"
+
+
+class UploadSessionStore:
+    """Creates, tracks and finalizes upload sessions."""
+
+    def __init__(self, db_helper, storage, ingestion_queue, writer, repository=None):
+        """
+        Initialize the store.
+
+        Args:
+            db_helper: DatabaseHelper holding the upload_sessions table
+            storage: Storage backend that stages and commits blocks
+            ingestion_queue: Queue that ingests the assembled file
+            writer: DatabaseWriter that applies session and job writes
+            repository: Catalog repository for project and file rows
+                (defaults to db_helper)
+        """
+        self.db_helper = db_helper
+        self.storage = storage
+        self.ingestion_queue = ingestion_queue
+        self.writer = writer
+        self.repository = repository or db_helper
+
+    def create(self, project: Dict[str, Any], file_name: str, file_size: int, chunk_size: int = None) -> Dict[str, Any]:
+        """
+        Create an upload session for one file.
+
+        Args:
+            project: Project metadata (API field names); the project is created or
+                updated on finalize
+            file_name: Name of the file being uploaded
+            file_size: Total size in bytes
+            chunk_size: Chunk size in bytes (defaults to UPLOAD_CHUNK_SIZE)
+
+        Returns:
+            Session status dict
+        """
+        if not all(project.get(field) for field in REQUIRED_PROJECT_FIELDS):
+            raise UploadSessionError("Missing required fields")
+        validate_upload_file(file_name, file_size)
+
+        chunk_size = chunk_size or config.upload_chunk_size
+        if not MIN_CHUNK_SIZE <= chunk_size <= MAX_CHUNK_SIZE:
+            raise UploadSessionError(f"chunkSize must be between {MIN_CHUNK_SIZE} and {MAX_CHUNK_SIZE} bytes")
+
+        session_id = uuid.uuid4().hex
+        self.writer.execute(lambda cursor: cursor.execute("""
+            INSERT INTO upload_sessions (
+                id, project_code, project_metadata, file_name, file_size, chunk_size
+            ) VALUES (?, ?, ?, ?, ?, ?)
+        """, (session_id, project['projectCode'], json.dumps(project), file_name, file_size, chunk_size)))
+
+        logger.info(f"Created upload session {session_id} for {project['projectCode']}/{file_name} ({file_size} bytes)")
+        return self.get(session_id)
+
+    def _load(self, conn: sqlite3.Connection, session_id: str) -> sqlite3.Row:
+        row = conn.execute("SELECT * FROM upload_sessions WHERE id = ?", (session_id,)).fetchone()
+        if not row:
+            raise UploadSessionError("Upload session not found", 404)
+        return row
+
+    def _load_session(self, session_id: str) -> sqlite3.Row:
+        conn = self.db_helper.get_connection()
+        try:
+            return self._load(conn, session_id)
+        finally:
+            conn.close()
+
+    def get(self, session_id: str) -> Dict[str, Any]:
+        """
+        Get session progress, including which chunks are still missing.
+
+        Returns:
+            Session status dict
+        """
+        conn = self.db_helper.get_connection()
+        try:
+            session = self._load(conn, session_id)
+            received = [row['chunk_index'] for row in conn.execute(
+                "SELECT chunk_index FROM upload_session_chunks WHERE session_id = ? ORDER BY chunk_index",
+                (session_id,)
+            )]
+        finally:
+            conn.close()
+
+        file_size, chunk_size = session['file_size'], session['chunk_size']
+        chunk_count = math.ceil(file_size / chunk_size)
+        received_set = set(received)
+
+        # Merge consecutive chunks into inclusive byte ranges
+        ranges: List[List[int]] = []
+        for index in received:
+            start = index * chunk_size
+            end = min(start + chunk_size, file_size) - 1
+            if ranges and ranges[-1][1] == start - 1:
+                ranges[-1][1] = end
+            else:
+                ranges.append([start, end])
+
+        return {
+            'sessionId': session['id'],
+            'status': session['status'],
+            'projectCode': session['project_code'],
+            'fileName': session['file_name'],
+            'fileSize': file_size,
+            'chunkSize': chunk_size,
+            'chunkCount': chunk_count,
+            'receivedBytes': sum(end - start + 1 for start, end in ranges),
+            'receivedRanges': ranges,
+            'missingChunks': [i for i in range(chunk_count) if i not in received_set],
+            'fileId': session['file_id'],
+            'jobId': session['job_id']
+        }
+
+    async def put_chunk(self, session_id: str, offset: int, data: bytes) -> Dict[str, Any]:
+        """
+        Stage one chunk. Re-sending a chunk simply replaces it.
+
+        Args:
+            session_id: Session ID
+            offset: Byte offset of the chunk (must be a multiple of the chunk size)
+            data: Chunk bytes (chunkSize bytes, except for the last chunk)
+
+        Returns:
+            Session status dict
+        """
+        session = await run_db(self._load_session, session_id)
+
+        if session['status'] != 'open':
+            raise UploadSessionError("Upload session is already finalized", 409)
+
+        file_size, chunk_size = session['file_size'], session['chunk_size']
+        if offset < 0 or offset >= file_size or offset % chunk_size != 0:
+            raise UploadSessionError("offset must be a chunk-aligned position inside the file", 416)
+
+        expected = min(chunk_size, file_size - offset)
+        if len(data) != expected:
+            raise UploadSessionError(f"Chunk at offset {offset} must be {expected} bytes, got {len(data)}")
+
+        chunk_index = offset // chunk_size
+
+        # Stage the block before recording it so a recorded chunk is always present
+        await self.storage.stage_block_async(staged_blob_path(session_id), block_id(chunk_index), data)
+
+        def record_chunk(cursor: sqlite3.Cursor) -> None:
+            cursor.execute("""
+                INSERT OR REPLACE INTO upload_session_chunks (session_id, chunk_index, length)
+                VALUES (?, ?, ?)
+            """, (session_id, chunk_index, len(data)))
+            cursor.execute("UPDATE upload_sessions SET updated_at = CURRENT_TIMESTAMP WHERE id = ?", (session_id,))
+
+        await run_write(self.writer, record_chunk)
+
+        return await run_db(self.get, session_id)
+
+    async def finalize(self, session_id: str) -> Dict[str, Any]:
+        """
+        Assemble the staged blocks, create the file row and enqueue ingestion.
+
+        Finalizing an already finalized session returns its existing result.
+
+        Returns:
+            Session status dict (with fileId and jobId)
+        """
+        status = await run_db(self.get, session_id)
+        if status['status'] == 'finalized':
+            return status
+        if status['missingChunks']:
+            raise UploadSessionError(f"{len(status['missingChunks'])} chunks are still missing", 409)
+
+        staged_key = staged_blob_path(session_id)
+        await self.storage.commit_blocks_async(staged_key, [block_id(i) for i in range(status['chunkCount'])])
+
+        file_name = status['fileName']
+        file_type = file_type_for(file_name)
+        blob_path = f"{status['projectCode']}/{file_name}"
+
+        project = json.loads((await run_db(self._load_session, session_id))['project_metadata'])
+
+        def register_file(cursor) -> Tuple[int, int]:
+            project_id, _ = self.repository.upsert_project(cursor, project)
+            # The hash is unknown until ingestion, so an existing file is always updated
+            file_id, _ = self.repository.upsert_file(cursor, project_id, {
+                'fileName': file_name,
+                'fileType': file_type,
+                'fileSize': status['fileSize'],
+                'blobPath': blob_path,
+                'contentHash': None
+            })
+            return project_id, file_id
+
+        # Catalog rows first; a concurrent finalize repeats the same upserts
+        project_id, file_id = await run_catalog_write(self.repository, self.writer, register_file)
+
+        def enqueue_file(cursor: sqlite3.Cursor) -> Optional[int]:
+            session = cursor.execute(
+                "SELECT status FROM upload_sessions WHERE id = ?", (session_id,)
+            ).fetchone()
+            if session['status'] == 'finalized':
+                return None  # Finalized concurrently
+
+            # The worker hashes the assembled blob and moves it to content storage
+            job_id = self.ingestion_queue.enqueue(cursor, project_id, [{
+                'fileId': file_id,
+                'fileName': file_name,
+                'fileType': file_type,
+                'blobPath': blob_path,
+                'stagedBlob': staged_key
+            }])
+
+            cursor.execute("""
+                UPDATE upload_sessions
+                SET status = 'finalized', file_id = ?, job_id = ?, updated_at = CURRENT_TIMESTAMP
+                WHERE id = ?
+            """, (file_id, job_id, session_id))
+            return job_id
+
+        job_id = await run_write(self.writer, enqueue_file)
+        if job_id is None:
+            return await run_db(self.get, session_id)
+
+        logger.info(f"Finalized upload session {session_id} as file {file_id} (ingestion job {job_id})")
+        return await run_db(self.get, session_id)
+
+
+class DirectUploadStore:
+    """Issues write-only storage URLs and registers the uploaded files."""
+
+    def __init__(self, db_helper, storage, ingestion_queue, writer, repository=None):
+        """
+        Initialize the store.
+
+        Args:
+            db_helper: DatabaseHelper holding the direct_uploads table
+            storage: Storage backend that issues upload URLs and blob properties
+            ingestion_queue: Queue that indexes the uploaded files
+            writer: DatabaseWriter that applies upload and job writes
+            repository: Catalog repository for project and file rows
+                (defaults to db_helper)
+        """
+        self.db_helper = db_helper
+        self.storage = storage
+        self.ingestion_queue = ingestion_queue
+        self.writer = writer
+        self.repository = repository or db_helper
+
+    async def initiate(self, project: Dict[str, Any], files: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Validate project metadata and issue one write URL per file.
+
+        Files are written to a key of their own under uploads/; ingestion
+        re-hashes them before storing them under their content-addressed key.
+        Only ingestion writes content keys, so content that is already stored
+        is marked skip and needs no transfer at all.
+
+        Args:
+            project: Project metadata (API field names)
+            files: Declared files: [{name, size, sha256}]
+
+        Returns:
+            Dict with uploadId and per-file uploadUrl, headers and skip flag
+        """
+        if not all(project.get(field) for field in REQUIRED_PROJECT_FIELDS):
+            raise UploadSessionError("Missing required fields")
+        if not files or not isinstance(files, list):
+            raise UploadSessionError("No files declared")
+
+        declared = []
+        for file in files:
+            validate_upload_file(file.get('name'), file.get('size'))
+            sha256 = str(file.get('sha256', '')).lower()
+            if not SHA256_PATTERN.match(sha256):
+                raise UploadSessionError(f"Invalid sha256 for {file.get('name')}")
+            declared.append({'name': file['name'], 'size': file['size'], 'sha256': sha256})
+
+        if len({file['name'] for file in declared}) != len(declared):
+            raise UploadSessionError("Duplicate file names")
+
+        upload_id = uuid.uuid4().hex
+        stored = await asyncio.gather(
+            *(self.storage.exists_async(content_blob_path(file['sha256'])) for file in declared)
+        )
+        entries = []
+        for file, skip in zip(declared, stored):
+            file['skip'] = skip
+            blob_key = direct_upload_blob_path(upload_id, file['name'])
+            entries.append({
+                'name': file['name'],
+                'skip': skip,
+                'uploadUrl': None if skip else self.storage.get_upload_url(blob_key, DIRECT_UPLOAD_EXPIRY_SECONDS),
+                'headers': {'x-ms-blob-type': 'BlockBlob'}
+            })
+
+        await run_write(self.writer, lambda cursor: cursor.execute("""
+            INSERT INTO direct_uploads (id, project_code, project_metadata, files)
+            VALUES (?, ?, ?, ?)
+        """, (upload_id, project['projectCode'], json.dumps(project), json.dumps(declared))))
+
+        logger.info(f"Initiated direct upload {upload_id} for {project['projectCode']} "
+                    f"({sum(not e['skip'] for e in entries)} of {len(entries)} files to transfer)")
+
+        return {'uploadId': upload_id, 'expiresIn': DIRECT_UPLOAD_EXPIRY_SECONDS, 'files': entries}
+
+    def _load_upload(self, upload_id: str) -> Optional[sqlite3.Row]:
+        conn = self.db_helper.get_connection()
+        try:
+            return conn.execute("SELECT * FROM direct_uploads WHERE id = ?", (upload_id,)).fetchone()
+        finally:
+            conn.close()
+
+    async def complete(self, upload_id: str) -> Dict[str, Any]:
+        """
+        Verify the uploaded blobs, write the files rows and enqueue indexing.
+
+        Completing an already completed upload returns its existing result.
+        Files already registered with the same content are left unchanged and
+        not re-indexed (jobId is None when nothing changed).
+
+        Returns:
+            Dict with projectId, per-file status and jobId
+        """
+        row = await run_db(self._load_upload, upload_id)
+
+        if not row:
+            raise UploadSessionError("Upload not found", 404)
+        if row['status'] == 'completed':
+            return json.loads(row['result'])
+
+        declared = json.loads(row['files'])
+        for file in declared:
+            # Skipped files were already stored under their content key
+            file['blobKey'] = (content_blob_path(file['sha256']) if file.get('skip')
+                               else direct_upload_blob_path(upload_id, file['name']))
+
+        # Check every blob before touching the database. This is only an early
+        # rejection: the hash is verified when ingestion re-hashes the blob.
+        blob_properties = await asyncio.gather(
+            *(self.storage.get_properties_async(file['blobKey']) for file in declared)
+        )
+        for file, properties in zip(declared, blob_properties):
+            if properties is None:
+                raise UploadSessionError(f"{file['name']} has not been uploaded", 409)
+            if properties['size'] != file['size']:
+                raise UploadSessionError(f"{file['name']} size mismatch", 422)
+            if properties['sha256'] and properties['sha256'] != file['sha256']:
+                raise UploadSessionError(f"{file['name']} hash mismatch", 422)
+
+        def register_files(cursor) -> Tuple[int, str, List[Dict[str, Any]], List[Dict[str, Any]]]:
+            project_id, project_status = self.repository.upsert_project(cursor, json.loads(row['project_metadata']))
+
+            uploaded_files = []
+            job_files = []
+            for file in declared:
+                blob_path = f"{row['project_code']}/{file['name']}"
+                file_type = file_type_for(file['name'])
+                file_id, file_status = self.repository.upsert_file(cursor, project_id, {
+                    'fileName': file['name'],
+                    'fileType': file_type,
+                    'fileSize': file['size'],
+                    'blobPath': blob_path,
+                    'contentHash': file['sha256']
+                })
+
+                uploaded_files.append({
+                    'id': file_id,
+                    'name': file['name'],
+                    'type': file_type,
+                    'size': file['size'],
+                    'blobPath': blob_path,
+                    'contentHash': file['sha256'],
+                    'status': file_status
+                })
+                if file_status == 'unchanged':
+                    continue
+                # The worker re-hashes the blob and only then stores it under its content key
+                job_files.append({
+                    'fileId': file_id,
+                    'fileName': file['name'],
+                    'fileType': file_type,
+                    'blobPath': blob_path,
+                    'contentHash': file['sha256'],
+                    'stagedBlob': file['blobKey'],
+                    'clientWritable': not file.get('skip')
+                })
+            return project_id, project_status, uploaded_files, job_files
+
+        project_id, project_status, uploaded_files, job_files = await run_catalog_write(
+            self.repository, self.writer, register_files
+        )
+
+        def enqueue_files(cursor: sqlite3.Cursor) -> Dict[str, Any]:
+            current = cursor.execute(
+                "SELECT status, result FROM direct_uploads WHERE id = ?", (upload_id,)
+            ).fetchone()
+            if current['status'] == 'completed':
+                return json.loads(current['result'])  # Completed concurrently
+
+            job_id = self.ingestion_queue.enqueue(cursor, project_id, job_files) if job_files else None
+
+            result = {
+                'success': True,
+                'uploadId': upload_id,
+                'projectId': project_id,
+                'projectCode': row['project_code'],
+                'projectStatus': project_status,
+                'filesUploaded': len(uploaded_files),
+                'filesChanged': len(job_files),
+                'files': uploaded_files,
+                'jobId': job_id
+            }
+            cursor.execute("""
+                UPDATE direct_uploads
+                SET status = 'completed', result = ?, updated_at = CURRENT_TIMESTAMP
+                WHERE id = ?
+            """, (json.dumps(result), upload_id))
+            return result
+
+        result = await run_write(self.writer, enqueue_files)
+
+        logger.info(f"Completed direct upload {upload_id}: {result['filesUploaded']} files (ingestion job {result['jobId']})")
+        return result
@@ -0,0 +1,108 @@
+"""
+EPAR Data Portal - Instance Warmup
+Primes a new instance before it takes traffic.
+
+Run by the Functions warmup trigger when an instance is added (scale-out) and
+from the command line:
+
+    python api/warmup.py             # warm the database, print the report
+    python api/warmup.py --searches 50
+
+In the Functions host all steps apply: connections are opened, the catalog
+tables, indexes and full-text index are read, the catalog snapshot (with its
+facet lists) is built and the most popular searches fill the search cache.
+From the command line the in-process caches die with the process, so the CLI
+is mainly useful to prime the OS page cache and to time the steps.
+"""
+
+import argparse
+import json
+import logging
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict
+
+# Add parent directory to path to import config
+parent_dir = str(Path(__file__).parent.parent)
+if parent_dir not in sys.path:
+    sys.path.insert(0, parent_dir)
+
+from config import config
+
+logger = logging.getLogger(__name__)
+
+# The landing page search: no query or filters, newest first
+DEFAULT_SEARCH = {'sort': 'date', 'include_files': True}
+
+
+def warm_up(repository, search_cache=None, catalog_cache=None, searches: int = None) -> Dict[str, Any]:
+    """
+    Warm the database and the in-process caches.
+
+    Args:
+        repository: Catalog repository
+        search_cache: SearchCache to fill with the popular searches (optional)
+        catalog_cache: CatalogSnapshotCache to build (optional)
+        searches: Popular searches to replay (default WARMUP_SEARCHES)
+
+    Returns:
+        Report with the result and duration (ms) of each step
+    """
+    searches = config.warmup_searches if searches is None else searches
+    report = {}
+    started = time.perf_counter()
+
+    def step(name, fn):
+        step_started = time.perf_counter()
+        try:
+            report[name] = {'result': fn()}
+        except Exception as e:
+            # A failed step must not keep the instance from serving
+            logger.warning(f"Warmup step {name} failed: {e}")
+            report[name] = {'error': str(e)}
+        report[name]['ms'] = round((time.perf_counter() - step_started) * 1000, 1)
+
+    step('database', repository.warm_up)
+    if catalog_cache is not None:
+        step('catalog', lambda: catalog_cache.get().project_count)
+    if search_cache is not None:
+        def replay():
+            queries = [DEFAULT_SEARCH] + [q for q in search_cache.popular(searches) if q != DEFAULT_SEARCH]
+            for params in queries[:searches + 1]:
+                search_cache.search(count=False, **params)
+            return len(search_cache)
+        step('searches', replay)
+
+    report['ms'] = round((time.perf_counter() - started) * 1000, 1)
+    logger.info(f"Warmup finished in {report['ms']:.0f} ms")
+    return report
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+
+    try:
+        from api.catalog import CatalogSnapshotCache
+        from api.db_helper import db_helper
+        from api.repository import get_repository
+        from api.search_cache import SearchCache
+    except ImportError:
+        from catalog import CatalogSnapshotCache
+        from db_helper import db_helper
+        from repository import get_repository
+        from search_cache import SearchCache
+
+    parser = argparse.ArgumentParser(description="Warm the catalog database and caches")
+    parser.add_argument('--searches', type=int, default=config.warmup_searches,
+                        help=f"Popular searches to replay (default {config.warmup_searches})")
+    args = parser.parse_args()
+
+    repository = get_repository()
+    report = warm_up(
+        repository,
+        search_cache=SearchCache(repository, db_helper.writer),
+        catalog_cache=CatalogSnapshotCache(repository),
+        searches=args.searches
+    )
+    print(json.dumps(report, indent=2))
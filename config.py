@@ -1,11 +1,18 @@
 """
 EPAR Data Portal - Configuration Loader
 Loads configuration from environment variables with fallback to .env files
+
+Every setting is read and validated once, when the Config instance is created,
+and then kept in an immutable snapshot: attribute access is a dict lookup
+instead of os.getenv and Path work on every call. Settings that are only
+required in some modes (BLOB_CONN, DATABASE_URL) raise their ValueError when
+accessed, as before; malformed values fail at startup with every problem listed.
 """
 
 import os
 from pathlib import Path
-from typing import List
+from types import MappingProxyType
+from typing import Dict, List
 
 
 def str_to_bool(value: str) -> bool:
@@ -46,14 +53,107 @@ def load_env_file(env_file: str = '.env.dev') -> None:
                     os.environ[key] = value
 
 
+class MissingSettingError(ValueError):
+    """A setting needed only in some modes is not configured (raised on access)."""
+
+
+class setting:
+    """
+    Config attribute computed from the environment once, when the snapshot is built.
+
+    The decorated method reads and parses the environment variable; afterwards
+    the attribute returns the stored value and cannot be assigned.
+    """
+
+    def __init__(self, read):
+        self.read = read
+        self.__doc__ = read.__doc__
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, obj, owner=None):
+        if obj is None:
+            return self
+        values = obj.__dict__['_values']
+        if self.name not in values:
+            # Still building the snapshot (settings may depend on each other)
+            try:
+                values[self.name] = self.read(obj)
+            except MissingSettingError as e:
+                values[self.name] = e
+        value = values[self.name]
+        if isinstance(value, MissingSettingError):
+            raise value
+        return value
+
+    def __set__(self, obj, value):
+        raise AttributeError(f"config.{self.name} is read-only")
+
+
+# Settings that must be positive / non-negative numbers
+POSITIVE_SETTINGS = (
+    'max_abstract_bytes', 'ingest_max_attempts', 'upload_chunk_size', 'db_pool_size',
+    'fts_hash_shards', 'fts_search_workers', 'catalog_changes_retention_days',
+    'db_write_batch_size', 'profile_interval_ms', 'db_executor_workers', 'search_coalesce_timeout_ms'
+)
+NON_NEGATIVE_SETTINGS = (
+    'ingest_workers', 'ingest_retry_base_seconds', 'query_recorder_slow_ms',
+    'db_busy_timeout_ms', 'db_write_window_ms', 'db_write_retries', 'download_rate_limit',
+    'search_cache_size', 'warmup_searches'
+)
+# Settings that select a mode, with their allowed values
+CHOICE_SETTINGS = {
+    'storage_backend': ('azure', 'local', 'mock'),
+    'database_backend': ('sqlite', 'postgres'),
+    'fts_shard_by': ('none', 'year', 'hash')
+}
+
+
 class Config:
-    """Configuration class that loads from environment variables."""
+    """Configuration snapshot loaded from environment variables (read-only)."""
     
     def __init__(self, env_file: str = '.env.dev'):
-        """Initialize configuration by loading from env file."""
+        """
+        Load the env file and build the snapshot.
+        
+        Raises:
+            ValueError: If any setting is malformed (all problems are listed)
+        """
         load_env_file(env_file)
+        self.__dict__['_values'] = {}
+        
+        errors = []
+        for name, attribute in vars(type(self)).items():
+            if isinstance(attribute, setting):
+                try:
+                    getattr(self, name)
+                except MissingSettingError:
+                    pass
+                except ValueError as e:
+                    errors.append(f"{name}: {e}")
+        
+        values = self.__dict__['_values']
+        for name in POSITIVE_SETTINGS:
+            if name in values and values[name] <= 0:
+                errors.append(f"{name}: must be greater than 0 (got {values[name]})")
+        for name in NON_NEGATIVE_SETTINGS:
+            if name in values and values[name] < 0:
+                errors.append(f"{name}: must not be negative (got {values[name]})")
+        for name, choices in CHOICE_SETTINGS.items():
+            if name in values and values[name] not in choices:
+                errors.append(f"{name}: must be one of {', '.join(choices)} (got {values[name]!r})")
+        if not 0 <= values.get('query_recorder_sample_rate', 1) <= 1:
+            errors.append("query_recorder_sample_rate: must be between 0 and 1")
+        if errors:
+            raise ValueError("Invalid configuration:\n  " + "\n  ".join(errors))
+        
+        self.__dict__['_values'] = MappingProxyType(values)
+    
+    def __setattr__(self, name, value):
+        raise AttributeError(f"config.{name} is read-only")
     
-    @property
+    @setting
     def db_path(self) -> str:
         """Database file path."""
         db_path = os.getenv('DB_PATH', './db/docs.sqlite')
@@ -62,39 +162,39 @@ class Config:
             db_path = str(Path(__file__).parent / db_path)
         return db_path
     
-    @property
+    @setting
     def require_auth(self) -> bool:
         """Whether authentication is required for downloads."""
         return str_to_bool(os.getenv('REQUIRE_AUTH', 'true'))
     
-    @property
+    @setting
     def max_abstract_bytes(self) -> int:
         """Maximum bytes to extract for search indexing."""
         return int(os.getenv('MAX_ABSTRACT_BYTES', '3000'))
     
-    @property
+    @setting
     def supported_extensions(self) -> List[str]:
         """List of supported file extensions."""
         ext_str = os.getenv('SUPPORTED_EXT', '.pdf,.txt,.md,.docx,.xlsx')
         return [ext.strip() for ext in ext_str.split(',')]
     
-    @property
+    @setting
     def blob_container(self) -> str:
         """Azure Blob Storage container name."""
         return os.getenv('BLOB_CONTAINER', 'docs')
     
-    @property
+    @setting
     def blob_connection_string(self) -> str:
         """Azure Blob Storage connection string."""
         conn_str = os.getenv('BLOB_CONN', '')
         if not conn_str or 'YOUR_ACCOUNT' in conn_str:
-            raise ValueError(
+            raise MissingSettingError(
                 "BLOB_CONN not configured. "
                 "Please set your Azure Storage connection string in .env.dev"
             )
         return conn_str
 
-    @property
+    @setting
     def use_azure_storage(self) -> bool:
         """Check if Azure Storage is configured (vs mock mode)."""
         conn_str = os.getenv('BLOB_CONN', '')
@@ -105,13 +205,210 @@ class Config:
         if 'AccountName=' in conn_str and 'AccountKey=' in conn_str:
             return True
         return False
-    
-    @property
+
+    @setting
+    def storage_backend(self) -> str:
+        """Storage backend: azure, local or mock (defaults to azure when configured)."""
+        backend = os.getenv('STORAGE_BACKEND', '').strip().lower()
+        if backend:
+            return backend
+        return 'azure' if self.use_azure_storage else 'mock'
+
+    @setting
+    def local_storage_path(self) -> str:
+        """Root directory for the local filesystem storage backend."""
+        storage_path = os.getenv('LOCAL_STORAGE_PATH', './data/blobs')
+        if not Path(storage_path).is_absolute():
+            storage_path = str(Path(__file__).parent / storage_path)
+        return storage_path
+
+    @setting
+    def local_storage_secret(self) -> str:
+        """Secret used to sign local storage URLs (empty = random per process)."""
+        return os.getenv('LOCAL_STORAGE_SECRET', '')
+
+    @setting
+    def public_api_url(self) -> str:
+        """Public base URL of the API, used to build local download links."""
+        return os.getenv('PUBLIC_API_URL', 'http://localhost:7071/api').rstrip('/')
+
+    @setting
+    def ingest_staging_path(self) -> str:
+        """Directory where uploaded files wait for background ingestion."""
+        staging_path = os.getenv('INGEST_STAGING_PATH', './data/staging')
+        if not Path(staging_path).is_absolute():
+            staging_path = str(Path(__file__).parent / staging_path)
+        return staging_path
+
+    @setting
+    def ingest_workers(self) -> int:
+        """Number of in-process ingestion worker threads (0 = CLI only)."""
+        return int(os.getenv('INGEST_WORKERS', '2'))
+
+    @setting
+    def ingest_max_attempts(self) -> int:
+        """Maximum attempts before an ingestion job is marked failed."""
+        return int(os.getenv('INGEST_MAX_ATTEMPTS', '5'))
+
+    @setting
+    def ingest_retry_base_seconds(self) -> float:
+        """Base delay for exponential retry backoff of ingestion jobs."""
+        return float(os.getenv('INGEST_RETRY_BASE_SECONDS', '2'))
+
+    @setting
+    def upload_chunk_size(self) -> int:
+        """Default chunk size for resumable upload sessions (bytes)."""
+        return int(os.getenv('UPLOAD_CHUNK_SIZE', str(8 * 1024 * 1024)))
+
+    @setting
+    def database_backend(self) -> str:
+        """Catalog database: sqlite (default) or postgres."""
+        return os.getenv('DATABASE_BACKEND', 'sqlite').strip().lower()
+
+    @setting
+    def database_url(self) -> str:
+        """PostgreSQL connection string (used when DATABASE_BACKEND=postgres)."""
+        url = os.getenv('DATABASE_URL', '')
+        if not url:
+            raise MissingSettingError(
+                "DATABASE_URL not configured. "
+                "Please set a PostgreSQL connection string in .env.dev"
+            )
+        return url
+
+    @setting
+    def db_pool_size(self) -> int:
+        """Maximum pooled connections per instance for the PostgreSQL backend."""
+        return int(os.getenv('DB_POOL_SIZE', '10'))
+
+    @setting
+    def fts_shard_by(self) -> str:
+        """Full-text index sharding: none (default), year (completion year) or hash (project ID)."""
+        return os.getenv('FTS_SHARD_BY', 'none').strip().lower()
+
+    @setting
+    def fts_hash_shards(self) -> int:
+        """Number of shards when FTS_SHARD_BY=hash."""
+        return int(os.getenv('FTS_HASH_SHARDS', '8'))
+
+    @setting
+    def fts_shard_path(self) -> str:
+        """Directory holding the FTS shard databases."""
+        shard_path = os.getenv('FTS_SHARD_PATH', './db/fts_shards')
+        if not Path(shard_path).is_absolute():
+            shard_path = str(Path(__file__).parent / shard_path)
+        return shard_path
+
+    @setting
+    def fts_search_workers(self) -> int:
+        """Threads used to search FTS shards in parallel."""
+        return int(os.getenv('FTS_SEARCH_WORKERS', '4'))
+
+    @setting
+    def catalog_changes_retention_days(self) -> int:
+        """Days of catalog change history kept for /changes (older cursors get 410)."""
+        return int(os.getenv('CATALOG_CHANGES_RETENTION_DAYS', '30'))
+
+    @setting
+    def query_recorder(self) -> bool:
+        """Record query shapes, latencies and slow query plans (see tools/query_advisor.py)."""
+        return str_to_bool(os.getenv('QUERY_RECORDER', 'false'))
+
+    @setting
+    def query_recorder_path(self) -> str:
+        """Workload database the query recorder writes to."""
+        recorder_path = os.getenv('QUERY_RECORDER_PATH', './db/query_workload.sqlite')
+        if not Path(recorder_path).is_absolute():
+            recorder_path = str(Path(__file__).parent / recorder_path)
+        return recorder_path
+
+    @setting
+    def query_recorder_sample_rate(self) -> float:
+        """Fraction of queries the recorder samples."""
+        return float(os.getenv('QUERY_RECORDER_SAMPLE_RATE', '1.0'))
+
+    @setting
+    def query_recorder_slow_ms(self) -> float:
+        """Queries at least this slow get their EXPLAIN QUERY PLAN captured."""
+        return float(os.getenv('QUERY_RECORDER_SLOW_MS', '50'))
+
+    @setting
+    def search_cache_size(self) -> int:
+        """Search results kept per instance for the current catalog generation (0 = off)."""
+        return int(os.getenv('SEARCH_CACHE_SIZE', '256'))
+
+    @setting
+    def search_coalesce_timeout_ms(self) -> float:
+        """How long requests sharing one in-flight search wait for it before failing."""
+        return float(os.getenv('SEARCH_COALESCE_TIMEOUT_MS', '10000'))
+
+    @setting
+    def query_budgets_ms(self) -> Dict[str, float]:
+        """Time budget of each route's database queries, e.g. search=2000,changes=5000 (0 = none)."""
+        budgets = {}
+        for item in os.getenv('QUERY_BUDGETS_MS', 'search=2000,changes=5000').split(','):
+            if not item.strip():
+                continue
+            route, separator, ms = item.partition('=')
+            if not separator or float(ms) < 0:
+                raise ValueError(f"expected route=milliseconds, got {item.strip()!r}")
+            budgets[route.strip()] = float(ms)
+        return MappingProxyType(budgets)
+
+    @setting
+    def warmup_searches(self) -> int:
+        """Most popular searches run by the warmup hook to fill the search cache."""
+        return int(os.getenv('WARMUP_SEARCHES', '20'))
+
+    @setting
+    def profile_token(self) -> str:
+        """Secret that enables request profiling via the X-Profile header (empty = off)."""
+        return os.getenv('PROFILE_TOKEN', '')
+
+    @setting
+    def profile_path(self) -> str:
+        """Directory for request profiles (collapsed stacks and SQL statements)."""
+        profile_path = os.getenv('PROFILE_PATH', './data/profiles')
+        if not Path(profile_path).is_absolute():
+            profile_path = str(Path(__file__).parent / profile_path)
+        return profile_path
+
+    @setting
+    def profile_interval_ms(self) -> float:
+        """Stack sampling interval of request profiles."""
+        return float(os.getenv('PROFILE_INTERVAL_MS', '1'))
+
+    @setting
+    def db_busy_timeout_ms(self) -> int:
+        """How long a connection waits for a database lock before failing."""
+        return int(os.getenv('DB_BUSY_TIMEOUT_MS', '5000'))
+
+    @setting
+    def db_write_batch_size(self) -> int:
+        """Maximum write intents committed together by the database writer."""
+        return int(os.getenv('DB_WRITE_BATCH_SIZE', '64'))
+
+    @setting
+    def db_write_window_ms(self) -> float:
+        """How long the database writer waits to group more writes into a commit."""
+        return float(os.getenv('DB_WRITE_WINDOW_MS', '5'))
+
+    @setting
+    def db_write_retries(self) -> int:
+        """Retries of BEGIN/COMMIT while the database is busy."""
+        return int(os.getenv('DB_WRITE_RETRIES', '3'))
+
+    @setting
+    def db_executor_workers(self) -> int:
+        """Threads that run the database calls of the async HTTP routes."""
+        return int(os.getenv('DB_EXECUTOR_WORKERS', '8'))
+
+    @setting
     def download_rate_limit(self) -> int:
         """Download rate limit (requests per minute)."""
         return int(os.getenv('DOWNLOAD_RATE_LIMIT', '30'))
     
-    @property
+    @setting
     def log_level(self) -> str:
         """Logging level."""
         return os.getenv('LOG_LEVEL', 'INFO')
@@ -129,6 +426,8 @@ if __name__ == '__main__':
     print(f"  Max Abstract Bytes: {config.max_abstract_bytes}")
     print(f"  Supported Extensions: {config.supported_extensions}")
     print(f"  Blob Container: {config.blob_container}")
+    print(f"  Storage Backend: {config.storage_backend}")
+    print(f"  Database Backend: {config.database_backend}")
     print(f"  Download Rate Limit: {config.download_rate_limit}")
     print(f"  Log Level: {config.log_level}")
     
@@ -0,0 +1,420 @@
+"""
+EPAR Data Portal - Bulk Import
+Loads historical project archives from a manifest plus a directory tree.
+
+The manifest (CSV or JSONL) has one row per file. Project metadata is repeated
+on every row of a project; the first row seen for a project code wins:
+
+    project_code, title, research_areas, date_initial_request, date_completion,
+    po_contact, other_pos, agdev_partner, output_type, geographies, file_path
+
+file_path is relative to the archive root. In CSV, list columns (research_areas,
+other_pos, geographies) are separated by ';'; in JSONL they may be arrays.
+
+Usage:
+    python db/bulk_import.py manifest.csv /path/to/archive [--batch-size 5000]
+        [--workers N] [--upload]
+"""
+
+import argparse
+import csv
+import hashlib
+import json
+import sqlite3
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+# Add parent directory to path to import config
+parent_dir = str(Path(__file__).parent.parent)
+if parent_dir not in sys.path:
+    sys.path.insert(0, parent_dir)
+
+from config import config
+from api.db_helper import UPSERT_PROJECT_SQL, db_helper
+from api.extraction import CHUNK_SIZE, extract_text
+from db.init_db import refresh_project_aggregates
+
+# Triggers suspended during the load; the FTS index and the project file
+# aggregates are caught up afterwards
+SUSPENDED_TRIGGERS = ('files_ai', 'files_agg_ai')
+
+LIST_FIELDS = ('research_areas', 'other_pos', 'geographies')
+REQUIRED_FIELDS = ('project_code', 'title', 'file_path')
+
+# Storage backend of the current worker process (created on first use)
+_storage = None
+
+
+# ============================================================================
+# MANIFEST
+# ============================================================================
+
+def _parse_list(value: Any) -> List[str]:
+    """Normalize a list column (JSON array or ';'-separated string)."""
+    if isinstance(value, list):
+        return [str(item).strip() for item in value if str(item).strip()]
+    if not value:
+        return []
+    return [item.strip() for item in str(value).split(';') if item.strip()]
+
+
+def read_manifest(manifest_path: str) -> Iterator[Dict[str, Any]]:
+    """
+    Stream manifest rows as dictionaries.
+
+    Args:
+        manifest_path: Path to a .csv or .jsonl manifest
+
+    Returns:
+        Iterator of rows with list columns normalized
+    """
+    with open(manifest_path, 'r', encoding='utf-8', newline='') as f:
+        if manifest_path.lower().endswith(('.jsonl', '.ndjson')):
+            rows = (json.loads(line) for line in f if line.strip())
+        else:
+            rows = csv.DictReader(f)
+
+        for line_number, row in enumerate(rows, start=1):
+            missing = [field for field in REQUIRED_FIELDS if not row.get(field)]
+            if missing:
+                raise ValueError(f"Manifest row {line_number} is missing {', '.join(missing)}")
+            for field in LIST_FIELDS:
+                row[field] = _parse_list(row.get(field))
+            yield row
+
+
+def _batches(rows: Iterator[Dict[str, Any]], size: int) -> Iterator[List[Dict[str, Any]]]:
+    """Group rows into lists of at most size rows."""
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+# ============================================================================
+# FILE PREPARATION (runs in worker processes)
+# ============================================================================
+
+def prepare_file(path: str, upload: bool = False, known_hash: str = None) -> Dict[str, Any]:
+    """
+    Hash a file, extract its text and optionally store it by content hash.
+
+    Args:
+        path: Absolute path of the file
+        upload: Upload the contents to the configured storage backend
+        known_hash: Content hash already recorded for this file; when it still
+            matches, extraction and upload are skipped
+
+    Returns:
+        Dictionary with size, contentHash and text (or unchanged), or error
+    """
+    global _storage
+
+    try:
+        digest = hashlib.sha256()
+        size = 0
+        with open(path, 'rb') as f:
+            while True:
+                chunk = f.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                size += len(chunk)
+            content_hash = digest.hexdigest()
+            if content_hash == known_hash:
+                return {'size': size, 'contentHash': content_hash, 'unchanged': True}
+            f.seek(0)
+            text = extract_text(Path(path).name, f)
+
+        if upload:
+            from api.storage import content_blob_path, get_storage
+            if _storage is None:
+                _storage = get_storage()
+            blob_key = content_blob_path(content_hash)
+            if not _storage.exists(blob_key):
+                _storage.upload_file(blob_key, str(path))
+
+        return {'size': size, 'contentHash': content_hash, 'text': text}
+
+    except Exception as e:
+        return {'error': str(e)}
+
+
+# ============================================================================
+# DATABASE LOAD
+# ============================================================================
+
+def suspend_triggers(conn: sqlite3.Connection) -> Dict[str, str]:
+    """
+    Drop the per-row insert triggers and return their definitions.
+
+    Returns:
+        Trigger name -> CREATE TRIGGER statement, for restore_triggers
+    """
+    placeholders = ','.join('?' * len(SUSPENDED_TRIGGERS))
+    saved = dict(conn.execute(
+        f"SELECT name, sql FROM sqlite_master WHERE type = 'trigger' AND name IN ({placeholders})",
+        SUSPENDED_TRIGGERS
+    ).fetchall())
+    for name in saved:
+        conn.execute(f"DROP TRIGGER {name}")
+    conn.commit()
+    return saved
+
+
+def restore_triggers(conn: sqlite3.Connection, saved: Dict[str, str]):
+    """Recreate triggers dropped by suspend_triggers."""
+    for sql in saved.values():
+        conn.execute(sql)
+    conn.commit()
+
+
+def rebuild_fts(conn: sqlite3.Connection, after_file_id: int) -> int:
+    """
+    Index files added while the insert trigger was suspended, then merge segments.
+
+    files_fts stores its own copy of the content (it is not an external-content
+    table), so 'rebuild' cannot repopulate it from files; the new rows are
+    indexed with one INSERT ... SELECT and 'optimize' merges the result.
+
+    Returns:
+        Number of files indexed
+    """
+    conn.execute("DELETE FROM files_fts WHERE rowid > ?", (after_file_id,))
+    cursor = conn.execute("""
+        INSERT INTO files_fts(rowid, file_id, project_code, title, file_name, text_content)
+        SELECT f.id, f.id, p.project_code, p.title, f.file_name, f.text_content
+        FROM files f
+        JOIN projects p ON p.id = f.project_id
+        WHERE f.id > ?
+    """, (after_file_id,))
+    indexed = cursor.rowcount
+    conn.execute("INSERT INTO files_fts(files_fts) VALUES('optimize')")
+    conn.commit()
+    return indexed
+
+
+def _upsert_projects(
+    conn: sqlite3.Connection,
+    batch: List[Dict[str, Any]],
+    project_ids: Dict[str, int],
+    seen: set
+) -> None:
+    """
+    Create or update the projects first seen in this batch and record their IDs.
+
+    Unchanged projects are not rewritten (see UPSERT_PROJECT_SQL).
+    """
+    new_projects = {}
+    for row in batch:
+        code = row['project_code']
+        if code not in seen and code not in new_projects:
+            new_projects[code] = row
+    if not new_projects:
+        return
+
+    conn.executemany(UPSERT_PROJECT_SQL, [(
+        row['project_code'],
+        row['title'],
+        json.dumps(row['research_areas']),
+        row.get('date_initial_request', ''),
+        row.get('date_completion', ''),
+        row.get('po_contact', ''),
+        json.dumps(row['other_pos']),
+        row.get('agdev_partner', ''),
+        row.get('output_type', ''),
+        json.dumps(row['geographies'])
+    ) for row in new_projects.values()])
+    seen.update(new_projects)
+
+    codes = list(new_projects)
+    for start in range(0, len(codes), 500):
+        chunk = codes[start:start + 500]
+        placeholders = ','.join('?' * len(chunk))
+        project_ids.update(conn.execute(
+            f"SELECT project_code, id FROM projects WHERE project_code IN ({placeholders})", chunk
+        ).fetchall())
+
+
+def _known_hashes(conn: sqlite3.Connection, blob_paths: List[str]) -> Dict[str, Optional[str]]:
+    """Map blob paths that are already imported to their content hash."""
+    known = {}
+    for start in range(0, len(blob_paths), 500):
+        chunk = blob_paths[start:start + 500]
+        placeholders = ','.join('?' * len(chunk))
+        known.update(conn.execute(
+            f"SELECT blob_path, content_hash FROM files WHERE blob_path IN ({placeholders})", chunk
+        ).fetchall())
+    return known
+
+
+def bulk_import(
+    manifest_path: str,
+    root_dir: str,
+    batch_size: int = 5000,
+    workers: Optional[int] = None,
+    upload: bool = False,
+    db_path: str = None
+) -> Dict[str, Any]:
+    """
+    Import a manifest into the database.
+
+    Each batch is prepared in a process pool (hashing, text extraction, optional
+    upload) and written with executemany in its own transaction. Files already
+    imported under the same path are compared by content hash: unchanged files
+    are skipped without extraction, changed files are updated in place.
+
+    Args:
+        manifest_path: CSV or JSONL manifest
+        root_dir: Directory that manifest file_path values are relative to
+        batch_size: Files per transaction
+        workers: Worker processes (defaults to the CPU count)
+        upload: Store file contents in the configured storage backend
+        db_path: Database path (defaults to config.db_path)
+
+    Returns:
+        Import statistics
+    """
+    conn = sqlite3.connect(db_path or config.db_path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA cache_size=-65536")  # 64 MB
+
+    root = Path(root_dir).resolve()
+    project_ids = {}
+    seen_projects = set()
+    new_file_projects = set()
+    start_file_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM files").fetchone()[0]
+    stats = {'rows': 0, 'created': 0, 'updated': 0, 'unchanged': 0, 'failed': 0, 'indexed': 0}
+    started = time.perf_counter()
+
+    saved_triggers = suspend_triggers(conn)
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for batch in _batches(read_manifest(manifest_path), batch_size):
+                for row in batch:
+                    row['file_name'] = Path(row['file_path']).name
+                    row['blob_path'] = f"{row['project_code']}/{row['file_name']}"
+                known = _known_hashes(conn, [row['blob_path'] for row in batch])
+
+                prepared = list(executor.map(
+                    prepare_file,
+                    [str(root / row['file_path']) for row in batch],
+                    [upload] * len(batch),
+                    [known.get(row['blob_path']) for row in batch],
+                    chunksize=32
+                ))
+
+                ready = []
+                for row, result in zip(batch, prepared):
+                    if 'error' in result:
+                        print(f"  ✗ {row['file_path']}: {result['error']}")
+                        stats['failed'] += 1
+                    elif result.get('unchanged'):
+                        stats['unchanged'] += 1
+                    else:
+                        ready.append((row, result))
+
+                # Metadata may change even when every file is unchanged
+                _upsert_projects(
+                    conn,
+                    [row for row, result in zip(batch, prepared) if 'error' not in result],
+                    project_ids,
+                    seen_projects
+                )
+
+                new_rows = []
+                changed_rows = []
+                for row, result in ready:
+                    file_name = row['file_name']
+                    values = (
+                        project_ids[row['project_code']],
+                        file_name.split('.')[-1].lower() if '.' in file_name else 'unknown',
+                        result['size'],
+                        result['contentHash'],
+                        result['text']
+                    )
+                    if row['blob_path'] in known:
+                        changed_rows.append(values + (row['blob_path'],))
+                    else:
+                        new_rows.append(values + (file_name, row['blob_path']))
+                        new_file_projects.add(values[0])
+
+                conn.executemany("""
+                    INSERT OR IGNORE INTO files (
+                        project_id, file_type, file_size, content_hash, text_content,
+                        file_name, blob_path
+                    ) VALUES (?, ?, ?, ?, ?, ?, ?)
+                """, new_rows)
+                # files_au stays active and rewrites the FTS row only if the text changed
+                conn.executemany("""
+                    UPDATE files
+                    SET project_id = ?, file_type = ?, file_size = ?, content_hash = ?,
+                        text_content = ?, upload_date = CURRENT_TIMESTAMP
+                    WHERE blob_path = ?
+                """, changed_rows)
+                conn.commit()
+
+                stats['created'] += len(new_rows)
+                stats['updated'] += len(changed_rows)
+                stats['rows'] += len(batch)
+
+                elapsed = time.perf_counter() - started
+                print(f"  {stats['rows']} rows: {stats['created']} new, {stats['updated']} updated, "
+                      f"{stats['unchanged']} unchanged ({stats['rows'] / elapsed:.0f} rows/s)")
+    finally:
+        conn.rollback()
+        stats['indexed'] = rebuild_fts(conn, start_file_id)
+        refresh_project_aggregates(conn, new_file_projects)
+        restore_triggers(conn, saved_triggers)
+        conn.close()
+
+    # Shard databases are caught up from the change queue
+    if db_helper.shards and Path(db_path or config.db_path) == Path(db_helper.db_path):
+        stats['sharded'] = db_helper.shards.sync(batch_size)
+        db_helper.writer.stop()
+
+    stats['projects'] = len(project_ids)
+    stats['seconds'] = round(time.perf_counter() - started, 2)
+    stats['rowsPerSecond'] = round(stats['rows'] / stats['seconds']) if stats['seconds'] else 0
+    return stats
+
+
+def main():
+    """Main function."""
+
+    parser = argparse.ArgumentParser(description="Bulk import project archives")
+    parser.add_argument('manifest', help="CSV or JSONL manifest (one row per file)")
+    parser.add_argument('root', help="Directory that file_path values are relative to")
+    parser.add_argument('--batch-size', type=int, default=5000, help="Files per transaction")
+    parser.add_argument('--workers', type=int, default=None, help="Extraction processes")
+    parser.add_argument('--upload', action='store_true', help="Store files in the configured storage backend")
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("EPAR Data Portal - Bulk Import")
+    print("=" * 60)
+
+    stats = bulk_import(args.manifest, args.root, args.batch_size, args.workers, args.upload)
+
+    print("\n" + "=" * 60)
+    print(f"✓ Imported {stats['rows']} rows in {stats['seconds']}s ({stats['rowsPerSecond']} rows/s)")
+    print(f"  New files: {stats['created']}")
+    print(f"  Updated files: {stats['updated']}")
+    print(f"  Unchanged files: {stats['unchanged']}")
+    print(f"  Failed: {stats['failed']}")
+    print(f"  FTS5 entries added: {stats['indexed']}")
+    if 'sharded' in stats:
+        print(f"  FTS shard changes applied: {stats['sharded']}")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
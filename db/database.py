@@ -19,7 +19,7 @@ from config import config
 
 def get_connection() -> sqlite3.Connection:
     """Get database connection with row factory."""
-    conn = sqlite3.connect(config.db_path)
+    conn = sqlite3.connect(config.db_path, timeout=config.db_busy_timeout_ms / 1000)
     conn.row_factory = sqlite3.Row  # Access columns by name
     return conn
 
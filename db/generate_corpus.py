@@ -0,0 +1,385 @@
+"""
+EPAR Data Portal - Synthetic Corpus Generator
+Builds catalog databases of any size for benchmarks and capacity tests.
+
+The corpus is deterministic: the same seed and size always produce the same
+projects, files and text. Facet values (research areas, geographies, partners,
+program officers, output types, file types) are drawn with skewed weights, and
+file text follows a Zipf distribution over a domain vocabulary padded with
+made-up words, so full-text queries hit common, mid-frequency and rare terms
+the way real reports do.
+
+Usage:
+    python db/generate_corpus.py --files 100000 --db ./db/bench-100k.sqlite
+    python db/generate_corpus.py --files 1000000 --db /tmp/bench-1m.sqlite --seed 7
+"""
+
+import argparse
+import hashlib
+import itertools
+import json
+import random
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Sequence
+
+# Add parent directory to path to import config
+parent_dir = str(Path(__file__).parent.parent)
+if parent_dir not in sys.path:
+    sys.path.insert(0, parent_dir)
+
+from config import config
+from db.bulk_import import rebuild_fts, restore_triggers, suspend_triggers
+from db.init_db import create_database, refresh_project_aggregates
+
+# ============================================================================
+# VOCABULARY
+# ============================================================================
+
+RESEARCH_AREAS = [
+    'Agricultural Economics', 'Food Security', 'Market Systems', 'Rural Development',
+    'Gender Studies', 'Agricultural Extension', 'Climate Adaptation', 'Nutrition',
+    'Livestock', 'Soil Health', 'Water Management', 'Financial Inclusion',
+    'Seed Systems', 'Post-Harvest Loss', 'Digital Agriculture', 'Land Tenure',
+    'Value Chains', 'Crop Insurance', 'Mechanization', 'Aquaculture',
+    'Agroforestry', 'Input Subsidies', 'Youth Employment', 'Trade Policy'
+]
+
+GEOGRAPHIES = [
+    'Kenya', 'Tanzania', 'Uganda', 'Ethiopia', 'Nigeria', 'Ghana', 'Rwanda', 'Malawi',
+    'Mozambique', 'Zambia', 'Burkina Faso', 'Mali', 'Senegal', 'Niger', 'India',
+    'Bangladesh', 'Nepal', 'Pakistan', 'Myanmar', 'Cambodia', 'Vietnam', 'Indonesia',
+    'Philippines', 'Haiti', 'Guatemala', 'Honduras', 'Zimbabwe', 'Madagascar',
+    'Sierra Leone', 'Liberia', 'South Sudan', 'Somalia', 'Benin', "Côte d'Ivoire",
+    'Cameroon', 'Democratic Republic of the Congo', 'Sub-Saharan Africa', 'South Asia'
+]
+
+OUTPUT_TYPES = [
+    'Final Report', 'Technical Note', 'Policy Brief', 'Literature Review',
+    'Dataset', 'Working Paper', 'Presentation', 'Evaluation'
+]
+
+FIRST_NAMES = [
+    'Sarah', 'John', 'Michael', 'Emily', 'David', 'Grace', 'Amina', 'Joseph', 'Priya',
+    'Daniel', 'Fatuma', 'Peter', 'Rachel', 'Samuel', 'Mary', 'Kwame', 'Lucy', 'Ahmed',
+    'Esther', 'James', 'Nadia', 'Thomas', 'Wanjiru', 'Carlos'
+]
+
+LAST_NAMES = [
+    'Johnson', 'Smith', 'Chen', 'Davis', 'Rodriguez', 'Okafor', 'Mwangi', 'Patel',
+    'Nguyen', 'Mensah', 'Haile', 'Kamau', 'Banda', 'Diallo', 'Sharma', 'Anderson',
+    'Otieno', 'Traore', 'Rahman', 'Garcia', 'Kiprop', 'Moyo', 'Osei', 'Lee'
+]
+
+PARTNER_PREFIXES = [
+    'National', 'International', 'African', 'Regional', 'Global', 'Rural', 'Smallholder',
+    'Applied', 'Sustainable', 'Tropical', 'Cooperative', 'East African', 'West African'
+]
+
+PARTNER_TOPICS = [
+    'Agricultural Research', 'Food Policy', 'Livestock', 'Crop Science', 'Development',
+    'Seed', 'Farmers', 'Nutrition', 'Water', 'Microfinance', 'Extension', 'Trade'
+]
+
+PARTNER_SUFFIXES = ['Institute', 'Network', 'Foundation', 'Alliance', 'Centre', 'Programme', 'Council']
+
+TITLE_TEMPLATES = [
+    '{area} in {geography}', 'Assessment of {area} in {geography}', '{area} and {area2} in {geography}',
+    'Review of {area} Programs', 'Impacts of {area} on {area2}', '{geography} {area} Landscape',
+    'Evidence on {area} Interventions', 'Cost-Effectiveness of {area} in {geography}'
+]
+
+# (extension, weight, median size in bytes, file name stems)
+FILE_TYPES = [
+    ('pdf', 45, 1_500_000, ['Final_Report', 'Technical_Note', 'Policy_Brief', 'Annex', 'Literature_Review']),
+    ('xlsx', 20, 800_000, ['Data_Analysis', 'Survey_Data', 'Field_Data', 'Budget', 'Indicators']),
+    ('docx', 20, 400_000, ['Draft_Report', 'Interview_Notes', 'Methodology', 'Terms_of_Reference']),
+    ('txt', 8, 40_000, ['README', 'Codebook', 'Notes']),
+    ('md', 7, 20_000, ['Summary', 'Changelog', 'Data_Dictionary'])
+]
+
+# Domain words, most frequent first; made-up words fill the long tail
+DOMAIN_WORDS = (
+    "the of and in to for farmers agricultural households market production data survey "
+    "analysis maize women rural crop prices income food security yields access land "
+    "program impact policy seed fertilizer smallholder extension services rainfall "
+    "livestock inputs adoption value chain nutrition children credit cooperative "
+    "productivity intervention baseline endline sample district region village harvest "
+    "storage irrigation drought climate soil beans rice cassava sorghum millet dairy "
+    "poultry goats cattle trade export import subsidy voucher mobile banking savings "
+    "insurance training gender youth labor wages employment consumption poverty "
+    "welfare expenditure evaluation randomized treatment control estimates regression "
+    "heterogeneity costs benefits returns profitability transport roads markets traders "
+    "processors aggregators contract quality certification standards agronomy pests "
+    "disease vaccination veterinary fisheries aquaculture forestry agroforestry tenure "
+    "rights titling groundnut sesame coffee cocoa tea cotton horticulture vegetables "
+    "fruit postharvest losses drying aflatoxin micronutrients stunting diets diversity"
+).split()
+
+SYLLABLES = [c + v for c in 'bdfgklmnprstvwz' for v in 'aeiou']
+
+# Zipf exponent of word frequencies in file text
+ZIPF_EXPONENT = 1.07
+
+
+class CorpusGenerator:
+    """Deterministic source of synthetic projects and files."""
+
+    def __init__(self, seed: int = 0, vocabulary_size: int = 20000):
+        """
+        Initialize the generator.
+
+        Args:
+            seed: Random seed; the same seed yields the same corpus
+            vocabulary_size: Distinct words in file text
+        """
+        self.seed = seed
+        self.rng = random.Random(seed)
+        self.vocabulary = self._build_vocabulary(vocabulary_size)
+        self._word_weights = list(itertools.accumulate(
+            1 / rank ** ZIPF_EXPONENT for rank in range(1, len(self.vocabulary) + 1)
+        ))
+        self.partners = [
+            f"{prefix} {topic} {suffix}"
+            for prefix in PARTNER_PREFIXES for topic in PARTNER_TOPICS for suffix in PARTNER_SUFFIXES
+        ]
+        random.Random(seed + 1).shuffle(self.partners)
+        self.people = [f"{first} {last}" for first in FIRST_NAMES for last in LAST_NAMES]
+        random.Random(seed + 2).shuffle(self.people)
+        self._rank_weights: Dict[int, List[float]] = {}
+
+    def _build_vocabulary(self, size: int) -> List[str]:
+        rng = random.Random(self.seed)
+        words = list(dict.fromkeys(DOMAIN_WORDS))
+        seen = set(words)
+        while len(words) < size:
+            word = ''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4)))
+            if word not in seen:
+                seen.add(word)
+                words.append(word)
+        return words
+
+    def _skewed(self, values: Sequence[str], count: int) -> List[str]:
+        """Distinct values, earlier ones far more often (Zipf-like)."""
+        weights = self._rank_weights.get(len(values))
+        if weights is None:
+            weights = self._rank_weights[len(values)] = list(itertools.accumulate(
+                1 / rank for rank in range(1, len(values) + 1)
+            ))
+        picked = []
+        while len(picked) < count:
+            value = self.rng.choices(values, cum_weights=weights)[0]
+            if value not in picked:
+                picked.append(value)
+        return picked
+
+    def text(self, max_bytes: int) -> str:
+        """File text of a few dozen to a few hundred Zipf-distributed words."""
+        words = self.rng.choices(
+            self.vocabulary, cum_weights=self._word_weights, k=int(self.rng.lognormvariate(5, 0.6))
+        )
+        text = ' '.join(words)
+        if len(text) > max_bytes:
+            text = text[:text.rfind(' ', 0, max_bytes)]
+        return text
+
+    def project(self, number: int) -> Dict[str, Any]:
+        """Project metadata of the number-th project (no files)."""
+        rng = self.rng
+        year = rng.randint(2008, 2025)
+        start_month = rng.randint(1, 12)
+        end = year * 12 + start_month - 1 + rng.randint(2, 18)
+        areas = self._skewed(RESEARCH_AREAS, rng.choice((1, 1, 2, 2, 3)))
+        geographies = self._skewed(GEOGRAPHIES, rng.choice((1, 1, 1, 2, 3)))
+        title = rng.choice(TITLE_TEMPLATES).format(
+            area=areas[0], area2=areas[-1] if len(areas) > 1 else rng.choice(RESEARCH_AREAS),
+            geography=geographies[0]
+        )
+        people = self._skewed(self.people[:60], rng.randint(1, 3))
+        return {
+            'project_code': f"EPAR-{year}-{number:06d}",
+            'title': title,
+            'research_areas': areas,
+            'date_initial_request': f"{year}-{start_month:02d}",
+            'date_completion': f"{end // 12}-{end % 12 + 1:02d}",
+            'po_contact': people[0],
+            'other_pos': people[1:],
+            'agdev_partner': self._skewed(self.partners[:300], 1)[0],
+            'output_type': self._skewed(OUTPUT_TYPES, 1)[0],
+            'geographies': geographies
+        }
+
+    def files(self, project: Dict[str, Any], count: int, max_bytes: int) -> List[Dict[str, Any]]:
+        """count files of a project, with unique names and text."""
+        rng = self.rng
+        files = []
+        completion = project['date_completion']
+        for index in range(count):
+            extension, _, median_size, stems = rng.choices(FILE_TYPES, weights=[t[1] for t in FILE_TYPES])[0]
+            name = f"{rng.choice(stems)}_{index + 1}.{extension}"
+            blob_path = f"{project['project_code']}/{name}"
+            files.append({
+                'name': name,
+                'type': extension,
+                'size': max(1, int(rng.lognormvariate(0, 1) * median_size)),
+                'blob_path': blob_path,
+                'content_hash': hashlib.sha256(f"{self.seed}:{blob_path}".encode('utf-8')).hexdigest(),
+                'text': self.text(max_bytes),
+                'upload_date': f"{completion}-{rng.randint(1, 28):02d} {rng.randint(0, 23):02d}:{rng.randint(0, 59):02d}:00"
+            })
+        return files
+
+    def projects(self, file_count: int, files_per_project: float = 8.0) -> Iterator[Dict[str, Any]]:
+        """
+        Projects with their files, until file_count files are generated.
+
+        Files per project are geometrically distributed around files_per_project.
+        """
+        max_bytes = config.max_abstract_bytes
+        remaining = file_count
+        for number in itertools.count(1):
+            if remaining <= 0:
+                return
+            count = min(remaining, 1 + int(self.rng.expovariate(1 / max(files_per_project - 1, 0.01))))
+            project = self.project(number)
+            project['files'] = self.files(project, count, max_bytes)
+            remaining -= count
+            yield project
+
+    def query_terms(self, band: str, count: int = 10) -> List[str]:
+        """
+        Words to search for, by frequency band.
+
+        Args:
+            band: 'common' (among the top 20 content words), 'medium' (rank ~500)
+                or 'rare' (rank ~5000)
+            count: Number of terms
+        """
+        # Skip the stop words at the top of DOMAIN_WORDS
+        starts = {'common': 6, 'medium': 500, 'rare': 5000}
+        start = min(starts[band], max(len(self.vocabulary) - count, 0))
+        return self.vocabulary[start:start + count]
+
+
+# ============================================================================
+# DATABASE BUILD
+# ============================================================================
+
+def generate_corpus(
+    db_path: str,
+    file_count: int,
+    seed: int = 0,
+    files_per_project: float = 8.0,
+    batch_size: int = 5000
+) -> Dict[str, Any]:
+    """
+    Create a database at db_path and fill it with a synthetic corpus.
+
+    Loads like db/bulk_import.py: rows are written with executemany while the
+    per-row FTS and aggregate triggers are suspended, then the index and the
+    project aggregates are caught up.
+
+    Args:
+        db_path: New database file (must not exist)
+        file_count: Files to generate
+        seed: Random seed
+        files_per_project: Mean files per project
+        batch_size: Files per transaction
+
+    Returns:
+        Generation statistics
+    """
+    if Path(db_path).exists():
+        raise FileExistsError(f"{db_path} already exists")
+
+    started = time.perf_counter()
+    conn = create_database(db_path)
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA cache_size=-65536")  # 64 MB
+
+    generator = CorpusGenerator(seed)
+    stats = {'projects': 0, 'files': 0, 'indexed': 0}
+    saved_triggers = suspend_triggers(conn)
+    try:
+        batch = []
+
+        def write(batch):
+            first_id = conn.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM projects").fetchone()[0]
+            conn.executemany("""
+                INSERT INTO projects (
+                    id, project_code, title, research_areas, date_initial_request,
+                    date_completion, po_contact, other_pos, agdev_partner,
+                    output_type, geographies
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, [(
+                project_id, p['project_code'], p['title'], json.dumps(p['research_areas']),
+                p['date_initial_request'], p['date_completion'], p['po_contact'],
+                json.dumps(p['other_pos']), p['agdev_partner'], p['output_type'],
+                json.dumps(p['geographies'])
+            ) for project_id, p in enumerate(batch, start=first_id)])
+            conn.executemany("""
+                INSERT INTO files (
+                    project_id, file_name, file_type, file_size, blob_path,
+                    content_hash, text_content, upload_date
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """, [
+                (project_id, f['name'], f['type'], f['size'], f['blob_path'],
+                 f['content_hash'], f['text'], f['upload_date'])
+                for project_id, p in enumerate(batch, start=first_id) for f in p['files']
+            ])
+            conn.commit()
+
+        pending = 0
+        for project in generator.projects(file_count, files_per_project):
+            batch.append(project)
+            pending += len(project['files'])
+            stats['projects'] += 1
+            stats['files'] += len(project['files'])
+            if pending >= batch_size:
+                write(batch)
+                batch, pending = [], 0
+                elapsed = time.perf_counter() - started
+                print(f"  {stats['files']} files in {stats['projects']} projects ({stats['files'] / elapsed:.0f} files/s)")
+        if batch:
+            write(batch)
+    finally:
+        conn.rollback()
+        stats['indexed'] = rebuild_fts(conn, 0)
+        refresh_project_aggregates(conn)
+        conn.commit()
+        restore_triggers(conn, saved_triggers)
+        conn.execute("ANALYZE")
+        conn.close()
+
+    stats['seed'] = seed
+    stats['seconds'] = round(time.perf_counter() - started, 2)
+    return stats
+
+
+def main():
+    """Main function."""
+
+    parser = argparse.ArgumentParser(description="Generate a synthetic catalog database")
+    parser.add_argument('--files', type=int, required=True, help="Files to generate")
+    parser.add_argument('--db', required=True, help="Database file to create")
+    parser.add_argument('--seed', type=int, default=0, help="Random seed (default 0)")
+    parser.add_argument('--files-per-project', type=float, default=8.0, help="Mean files per project")
+    parser.add_argument('--batch-size', type=int, default=5000, help="Files per transaction")
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("EPAR Data Portal - Synthetic Corpus")
+    print("=" * 60)
+
+    stats = generate_corpus(args.db, args.files, args.seed, args.files_per_project, args.batch_size)
+
+    print("\n" + "=" * 60)
+    print(f"✓ Generated {stats['files']} files in {stats['projects']} projects ({stats['seconds']}s)")
+    print(f"  FTS5 entries: {stats['indexed']}")
+    print(f"  Location: {args.db}")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
@@ -15,6 +15,7 @@ if parent_dir not in sys.path:
     sys.path.insert(0, parent_dir)
 
 from config import config
+from api.fts_shards import drop_shard_queue, install_shard_queue
 
 
 def create_database(db_path: str):
@@ -46,6 +47,10 @@ def create_database(db_path: str):
             agdev_partner TEXT,
             output_type TEXT,
             geographies TEXT,  -- JSON array
+            file_count INTEGER NOT NULL DEFAULT 0,  -- Maintained by the files_agg_* triggers
+            total_bytes INTEGER NOT NULL DEFAULT 0,
+            file_types TEXT NOT NULL DEFAULT '[]',  -- JSON array, sorted
+            last_upload_date TEXT,
             created_at TEXT DEFAULT CURRENT_TIMESTAMP,
             updated_at TEXT DEFAULT CURRENT_TIMESTAMP
         )
@@ -61,7 +66,8 @@ def create_database(db_path: str):
             file_name TEXT NOT NULL,
             file_type TEXT NOT NULL,
             file_size INTEGER,  -- Size in bytes
-            blob_path TEXT UNIQUE NOT NULL,
+            blob_path TEXT UNIQUE NOT NULL,  -- Logical path: {project_code}/{file_name}
+            content_hash TEXT,  -- SHA-256 of the contents; blob stored once under content/sha256/
             text_content TEXT,  -- Extracted text for search (limited to MAX_ABSTRACT_BYTES)
             upload_date TEXT DEFAULT CURRENT_TIMESTAMP,
             FOREIGN KEY (project_id) REFERENCES projects(id) ON DELETE CASCADE
@@ -84,12 +90,18 @@ def create_database(db_path: str):
     # ========================================================================
     # Triggers: Keep FTS5 index in sync with files table
     # ========================================================================
+    # files_fts rows use the file ID as their rowid, so a file's entry is
+    # found by rowid instead of scanning the index for file_id.
+    
+    # Replace triggers from older versions (full-index scans, fired on any column)
+    migrate_fts_triggers(conn)
     
     # Trigger: Insert
     cursor.execute("""
         CREATE TRIGGER IF NOT EXISTS files_ai AFTER INSERT ON files BEGIN
-            INSERT INTO files_fts(file_id, project_code, title, file_name, text_content)
+            INSERT INTO files_fts(rowid, file_id, project_code, title, file_name, text_content)
             SELECT 
+                new.id,
                 new.id,
                 p.project_code,
                 p.title,
@@ -103,16 +115,21 @@ def create_database(db_path: str):
     # Trigger: Delete
     cursor.execute("""
         CREATE TRIGGER IF NOT EXISTS files_ad AFTER DELETE ON files BEGIN
-            DELETE FROM files_fts WHERE file_id = old.id;
+            DELETE FROM files_fts WHERE rowid = old.id;
         END
     """)
     
-    # Trigger: Update
+    # Trigger: Update (only when an indexed column actually changes)
     cursor.execute("""
-        CREATE TRIGGER IF NOT EXISTS files_au AFTER UPDATE ON files BEGIN
-            DELETE FROM files_fts WHERE file_id = old.id;
-            INSERT INTO files_fts(file_id, project_code, title, file_name, text_content)
+        CREATE TRIGGER IF NOT EXISTS files_au AFTER UPDATE OF file_name, text_content, project_id ON files
+        WHEN old.file_name IS NOT new.file_name
+            OR old.text_content IS NOT new.text_content
+            OR old.project_id IS NOT new.project_id
+        BEGIN
+            DELETE FROM files_fts WHERE rowid = old.id;
+            INSERT INTO files_fts(rowid, file_id, project_code, title, file_name, text_content)
             SELECT 
+                new.id,
                 new.id,
                 p.project_code,
                 p.title,
@@ -123,12 +140,203 @@ def create_database(db_path: str):
         END
     """)
     
+    # Trigger: Project code/title change rewrites only that project's entries
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS projects_au AFTER UPDATE OF project_code, title ON projects
+        WHEN old.project_code IS NOT new.project_code OR old.title IS NOT new.title
+        BEGIN
+            UPDATE files_fts
+            SET project_code = new.project_code, title = new.title
+            WHERE rowid IN (SELECT id FROM files WHERE project_id = new.id);
+        END
+    """)
+    
+    # Sharded index (FTS_SHARD_BY): queue changes for the shard databases,
+    # which are built with python api/fts_shards.py build
+    if config.fts_shard_by in ('year', 'hash'):
+        install_shard_queue(conn)
+    else:
+        drop_shard_queue(conn)
+    
+    # ========================================================================
+    # Table 4: ingestion_jobs - Background ingestion queue
+    # ========================================================================
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS ingestion_jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            project_id INTEGER NOT NULL,
+            status TEXT NOT NULL DEFAULT 'queued',  -- queued, running, succeeded, failed
+            payload TEXT NOT NULL,  -- JSON array of files to ingest
+            attempts INTEGER NOT NULL DEFAULT 0,
+            max_attempts INTEGER NOT NULL DEFAULT 5,
+            last_error TEXT,
+            next_attempt_at REAL NOT NULL,  -- Unix timestamp
+            locked_until REAL,  -- Lease expiry while running
+            created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+            updated_at TEXT DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (project_id) REFERENCES projects(id) ON DELETE CASCADE
+        )
+    """)
+
+    # ========================================================================
+    # Tables 5-6: upload_sessions - Resumable chunked uploads
+    # ========================================================================
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS upload_sessions (
+            id TEXT PRIMARY KEY,
+            project_code TEXT NOT NULL,
+            project_metadata TEXT NOT NULL,  -- JSON, used to create the project on finalize
+            file_name TEXT NOT NULL,
+            file_size INTEGER NOT NULL,
+            chunk_size INTEGER NOT NULL,
+            status TEXT NOT NULL DEFAULT 'open',  -- open, finalized
+            file_id INTEGER,
+            job_id INTEGER,
+            created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+            updated_at TEXT DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS upload_session_chunks (
+            session_id TEXT NOT NULL,
+            chunk_index INTEGER NOT NULL,
+            length INTEGER NOT NULL,
+            received_at TEXT DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (session_id, chunk_index),
+            FOREIGN KEY (session_id) REFERENCES upload_sessions(id) ON DELETE CASCADE
+        )
+    """)
+    
+    # ========================================================================
+    # Table 7: direct_uploads - Client uploads straight to storage
+    # ========================================================================
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS direct_uploads (
+            id TEXT PRIMARY KEY,
+            project_code TEXT NOT NULL,
+            project_metadata TEXT NOT NULL,  -- JSON
+            files TEXT NOT NULL,  -- JSON array of declared {name, size, sha256}
+            status TEXT NOT NULL DEFAULT 'pending',  -- pending, completed
+            result TEXT,  -- JSON response returned by /upload/complete
+            created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+            updated_at TEXT DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    
+    # ========================================================================
+    # Table 8: catalog_changes - Change feed for incremental client sync
+    # ========================================================================
+    # Appended to by the triggers below; /changes?since=<seq> reads it. Commits
+    # go through a single writer, so seq order is commit order.
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS catalog_changes (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            entity TEXT NOT NULL,  -- project, file
+            entity_id INTEGER NOT NULL,
+            op TEXT NOT NULL,  -- insert, update, delete
+            changed_at TEXT DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    
+    for entity, table in (('project', 'projects'), ('file', 'files')):
+        cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {table}_log_ai AFTER INSERT ON {table} BEGIN
+                INSERT INTO catalog_changes (entity, entity_id, op) VALUES ('{entity}', new.id, 'insert');
+            END
+        """)
+        cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {table}_log_ad AFTER DELETE ON {table} BEGIN
+                INSERT INTO catalog_changes (entity, entity_id, op) VALUES ('{entity}', old.id, 'delete');
+            END
+        """)
+    
+    # Project upserts only write when metadata changed
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS projects_log_au AFTER UPDATE ON projects BEGIN
+            INSERT INTO catalog_changes (entity, entity_id, op) VALUES ('project', new.id, 'update');
+        END
+    """)
+    
+    # File rows: only columns clients see (not text_content or content_hash)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS files_log_au
+        AFTER UPDATE OF file_name, file_type, file_size, blob_path, project_id ON files
+        WHEN old.file_name IS NOT new.file_name
+            OR old.file_type IS NOT new.file_type
+            OR old.file_size IS NOT new.file_size
+            OR old.blob_path IS NOT new.blob_path
+            OR old.project_id IS NOT new.project_id
+        BEGIN
+            INSERT INTO catalog_changes (entity, entity_id, op) VALUES ('file', new.id, 'update');
+        END
+    """)
+    
+    # Search results also depend on file text, which the change log leaves out:
+    # search_index_version advances when text changes (and when FTS shards sync),
+    # so cached searches are keyed on both
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS search_index_version (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            version INTEGER NOT NULL
+        )
+    """)
+    cursor.execute("INSERT OR IGNORE INTO search_index_version (id, version) VALUES (1, 0)")
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS files_text_au AFTER UPDATE OF text_content ON files
+        WHEN old.text_content IS NOT new.text_content
+        BEGIN
+            UPDATE search_index_version SET version = version + 1;
+        END
+    """)
+    
+    # Bring databases created by older versions up to date
+    added_columns = migrate_schema(conn)
+    
+    # ========================================================================
+    # Table 9: project_file_types - File types per project (fileTypes filter)
+    # ========================================================================
+    # With the aggregate columns on projects, list views and file type filters
+    # never read the files table. file_count is the number of files of that
+    # type, so a type disappears when its last file does.
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS project_file_types (
+            project_id INTEGER NOT NULL,
+            file_type TEXT NOT NULL,
+            file_count INTEGER NOT NULL,
+            PRIMARY KEY (project_id, file_type)
+        ) WITHOUT ROWID
+    """)
+    
+    for statement in PROJECT_AGGREGATE_TRIGGERS:
+        cursor.execute(statement)
+    
+    if ('projects', 'file_count') in added_columns:
+        refresh_project_aggregates(conn)
+        print("✓ Computed project file aggregates")
+
+    # ========================================================================
+    # Table 10: popular_searches - Search hit counts for cache warmup
+    # ========================================================================
+    # Written in batches by api/search_cache.py; the warmup hook replays the
+    # most popular searches on new instances.
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS popular_searches (
+            search_key TEXT PRIMARY KEY,  -- Canonical JSON of the search_files arguments
+            hits INTEGER NOT NULL DEFAULT 0,
+            last_seen TEXT NOT NULL
+        )
+    """)
+
     # ========================================================================
     # Indexes for better query performance
     # ========================================================================
     cursor.execute("CREATE INDEX IF NOT EXISTS idx_files_project_id ON files(project_id)")
     cursor.execute("CREATE INDEX IF NOT EXISTS idx_files_blob_path ON files(blob_path)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_files_content_hash ON files(content_hash)")
     cursor.execute("CREATE INDEX IF NOT EXISTS idx_projects_code ON projects(project_code)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_project_file_types_type ON project_file_types(file_type, project_id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_ingestion_jobs_ready ON ingestion_jobs(status, next_attempt_at)")
     
     conn.commit()
     print("✓ Database schema created successfully")
@@ -136,6 +344,171 @@ def create_database(db_path: str):
     return conn
 
 
+# Columns added after the initial schema: table -> [(column, declaration)]
+SCHEMA_MIGRATIONS = {
+    'files': [
+        ('content_hash', 'TEXT'),
+    ],
+    'projects': [
+        ('file_count', 'INTEGER NOT NULL DEFAULT 0'),
+        ('total_bytes', 'INTEGER NOT NULL DEFAULT 0'),
+        ('file_types', "TEXT NOT NULL DEFAULT '[]'"),
+        ('last_upload_date', 'TEXT'),
+    ],
+}
+
+# Sorted JSON array of a project's file types
+_FILE_TYPES_SQL = """(
+    SELECT json_group_array(file_type) FROM (
+        SELECT file_type FROM project_file_types WHERE project_id = projects.id ORDER BY file_type
+    )
+)"""
+
+# Keep projects.file_count/total_bytes/file_types/last_upload_date and
+# project_file_types current. Each trigger updates a project row once, so it
+# logs one catalog change per project.
+PROJECT_AGGREGATE_TRIGGERS = [
+    f"""
+    CREATE TRIGGER IF NOT EXISTS files_agg_ai AFTER INSERT ON files BEGIN
+        INSERT INTO project_file_types (project_id, file_type, file_count)
+        VALUES (new.project_id, new.file_type, 1)
+        ON CONFLICT(project_id, file_type) DO UPDATE SET file_count = file_count + 1;
+        UPDATE projects SET
+            file_count = file_count + 1,
+            total_bytes = total_bytes + COALESCE(new.file_size, 0),
+            file_types = {_FILE_TYPES_SQL},
+            last_upload_date = CASE
+                WHEN last_upload_date IS NULL OR new.upload_date > last_upload_date THEN new.upload_date
+                ELSE last_upload_date
+            END
+        WHERE id = new.project_id;
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS files_agg_ad AFTER DELETE ON files BEGIN
+        UPDATE project_file_types SET file_count = file_count - 1
+        WHERE project_id = old.project_id AND file_type = old.file_type;
+        DELETE FROM project_file_types
+        WHERE project_id = old.project_id AND file_type = old.file_type AND file_count <= 0;
+        UPDATE projects SET
+            file_count = file_count - 1,
+            total_bytes = total_bytes - COALESCE(old.file_size, 0),
+            file_types = {_FILE_TYPES_SQL},
+            last_upload_date = (SELECT MAX(upload_date) FROM files WHERE project_id = old.project_id)
+        WHERE id = old.project_id;
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS files_agg_au
+    AFTER UPDATE OF project_id, file_type, file_size, upload_date ON files
+    WHEN old.project_id IS NOT new.project_id
+        OR old.file_type IS NOT new.file_type
+        OR old.file_size IS NOT new.file_size
+        OR old.upload_date IS NOT new.upload_date
+    BEGIN
+        UPDATE project_file_types SET file_count = file_count - 1
+        WHERE project_id = old.project_id AND file_type = old.file_type;
+        DELETE FROM project_file_types
+        WHERE project_id = old.project_id AND file_type = old.file_type AND file_count <= 0;
+        INSERT INTO project_file_types (project_id, file_type, file_count)
+        VALUES (new.project_id, new.file_type, 1)
+        ON CONFLICT(project_id, file_type) DO UPDATE SET file_count = file_count + 1;
+        UPDATE projects SET
+            file_count = file_count + (id = new.project_id) - (id = old.project_id),
+            total_bytes = total_bytes
+                + CASE WHEN id = new.project_id THEN COALESCE(new.file_size, 0) ELSE 0 END
+                - CASE WHEN id = old.project_id THEN COALESCE(old.file_size, 0) ELSE 0 END,
+            file_types = {_FILE_TYPES_SQL},
+            last_upload_date = (SELECT MAX(upload_date) FROM files WHERE project_id = projects.id)
+        WHERE id IN (old.project_id, new.project_id);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS projects_agg_ad AFTER DELETE ON projects BEGIN
+        DELETE FROM project_file_types WHERE project_id = old.id;
+    END
+    """,
+]
+
+
+def refresh_project_aggregates(conn: sqlite3.Connection, project_ids=None):
+    """
+    Recompute the file aggregates of some (default: all) projects from files.
+    
+    Used after adding the aggregate columns and after bulk loads that suspend
+    files_agg_ai.
+    """
+    
+    cursor = conn.cursor()
+    scope = "1=1"
+    params = []
+    if project_ids is not None:
+        scope = "{column} IN (SELECT value FROM json_each(?))"
+        params = [json.dumps(list(project_ids))]
+    
+    cursor.execute(f"DELETE FROM project_file_types WHERE {scope.format(column='project_id')}", params)
+    cursor.execute(f"""
+        INSERT INTO project_file_types (project_id, file_type, file_count)
+        SELECT project_id, file_type, COUNT(*) FROM files
+        WHERE {scope.format(column='project_id')}
+        GROUP BY project_id, file_type
+    """, params)
+    cursor.execute(f"""
+        UPDATE projects SET
+            (file_count, total_bytes, last_upload_date) = (
+                SELECT COUNT(*), COALESCE(SUM(file_size), 0), MAX(upload_date)
+                FROM files WHERE project_id = projects.id
+            ),
+            file_types = {_FILE_TYPES_SQL}
+        WHERE {scope.format(column='id')}
+    """, params)
+
+
+def migrate_schema(conn: sqlite3.Connection):
+    """
+    Add columns introduced after the initial schema to existing tables.
+    
+    Returns:
+        Set of (table, column) pairs that were added
+    """
+    
+    cursor = conn.cursor()
+    added = set()
+    for table, columns in SCHEMA_MIGRATIONS.items():
+        existing = {row[1] for row in cursor.execute(f"PRAGMA table_info({table})")}
+        for column, declaration in columns:
+            if column not in existing:
+                cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {declaration}")
+                added.add((table, column))
+                print(f"✓ Added column {table}.{column}")
+    return added
+
+
+def migrate_fts_triggers(conn: sqlite3.Connection):
+    """
+    Drop FTS triggers created by older versions and re-key files_fts by file ID.
+    
+    Older triggers did not set the FTS rowid and refreshed the index on every
+    files update; create_database recreates them afterwards.
+    """
+    
+    cursor = conn.cursor()
+    row = cursor.execute("SELECT sql FROM sqlite_master WHERE type = 'trigger' AND name = 'files_au'").fetchone()
+    if row is None or 'UPDATE OF' in row[0]:
+        return
+    
+    for trigger in ('files_ai', 'files_ad', 'files_au'):
+        cursor.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+    cursor.execute("DELETE FROM files_fts")
+    cursor.execute("""
+        INSERT INTO files_fts(rowid, file_id, project_code, title, file_name, text_content)
+        SELECT f.id, f.id, p.project_code, p.title, f.file_name, f.text_content
+        FROM files f
+        JOIN projects p ON p.id = f.project_id
+    """)
+    print("✓ Rebuilt FTS5 index keyed by file ID")
+
+
 def populate_mock_data(conn: sqlite3.Connection):
     """Populate database with mock data for testing."""
     
@@ -284,12 +657,14 @@ def main():
     print("=" * 60)
     
     db_path = config.db_path
+    schema_only = '--schema-only' in sys.argv
     
-    # Create database
+    # Create database (safe to re-run: only missing objects are created)
     conn = create_database(db_path)
     
     # Populate with mock data
-    populate_mock_data(conn)
+    if not schema_only:
+        populate_mock_data(conn)
     
     # Verify
     verify_database(conn)
@@ -304,4 +679,3 @@ def main():
 
 if __name__ == "__main__":
     main()
-
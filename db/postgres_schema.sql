@@ -0,0 +1,214 @@
+-- EPAR Data Portal - PostgreSQL catalog schema
+-- Used when DATABASE_BACKEND=postgres. Safe to re-run.
+-- Ingestion jobs and upload sessions stay in each instance's local SQLite file.
+
+-- ============================================================================
+-- Table 1: projects - Project metadata (facets as text[] for GIN overlap)
+-- ============================================================================
+CREATE TABLE IF NOT EXISTS projects (
+    id BIGSERIAL PRIMARY KEY,
+    project_code TEXT UNIQUE NOT NULL,
+    title TEXT NOT NULL,
+    research_areas TEXT[] NOT NULL DEFAULT '{}',
+    date_initial_request TEXT,
+    date_completion TEXT,
+    po_contact TEXT,
+    other_pos TEXT[] NOT NULL DEFAULT '{}',
+    agdev_partner TEXT,
+    output_type TEXT,
+    geographies TEXT[] NOT NULL DEFAULT '{}',
+    file_count INTEGER NOT NULL DEFAULT 0,  -- Maintained by files_aggregates
+    total_bytes BIGINT NOT NULL DEFAULT 0,
+    file_types TEXT[] NOT NULL DEFAULT '{}',  -- Sorted, GIN-indexed for the fileTypes filter
+    last_upload_date TIMESTAMPTZ,
+    created_at TIMESTAMPTZ DEFAULT now(),
+    updated_at TIMESTAMPTZ DEFAULT now()
+);
+
+-- ============================================================================
+-- Table 2: files - File metadata with a full-text search vector
+-- ============================================================================
+CREATE TABLE IF NOT EXISTS files (
+    id BIGSERIAL PRIMARY KEY,
+    project_id BIGINT NOT NULL REFERENCES projects(id) ON DELETE CASCADE,
+    file_name TEXT NOT NULL,
+    file_type TEXT NOT NULL,
+    file_size BIGINT,
+    blob_path TEXT UNIQUE NOT NULL,  -- Logical path: {project_code}/{file_name}
+    content_hash TEXT,  -- SHA-256; blob stored once under content/sha256/
+    text_content TEXT,  -- Extracted text (limited to MAX_ABSTRACT_BYTES)
+    search_vector TSVECTOR,  -- project code + title, file name, text ('simple' config)
+    upload_date TIMESTAMPTZ DEFAULT now()
+);
+
+-- ============================================================================
+-- Search vector maintenance (replaces the SQLite files_fts triggers)
+-- ============================================================================
+CREATE OR REPLACE FUNCTION files_search_vector() RETURNS trigger AS $$
+DECLARE
+    header TSVECTOR;
+BEGIN
+    SELECT setweight(to_tsvector('simple', p.project_code || ' ' || p.title), 'A')
+    INTO header
+    FROM projects p
+    WHERE p.id = NEW.project_id;
+
+    NEW.search_vector := coalesce(header, ''::tsvector)
+        -- The parser keeps names like Draft_Report_4.docx as one token; split
+        -- them into words like SQLite's unicode61 tokenizer does
+        || setweight(to_tsvector('simple', regexp_replace(coalesce(NEW.file_name, ''), '[^[:alnum:]]+', ' ', 'g')), 'B')
+        || setweight(to_tsvector('simple', coalesce(NEW.text_content, '')), 'C');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS files_search_vector ON files;
+CREATE TRIGGER files_search_vector
+    BEFORE INSERT OR UPDATE OF file_name, text_content, project_id ON files
+    FOR EACH ROW EXECUTE FUNCTION files_search_vector();
+
+-- A project code/title change refreshes only that project's files
+CREATE OR REPLACE FUNCTION projects_search_vector() RETURNS trigger AS $$
+BEGIN
+    UPDATE files SET file_name = file_name WHERE project_id = NEW.id;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS projects_search_vector ON projects;
+CREATE TRIGGER projects_search_vector
+    AFTER UPDATE OF project_code, title ON projects
+    FOR EACH ROW
+    WHEN (OLD.project_code IS DISTINCT FROM NEW.project_code OR OLD.title IS DISTINCT FROM NEW.title)
+    EXECUTE FUNCTION projects_search_vector();
+
+-- ============================================================================
+-- Per-project file aggregates (list views and fileTypes never read files)
+-- ============================================================================
+ALTER TABLE projects ADD COLUMN IF NOT EXISTS file_count INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE projects ADD COLUMN IF NOT EXISTS total_bytes BIGINT NOT NULL DEFAULT 0;
+ALTER TABLE projects ADD COLUMN IF NOT EXISTS file_types TEXT[] NOT NULL DEFAULT '{}';
+ALTER TABLE projects ADD COLUMN IF NOT EXISTS last_upload_date TIMESTAMPTZ;
+
+-- Recomputed from the project's files (uses idx_files_project_id); only
+-- writes when a value changed, so unchanged projects log no change
+CREATE OR REPLACE FUNCTION refresh_project_aggregates(target BIGINT) RETURNS void AS $$
+BEGIN
+    UPDATE projects p SET
+        file_count = agg.file_count,
+        total_bytes = agg.total_bytes,
+        file_types = agg.file_types,
+        last_upload_date = agg.last_upload_date
+    FROM (
+        SELECT count(*)::int AS file_count,
+            coalesce(sum(file_size), 0) AS total_bytes,
+            coalesce(array_agg(DISTINCT file_type ORDER BY file_type) FILTER (WHERE file_type IS NOT NULL), '{}') AS file_types,
+            max(upload_date) AS last_upload_date
+        FROM files WHERE project_id = target
+    ) agg
+    WHERE p.id = target
+      AND (p.file_count, p.total_bytes, p.file_types, p.last_upload_date)
+          IS DISTINCT FROM (agg.file_count, agg.total_bytes, agg.file_types, agg.last_upload_date);
+END
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION files_aggregates() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM refresh_project_aggregates(OLD.project_id);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') AND (TG_OP = 'INSERT' OR NEW.project_id IS DISTINCT FROM OLD.project_id) THEN
+        PERFORM refresh_project_aggregates(NEW.project_id);
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS files_aggregates ON files;
+CREATE TRIGGER files_aggregates
+    AFTER INSERT OR DELETE OR UPDATE OF project_id, file_type, file_size, upload_date ON files
+    FOR EACH ROW EXECUTE FUNCTION files_aggregates();
+
+-- Backfill projects created before the aggregate columns existed
+SELECT refresh_project_aggregates(p.id)
+FROM projects p
+WHERE p.file_count = 0 AND EXISTS (SELECT 1 FROM files f WHERE f.project_id = p.id);
+
+-- ============================================================================
+-- Table 3: catalog_changes - Change feed for incremental client sync
+-- ============================================================================
+CREATE TABLE IF NOT EXISTS catalog_changes (
+    seq BIGSERIAL PRIMARY KEY,
+    entity TEXT NOT NULL,  -- project, file
+    entity_id BIGINT NOT NULL,
+    op TEXT NOT NULL,  -- insert, update, delete
+    changed_at TIMESTAMPTZ DEFAULT now()
+);
+
+-- The transaction-scoped lock makes seq order equal commit order, so a reader
+-- never sees seq N+1 before N commits (catalog writes are infrequent)
+CREATE OR REPLACE FUNCTION log_catalog_change() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_advisory_xact_lock(hashtext('catalog_changes'));
+    INSERT INTO catalog_changes (entity, entity_id, op)
+    VALUES (
+        TG_ARGV[0],
+        CASE WHEN TG_OP = 'DELETE' THEN OLD.id ELSE NEW.id END,
+        lower(TG_OP)
+    );
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS projects_log ON projects;
+CREATE TRIGGER projects_log
+    AFTER INSERT OR UPDATE OR DELETE ON projects
+    FOR EACH ROW EXECUTE FUNCTION log_catalog_change('project');
+
+DROP TRIGGER IF EXISTS files_log ON files;
+CREATE TRIGGER files_log
+    AFTER INSERT OR DELETE ON files
+    FOR EACH ROW EXECUTE FUNCTION log_catalog_change('file');
+
+-- File rows: only columns clients see (not text_content or content_hash)
+DROP TRIGGER IF EXISTS files_log_update ON files;
+CREATE TRIGGER files_log_update
+    AFTER UPDATE OF file_name, file_type, file_size, blob_path, project_id ON files
+    FOR EACH ROW
+    WHEN ((OLD.file_name, OLD.file_type, OLD.file_size, OLD.blob_path, OLD.project_id)
+          IS DISTINCT FROM (NEW.file_name, NEW.file_type, NEW.file_size, NEW.blob_path, NEW.project_id))
+    EXECUTE FUNCTION log_catalog_change('file');
+
+-- Search results also depend on file text, which the change log leaves out:
+-- search_index_version advances when text changes, so cached searches are
+-- keyed on both
+CREATE TABLE IF NOT EXISTS search_index_version (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    version BIGINT NOT NULL
+);
+INSERT INTO search_index_version (id, version) VALUES (1, 0) ON CONFLICT (id) DO NOTHING;
+
+CREATE OR REPLACE FUNCTION bump_search_index_version() RETURNS trigger AS $$
+BEGIN
+    UPDATE search_index_version SET version = version + 1;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS files_text_update ON files;
+CREATE TRIGGER files_text_update
+    AFTER UPDATE OF text_content ON files
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_search_index_version();
+
+-- ============================================================================
+-- Indexes
+-- ============================================================================
+CREATE INDEX IF NOT EXISTS idx_files_search_vector ON files USING GIN (search_vector);
+CREATE INDEX IF NOT EXISTS idx_files_project_id ON files(project_id);
+CREATE INDEX IF NOT EXISTS idx_files_content_hash ON files(content_hash);
+CREATE INDEX IF NOT EXISTS idx_projects_research_areas ON projects USING GIN (research_areas);
+CREATE INDEX IF NOT EXISTS idx_projects_geographies ON projects USING GIN (geographies);
+CREATE INDEX IF NOT EXISTS idx_projects_file_types ON projects USING GIN (file_types);
+CREATE INDEX IF NOT EXISTS idx_projects_output_type ON projects(output_type);
+CREATE INDEX IF NOT EXISTS idx_projects_po_contact ON projects(po_contact);
+CREATE INDEX IF NOT EXISTS idx_projects_date_completion ON projects(date_completion DESC NULLS LAST);
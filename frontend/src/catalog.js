@@ -0,0 +1,70 @@
+// Client-side copy of the catalog from GET /api/catalog.
+// The snapshot is dictionary-encoded: facet values live in `dictionaries` and
+// projects reference them by index. The browser revalidates it with its ETag,
+// so it is only downloaded again after the catalog changes.
+
+const formatSize = (bytes) => (bytes ? `${(bytes / 1024 / 1024).toFixed(1)} MB` : 'Unknown')
+
+// Decode the snapshot into the same project shape /api/search returns
+export function decodeCatalog(snapshot) {
+  const { dictionaries: d } = snapshot
+  const column = Object.fromEntries(snapshot.columns.map((name, i) => [name, i]))
+
+  return snapshot.projects.map((row) => {
+    const projectCode = row[column.projectCode]
+    const files = row[column.files]
+    return {
+      id: row[column.id],
+      projectCode,
+      title: row[column.title],
+      dateInitialRequest: row[column.dateInitialRequest],
+      dateCompletion: row[column.dateCompletion],
+      poContact: row[column.poContact] === null ? null : d.people[row[column.poContact]],
+      otherPos: row[column.otherPos].map((i) => d.people[i]),
+      agdevPartner: row[column.agdevPartner] === null ? '' : d.agdevPartners[row[column.agdevPartner]],
+      outputType: row[column.outputType] === null ? null : d.outputTypes[row[column.outputType]],
+      researchAreas: row[column.researchAreas].map((i) => d.researchAreas[i]),
+      geographies: row[column.geographies].map((i) => d.geographies[i]),
+      // Aggregates /api/search reads from projects, derived from the file rows
+      fileCount: files.length,
+      totalBytes: files.reduce((total, [, , , size]) => total + (size || 0), 0),
+      fileTypes: [...new Set(files.map(([, , type]) => d.fileTypes[type]))].sort(),
+      lastUploadDate: row[column.lastUploadDate],
+      files: files.map(([id, name, type, size, blobPath]) => ({
+        id,
+        name,
+        type: d.fileTypes[type],
+        size: formatSize(size),
+        blobPath: blobPath ?? `${projectCode}/${name}`
+      }))
+    }
+  })
+}
+
+export async function loadCatalog(apiBaseUrl) {
+  // no-cache: always revalidate, reuse the cached copy on 304
+  const response = await fetch(`${apiBaseUrl}/catalog`, { cache: 'no-cache' })
+  if (!response.ok) {
+    throw new Error(`Catalog API error: ${response.status}`)
+  }
+  return decodeCatalog(await response.json())
+}
+
+// Same rules as /api/search: OR within a category, AND between categories,
+// newest completion date first
+export function filterCatalog(projects, filters) {
+  const matchesAny = (selected, values) =>
+    selected.length === 0 || selected.some((value) => values.includes(value))
+
+  return projects
+    .filter((project) =>
+      matchesAny(filters.researchAreas, project.researchAreas) &&
+      matchesAny(filters.geographies, project.geographies) &&
+      matchesAny(filters.outputTypes, [project.outputType]) &&
+      matchesAny(filters.poContacts, [project.poContact]) &&
+      matchesAny(filters.fileTypes, project.fileTypes) &&
+      (!filters.dateFrom || (project.dateCompletion && project.dateCompletion >= filters.dateFrom)) &&
+      (!filters.dateTo || (project.dateCompletion && project.dateCompletion <= filters.dateTo))
+    )
+    .sort((a, b) => (b.dateCompletion || '').localeCompare(a.dateCompletion || ''))
+}
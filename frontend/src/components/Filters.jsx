@@ -102,6 +102,28 @@ function Filters({ filters, filterOptions, onFilterChange }) {
           </div>
         )}
       </div>
+
+      <div className="filter-group">
+        <label className="filter-label">File Type</label>
+        <select 
+          className="filter-select"
+          onChange={(e) => handleMultiSelectChange('fileTypes', e.target.value)}
+          value=""
+          aria-label="Filter by file type"
+        >
+          <option value="">Select file type...</option>
+          {filterOptions.fileTypes.map((type) => (
+            <option key={type} value={type}>
+              {type} {filters.fileTypes.includes(type) ? '✓' : ''}
+            </option>
+          ))}
+        </select>
+        {filters.fileTypes.length > 0 && (
+          <div style={{ marginTop: '0.5rem', fontSize: '0.75rem' }}>
+            Selected: {filters.fileTypes.join(', ')}
+          </div>
+        )}
+      </div>
     </div>
   )
 }
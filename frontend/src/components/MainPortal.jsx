@@ -4,6 +4,7 @@ import ProjectCard from './ProjectCard'
 import SearchBar from './SearchBar'
 import Filters from './Filters'
 import EmptyState from './EmptyState'
+import { loadCatalog, filterCatalog } from '../catalog'
 
 const API_BASE_URL = 'http://localhost:7071/api'
 
@@ -14,6 +15,7 @@ function MainPortal({ userName, onSignOut, onOpenHelp, onSwitchToUploader }) {
     geographies: [],
     outputTypes: [],
     poContacts: [],
+    fileTypes: [],
     dateFrom: '',
     dateTo: ''
   })
@@ -22,12 +24,29 @@ function MainPortal({ userName, onSignOut, onOpenHelp, onSwitchToUploader }) {
   const [projects, setProjects] = useState([])
   const [loading, setLoading] = useState(false)
   const [error, setError] = useState(null)
+  const [catalog, setCatalog] = useState(null)
   const resultsPerPage = 10
 
+  // Load the catalog snapshot once; filter-only searches run locally on it
+  useEffect(() => {
+    if (!hasSearched || catalog) return
+
+    loadCatalog(API_BASE_URL)
+      .then(setCatalog)
+      .catch((err) => console.warn('Catalog snapshot unavailable, using /search:', err))
+  }, [hasSearched, catalog])
+
   // Fetch projects from backend API
   useEffect(() => {
     if (!hasSearched) return
 
+    // Full-text queries need the server; facet filters do not
+    if (!searchQuery.trim() && catalog) {
+      setError(null)
+      setProjects(filterCatalog(catalog, filters))
+      return
+    }
+
     const fetchProjects = async () => {
       setLoading(true)
       setError(null)
@@ -56,6 +75,10 @@ function MainPortal({ userName, onSignOut, onOpenHelp, onSwitchToUploader }) {
           params.append('poContacts', filters.poContacts.join(','))
         }
 
+        if (filters.fileTypes.length > 0) {
+          params.append('fileTypes', filters.fileTypes.join(','))
+        }
+
         // Call backend API
         const response = await fetch(`${API_BASE_URL}/search?${params.toString()}`)
 
@@ -75,7 +98,7 @@ function MainPortal({ userName, onSignOut, onOpenHelp, onSwitchToUploader }) {
     }
 
     fetchProjects()
-  }, [searchQuery, filters, hasSearched])
+  }, [searchQuery, filters, hasSearched, catalog])
 
   // Pagination
   const totalPages = Math.ceil(projects.length / resultsPerPage)
@@ -102,6 +125,7 @@ function MainPortal({ userName, onSignOut, onOpenHelp, onSwitchToUploader }) {
       geographies: [],
       outputTypes: [],
       poContacts: [],
+      fileTypes: [],
       dateFrom: '',
       dateTo: ''
     })
@@ -147,7 +171,8 @@ function MainPortal({ userName, onSignOut, onOpenHelp, onSwitchToUploader }) {
     filters.researchAreas.length > 0 ||
     filters.geographies.length > 0 ||
     filters.outputTypes.length > 0 ||
-    filters.poContacts.length > 0
+    filters.poContacts.length > 0 ||
+    filters.fileTypes.length > 0
 
   return (
     <>
@@ -58,7 +58,7 @@ function ProjectCard({ project, onDownload }) {
 
       <div className="files-section">
         <div className="files-header">
-          Files ({project.files.length})
+          Files ({project.fileCount ?? project.files.length})
         </div>
         <div className="files-list">
           {project.files.map((file) => (
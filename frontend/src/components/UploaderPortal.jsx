@@ -1,5 +1,8 @@
 import { useState } from 'react'
 import './UploaderPortal.css'
+import { sha256File } from '../sha256'
+
+const API_BASE_URL = 'http://localhost:7071/api'
 
 function UploaderPortal({ userName, onSignOut, onSwitchToDownloader }) {
   const [formData, setFormData] = useState({
@@ -107,37 +110,86 @@ function UploaderPortal({ userName, onSignOut, onSwitchToDownloader }) {
     setFiles(prev => prev.filter((_, i) => i !== index))
   }
 
+  // Upload files straight to storage with short-lived write URLs.
+  // Returns null if the backend has no direct-upload storage (mock mode).
+  const uploadDirect = async () => {
+    // Hash one file at a time, in slices, so only one slice is in memory
+    const declaredFiles = []
+    for (const file of files) {
+      declaredFiles.push({ name: file.name, size: file.size, sha256: await sha256File(file) })
+    }
+
+    const initiateResponse = await fetch(`${API_BASE_URL}/upload/initiate`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({ ...formData, files: declaredFiles })
+    })
+
+    if (initiateResponse.status === 501) {
+      return null
+    }
+    if (!initiateResponse.ok) {
+      throw new Error('Upload initiate failed')
+    }
+
+    const { uploadId, files: targets } = await initiateResponse.json()
+
+    // Files already in storage (same content) are skipped entirely
+    await Promise.all(targets.map(async (target, index) => {
+      if (target.skip) return
+      const putResponse = await fetch(target.uploadUrl, {
+        method: 'PUT',
+        headers: target.headers,
+        body: files[index]
+      })
+      if (!putResponse.ok) {
+        throw new Error(`Upload of ${target.name} failed`)
+      }
+    }))
+
+    return fetch(`${API_BASE_URL}/upload/complete`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({ uploadId })
+    })
+  }
+
+  // Upload files through the API as multipart form data
+  const uploadViaApi = async () => {
+    // Create FormData for file upload
+    const uploadData = new FormData()
+    
+    // Add project metadata
+    uploadData.append('projectCode', formData.projectCode)
+    uploadData.append('title', formData.title)
+    uploadData.append('researchAreas', JSON.stringify(formData.researchAreas))
+    uploadData.append('dateInitialRequest', formData.dateInitialRequest)
+    uploadData.append('dateCompletion', formData.dateCompletion)
+    uploadData.append('poContact', formData.poContact)
+    uploadData.append('otherPos', JSON.stringify(formData.otherPos))
+    uploadData.append('agdevPartner', formData.agdevPartner)
+    uploadData.append('outputType', formData.outputType)
+    uploadData.append('geographies', JSON.stringify(formData.geographies))
+    
+    // Add files
+    files.forEach((file, index) => {
+      uploadData.append(`file_${index}`, file)
+    })
+
+    // Submit to backend
+    return fetch(`${API_BASE_URL}/upload`, {
+      method: 'POST',
+      body: uploadData
+    })
+  }
+
   const handleSubmit = async (e) => {
     e.preventDefault()
     setIsSubmitting(true)
     setSubmitStatus(null)
 
     try {
-      // Create FormData for file upload
-      const uploadData = new FormData()
-      
-      // Add project metadata
-      uploadData.append('projectCode', formData.projectCode)
-      uploadData.append('title', formData.title)
-      uploadData.append('researchAreas', JSON.stringify(formData.researchAreas))
-      uploadData.append('dateInitialRequest', formData.dateInitialRequest)
-      uploadData.append('dateCompletion', formData.dateCompletion)
-      uploadData.append('poContact', formData.poContact)
-      uploadData.append('otherPos', JSON.stringify(formData.otherPos))
-      uploadData.append('agdevPartner', formData.agdevPartner)
-      uploadData.append('outputType', formData.outputType)
-      uploadData.append('geographies', JSON.stringify(formData.geographies))
-      
-      // Add files
-      files.forEach((file, index) => {
-        uploadData.append(`file_${index}`, file)
-      })
-
-      // Submit to backend
-      const response = await fetch('http://localhost:7071/api/upload', {
-        method: 'POST',
-        body: uploadData
-      })
+      const response = (await uploadDirect()) || (await uploadViaApi())
 
       if (!response.ok) {
         throw new Error('Upload failed')
@@ -291,6 +291,13 @@ export const filterOptions = {
     "Sarah Johnson",
     "Michael Chen",
     "Emily Davis"
+  ],
+  fileTypes: [
+    "pdf",
+    "docx",
+    "xlsx",
+    "txt",
+    "md"
   ]
 };
 
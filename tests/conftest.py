@@ -0,0 +1,47 @@
+"""
+Shared pytest setup: the configuration is read once at import, so the test
+environment (local storage and databases in a temporary directory, short
+timeouts) is set here before any portal module is imported.
+"""
+
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).parent.parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+_workdir = tempfile.mkdtemp(prefix='epar-tests-')
+os.environ.update({
+    'STORAGE_BACKEND': 'local',
+    'LOCAL_STORAGE_PATH': os.path.join(_workdir, 'blobs'),
+    'LOCAL_STORAGE_SECRET': 'test-secret',
+    'DB_PATH': os.path.join(_workdir, 'docs.sqlite'),
+    'INGEST_STAGING_PATH': os.path.join(_workdir, 'staging'),
+    'INGEST_RETRY_BASE_SECONDS': '0',
+    'SEARCH_COALESCE_TIMEOUT_MS': '200',
+})
+
+
+@pytest.fixture
+def catalog_db(tmp_path):
+    """DatabaseHelper on a fresh SQLite catalog with the mock projects."""
+    from api.db_helper import DatabaseHelper
+    from db import init_db
+
+    db_path = str(tmp_path / 'docs.sqlite')
+    conn = init_db.create_database(db_path)
+    init_db.populate_mock_data(conn)
+    conn.close()
+    return DatabaseHelper(db_path)
+
+
+@pytest.fixture
+def local_storage(tmp_path):
+    from api.storage import LocalFileStorage
+
+    return LocalFileStorage(str(tmp_path / 'blobs'), secret='test-secret', base_url='/api')
@@ -0,0 +1,24 @@
+"""Tests for configuration validation (config.py)."""
+
+import pytest
+
+from config import Config
+
+
+@pytest.mark.parametrize('variable, value', [
+    ('STORAGE_BACKEND', 'lcoal'),
+    ('DATABASE_BACKEND', 'postgresql'),
+    ('FTS_SHARD_BY', 'years'),
+])
+def test_unknown_mode_fails_at_startup(monkeypatch, variable, value):
+    monkeypatch.setenv(variable, value)
+    with pytest.raises(ValueError, match=f"{variable.lower()}: must be one of .*'{value}'"):
+        Config(env_file='.env.missing')
+
+
+def test_modes_are_case_insensitive(monkeypatch):
+    monkeypatch.setenv('STORAGE_BACKEND', 'Local')
+    monkeypatch.setenv('FTS_SHARD_BY', 'YEAR')
+    settings = Config(env_file='.env.missing')
+    assert settings.storage_backend == 'local'
+    assert settings.fts_shard_by == 'year'
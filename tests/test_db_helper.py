@@ -0,0 +1,55 @@
+"""Tests for the SQLite catalog repository (api/db_helper.py)."""
+
+
+def file_row(**fields):
+    return dict({
+        'fileName': 'survey.pdf', 'fileType': 'pdf', 'fileSize': 1000,
+        'blobPath': 'EPAR-TEST/survey.pdf', 'contentHash': 'a' * 64
+    }, **fields)
+
+
+def project_id(catalog_db):
+    return catalog_db.write(lambda cursor: cursor.execute("SELECT MIN(id) FROM projects").fetchone()[0])
+
+
+def test_upsert_file_statuses(catalog_db):
+    pid = project_id(catalog_db)
+    upsert = lambda file: catalog_db.write(lambda cursor: catalog_db.upsert_file(cursor, pid, file))
+
+    file_id, status = upsert(file_row())
+    assert status == 'created'
+
+    assert upsert(file_row()) == (file_id, 'unchanged')
+    assert upsert(file_row(contentHash='b' * 64, fileSize=2000)) == (file_id, 'updated')
+    # Without a known hash the file cannot be proven unchanged
+    assert upsert(file_row(contentHash=None, fileSize=2000)) == (file_id, 'updated')
+
+
+def test_updated_file_keeps_its_text_until_ingestion(catalog_db):
+    pid = project_id(catalog_db)
+    file_id, _ = catalog_db.write(lambda cursor: catalog_db.upsert_file(cursor, pid, file_row()))
+    catalog_db.set_file_content(file_id, 'a' * 64, 'maize yields')
+
+    catalog_db.write(lambda cursor: catalog_db.upsert_file(cursor, pid, file_row(contentHash='b' * 64)))
+
+    row = catalog_db.write(lambda cursor: cursor.execute(
+        "SELECT content_hash, text_content FROM files WHERE id = ?", (file_id,)
+    ).fetchone())
+    assert tuple(row) == ('b' * 64, 'maize yields')
+
+
+def test_facet_filters_match_whole_values(catalog_db):
+    def add(code, geography):
+        catalog_db.write(lambda cursor: catalog_db.upsert_project(cursor, {
+            'projectCode': code, 'title': code, 'dateCompletion': '2024-06', 'poContact': 'Ann',
+            'outputType': 'Report', 'researchAreas': ['Food Security'], 'geographies': [geography]
+        }))
+    add('EPAR-NIGER', 'Niger')
+    add('EPAR-NIGERIA', 'Nigeria')
+
+    codes = lambda **filters: [p['projectCode'] for p in catalog_db.search_files(**filters)]
+    assert codes(geographies=['Niger']) == ['EPAR-NIGER']
+    assert codes(geographies=['niger']) == []
+    assert 'EPAR-NIGERIA' in codes(geographies=['Nigeria', 'Tanzania'])
+    assert 'EPAR-NIGER' in codes(research_areas=['Food Security'])
+    assert codes(research_areas=['Food']) == []
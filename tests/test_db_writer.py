@@ -0,0 +1,62 @@
+"""Tests for the group-commit writer (api/db_writer.py)."""
+
+import sqlite3
+
+import pytest
+
+from api.db_writer import DatabaseWriter
+
+
+@pytest.fixture
+def connect(tmp_path):
+    db_path = str(tmp_path / 'writer.sqlite')
+    conn = sqlite3.connect(db_path)
+    conn.execute("CREATE TABLE notes (id INTEGER PRIMARY KEY, body TEXT)")
+    conn.close()
+    return lambda: sqlite3.connect(db_path)
+
+
+def insert(body):
+    return lambda cursor: cursor.execute("INSERT INTO notes (body) VALUES (?)", (body,)).lastrowid
+
+
+def test_failing_intent_is_rolled_back_alone(connect):
+    writer = DatabaseWriter(connect, window_ms=50)
+    futures = [
+        writer.submit(insert('a')),
+        writer.submit(lambda cursor: cursor.execute("INSERT INTO nowhere VALUES (1)")),
+        writer.submit(insert('b'))
+    ]
+
+    assert futures[0].result(5) and futures[2].result(5)
+    with pytest.raises(sqlite3.OperationalError):
+        futures[1].result(5)
+    writer.stop()
+
+
+def test_writer_that_cannot_connect_fails_the_write_and_restarts(connect):
+    attempts = []
+
+    def flaky_connect():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise sqlite3.OperationalError('unable to open database file')
+        return connect()
+
+    writer = DatabaseWriter(flaky_connect)
+    with pytest.raises(sqlite3.OperationalError, match='unable to open'):
+        writer.execute(insert('lost'), timeout=5)
+
+    assert writer.execute(insert('kept'), timeout=5) == 1
+    writer.stop()
+
+
+def test_aborted_transaction_fails_the_batch_instead_of_hanging(connect):
+    writer = DatabaseWriter(connect)
+
+    # Ending the transaction inside an intent makes ROLLBACK TO fail, as after SQLITE_FULL
+    with pytest.raises(sqlite3.OperationalError):
+        writer.execute(lambda cursor: (cursor.execute("ROLLBACK"), 1 / 0), timeout=5)
+
+    assert writer.execute(insert('after'), timeout=5) == 1
+    writer.stop()
@@ -0,0 +1,38 @@
+"""Tests for text extraction (api/extraction.py)."""
+
+import io
+
+from api.extraction import CHUNK_SIZE, _iter_plain_text, extract_text
+
+
+class CountingStream(io.BytesIO):
+    """BytesIO that counts the bytes read from it."""
+
+    def __init__(self, data):
+        super().__init__(data)
+        self.bytes_read = 0
+
+    def read(self, size=-1):
+        data = super().read(size)
+        self.bytes_read += len(data)
+        return data
+
+
+def test_words_are_not_split_across_chunks():
+    data = ('maize ' * (CHUNK_SIZE // 3)).encode('utf-8')
+    words = ' '.join(_iter_plain_text(io.BytesIO(data))).split()
+    assert set(words) == {'maize'}
+    assert len(words) == CHUNK_SIZE // 3
+
+
+def test_text_without_whitespace_is_split_at_the_chunk_size():
+    pieces = list(_iter_plain_text(io.BytesIO(b'A' * (CHUNK_SIZE * 10 + 5))))
+    assert max(len(piece) for piece in pieces) <= CHUNK_SIZE
+    assert ''.join(pieces) == 'A' * (CHUNK_SIZE * 10 + 5)
+
+
+def test_extraction_of_text_without_whitespace_stops_at_the_budget():
+    stream = CountingStream(b'A' * (CHUNK_SIZE * 100))
+    text = extract_text('blob.txt', stream, max_bytes=1000)
+    assert text == 'A' * 1000
+    assert stream.bytes_read <= CHUNK_SIZE * 2
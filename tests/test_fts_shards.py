@@ -0,0 +1,116 @@
+"""Tests for the sharded full-text index (api/fts_shards.py)."""
+
+import threading
+import time
+
+import pytest
+
+from api.fts_shards import ShardedSearchIndex, install_shard_queue
+
+
+@pytest.fixture
+def index(catalog_db, tmp_path):
+    conn = catalog_db.get_connection()
+    install_shard_queue(conn)
+    conn.commit()
+    conn.close()
+    index = ShardedSearchIndex(catalog_db.db_path, catalog_db.writer, shard_path=str(tmp_path / 'shards'), shard_by='year')
+    index.build()
+    return index
+
+
+def set_text(catalog_db, text):
+    catalog_db.writer.execute(lambda cursor: cursor.execute(
+        "UPDATE files SET text_content = ? WHERE id = (SELECT MIN(id) FROM files)", (text,)
+    ))
+
+
+def wait_for(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+def test_commits_are_applied_in_the_background(index, catalog_db):
+    sync_threads = []
+    sync = index.sync
+
+    def recorded_sync(*args, **kwargs):
+        sync_threads.append(threading.current_thread().name)
+        return sync(*args, **kwargs)
+
+    index.sync = recorded_sync
+    set_text(catalog_db, 'zanzibarquokka')
+
+    assert wait_for(lambda: index.search('zanzibarquokka'))
+    assert sync_threads and set(sync_threads) == {'fts-shard-sync'}
+    assert not index.has_pending()
+
+
+def test_search_does_not_apply_the_queue(index, catalog_db):
+    callers = []
+    index.sync = lambda *args, **kwargs: callers.append(threading.current_thread().name) or 0
+    index.has_pending = lambda: callers.append(threading.current_thread().name) or True
+    set_text(catalog_db, 'zanzibarquokka')
+
+    assert index.search('zanzibarquokka') == []  # Not applied yet
+    index.warm_up()
+    assert threading.current_thread().name not in callers
+
+
+def opened_shards(index):
+    opened = []
+    shard_writer = index._shard_writer
+
+    def recorded(key):
+        opened.append(key)
+        return shard_writer(key)
+
+    index._shard_writer = recorded
+    return opened
+
+
+def first_file(catalog_db):
+    return catalog_db.write(lambda cursor: tuple(cursor.execute("""
+        SELECT f.id, p.id, substr(p.date_completion, 1, 4)
+        FROM files f INNER JOIN projects p ON f.project_id = p.id
+        WHERE f.id = (SELECT MIN(id) FROM files)
+    """).fetchone()))
+
+
+def test_sync_only_opens_the_shards_of_the_changed_rows(index, catalog_db):
+    index.sync = lambda *args, **kwargs: 0  # Applied explicitly below
+    _, _, year = first_file(catalog_db)
+    opened = opened_shards(index)
+
+    set_text(catalog_db, 'zanzibarquokka')
+    generation = catalog_db.search_generation()
+    ShardedSearchIndex.sync(index)
+
+    assert opened == [year]
+    assert catalog_db.search_generation()[1] > generation[1]  # Cached searches see the synced text
+    assert len(index.search('zanzibarquokka')) == 1
+
+
+def test_moved_rows_leave_their_previous_shard(index, catalog_db):
+    index.sync = lambda *args, **kwargs: 0
+    file_id, project_id, year = first_file(catalog_db)
+    new_year = '2030'
+    catalog_db.write(lambda cursor: cursor.execute(
+        "UPDATE projects SET date_completion = ? WHERE id = ?", (f"{new_year}-01", project_id)
+    ))
+    opened = opened_shards(index)
+
+    ShardedSearchIndex.sync(index)
+
+    assert set(opened) == {year, new_year}
+    assert [key for (key,) in catalog_db.write(lambda cursor: cursor.execute(
+        "SELECT shard_key FROM fts_shard_rows WHERE file_id = ?", (file_id,)
+    ).fetchall())] == [new_year]
+    entries = {key: index.shard_status(key)['entries'] for key in index.shard_keys()}
+    assert sum(entries.values()) == catalog_db.write(
+        lambda cursor: cursor.execute("SELECT COUNT(*) FROM files").fetchone()[0]
+    )
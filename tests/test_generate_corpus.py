@@ -0,0 +1,42 @@
+"""Tests for the synthetic corpus generator (db/generate_corpus.py)."""
+
+import sqlite3
+
+from db.generate_corpus import CorpusGenerator, generate_corpus
+
+
+# Written by the database when the row is inserted
+TIMESTAMP_COLUMNS = ('created_at', 'updated_at')
+
+
+def dump(db_path):
+    """Rows of the catalog tables without their insert timestamps."""
+    conn = sqlite3.connect(db_path)
+    try:
+        tables = {}
+        for table in ('projects', 'files'):
+            columns = [row[1] for row in conn.execute(f"PRAGMA table_info({table})")
+                       if row[1] not in TIMESTAMP_COLUMNS]
+            tables[table] = conn.execute(f"SELECT {', '.join(columns)} FROM {table} ORDER BY id").fetchall()
+        return tables
+    finally:
+        conn.close()
+
+
+def test_same_seed_and_size_give_the_same_database(tmp_path):
+    first = generate_corpus(str(tmp_path / 'a.sqlite'), 300, seed=7, batch_size=100)
+    second = generate_corpus(str(tmp_path / 'b.sqlite'), 300, seed=7, batch_size=100)
+
+    assert (first['projects'], first['files']) == (second['projects'], second['files'])
+    assert first['files'] == 300
+    assert dump(str(tmp_path / 'a.sqlite')) == dump(str(tmp_path / 'b.sqlite'))
+
+
+def test_different_seeds_give_different_corpora():
+    first = list(CorpusGenerator(seed=1).projects(50))
+    assert list(CorpusGenerator(seed=1).projects(50)) == first
+    assert list(CorpusGenerator(seed=2).projects(50)) != first
+
+
+def test_query_terms_are_fixed_for_a_seed():
+    assert CorpusGenerator(seed=7).query_terms('rare') == CorpusGenerator(seed=7).query_terms('rare')
@@ -0,0 +1,158 @@
+"""Tests for the ingestion queue and jobs (api/ingestion.py)."""
+
+import hashlib
+import io
+import os
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import api.ingestion
+from api.ingestion import IngestionQueue, process_job
+from api.storage import content_blob_path
+
+DATA = b'Soil health survey results for western Kenya.\n' * 100
+DATA_HASH = hashlib.sha256(DATA).hexdigest()
+
+
+class RecordingStorage:
+    """Wraps a storage backend and records which methods moved bytes."""
+
+    def __init__(self, storage):
+        self.storage = storage
+        self.calls = []
+
+    def __getattr__(self, name):
+        method = getattr(self.storage, name)
+        if name in ('upload', 'upload_file', 'copy'):
+            def recorded(*args, **kwargs):
+                self.calls.append(name)
+                return method(*args, **kwargs)
+            return recorded
+        return method
+
+
+@pytest.fixture
+def queue(catalog_db, tmp_path):
+    return IngestionQueue(
+        catalog_db.get_connection, staging_dir=str(tmp_path / 'staging'), max_attempts=2,
+        writer=catalog_db.writer, repository=catalog_db
+    )
+
+
+def enqueue(queue, files):
+    return queue.writer.execute(lambda cursor: queue.enqueue(cursor, 1, files))
+
+
+def file_entry(**fields):
+    return dict({'fileId': 1, 'fileName': 'survey.txt', 'fileType': 'txt', 'blobPath': 'p/survey.txt'}, **fields)
+
+
+def test_local_upload_is_streamed_from_the_staged_file(queue, local_storage):
+    staged = queue.stage_file(io.BytesIO(DATA))
+    assert staged['contentHash'] == DATA_HASH and staged['size'] == len(DATA)
+    enqueue(queue, [file_entry(stagedPath=staged['stagedPath'], contentHash=staged['contentHash'])])
+    storage = RecordingStorage(local_storage)
+
+    process_job(queue.claim_next(), queue, storage)
+
+    assert storage.calls == ['upload_file']
+    assert local_storage.get_size(content_blob_path(DATA_HASH)) == len(DATA)
+    assert not os.path.exists(staged['stagedPath'])
+
+
+def test_storage_staged_blob_is_copied_inside_the_storage(queue, local_storage):
+    local_storage.upload('staging/session-1', DATA)
+    enqueue(queue, [file_entry(stagedBlob='staging/session-1', contentHash=DATA_HASH)])
+    storage = RecordingStorage(local_storage)
+
+    process_job(queue.claim_next(), queue, storage)
+
+    assert storage.calls == ['copy']
+    assert local_storage.get_size(content_blob_path(DATA_HASH)) == len(DATA)
+    assert not local_storage.exists('staging/session-1')
+    assert not os.listdir(queue.staging_dir)
+
+
+def test_job_marked_failed_deletes_its_staged_files(queue):
+    staged = queue.stage_file(io.BytesIO(DATA))
+    enqueue(queue, [file_entry(stagedPath=staged['stagedPath'], contentHash=staged['contentHash'])])
+
+    job = queue.claim_next()
+    queue.fail(job, 'storage unavailable')
+    assert os.path.exists(staged['stagedPath'])  # Kept for the retry
+
+    job = queue.claim_next()
+    queue.fail(job, 'storage unavailable')
+    assert queue.get_job(job['id'])['status'] == 'failed'
+    assert not os.path.exists(staged['stagedPath'])
+
+
+def set_job(queue, job_id, **columns):
+    assignments = ', '.join(f"{column} = ?" for column in columns)
+    queue.writer.execute(lambda cursor: cursor.execute(
+        f"UPDATE ingestion_jobs SET {assignments} WHERE id = ?", (*columns.values(), job_id)
+    ))
+
+
+def test_claimed_job_is_leased_to_one_worker(queue):
+    job_id = enqueue(queue, [file_entry()])
+
+    job = queue.claim_next()
+    assert (job['id'], job['attempts'], job['maxAttempts']) == (job_id, 1, 2)
+    assert queue.get_job(job_id)['status'] == 'running'
+    assert queue.claim_next() is None  # Still leased
+
+    # A worker that died keeps the job only until its lease expires
+    set_job(queue, job_id, locked_until=time.time() - 1)
+    job = queue.claim_next()
+    assert (job['id'], job['attempts']) == (job_id, 2)
+
+
+def test_failed_attempt_is_retried_after_a_backoff(catalog_db, tmp_path):
+    queue = IngestionQueue(
+        catalog_db.get_connection, staging_dir=str(tmp_path / 'staging'), max_attempts=3,
+        retry_base_seconds=60, writer=catalog_db.writer, repository=catalog_db
+    )
+    job_id = enqueue(queue, [file_entry()])
+
+    before = time.time()
+    queue.fail(queue.claim_next(), 'storage unavailable')
+    job = queue.get_job(job_id)
+    assert (job['status'], job['lastError']) == ('queued', 'storage unavailable')
+    assert queue.claim_next() is None  # Backing off for retry_base_seconds
+
+    next_attempt_at = queue.writer.execute(lambda cursor: cursor.execute(
+        "SELECT next_attempt_at FROM ingestion_jobs WHERE id = ?", (job_id,)
+    ).fetchone()[0])
+    assert before + 60 <= next_attempt_at <= time.time() + 60
+
+    set_job(queue, job_id, next_attempt_at=time.time() - 1)
+    queue.fail(queue.claim_next(), 'storage unavailable')
+    set_job(queue, job_id, next_attempt_at=time.time() - 1)
+    queue.fail(queue.claim_next(), 'storage unavailable')
+    assert queue.get_job(job_id)['status'] == 'failed'
+    assert queue.claim_next() is None
+
+
+def test_completed_job_is_not_claimed_again(queue):
+    job_id = enqueue(queue, [file_entry()])
+    queue.complete(queue.claim_next()['id'])
+
+    assert queue.get_job(job_id)['status'] == 'succeeded'
+    assert queue.claim_next() is None
+
+
+def test_explicit_zero_retry_delay_is_not_replaced_by_the_config(catalog_db, tmp_path, monkeypatch):
+    monkeypatch.setattr(api.ingestion, 'config', SimpleNamespace(
+        ingest_staging_path=str(tmp_path / 'staging'), ingest_max_attempts=5, ingest_retry_base_seconds=60
+    ))
+    queue = IngestionQueue(
+        catalog_db.get_connection, retry_base_seconds=0, writer=catalog_db.writer, repository=catalog_db
+    )
+    assert (queue.retry_base_seconds, queue.max_attempts) == (0, 5)
+
+    job_id = enqueue(queue, [file_entry()])
+    queue.fail(queue.claim_next(), 'storage unavailable')
+    assert queue.claim_next()['id'] == job_id  # Retried without a delay
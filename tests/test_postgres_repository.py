@@ -0,0 +1,120 @@
+"""
+Tests for the PostgreSQL catalog (api/repository.py PostgresRepository).
+Skipped unless DATABASE_URL points at a PostgreSQL server; each run creates
+and drops a schema of its own.
+"""
+
+import os
+import uuid
+
+import pytest
+
+DATABASE_URL = os.environ.get('DATABASE_URL')
+
+pytestmark = pytest.mark.skipif(not DATABASE_URL, reason="DATABASE_URL is not set")
+
+
+def project(code, **fields):
+    return dict({
+        'projectCode': code, 'title': f'{code} Study', 'researchAreas': ['Food Security'],
+        'dateCompletion': '2024-06', 'poContact': 'Ann', 'outputType': 'Report', 'geographies': ['Kenya']
+    }, **fields)
+
+
+def file(name, project_code, **fields):
+    return dict({
+        'fileName': name, 'fileType': name.rsplit('.', 1)[-1], 'fileSize': 100,
+        'blobPath': f'{project_code}/{name}', 'contentHash': 'a' * 64
+    }, **fields)
+
+
+@pytest.fixture(scope='module')
+def postgres():
+    import psycopg
+    from psycopg.conninfo import make_conninfo
+
+    from api.repository import PostgresRepository
+
+    schema = f"epar_test_{uuid.uuid4().hex[:12]}"
+    with psycopg.connect(DATABASE_URL, autocommit=True) as conn:
+        conn.execute(f"CREATE SCHEMA {schema}")
+
+    repository = PostgresRepository(make_conninfo(DATABASE_URL, options=f'-c search_path={schema}'), pool_size=2)
+    try:
+        repository.create_schema()
+        yield repository
+    finally:
+        repository.close()
+        with psycopg.connect(DATABASE_URL, autocommit=True) as conn:
+            conn.execute(f"DROP SCHEMA {schema} CASCADE")
+
+
+def add(postgres, code, files, **fields):
+    """Upsert a project and its files; returns (project id and status, [(file id, status)])."""
+    def write(cursor):
+        project_id, status = postgres.upsert_project(cursor, project(code, **fields))
+        return (project_id, status), [postgres.upsert_file(cursor, project_id, entry) for entry in files]
+    return postgres.write(write)
+
+
+def codes(results):
+    return sorted(result['projectCode'] for result in results)
+
+
+def test_upserts_report_created_unchanged_and_updated(postgres):
+    files = [file('Survey.pdf', 'PG-UPSERT')]
+
+    (project_id, status), [(file_id, file_status)] = add(postgres, 'PG-UPSERT', files)
+    assert (status, file_status) == ('created', 'created')
+
+    assert add(postgres, 'PG-UPSERT', files) == ((project_id, 'unchanged'), [(file_id, 'unchanged')])
+
+    updated = add(postgres, 'PG-UPSERT', [file('Survey.pdf', 'PG-UPSERT', contentHash='b' * 64)], title='Renamed')
+    assert updated == ((project_id, 'updated'), [(file_id, 'updated')])
+    assert postgres.get_file_by_id(file_id)['contentHash'] == 'b' * 64
+
+
+def test_search_matches_file_name_words_and_whole_facet_values(postgres):
+    add(postgres, 'PG-NIGER', [file('Literature_Review_1.pdf', 'PG-NIGER')], geographies=['Niger'])
+    add(postgres, 'PG-NIGERIA', [file('Budget_2.xlsx', 'PG-NIGERIA')], geographies=['Nigeria'])
+
+    assert codes(postgres.search_files(query='review')) == ['PG-NIGER']
+    assert codes(postgres.search_files(geographies=['Niger'])) == ['PG-NIGER']
+    assert codes(postgres.search_files(query='review', geographies=['Nigeria'])) == []
+
+    [result] = postgres.search_files(query='"PG-NIGERIA"')
+    assert [entry['name'] for entry in result['files']] == ['Budget_2.xlsx']
+    assert (result['fileCount'], result['fileTypes']) == (1, ['xlsx'])
+
+
+def test_text_changes_are_searchable_and_advance_the_search_version(postgres):
+    _, [(file_id, _)] = add(postgres, 'PG-TEXT', [file('Notes.txt', 'PG-TEXT')])
+    generation, version = postgres.search_generation()
+
+    postgres.set_file_content(file_id, 'a' * 64, 'Sorghum yields in the dry season')
+
+    assert codes(postgres.search_files(query='sorghum')) == ['PG-TEXT']
+    assert postgres.get_text_for_content('a' * 64, 'txt', exclude_file_id=0) == 'Sorghum yields in the dry season'
+    assert postgres.search_generation() == (generation, version + 1)
+
+
+def test_change_feed_collapses_changes_and_reports_deletes(postgres):
+    cursor = postgres.get_changes(None)['cursor']
+
+    (project_id, _), [(kept_id, _), (deleted_id, _)] = add(
+        postgres, 'PG-FEED', [file('Kept.pdf', 'PG-FEED'), file('Deleted.pdf', 'PG-FEED')]
+    )
+    add(postgres, 'PG-FEED', [], title='Feed Study v2')
+    postgres.write(lambda db: db.execute("DELETE FROM files WHERE id = %s", (deleted_id,)))
+
+    feed = postgres.get_changes(cursor)
+    entries = {(entry['entity'], entry['id']): entry for entry in feed['changes']}
+
+    assert entries[('project', project_id)]['op'] == 'insert'
+    assert entries[('project', project_id)]['data']['title'] == 'Feed Study v2'
+    assert entries[('file', kept_id)]['data']['blobPath'] == 'PG-FEED/Kept.pdf'
+    assert entries[('file', deleted_id)] == {
+        'seq': entries[('file', deleted_id)]['seq'], 'entity': 'file', 'id': deleted_id, 'op': 'delete'
+    }
+    assert not feed['hasMore'] and feed['cursor'] == postgres.catalog_generation()
+    assert postgres.get_changes(feed['cursor'])['changes'] == []
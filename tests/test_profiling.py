@@ -0,0 +1,25 @@
+"""Tests for request profile stack labels (api/profiling.py)."""
+
+import sys
+import types
+
+from api.profiling import frame_label
+
+
+class Sampled:
+    def method(self):
+        return sys._getframe()
+
+
+def test_frame_label_names_function_file_and_line():
+    frame = Sampled().method()
+    label = frame_label(frame)
+    assert label.startswith('Sampled.method (test_profiling.py:') or label.startswith('method (test_profiling.py:')
+    assert label.endswith(f":{frame.f_code.co_firstlineno})")
+
+
+def test_frame_label_without_co_qualname():
+    # Code objects before Python 3.11 have no co_qualname
+    code = types.SimpleNamespace(co_name='search', co_filename='/app/api/function_app.py', co_firstlineno=42)
+    frame = types.SimpleNamespace(f_code=code)
+    assert frame_label(frame) == 'search (function_app.py:42)'
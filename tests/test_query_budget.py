@@ -0,0 +1,53 @@
+"""Tests for per-route query time budgets (api/query_budget.py)."""
+
+import asyncio
+import sqlite3
+
+import pytest
+
+from api.metrics import QUERY_BUDGET_OVERRUNS
+from api.offload import run_db
+from api.query_budget import QueryBudget, _current_budget, label_shape, overrun
+from api.repository import QueryTimeoutError
+
+ENDLESS_QUERY = "WITH RECURSIVE n(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM n) SELECT max(x) FROM n"
+
+
+def run_with_budget(budget, fn):
+    async def main():
+        token = _current_budget.set(budget)
+        try:
+            return await run_db(fn)
+        finally:
+            _current_budget.reset(token)
+    return asyncio.run(main())
+
+
+def test_budget_interrupts_the_query_with_query_timeout_error(catalog_db):
+    def endless():
+        label_shape('endless')
+        conn = catalog_db.get_connection()
+        try:
+            return conn.execute(ENDLESS_QUERY).fetchone()
+        finally:
+            conn.close()
+
+    before = QUERY_BUDGET_OVERRUNS.value('search', 'endless')
+    with pytest.raises(QueryTimeoutError):
+        run_with_budget(QueryBudget('search', 50), endless)
+    assert QUERY_BUDGET_OVERRUNS.value('search', 'endless') == before + 1
+
+
+def test_queries_within_the_budget_are_not_interrupted(catalog_db):
+    def count():
+        conn = catalog_db.get_connection()
+        try:
+            return conn.execute("SELECT COUNT(*) FROM files").fetchone()[0]
+        finally:
+            conn.close()
+
+    assert run_with_budget(QueryBudget('search', 5000), count) > 0
+
+
+def test_interrupts_outside_a_budget_are_not_timeouts():
+    assert overrun(sqlite3.OperationalError('interrupted')) is None
@@ -0,0 +1,39 @@
+"""Tests for the change feed helpers shared by the repositories (api/repository.py)."""
+
+from api.repository import change_entries, collapse_changes
+
+
+def change(seq, entity, entity_id, op):
+    return {'seq': seq, 'entity': entity, 'entity_id': entity_id, 'op': op}
+
+
+def test_collapse_keeps_the_last_change_per_entity():
+    rows = [
+        change(1, 'project', 7, 'insert'),
+        change(2, 'file', 3, 'update'),
+        change(3, 'project', 7, 'update'),
+        change(4, 'file', 3, 'delete'),
+        change(5, 'file', 4, 'update'),
+    ]
+
+    latest, inserted = collapse_changes(rows)
+
+    assert {key: row['seq'] for key, row in latest.items()} == {('project', 7): 3, ('file', 3): 4, ('file', 4): 5}
+    assert inserted == {('project', 7)}
+
+
+def test_change_entries_report_the_current_state():
+    latest, inserted = collapse_changes([
+        change(1, 'project', 7, 'insert'),
+        change(2, 'project', 7, 'update'),
+        change(3, 'file', 3, 'update'),
+        change(4, 'file', 4, 'insert'),  # Inserted and deleted within the page
+    ])
+
+    entries = change_entries(latest, inserted, projects={7: {'id': 7}}, files={3: {'id': 3}})
+
+    assert entries == [
+        {'seq': 2, 'entity': 'project', 'id': 7, 'op': 'insert', 'data': {'id': 7}},
+        {'seq': 3, 'entity': 'file', 'id': 3, 'op': 'update', 'data': {'id': 3}},
+        {'seq': 4, 'entity': 'file', 'id': 4, 'op': 'delete'},
+    ]
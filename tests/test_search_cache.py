@@ -0,0 +1,41 @@
+"""Tests for the search result cache (api/search_cache.py)."""
+
+import io
+
+from api.ingestion import IngestionQueue, process_job
+from api.search_cache import SearchCache
+
+DATA = b'Smallholder zanzibarquokka adoption survey.\n'
+
+
+def test_ingested_text_is_visible_to_a_cached_search(catalog_db, local_storage, tmp_path):
+    cache = SearchCache(catalog_db, catalog_db.writer)
+    queue = IngestionQueue(
+        catalog_db.get_connection, staging_dir=str(tmp_path / 'staging'),
+        writer=catalog_db.writer, repository=catalog_db
+    )
+
+    # Upload: the file row exists, its text arrives with ingestion
+    staged = queue.stage_file(io.BytesIO(DATA))
+
+    def upload(cursor):
+        project_id = cursor.execute("SELECT MIN(id) FROM projects").fetchone()[0]
+        file_id, _ = catalog_db.upsert_file(cursor, project_id, {
+            'fileName': 'survey.txt', 'fileType': 'txt', 'fileSize': len(DATA),
+            'blobPath': 'EPAR-TEST/survey.txt', 'contentHash': staged['contentHash']
+        })
+        return queue.enqueue(cursor, project_id, [{
+            'fileId': file_id, 'fileName': 'survey.txt', 'fileType': 'txt',
+            'blobPath': 'EPAR-TEST/survey.txt', 'stagedPath': staged['stagedPath'],
+            'contentHash': staged['contentHash']
+        }])
+
+    catalog_db.write(upload)
+    assert cache.search(query='zanzibarquokka') == []
+
+    process_job(queue.claim_next(), queue, local_storage)
+
+    assert len(cache.search(query='zanzibarquokka')) == 1
+    assert cache.stats == {'hits': 0, 'misses': 2}
+    cache.search(query='zanzibarquokka')
+    assert cache.stats['hits'] == 1
@@ -0,0 +1,133 @@
+"""Tests for SingleFlight (api/offload.py) and coalesced searches (api/search_cache.py)."""
+
+import asyncio
+import concurrent.futures
+import time
+
+from api.offload import SingleFlight
+from api.repository import QueryTimeoutError
+from api.search_cache import SearchCache
+
+
+def test_followers_share_the_leaders_result():
+    flights = SingleFlight()
+    calls = []
+
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return ['result']
+
+    async def main():
+        joined = [flights.join('key', work, timeout=1) for _ in range(5)]
+        assert [shared for _, shared in joined] == [False, True, True, True, True]
+        return await asyncio.gather(*(flight for flight, _ in joined))
+
+    results = asyncio.run(main())
+    assert results == [['result']] * 5
+    assert len(calls) == 1
+    assert len(flights) == 0
+
+
+def test_slow_leader_times_out_every_waiter_and_releases_the_key():
+    flights = SingleFlight()
+
+    async def slow():
+        await asyncio.sleep(0.5)
+
+    async def fast():
+        return 'fresh'
+
+    async def main():
+        joined = [flights.join('key', slow, timeout=0.05) for _ in range(3)]
+        results = await asyncio.gather(*(flight for flight, _ in joined), return_exceptions=True)
+        assert all(isinstance(result, asyncio.TimeoutError) for result in results)
+        assert len(flights) == 0
+        # The next call starts a new flight instead of joining the stuck one
+        flight, shared = flights.join('key', fast, timeout=1)
+        assert not shared
+        return await flight
+
+    assert asyncio.run(main()) == 'fresh'
+
+
+def test_leader_error_reaches_every_waiter():
+    flights = SingleFlight()
+
+    async def failing():
+        await asyncio.sleep(0.01)
+        raise ValueError('bad query')
+
+    async def main():
+        joined = [flights.join('key', failing, timeout=1) for _ in range(4)]
+        return await asyncio.gather(*(flight for flight, _ in joined), return_exceptions=True)
+
+    results = asyncio.run(main())
+    assert len(results) == 4
+    assert all(isinstance(result, ValueError) and str(result) == 'bad query' for result in results)
+    assert len(flights) == 0
+
+
+class SlowRepository:
+    """search_files that takes `delay` seconds (or fails) and counts its calls."""
+
+    def __init__(self, delay: float = 0.0, error: Exception = None):
+        self.delay = delay
+        self.error = error
+        self.calls = 0
+
+    def search_generation(self):
+        return 1, 0
+
+    def search_files(self, **params):
+        self.calls += 1
+        time.sleep(self.delay)
+        if self.error:
+            raise self.error
+        return [{'id': 1}]
+
+
+class NullWriter:
+    def submit(self, fn):
+        future = concurrent.futures.Future()
+        future.set_result(None)
+        return future
+
+
+def _burst(cache, n):
+    async def main():
+        return await asyncio.gather(*(cache.search_async(query='soil') for _ in range(n)), return_exceptions=True)
+    return asyncio.run(main())
+
+
+def test_search_async_times_out_followers_of_a_slow_search():
+    # SEARCH_COALESCE_TIMEOUT_MS is 200 in the test environment (conftest.py)
+    repository = SlowRepository(delay=0.5)
+    cache = SearchCache(repository, NullWriter())
+
+    results = _burst(cache, 5)
+
+    assert all(isinstance(result, QueryTimeoutError) for result in results)
+    assert repository.calls == 1
+    assert len(cache._flights) == 0
+
+
+def test_search_async_propagates_the_search_error_to_every_request():
+    repository = SlowRepository(delay=0.05, error=RuntimeError('fts5: syntax error'))
+    cache = SearchCache(repository, NullWriter())
+
+    results = _burst(cache, 5)
+
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert repository.calls == 1
+
+
+def test_search_async_shares_results():
+    repository = SlowRepository(delay=0.05)
+    cache = SearchCache(repository, NullWriter(), max_entries=0)
+
+    results = _burst(cache, 5)
+
+    assert results == [[{'id': 1}]] * 5
+    assert repository.calls == 1
+
@@ -0,0 +1,66 @@
+"""Tests for the storage helpers and the local backend's signed URLs (api/storage.py)."""
+
+from urllib.parse import parse_qs, urlsplit
+
+import pytest
+
+from api.storage import content_disposition, parse_range_header
+
+
+def url_params(url):
+    return {name: values[0] for name, values in parse_qs(urlsplit(url).query).items()}
+
+
+def test_download_url_signature_covers_the_file_name(local_storage):
+    params = url_params(local_storage.get_download_url('content/sha256/ab/abc', filename='report.pdf'))
+    assert params['rscd'] == content_disposition('report.pdf')
+
+    assert local_storage.verify('content/sha256/ab/abc', params['se'], 'r', params['sig'], params['rscd'])
+    # Rewriting the served file name invalidates the link
+    assert not local_storage.verify(
+        'content/sha256/ab/abc', params['se'], 'r', params['sig'], content_disposition('invoice.exe')
+    )
+    assert not local_storage.verify('content/sha256/ab/abc', params['se'], 'r', params['sig'])
+
+
+def test_upload_url_is_write_only(local_storage):
+    params = url_params(local_storage.get_upload_url('staging/upload-1'))
+    assert params['sp'] == 'cw'
+    assert local_storage.verify('staging/upload-1', params['se'], 'cw', params['sig'])
+    assert not local_storage.verify('staging/upload-1', params['se'], 'r', params['sig'])
+
+
+def test_expired_signature_is_rejected(local_storage):
+    signature = local_storage.sign('p/file.txt', 1, 'r')
+    assert not local_storage.verify('p/file.txt', '1', 'r', signature)
+
+
+def test_read_range_returns_only_the_requested_bytes(local_storage):
+    local_storage.upload('p/data.bin', bytes(range(256)) * 4)
+    assert local_storage.read_range('p/data.bin', 10, 13) == bytes([10, 11, 12, 13])
+    assert local_storage.read_range('p/data.bin', 1020, 2000) == bytes([252, 253, 254, 255])
+    assert local_storage.read_range('p/data.bin', 5, 4) == b''
+
+
+@pytest.mark.parametrize('header, expected', [
+    ('bytes=0-99', (0, 99)),
+    ('bytes=100-', (100, 999)),
+    ('bytes=-200', (800, 999)),
+    ('bytes=-5000', (0, 999)),  # Suffix longer than the file
+    ('bytes=900-5000', (900, 999)),  # End clamped to the file
+])
+def test_parse_range_header(header, expected):
+    assert parse_range_header(header, 1000) == expected
+
+
+@pytest.mark.parametrize('header', [
+    None, '', 'items=0-10', 'bytes=0-10,20-30', 'bytes=abc', 'bytes=-', 'bytes=10-5', 'bytes=1-x'
+])
+def test_ignored_range_headers_serve_the_whole_file(header):
+    assert parse_range_header(header, 1000) is None
+
+
+@pytest.mark.parametrize('header, size', [('bytes=1000-', 1000), ('bytes=-0', 1000), ('bytes=-10', 0)])
+def test_unsatisfiable_ranges(header, size):
+    with pytest.raises(ValueError):
+        parse_range_header(header, size)
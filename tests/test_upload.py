@@ -0,0 +1,87 @@
+"""Tests for the multipart /upload route (api/function_app.py)."""
+
+import asyncio
+import json
+import os
+
+import azure.functions as func
+import pytest
+
+from config import config
+
+BOUNDARY = '----epar-test'
+META = {
+    'projectCode': 'EPAR-UPLOAD-1', 'title': 'Upload Test', 'outputType': 'Report', 'poContact': 'Ann',
+    'dateCompletion': '2025-01', 'researchAreas': '["Food Security"]', 'geographies': '["Kenya"]'
+}
+
+
+@pytest.fixture(scope='module')
+def function_app():
+    from db import init_db
+
+    if not os.path.exists(config.db_path):
+        conn = init_db.create_database(config.db_path)
+        init_db.populate_mock_data(conn)
+        conn.close()
+    from api import function_app
+    return function_app
+
+
+def multipart(fields, files):
+    parts = [
+        f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode()
+        for name, value in fields.items()
+    ]
+    for name, (file_name, data) in files.items():
+        parts.append(
+            f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="{name}"; filename="{file_name}"\r\n'
+            f'Content-Type: application/octet-stream\r\n\r\n'.encode() + data + b'\r\n'
+        )
+    parts.append(f'--{BOUNDARY}--\r\n'.encode())
+    return b''.join(parts)
+
+
+def post_upload(function_app, project_code, data):
+    request = func.HttpRequest(
+        method='POST', url='/api/upload',
+        body=multipart(dict(META, projectCode=project_code), {'file_0': ('notes.txt', data)}),
+        headers={'Content-Type': f'multipart/form-data; boundary={BOUNDARY}'}
+    )
+    return asyncio.run(function_app.upload._function._func(request))
+
+
+def catalog_files(function_app, project_code):
+    conn = function_app.db_helper.get_connection()
+    try:
+        return conn.execute("""
+            SELECT f.id FROM files f INNER JOIN projects p ON f.project_id = p.id
+            WHERE p.project_code = ?
+        """, (project_code,)).fetchall()
+    finally:
+        conn.close()
+
+
+def test_upload_commits_the_catalog_rows_and_the_job(function_app):
+    response = post_upload(function_app, 'EPAR-UPLOAD-1', b'maize yields by district')
+
+    assert response.status_code == 202
+    body = json.loads(response.get_body())
+    assert body['jobId'] and body['files'][0]['status'] == 'created'
+    assert len(catalog_files(function_app, 'EPAR-UPLOAD-1')) == 1
+
+
+def test_failed_enqueue_leaves_no_catalog_rows(function_app, monkeypatch):
+    queue = function_app.ingestion_queue.resolve()
+
+    def failing_enqueue(cursor, project_id, files):
+        raise OSError('disk full')
+
+    monkeypatch.setattr(queue, 'enqueue', failing_enqueue)
+    staged_before = set(os.listdir(config.ingest_staging_path))
+
+    response = post_upload(function_app, 'EPAR-UPLOAD-2', b'sorghum prices by market')
+
+    assert response.status_code == 500
+    assert catalog_files(function_app, 'EPAR-UPLOAD-2') == []
+    assert set(os.listdir(config.ingest_staging_path)) <= staged_before
@@ -0,0 +1,85 @@
+"""Tests for direct-to-storage uploads (api/upload_sessions.py)."""
+
+import asyncio
+import hashlib
+from urllib.parse import unquote, urlsplit
+
+import pytest
+
+from api.ingestion import IngestionQueue, process_job
+from api.storage import content_blob_path
+from api.upload_sessions import DirectUploadStore
+
+DATA = b'Household survey of smallholder maize farmers.\n' * 50
+DATA_HASH = hashlib.sha256(DATA).hexdigest()
+PROJECT = {
+    'projectCode': 'EPAR-DIRECT-1', 'title': 'Direct Upload Test', 'outputType': 'Report',
+    'poContact': 'Ann', 'dateCompletion': '2025-01'
+}
+
+
+@pytest.fixture
+def queue(catalog_db, tmp_path):
+    return IngestionQueue(
+        catalog_db.get_connection, staging_dir=str(tmp_path / 'staging'), max_attempts=1,
+        writer=catalog_db.writer, repository=catalog_db
+    )
+
+
+@pytest.fixture
+def store(catalog_db, local_storage, queue):
+    return DirectUploadStore(catalog_db, local_storage, queue, catalog_db.writer)
+
+
+def initiate(store):
+    files = [{'name': 'survey.txt', 'size': len(DATA), 'sha256': DATA_HASH}]
+    return asyncio.run(store.initiate(PROJECT, files))
+
+
+def upload_key(initiated):
+    """Storage key the upload URL writes to (what a client's PUT would create)."""
+    return unquote(urlsplit(initiated['files'][0]['uploadUrl']).path.split('/storage/', 1)[1])
+
+
+def test_upload_urls_never_point_at_content_keys(store):
+    initiated = initiate(store)
+
+    key = upload_key(initiated)
+    assert key == f"uploads/{initiated['uploadId']}/survey.txt"
+    assert 'x-ms-meta-sha256' not in initiated['files'][0]['headers']
+
+
+def test_abandoned_upload_cannot_plant_content(store, local_storage):
+    # A client declares a hash, writes other bytes and never completes
+    abandoned = initiate(store)
+    local_storage.upload(upload_key(abandoned), b'x' * len(DATA))
+
+    assert not local_storage.exists(content_blob_path(DATA_HASH))
+    assert initiate(store)['files'][0]['skip'] is False
+
+
+def test_completed_upload_is_re_hashed_before_it_is_stored(store, local_storage, queue):
+    initiated = initiate(store)
+    local_storage.upload(upload_key(initiated), DATA)
+    result = asyncio.run(store.complete(initiated['uploadId']))
+
+    # The client still holds its write URL and swaps the bytes before ingestion
+    local_storage.upload(upload_key(initiated), b'x' * len(DATA))
+    job = queue.claim_next()
+    with pytest.raises(ValueError, match='hash mismatch'):
+        process_job(job, queue, local_storage)
+
+    assert result['jobId'] == job['id']
+    assert not local_storage.exists(content_blob_path(DATA_HASH))
+
+
+def test_verified_upload_is_stored_under_its_content_key(store, local_storage, queue):
+    initiated = initiate(store)
+    local_storage.upload(upload_key(initiated), DATA)
+    asyncio.run(store.complete(initiated['uploadId']))
+
+    process_job(queue.claim_next(), queue, local_storage)
+
+    assert local_storage.get_size(content_blob_path(DATA_HASH)) == len(DATA)
+    assert not local_storage.exists(upload_key(initiated))
+    assert initiate(store)['files'][0]['skip'] is True
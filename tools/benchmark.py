@@ -0,0 +1,361 @@
+"""
+Benchmark search, download and upload against a synthetic catalog of a given size.
+
+The catalog is built by db/generate_corpus.py (cached under data/bench/ and
+reused by later runs with the same size and seed). Each case runs a warmup and
+then --iterations timed calls on one thread, and reports p50/p95/p99 latency
+and throughput:
+
+- search.*: typical search_files shapes (browse, common/medium/rare terms,
+  relevance sort, facets, file types); each call cycles through several terms
+  or values of its frequency band
+- download.lookup: get_file_by_id on random files
+- download.sign: download URL signing of the configured storage backend
+- upload.accept / upload.ingest: staging and the catalog write of /upload, then
+  the ingestion job (storage upload, text extraction, index update)
+
+Results are written as JSON (data/bench/results-<commit>.json by default) so
+runs can be compared across commits:
+
+Usage:
+    python tools/benchmark.py --files 100000
+    python tools/benchmark.py --files 1000000 --iterations 500 --only search
+    python tools/benchmark.py --db ./db/docs.sqlite --output before.json
+    python tools/benchmark.py --compare before.json after.json
+"""
+
+import argparse
+import io
+import json
+import logging
+import platform
+import random
+import shutil
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# Add parent directory to path to import config
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from config import config
+from api.db_helper import DatabaseHelper
+from api.ingestion import IngestionQueue, IngestionWorkerPool
+from api.storage import content_blob_path, get_storage
+from db.generate_corpus import FILE_TYPES, GEOGRAPHIES, RESEARCH_AREAS, CorpusGenerator, generate_corpus
+
+BENCH_DIR = Path(__file__).parent.parent / 'data' / 'bench'
+
+# Project code prefix of the uploads made by the benchmark (removed afterwards)
+UPLOAD_PREFIX = 'BENCH-UPLOAD'
+
+CASE_GROUPS = ('search', 'download', 'upload')
+
+
+# ============================================================================
+# MEASUREMENT
+# ============================================================================
+
+def summarize(samples: List[float], wall_seconds: float) -> Dict[str, float]:
+    """Latency percentiles (ms) and throughput of one case."""
+    ms = sorted(sample * 1000 for sample in samples)
+    cuts = statistics.quantiles(ms, n=100, method='inclusive') if len(ms) > 1 else ms * 99
+    return {
+        'iterations': len(ms),
+        'p50_ms': round(cuts[49], 3),
+        'p95_ms': round(cuts[94], 3),
+        'p99_ms': round(cuts[98], 3),
+        'mean_ms': round(statistics.fmean(ms), 3),
+        'max_ms': round(ms[-1], 3),
+        'ops_per_sec': round(len(ms) / wall_seconds, 1) if wall_seconds else 0
+    }
+
+
+def run_case(fn: Callable[[int], Any], iterations: int, warmup: int) -> Tuple[Dict[str, float], List[Any]]:
+    """
+    Call fn(i) warmup times untimed, then iterations times timed.
+
+    Returns:
+        Summary and the return values of the timed calls
+    """
+    for i in range(warmup):
+        fn(i)
+    samples, outputs = [], []
+    started = time.perf_counter()
+    for i in range(iterations):
+        call_started = time.perf_counter()
+        outputs.append(fn(warmup + i))
+        samples.append(time.perf_counter() - call_started)
+    return summarize(samples, time.perf_counter() - started), outputs
+
+
+# ============================================================================
+# CASES
+# ============================================================================
+
+def search_cases(generator: CorpusGenerator) -> Dict[str, List[Dict[str, Any]]]:
+    """search_files keyword arguments per case; calls cycle through the list."""
+    common = generator.query_terms('common')
+    medium = generator.query_terms('medium')
+    rare = generator.query_terms('rare')
+    return {
+        'search.browse': [{'sort': 'date'}],
+        'search.browse_no_files': [{'sort': 'date', 'include_files': False}],
+        'search.query_common': [{'query': term} for term in common],
+        'search.query_medium': [{'query': term} for term in medium],
+        'search.query_rare': [{'query': term} for term in rare],
+        'search.query_two_terms': [{'query': f"{a} {b}"} for a, b in zip(common, medium)],
+        'search.query_relevance': [{'query': term, 'sort': 'relevance'} for term in medium],
+        'search.research_area': [{'research_areas': [area]} for area in RESEARCH_AREAS[:10]],
+        'search.facets_dates': [{
+            'research_areas': [area], 'geographies': [geography],
+            'date_from': f"{year}-01", 'date_to': f"{year + 3}-12"
+        } for area, geography, year in zip(RESEARCH_AREAS[:10], GEOGRAPHIES[:10], range(2010, 2020))],
+        'search.file_types': [{'file_types': [file_type[0]]} for file_type in FILE_TYPES],
+        'search.query_facets': [
+            {'query': term, 'geographies': [geography]} for term, geography in zip(medium, GEOGRAPHIES)
+        ]
+    }
+
+
+def benchmark_search(repository, generator: CorpusGenerator, iterations: int, warmup: int) -> Dict[str, Any]:
+    results = {}
+    for name, variants in search_cases(generator).items():
+        summary, outputs = run_case(
+            lambda i: repository.search_files(**variants[i % len(variants)]), iterations, warmup
+        )
+        summary['mean_projects'] = round(statistics.fmean(len(projects) for projects in outputs), 1)
+        results[name] = summary
+        print_result(name, summary)
+    return results
+
+
+def benchmark_download(repository, storage, iterations: int, warmup: int, seed: int) -> Dict[str, Any]:
+    conn = repository.get_connection()
+    try:
+        max_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM files").fetchone()[0]
+    finally:
+        conn.close()
+    if not max_id:
+        return {}
+
+    rng = random.Random(seed)
+    file_ids = [rng.randint(1, max_id) for _ in range(iterations + warmup)]
+    results = {}
+
+    summary, files = run_case(lambda i: repository.get_file_by_id(file_ids[i]), iterations, warmup)
+    results['download.lookup'] = summary
+    print_result('download.lookup', summary)
+
+    files = [file for file in files if file]
+    summary, _ = run_case(lambda i: storage.get_download_url(
+        content_blob_path(files[i % len(files)]['contentHash']),
+        expires_in=3600, filename=files[i % len(files)]['name']
+    ), iterations, warmup)
+    results['download.sign'] = summary
+    print_result('download.sign', summary)
+    return results
+
+
+def benchmark_upload(repository, storage, generator: CorpusGenerator, iterations: int, warmup: int) -> Dict[str, Any]:
+    """Single-file uploads of new text documents: /upload's work, then ingestion."""
+    staging_dir = tempfile.mkdtemp(prefix='bench-staging-')
+    queue = IngestionQueue(repository.get_connection, staging_dir=staging_dir,
+                           writer=repository.writer, repository=repository)
+    pool = IngestionWorkerPool(queue, storage, workers=0)
+    run_id = datetime.now(timezone.utc).strftime('%Y%m%d%H%M%S')
+    max_bytes = config.max_abstract_bytes
+
+    def accept(i):
+        project = generator.project(i)
+        project['project_code'] = f"{UPLOAD_PREFIX}-{run_id}-{i:06d}"
+        data = f"{run_id} {i} {generator.text(max_bytes)}".encode('utf-8')
+        staged = queue.stage_file(io.BytesIO(data))
+        entry = {
+            'fileName': f"Upload_{i}.txt", 'fileType': 'txt', 'fileSize': staged['size'],
+            'blobPath': f"{project['project_code']}/Upload_{i}.txt",
+            'contentHash': staged['contentHash'], 'stagedPath': staged['stagedPath']
+        }
+
+        def write_upload(cursor):
+            project_id, _ = repository.upsert_project(cursor, {
+                'projectCode': project['project_code'], 'title': project['title'],
+                'researchAreas': project['research_areas'], 'dateInitialRequest': project['date_initial_request'],
+                'dateCompletion': project['date_completion'], 'poContact': project['po_contact'],
+                'otherPos': project['other_pos'], 'agdevPartner': project['agdev_partner'],
+                'outputType': project['output_type'], 'geographies': project['geographies']
+            })
+            entry['fileId'], _ = repository.upsert_file(cursor, project_id, entry)
+            return project_id
+
+        project_id = repository.write(write_upload)
+        repository.writer.execute(lambda cursor: queue.enqueue(cursor, project_id, [
+            {key: entry[key] for key in ('fileId', 'fileName', 'fileType', 'fileSize', 'blobPath', 'contentHash', 'stagedPath')}
+        ]))
+        return entry['contentHash']
+
+    results = {}
+    try:
+        summary, hashes = run_case(accept, iterations, warmup)
+        results['upload.accept'] = summary
+        print_result('upload.accept', summary)
+
+        # Jobs run in upload order, so the warmup calls take the warmup uploads
+        summary, processed = run_case(lambda i: pool.run_once(), iterations, warmup)
+        results['upload.ingest'] = summary
+        print_result('upload.ingest', summary)
+        if not all(processed):
+            print("  ! fewer ingestion jobs than uploads; check the ingestion_jobs table")
+    finally:
+        remove_uploads(repository, storage)
+        shutil.rmtree(staging_dir, ignore_errors=True)
+    return results
+
+
+def remove_uploads(repository, storage) -> None:
+    """Delete the benchmark's projects, files, jobs and stored blobs."""
+    pattern = f"{UPLOAD_PREFIX}-%"
+
+    def delete(cursor):
+        hashes = [row[0] for row in cursor.execute("""
+            SELECT f.content_hash FROM files f JOIN projects p ON p.id = f.project_id
+            WHERE p.project_code LIKE ?
+        """, (pattern,)).fetchall()]
+        project_ids = "SELECT id FROM projects WHERE project_code LIKE ?"
+        cursor.execute(f"DELETE FROM ingestion_jobs WHERE project_id IN ({project_ids})", (pattern,))
+        cursor.execute(f"DELETE FROM files WHERE project_id IN ({project_ids})", (pattern,))
+        cursor.execute("DELETE FROM projects WHERE project_code LIKE ?", (pattern,))
+        return hashes
+
+    for content_hash in repository.writer.execute(delete):
+        if content_hash:
+            storage.delete(content_blob_path(content_hash))
+
+
+# ============================================================================
+# REPORTING
+# ============================================================================
+
+def print_result(name: str, summary: Dict[str, float]) -> None:
+    print(f"  {name:<28} p50 {summary['p50_ms']:>9.2f} ms  p95 {summary['p95_ms']:>9.2f} ms  "
+          f"p99 {summary['p99_ms']:>9.2f} ms  {summary['ops_per_sec']:>9.1f}/s")
+
+
+def git_commit() -> Optional[str]:
+    """Current commit, with '-dirty' when the tree has changes."""
+    root = Path(__file__).parent.parent
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=root,
+                                capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=root,
+                               capture_output=True, text=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return f"{commit}-dirty" if dirty else commit
+
+
+def corpus_info(db_path: str) -> Dict[str, int]:
+    conn = sqlite3.connect(db_path)
+    try:
+        projects, files = conn.execute(
+            "SELECT (SELECT COUNT(*) FROM projects), (SELECT COUNT(*) FROM files)"
+        ).fetchone()
+    finally:
+        conn.close()
+    return {'projects': projects, 'files': files}
+
+
+def compare(before_path: str, after_path: str) -> None:
+    """Print p50/p95/p99 of two result files side by side."""
+    with open(before_path) as f:
+        before = json.load(f)
+    with open(after_path) as f:
+        after = json.load(f)
+
+    print(f"{before['meta'].get('commit')} -> {after['meta'].get('commit')} "
+          f"({before['meta']['corpus']['files']} -> {after['meta']['corpus']['files']} files)")
+    for name, new in after['results'].items():
+        old = before['results'].get(name)
+        if old is None:
+            print(f"  {name:<28} (new)")
+            continue
+        cells = []
+        for key in ('p50_ms', 'p95_ms', 'p99_ms'):
+            change = (new[key] - old[key]) / old[key] * 100 if old[key] else 0
+            cells.append(f"{key[:3]} {old[key]:>8.2f} -> {new[key]:>8.2f} ms ({change:+5.0f}%)")
+        print(f"  {name:<28} " + '  '.join(cells))
+
+
+def main():
+    """Main function."""
+
+    parser = argparse.ArgumentParser(description="Benchmark search, download and upload on a synthetic catalog")
+    parser.add_argument('--files', type=int, default=10000, help="Corpus size in files (default 10000)")
+    parser.add_argument('--seed', type=int, default=0, help="Corpus seed (default 0)")
+    parser.add_argument('--db', help="Benchmark this database instead of a generated corpus")
+    parser.add_argument('--iterations', type=int, default=200, help="Timed calls per case (default 200)")
+    parser.add_argument('--warmup', type=int, default=20, help="Untimed calls per case (default 20)")
+    parser.add_argument('--only', choices=CASE_GROUPS, action='append', help="Run only these groups")
+    parser.add_argument('--output', help="Result file (default data/bench/results-<commit>.json)")
+    parser.add_argument('--compare', nargs=2, metavar=('BEFORE', 'AFTER'), help="Compare two result files")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    logging.basicConfig(level=logging.WARNING)
+    db_path = args.db
+    if not db_path:
+        db_path = str(BENCH_DIR / f"corpus-{args.files}-s{args.seed}.sqlite")
+        if not Path(db_path).exists():
+            print(f"Generating corpus of {args.files} files at {db_path}")
+            generate_corpus(db_path, args.files, args.seed)
+
+    repository = DatabaseHelper(db_path)
+    if repository.shards:
+        repository.shards.sync()
+    storage = get_storage()
+    generator = CorpusGenerator(args.seed)
+    groups = args.only or CASE_GROUPS
+    commit = git_commit()
+
+    print(f"Benchmarking {db_path} ({args.iterations} iterations, {storage.mode} storage)")
+    results = {}
+    if 'search' in groups:
+        results.update(benchmark_search(repository, generator, args.iterations, args.warmup))
+    if 'download' in groups:
+        results.update(benchmark_download(repository, storage, args.iterations, args.warmup, args.seed))
+    if 'upload' in groups:
+        results.update(benchmark_upload(repository, storage, generator, args.iterations, args.warmup))
+    repository.writer.stop()
+
+    report = {
+        'meta': {
+            'commit': commit,
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'platform': platform.platform(),
+            'corpus': {'path': db_path, 'seed': None if args.db else args.seed, **corpus_info(db_path)},
+            'storage': storage.mode,
+            'fts_shard_by': config.fts_shard_by,
+            'iterations': args.iterations,
+            'warmup': args.warmup
+        },
+        'results': results
+    }
+    output = Path(args.output or BENCH_DIR / f"results-{commit or 'unknown'}.json")
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2))
+    print(f"Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Measure the cold-start import cost of the Functions app and fail past a budget.
+
+Each run imports api/function_app.py in a fresh interpreter with
+python -X importtime. The portal's own share is the import time of
+function_app minus the Azure Functions library (which every app pays), and the
+median over the runs is compared with --budget-ms. The script also fails when a
+module that should load on first use (database helper, ingestion and text
+extraction, catalog snapshots, the Azure Storage SDK) is imported up front.
+
+Usage:
+    python tools/import_benchmark.py                  # 5 runs, 60 ms budget
+    python tools/import_benchmark.py --runs 10 --budget-ms 40 --top 20
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+API_DIR = Path(__file__).parent.parent / 'api'
+
+# Modules the routes import on first use; loading them at import time is a regression
+DEFERRED_MODULES = [
+    'api.db_helper', 'api.ingestion', 'api.extraction', 'api.fts_shards', 'api.catalog',
+    'api.search_cache', 'api.warmup', 'azure.storage.blob', 'pypdf', 'psycopg_pool'
+]
+
+IMPORT_SCRIPT = (
+    "import json, sys; sys.path.insert(0, sys.argv[1]); import function_app; "
+    "print(json.dumps(sorted(sys.modules)))"
+)
+
+
+def measure() -> dict:
+    """
+    Import the app once in a fresh interpreter.
+
+    Returns:
+        {'total_ms', 'own_ms', 'modules': {name: (self_ms, cumulative_ms)}, 'loaded': set}
+    """
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', IMPORT_SCRIPT, str(API_DIR)],
+        capture_output=True, text=True, cwd=API_DIR.parent
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing function_app failed:\n{result.stderr[-2000:]}")
+
+    modules = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        # Modules imported more than once keep their first (real) measurement
+        modules.setdefault(name.strip(), (int(self_us) / 1000, int(cumulative_us) / 1000))
+
+    total_ms = modules['function_app'][1]
+    framework_ms = modules.get('azure.functions', (0, 0))[1]
+    loaded = set(json.loads(result.stdout.strip().splitlines()[-1]))
+    return {'total_ms': total_ms, 'own_ms': total_ms - framework_ms, 'modules': modules, 'loaded': loaded}
+
+
+def main(runs: int, budget_ms: float, top: int) -> bool:
+    """Run the benchmark and print the report; returns False when over budget."""
+    samples = [measure() for _ in range(runs)]
+    total_ms = statistics.median(sample['total_ms'] for sample in samples)
+    own_ms = statistics.median(sample['own_ms'] for sample in samples)
+
+    print("=" * 70)
+    print(f"function_app import ({runs} runs, median)")
+    print("=" * 70)
+    print(f"  Total:                 {total_ms:8.1f} ms")
+    print(f"  Azure Functions:       {total_ms - own_ms:8.1f} ms")
+    print(f"  Portal (budget {budget_ms:.0f}):  {own_ms:8.1f} ms")
+
+    # Slowest modules by self time, excluding the Azure Functions library
+    self_times = {}
+    for sample in samples:
+        for name, (self_ms, _) in sample['modules'].items():
+            if not name.startswith('azure.functions'):
+                self_times.setdefault(name, []).append(self_ms)
+    slowest = sorted(self_times.items(), key=lambda item: statistics.median(item[1]), reverse=True)
+    print("\nSlowest modules (self time, excluding azure.functions):")
+    for name, times in slowest[:top]:
+        print(f"  {statistics.median(times):8.2f} ms  {name}")
+
+    eager = [name for name in DEFERRED_MODULES if name in samples[0]['loaded']]
+    ok = own_ms <= budget_ms and not eager
+    print()
+    for name in eager:
+        print(f"❌ {name} is imported at startup (it should load on first use)")
+    if own_ms > budget_ms:
+        print(f"❌ Portal import time {own_ms:.1f} ms is over the {budget_ms:.0f} ms budget")
+    if ok:
+        print("✅ Within budget, no deferred modules imported at startup")
+    return ok
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark the cold-start import of the Functions app")
+    parser.add_argument('--runs', type=int, default=5, help="Fresh interpreters to measure (default 5)")
+    parser.add_argument('--budget-ms', type=float, default=60,
+                        help="Maximum median import time excluding azure.functions (default 60)")
+    parser.add_argument('--top', type=int, default=10, help="Slowest modules to list (default 10)")
+    args = parser.parse_args()
+
+    sys.exit(0 if main(args.runs, args.budget_ms, args.top) else 1)
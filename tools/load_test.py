@@ -0,0 +1,393 @@
+"""
+Drive the search, download and upload handlers concurrently, in-process.
+
+Each worker process imports api/function_app.py, runs the warmup trigger and
+then awaits the route coroutines directly with synthetic func.HttpRequest
+objects, --concurrency at a time, back to back, for --duration seconds. Requests
+are drawn by --mix (search=80,download=15,upload=5 by default); searches
+cycle through the shapes of tools/benchmark.py, downloads pick random files,
+uploads post a new project with one text file (ingested by the app's own
+ingestion workers while the test runs).
+
+The requests of one process share one event loop and app instance, like the
+Functions worker running async routes (database calls queue for its
+DB_EXECUTOR_WORKERS threads); several --processes contend for the SQLite file
+like several workers or instances on one host. The report has latency
+percentiles, throughput and errors per route, how long database calls waited
+for an executor thread, the time the database writers waited for the write
+lock, busy retries, and the ingestion backlog left at the end.
+
+The test runs against a copy of the corpus (generated by db/generate_corpus.py
+and cached in data/bench/, or --db) with local storage in a temporary
+directory, so it never touches the configured database or storage.
+
+Usage:
+    python tools/load_test.py --files 100000 --concurrency 64
+    python tools/load_test.py --processes 4 --concurrency 16 --mix search=50,upload=50
+    python tools/load_test.py --db ./db/docs.sqlite --duration 60 --output load.json
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import random
+import secrets
+import shutil
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+ROOT = Path(__file__).parent.parent
+BENCH_DIR = ROOT / 'data' / 'bench'
+
+ROUTES = ('search', 'download', 'upload')
+
+# search_files keyword -> /api/search query parameter
+SEARCH_PARAMS = {
+    'query': 'q', 'research_areas': 'researchAreas', 'geographies': 'geographies',
+    'output_types': 'outputTypes', 'po_contacts': 'poContacts', 'file_types': 'fileTypes',
+    'date_from': 'dateFrom', 'date_to': 'dateTo', 'sort': 'sort', 'include_files': 'includeFiles'
+}
+
+MULTIPART_BOUNDARY = 'load-test-boundary'
+
+
+def parse_mix(mix: str) -> Dict[str, float]:
+    """'search=80,download=15,upload=5' -> {route: weight}."""
+    weights = {}
+    for part in mix.split(','):
+        route, _, weight = part.partition('=')
+        route = route.strip()
+        if route not in ROUTES:
+            raise argparse.ArgumentTypeError(f"Unknown route '{route}' (expected one of {', '.join(ROUTES)})")
+        weights[route] = float(weight or 1)
+    if not any(weights.values()):
+        raise argparse.ArgumentTypeError("The mix needs at least one route with a positive weight")
+    return weights
+
+
+# ============================================================================
+# REQUESTS
+# ============================================================================
+
+def search_query(params: Dict[str, Any]) -> Dict[str, str]:
+    """search_files keyword arguments as /api/search query parameters."""
+    query = {}
+    for name, value in params.items():
+        if isinstance(value, list):
+            value = ','.join(value)
+        elif isinstance(value, bool):
+            value = 'true' if value else 'false'
+        query[SEARCH_PARAMS[name]] = str(value)
+    return query
+
+
+def multipart_body(fields: Dict[str, str], file_name: str, data: bytes) -> bytes:
+    parts = [
+        f'--{MULTIPART_BOUNDARY}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode('utf-8')
+        for name, value in fields.items()
+    ]
+    parts.append(
+        f'--{MULTIPART_BOUNDARY}\r\nContent-Disposition: form-data; name="file_0"; filename="{file_name}"\r\n'
+        f'Content-Type: text/plain\r\n\r\n'.encode('utf-8') + data + b'\r\n'
+    )
+    parts.append(f'--{MULTIPART_BOUNDARY}--\r\n'.encode('utf-8'))
+    return b''.join(parts)
+
+
+class RequestFactory:
+    """Synthetic requests for one client (deterministic per seed)."""
+
+    def __init__(self, seed: int, corpus_seed: int, max_file_id: int, tag: str):
+        import azure.functions as func
+        from db.generate_corpus import CorpusGenerator
+        from tools.benchmark import search_cases
+
+        self.func = func
+        self.rng = random.Random(seed)
+        # The corpus seed gives the corpus vocabulary; new projects and text vary per client
+        self.generator = CorpusGenerator(corpus_seed)
+        self.generator.rng = random.Random(seed)
+        self.searches = [search_query(params) for variants in search_cases(self.generator).values() for params in variants]
+        self.max_file_id = max_file_id
+        self.tag = tag
+        self.uploads = 0
+
+    def search(self):
+        return self.func.HttpRequest('GET', '/api/search', params=self.rng.choice(self.searches), body=b'')
+
+    def download(self):
+        file_id = self.rng.randint(1, max(self.max_file_id, 1))
+        return self.func.HttpRequest('GET', '/api/download', params={'fileId': str(file_id)}, body=b'')
+
+    def upload(self):
+        self.uploads += 1
+        project = self.generator.project(self.uploads)
+        fields = {
+            'projectCode': f"LOAD-{self.tag}-{self.uploads:06d}",
+            'title': project['title'],
+            'researchAreas': json.dumps(project['research_areas']),
+            'geographies': json.dumps(project['geographies']),
+            'outputType': project['output_type'],
+            'poContact': project['po_contact'],
+            'otherPos': json.dumps(project['other_pos']),
+            'agdevPartner': project['agdev_partner'],
+            'dateInitialRequest': project['date_initial_request'],
+            'dateCompletion': project['date_completion']
+        }
+        data = f"{fields['projectCode']} {self.generator.text(3000)}".encode('utf-8')
+        return self.func.HttpRequest(
+            'POST', '/api/upload',
+            headers={'Content-Type': f'multipart/form-data; boundary={MULTIPART_BOUNDARY}'},
+            body=multipart_body(fields, 'Load_Test.txt', data)
+        )
+
+
+# ============================================================================
+# WORKER
+# ============================================================================
+
+def run_worker(options: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Run one worker process's concurrent clients against its own app instance.
+
+    Returns:
+        Latencies (seconds) and status counts per route, error messages and
+        database executor and lock statistics of this process
+    """
+    sys.path.insert(0, str(ROOT))
+    sys.path.insert(0, str(ROOT / 'api'))
+    import logging
+    logging.basicConfig(level=logging.ERROR)
+
+    import function_app
+    from api.metrics import DB_BUSY_RETRIES, DB_EXECUTOR_WAIT, DB_LOCK_WAIT, SEARCH_FLIGHTS
+
+    handlers = {f.get_function_name(): f.get_user_function() for f in function_app.app.get_functions()}
+    handlers['warmup_instance'](None)
+
+    routes = list(options['mix'])
+    weights = [options['mix'][route] for route in routes]
+    factories = [
+        RequestFactory(options['seed'] * 1_000_003 + options['worker'] * 1000 + client, options['corpus_seed'],
+                       options['max_file_id'], f"{options['run_id']}-{options['worker']}-{client}")
+        for client in range(options['concurrency'])
+    ]
+
+    async def drive(factory: RequestFactory, deadline: float):
+        samples = {route: [] for route in routes}
+        statuses = {route: {} for route in routes}
+        messages = {}
+        while time.monotonic() < deadline:
+            route = factory.rng.choices(routes, weights=weights)[0]
+            req = getattr(factory, route)()
+            started = time.perf_counter()
+            message = None
+            try:
+                response = await handlers[route](req)
+                status = str(response.status_code)
+                if response.status_code >= 500:
+                    try:
+                        message = f"{route} {status}: {json.loads(response.get_body()).get('error', '')}"
+                    except (ValueError, AttributeError):
+                        message = f"{route} {status}"
+            except Exception as e:
+                # The host would answer 500
+                status = 'exception'
+                message = f"{route} raised {type(e).__name__}: {e}"
+            samples[route].append(time.perf_counter() - started)
+            statuses[route][status] = statuses[route].get(status, 0) + 1
+            if message:
+                messages[message[:160]] = messages.get(message[:160], 0) + 1
+        return samples, statuses, messages
+
+    async def drive_all():
+        deadline = time.monotonic() + options['duration']
+        return await asyncio.gather(*(drive(factory, deadline) for factory in factories))
+
+    results = asyncio.run(drive_all())
+
+    merged = {'samples': {route: [] for route in routes}, 'statuses': {route: {} for route in routes}, 'messages': {}}
+    for samples, statuses, messages in results:
+        for route in routes:
+            merged['samples'][route].extend(samples[route])
+            for status, count in statuses[route].items():
+                merged['statuses'][route][status] = merged['statuses'][route].get(status, 0) + count
+        for message, count in messages.items():
+            merged['messages'][message] = merged['messages'].get(message, 0) + count
+
+    merged['executor_calls'], merged['executor_wait_seconds'] = DB_EXECUTOR_WAIT.total()
+    merged['lock_waits'], merged['lock_wait_seconds'] = DB_LOCK_WAIT.total()
+    merged['busy_retries'] = DB_BUSY_RETRIES.value('BEGIN') + DB_BUSY_RETRIES.value('COMMIT')
+    merged['coalesced_searches'] = sum(SEARCH_FLIGHTS.value('follower', result) for result in ('ok', 'error', 'timeout'))
+    return merged
+
+
+# ============================================================================
+# REPORT
+# ============================================================================
+
+def percentiles(samples: List[float]) -> Tuple[float, float, float]:
+    ms = sorted(sample * 1000 for sample in samples)
+    if len(ms) < 2:
+        return (ms[0],) * 3 if ms else (0.0,) * 3
+    cuts = statistics.quantiles(ms, n=100, method='inclusive')
+    return cuts[49], cuts[94], cuts[98]
+
+
+def build_report(workers: List[Dict[str, Any]], options: Dict[str, Any], db_path: str) -> Dict[str, Any]:
+    routes = {}
+    for route in options['mix']:
+        samples = [sample for worker in workers for sample in worker['samples'][route]]
+        statuses = {}
+        for worker in workers:
+            for status, count in worker['statuses'][route].items():
+                statuses[status] = statuses.get(status, 0) + count
+        p50, p95, p99 = percentiles(samples)
+        errors = sum(count for status, count in statuses.items() if not status.startswith(('2', '3')))
+        routes[route] = {
+            'requests': len(samples),
+            'errors': errors,
+            'statuses': statuses,
+            'p50_ms': round(p50, 2),
+            'p95_ms': round(p95, 2),
+            'p99_ms': round(p99, 2),
+            'max_ms': round(max(samples) * 1000, 2) if samples else 0,
+            'per_sec': round(len(samples) / options['duration'], 1)
+        }
+
+    messages = {}
+    for worker in workers:
+        for message, count in worker['messages'].items():
+            messages[message] = messages.get(message, 0) + count
+
+    executor_calls = sum(worker['executor_calls'] for worker in workers)
+    executor_wait_seconds = sum(worker['executor_wait_seconds'] for worker in workers)
+    lock_waits = sum(worker['lock_waits'] for worker in workers)
+    lock_wait_seconds = sum(worker['lock_wait_seconds'] for worker in workers)
+
+    conn = sqlite3.connect(db_path)
+    try:
+        jobs = dict(conn.execute("SELECT status, COUNT(*) FROM ingestion_jobs GROUP BY status").fetchall())
+    finally:
+        conn.close()
+
+    return {
+        'options': {key: value for key, value in options.items() if key not in ('worker', 'max_file_id')},
+        'routes': routes,
+        'total_per_sec': round(sum(route['requests'] for route in routes.values()) / options['duration'], 1),
+        'errors': dict(sorted(messages.items(), key=lambda item: -item[1])),
+        'database': {
+            'executor_calls': executor_calls,
+            'coalesced_searches': sum(worker['coalesced_searches'] for worker in workers),
+            'mean_executor_wait_ms': round(executor_wait_seconds / executor_calls * 1000, 2) if executor_calls else 0,
+            'write_transactions': lock_waits,
+            'lock_wait_seconds': round(lock_wait_seconds, 3),
+            'mean_lock_wait_ms': round(lock_wait_seconds / lock_waits * 1000, 2) if lock_waits else 0,
+            'busy_retries': sum(worker['busy_retries'] for worker in workers)
+        },
+        'ingestion_jobs': jobs
+    }
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    options = report['options']
+    print(f"\n{options['processes']} process(es) x {options['concurrency']} concurrent requests, {options['duration']}s")
+    print(f"  {'route':<10} {'requests':>9} {'errors':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9} {'/s':>8}")
+    for route, stats in report['routes'].items():
+        print(f"  {route:<10} {stats['requests']:>9} {stats['errors']:>7} {stats['p50_ms']:>9.1f} "
+              f"{stats['p95_ms']:>9.1f} {stats['p99_ms']:>9.1f} {stats['max_ms']:>9.1f} {stats['per_sec']:>8.1f}")
+    print(f"  total {report['total_per_sec']:.1f} requests/s")
+
+    database = report['database']
+    print(f"\nDatabase calls: {database['executor_calls']}, "
+          f"mean {database['mean_executor_wait_ms']:.1f} ms waiting for an executor thread, "
+          f"{database['coalesced_searches']} searches shared an identical one in flight")
+    print(f"Database writes: {database['write_transactions']} transactions, "
+          f"{database['lock_wait_seconds']:.2f}s waiting for the write lock "
+          f"(mean {database['mean_lock_wait_ms']:.1f} ms), {database['busy_retries']} busy retries")
+    print(f"Ingestion jobs at the end: {report['ingestion_jobs'] or 'none'}")
+    if report['errors']:
+        print("\nErrors:")
+        for message, count in list(report['errors'].items())[:10]:
+            print(f"  {count:>6}  {message}")
+
+
+def main():
+    """Main function."""
+
+    parser = argparse.ArgumentParser(description="In-process concurrent load test of the HTTP handlers")
+    parser.add_argument('--files', type=int, default=10000, help="Corpus size in files (default 10000)")
+    parser.add_argument('--seed', type=int, default=0, help="Corpus and request seed (default 0)")
+    parser.add_argument('--db', help="Copy this database instead of a generated corpus")
+    parser.add_argument('--concurrency', type=int, default=8, help="Requests in flight per process (default 8)")
+    parser.add_argument('--processes', type=int, default=1, help="Worker processes (default 1)")
+    parser.add_argument('--duration', type=float, default=20.0, help="Seconds of load (default 20)")
+    parser.add_argument('--mix', type=parse_mix, default=parse_mix('search=80,download=15,upload=5'),
+                        help="Route weights (default search=80,download=15,upload=5)")
+    parser.add_argument('--no-search-cache', action='store_true', help="Run with SEARCH_CACHE_SIZE=0")
+    parser.add_argument('--output', help="Write the report as JSON")
+    args = parser.parse_args()
+
+    # The app reads its configuration once at import: point it at the run
+    # directory before anything imports config
+    run_dir = Path(tempfile.mkdtemp(prefix='load-test-'))
+    db_path = str(run_dir / 'docs.sqlite')
+    os.environ.update({
+        'DB_PATH': db_path,
+        'DATABASE_BACKEND': 'sqlite',
+        'STORAGE_BACKEND': 'local',
+        'LOCAL_STORAGE_PATH': str(run_dir / 'blobs'),
+        'LOCAL_STORAGE_SECRET': secrets.token_hex(16),
+        'INGEST_STAGING_PATH': str(run_dir / 'staging'),
+        'FTS_SHARD_PATH': str(run_dir / 'fts_shards')
+    })
+    if args.no_search_cache:
+        os.environ['SEARCH_CACHE_SIZE'] = '0'
+    sys.path.insert(0, str(ROOT))
+    from db.generate_corpus import generate_corpus
+
+    try:
+        source = args.db
+        if not source:
+            source = str(BENCH_DIR / f"corpus-{args.files}-s{args.seed}.sqlite")
+            if not Path(source).exists():
+                print(f"Generating corpus of {args.files} files at {source}")
+                generate_corpus(source, args.files, args.seed)
+        print(f"Copying {source} to {db_path}")
+        with sqlite3.connect(source) as src, sqlite3.connect(db_path) as dst:
+            src.backup(dst)
+            max_file_id = dst.execute("SELECT COALESCE(MAX(id), 0) FROM files").fetchone()[0]
+
+        options = {
+            'concurrency': args.concurrency, 'processes': args.processes, 'duration': args.duration,
+            'mix': args.mix, 'seed': args.seed, 'corpus_seed': args.seed, 'max_file_id': max_file_id,
+            'search_cache': not args.no_search_cache, 'run_id': run_dir.name.rsplit('-', 1)[-1]
+        }
+        print(f"Running {args.processes} x {args.concurrency} concurrent requests for {args.duration:.0f}s, mix {args.mix}")
+        if args.processes == 1:
+            workers = [run_worker({**options, 'worker': 0})]
+        else:
+            # Fresh interpreters, so each worker builds its own app like a Functions worker
+            context = multiprocessing.get_context('spawn')
+            with ProcessPoolExecutor(max_workers=args.processes, mp_context=context) as executor:
+                workers = list(executor.map(run_worker, [{**options, 'worker': i} for i in range(args.processes)]))
+
+        report = build_report(workers, options, db_path)
+        print_report(report)
+        if args.output:
+            Path(args.output).write_text(json.dumps(report, indent=2))
+            print(f"\nReport written to {args.output}")
+    finally:
+        shutil.rmtree(run_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,238 @@
+"""
+Report on the query workload recorded with QUERY_RECORDER=true and suggest indexes.
+Shapes are ranked by total time. For each one the captured EXPLAIN QUERY PLAN is
+shown with full table scans and temporary sorts flagged, and an index is proposed
+for the flagged tables: equality columns first, then the range or ORDER BY column,
+then (when it stays small) the other columns the query reads, so the index covers
+it. Each proposal is tried inside a transaction on the catalog database and only
+reported when the planner uses it and the plan gets better; --apply keeps them.
+
+Conditions like agdev_partner LIKE '%x%' (substring matches) cannot use an index and
+are listed as such.
+
+Usage:
+    python tools/query_advisor.py                # report the top 10 shapes
+    python tools/query_advisor.py --top 20
+    python tools/query_advisor.py --apply        # create the indexes that helped
+    python tools/query_advisor.py --reset        # clear the recorded workload
+"""
+
+import argparse
+import json
+import re
+import sqlite3
+import sys
+from pathlib import Path
+
+# Add parent directory to path to import config
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from config import config
+from api.query_recorder import explain_query_plan, format_plan, plan_warnings, shape_fingerprint, table_aliases
+
+# Wider indexes cost more on every write than they save on reads
+MAX_INDEX_COLUMNS = 6
+
+
+def plan_cost(plan, tables) -> int:
+    """Rough plan badness: full scans weigh more than temporary sorts."""
+    return sum(10 if warning.startswith('SCAN') else 1 for warning in plan_warnings(plan, tables))
+
+
+def column_usage(conn: sqlite3.Connection, sql: str, alias: str, table: str):
+    """
+    How the statement uses the columns of one table.
+
+    Returns:
+        (equality, range, order_by, like, referenced) column name lists
+    """
+    columns = [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+    order_clause = re.search(r'\bORDER BY (.*?)(?:\bLIMIT\b|$)', sql, re.IGNORECASE | re.DOTALL)
+    usage = {'equality': [], 'range': [], 'order_by': [], 'like': [], 'referenced': []}
+    qualified = re.search(rf'\b{re.escape(alias)}\.\w', sql) is not None
+
+    for column in columns:
+        prefix = rf'\b{re.escape(alias)}\.' if qualified else r'(?<![\w.])'
+        pattern = rf'{prefix}{re.escape(column)}\b'
+        if not re.search(pattern, sql):
+            continue
+        usage['referenced'].append(column)
+        if re.search(pattern + r'\s*(?:=|IN\s*\()', sql, re.IGNORECASE):
+            usage['equality'].append(column)
+        if re.search(pattern + r'\s*(?:>=|<=|>|<)\s*\?', sql):
+            usage['range'].append(column)
+        if re.search(pattern + r'\s+LIKE\b', sql, re.IGNORECASE):
+            usage['like'].append(column)
+        if order_clause and re.search(pattern, order_clause.group(1)):
+            usage['order_by'].append(column)
+
+    return tuple(usage[key] for key in ('equality', 'range', 'order_by', 'like', 'referenced'))
+
+
+def propose_index(conn: sqlite3.Connection, sql: str, alias: str, table: str):
+    """Index columns for one table of the statement, or (None, notes) when no index can help."""
+    equality, ranges, order_by, like, referenced = column_usage(conn, sql, alias, table)
+    notes = [f"{table}.{column} LIKE '%...%' cannot use an index" for column in like]
+
+    key = sorted(column for column in equality if column not in like)
+    trailing = ranges[:1] or [column for column in order_by if column not in key]
+    key += [column for column in trailing if column not in key]
+    if not key:
+        return None, notes
+
+    # The rowid is always in the index, so 'id' never needs to be added
+    covering = key + [column for column in referenced if column not in key and column != 'id']
+    if len(covering) <= MAX_INDEX_COLUMNS:
+        key = covering
+    return key, notes
+
+
+def try_index(conn: sqlite3.Connection, sql: str, params, table: str, columns, tables, apply: bool):
+    """
+    Create the index in a transaction and re-explain the statement.
+
+    Returns:
+        (index DDL, plan before, plan after, helped)
+    """
+    name = f"idx_advisor_{table}_{'_'.join(columns)}"
+    if len(name) > 60:
+        name = f"idx_advisor_{table}_{shape_fingerprint(','.join(columns))[:8]}"
+    ddl = f"CREATE INDEX IF NOT EXISTS {name} ON {table}({', '.join(columns)})"
+    before = explain_query_plan(conn, sql, params)
+
+    helped = False
+    conn.execute("BEGIN")
+    try:
+        conn.execute(ddl)
+        after = explain_query_plan(conn, sql, params)
+        used = any(name in detail for _, _, detail in after)
+        newly_covering = (any(f"COVERING INDEX {name}" in detail for _, _, detail in after)
+                          and not any('COVERING INDEX' in detail for _, _, detail in before))
+        helped = used and (plan_cost(after, tables) < plan_cost(before, tables) or newly_covering)
+    finally:
+        if apply and helped:
+            conn.commit()
+        else:
+            conn.rollback()
+    return ddl, before, after, helped
+
+
+def report(top: int, apply: bool) -> bool:
+    """Print the workload report; returns False when nothing has been recorded."""
+    workload_path = config.query_recorder_path
+    if not Path(workload_path).exists():
+        print(f"No workload recorded at {workload_path}")
+        print("Set QUERY_RECORDER=true, run some searches and try again")
+        return False
+
+    workload = sqlite3.connect(workload_path)
+    workload.row_factory = sqlite3.Row
+    shapes = workload.execute("""
+        SELECT s.*, p.plan, p.elapsed_ms AS plan_ms
+        FROM query_shapes s
+        LEFT JOIN query_plans p ON p.fingerprint = s.fingerprint
+        ORDER BY s.total_ms DESC
+    """).fetchall()
+    workload.close()
+    if not shapes:
+        print(f"No query shapes recorded in {workload_path} yet")
+        return False
+
+    # Autocommit: the index trials manage their own transactions
+    catalog = sqlite3.connect(config.db_path, isolation_level=None)
+    total_ms = sum(shape['total_ms'] for shape in shapes)
+
+    print("=" * 100)
+    print(f"Query workload: {len(shapes)} shapes, {sum(s['calls'] for s in shapes)} sampled calls, "
+          f"{total_ms:.0f} ms")
+    print("=" * 100)
+    print(f"{'#':>3}  {'shape':<12}  {'calls':>7}  {'total ms':>10}  {'share':>6}  {'avg ms':>8}  "
+          f"{'max ms':>8}  {'slow':>5}  flags")
+    for rank, shape in enumerate(shapes[:top], 1):
+        plan = json.loads(shape['plan']) if shape['plan'] else None
+        flags = len(plan_warnings(plan, list(table_aliases(catalog, shape['sample_sql'])))) if plan else '-'
+        print(f"{rank:>3}  {shape['fingerprint']:<12}  {shape['calls']:>7}  {shape['total_ms']:>10.1f}  "
+              f"{shape['total_ms'] / total_ms:>6.1%}  {shape['total_ms'] / shape['calls']:>8.2f}  "
+              f"{shape['max_ms']:>8.1f}  {shape['slow_calls']:>5}  {flags}")
+
+    proposals = []
+    for rank, shape in enumerate(shapes[:top], 1):
+        sql = shape['sample_sql']
+        print(f"\n[{rank}] {shape['fingerprint']}: {shape['shape'][:400]}")
+        if not shape['plan']:
+            print(f"    No plan captured (never slower than {config.query_recorder_slow_ms:.0f} ms)")
+            continue
+
+        plan = json.loads(shape['plan'])
+        aliases = table_aliases(catalog, sql)
+        warnings = plan_warnings(plan, list(aliases))
+        print(f"    Plan (captured at {shape['plan_ms']:.1f} ms):")
+        for line in format_plan(plan):
+            print(f"      {line}")
+        if not warnings:
+            print("    ✅ No full scans or temporary sorts")
+            continue
+        for warning in warnings:
+            print(f"    ⚠️  {warning}")
+
+        # Which tables to index: the scanned ones, plus the ORDER BY table for temp sorts
+        flagged_aliases = {warning.split()[1] for warning in warnings if warning.startswith('SCAN')}
+        if any('ORDER BY' in warning for warning in warnings):
+            order_clause = re.search(r'\bORDER BY (.*?)(?:\bLIMIT\b|$)', sql, re.DOTALL)
+            ordered = [name for name in re.findall(r'(\w+)\.', order_clause.group(1)) if name in aliases]
+            flagged_aliases.add(ordered[0] if ordered else next(iter(aliases)))
+
+        # Placeholders are bound to NULL: plans do not depend on the values here
+        params = [None] * shape['param_count']
+        for alias in sorted(flagged_aliases & set(aliases)):
+            table = aliases[alias]
+            columns, notes = propose_index(catalog, sql, alias, table)
+            for note in notes:
+                print(f"    ℹ️  {note}")
+            if not columns:
+                continue
+            ddl, _, after, helped = try_index(catalog, sql, params, table, columns, list(aliases), apply)
+            if helped:
+                proposals.append(ddl)
+                print(f"    💡 {ddl}{'  (created)' if apply else ''}")
+                for line in format_plan(after):
+                    print(f"         {line}")
+            else:
+                print(f"    ✗ Tried {ddl}: the planner did not use it or the plan did not improve")
+
+    catalog.close()
+    print("\n" + "=" * 100)
+    if proposals:
+        print(f"{len(proposals)} index{'es' if len(proposals) > 1 else ''} "
+              f"{'created' if apply else 'suggested (run with --apply to create)'}:")
+        for ddl in dict.fromkeys(proposals):
+            print(f"  {ddl};")
+    else:
+        print("No index suggestions")
+    print("=" * 100)
+    return True
+
+
+def reset() -> None:
+    """Delete the recorded workload."""
+    workload_path = Path(config.query_recorder_path)
+    if workload_path.exists():
+        workload = sqlite3.connect(workload_path)
+        with workload:
+            workload.execute("DELETE FROM query_shapes")
+            workload.execute("DELETE FROM query_plans")
+        workload.close()
+    print(f"Cleared the query workload at {workload_path}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Report recorded query shapes and suggest indexes")
+    parser.add_argument('--top', type=int, default=10, help="Number of shapes to report (default 10)")
+    parser.add_argument('--apply', action='store_true', help="Create the suggested indexes")
+    parser.add_argument('--reset', action='store_true', help="Clear the recorded workload")
+    args = parser.parse_args()
+
+    if args.reset:
+        reset()
+        sys.exit(0)
+    sys.exit(0 if report(args.top, args.apply) else 1)
@@ -0,0 +1,91 @@
+"""
+Test direct-to-storage uploads against Azure Storage or a local Azurite emulator.
+This script verifies that a write-only upload URL accepts a PUT, that the blob
+size can be read back, that client-set metadata is not reported as the
+content hash, and that the URL cannot be used to read the blob.
+
+Start Azurite and point BLOB_CONN at it, e.g.:
+    azurite-blob --location ./azurite
+    BLOB_CONN="DefaultEndpointsProtocol=http;AccountName=devstoreaccount1;AccountKey=Eby8vdM02xNOcqFlqUwJPLlmEtlCDXJ1OUzFT50uSRZ6IFsuFq2UVErCz4I6tq/K1SZFPTOtr/KBHBeksoGMGw==;BlobEndpoint=http://127.0.0.1:10000/devstoreaccount1;"
+"""
+
+import hashlib
+import sys
+import urllib.error
+import urllib.request
+from pathlib import Path
+
+# Add parent directory to path to import config
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from config import config
+from api.storage import AzureBlobStorage
+from api.upload_sessions import direct_upload_blob_path
+
+
+def test_direct_upload():
+    """Upload a blob through a write-only SAS URL and verify it."""
+    print("=" * 60)
+    print("Testing Direct-to-Storage Upload")
+    print("=" * 60)
+
+    try:
+        print(f"\n1. Connecting to storage (container: {config.blob_container})...")
+        storage = AzureBlobStorage(config.blob_connection_string, config.blob_container)
+        if not storage.container_client.exists():
+            storage.container_client.create_container()
+            print(f"   ✅ Container created")
+        else:
+            print(f"   ✅ Container exists")
+
+        content = b"Direct upload test file from EPAR Data Portal."
+        sha256 = hashlib.sha256(content).hexdigest()
+        blob_key = direct_upload_blob_path('direct-upload-test', 'test.txt')
+
+        print(f"\n2. Generating write-only upload URL for {blob_key}...")
+        upload_url = storage.get_upload_url(blob_key, expires_in=300)
+        print(f"   ✅ {upload_url.split('?')[0]}")
+
+        print(f"\n3. Uploading with PUT...")
+        request = urllib.request.Request(upload_url, data=content, method='PUT', headers={
+            'x-ms-blob-type': 'BlockBlob',
+            'x-ms-meta-sha256': sha256
+        })
+        with urllib.request.urlopen(request) as response:
+            print(f"   ✅ Status {response.status}")
+
+        print(f"\n4. Verifying blob properties...")
+        properties = storage.get_properties(blob_key)
+        if properties['size'] != len(content) or properties['sha256'] is not None:
+            print(f"   ❌ Unexpected properties: {properties}")
+            return False
+        print(f"   ✅ size={properties['size']}, client metadata ignored")
+
+        print(f"\n5. Checking the upload URL cannot read the blob...")
+        try:
+            urllib.request.urlopen(upload_url)
+            print(f"   ❌ Read with a write-only URL succeeded!")
+            return False
+        except urllib.error.HTTPError as e:
+            print(f"   ✅ Read rejected ({e.code})")
+
+        print(f"\n6. Cleaning up...")
+        storage.delete(blob_key)
+        print(f"   ✅ Test blob deleted!")
+
+        print("\n" + "=" * 60)
+        print("✅ ALL TESTS PASSED! Direct uploads are working correctly!")
+        print("=" * 60)
+        return True
+
+    except Exception as e:
+        print(f"\n❌ ERROR: {str(e)}")
+        print("\nTroubleshooting:")
+        print("1. Check that BLOB_CONN points at Azure Storage or Azurite")
+        print("2. For Azurite, make sure azurite-blob is running on port 10000")
+        return False
+
+
+if __name__ == '__main__':
+    success = test_direct_upload()
+    sys.exit(0 if success else 1)